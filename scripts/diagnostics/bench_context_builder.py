@@ -0,0 +1,85 @@
+"""
+Parity + timing check: dense-grid history lags vs shift().over("acct").
+
+Builds a synthetic (acct, yr) panel with year gaps and duplicate rows, then
+compares worldmodel.dense_hist_lags (panel index path) and, for accts without
+duplicate rows, worldmodel.last_k_observed on the (acct x year) grid (panel
+tensor path) against the window-function lags that
+build_inference_context_chunked_v102 uses without the panel index.
+
+The worldmodel helpers are pulled out of worldmodel.py with ast
+(worldmodel itself mounts Drive and loads the panel on exec).
+
+Usage:
+    python scripts/diagnostics/bench_context_builder.py [N_ACCTS]
+"""
+import ast
+import os
+import sys
+import time
+
+import numpy as np
+import polars as pl
+
+N_ACCTS = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+MIN_YEAR, ANCHOR = 2005, 2024
+L = 21
+
+WM_PY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "inference", "worldmodel.py")
+WANT = {"dense_hist_lags", "_ranges_to_index", "last_k_observed"}
+with open(WM_PY) as f:
+    tree = ast.parse(f.read())
+ns = {"np": np}
+exec(compile(ast.Module(body=[n for n in tree.body if isinstance(n, ast.FunctionDef) and n.name in WANT],
+                        type_ignores=[]), WM_PY, "exec"), ns)
+
+rng = np.random.default_rng(0)
+years = np.arange(MIN_YEAR, ANCHOR + 1)
+keep = rng.random((N_ACCTS, years.size)) > 0.08            # ~8% missing years
+acct = np.repeat(np.arange(N_ACCTS), keep.sum(axis=1))
+yr = np.tile(years, N_ACCTS)[keep.ravel()]
+dup = rng.random(acct.size) < 0.01                           # ~1% duplicated rows
+acct = np.concatenate([acct, acct[dup]])
+yr = np.concatenate([yr, yr[dup]])
+df = (
+    pl.DataFrame({"acct": [f"{a:013d}" for a in acct], "yr": yr.astype(np.int32),
+                  "y_log": rng.normal(12.5, 0.6, acct.size)})
+    .sort(["acct", "yr"], maintain_order=True)
+)
+print(f"rows={len(df):,} accts={N_ACCTS:,} L={L}")
+
+t0 = time.perf_counter()
+ref = (
+    df.with_columns([pl.col("y_log").shift(i).over("acct").alias(f"lag_{i}") for i in range(L)])
+    .filter(pl.col("yr") == ANCHOR)
+)
+ref_mat = np.column_stack([ref[f"lag_{i}"].to_numpy() for i in range(L - 1, -1, -1)]).astype(np.float32)
+t_win = time.perf_counter() - t0
+
+t0 = time.perf_counter()
+rows = np.flatnonzero(df["yr"].to_numpy() == ANCHOR)
+new_mat = ns["dense_hist_lags"](df["acct"].to_numpy(), df["y_log"].to_numpy(), rows, L)
+t_grid = time.perf_counter() - t0
+
+print(f"window shift().over  {t_win:7.3f}s")
+print(f"dense grid           {t_grid:7.3f}s  speedup={t_win / max(t_grid, 1e-9):.1f}x")
+
+same = np.array_equal(np.isnan(ref_mat), np.isnan(new_mat)) and np.allclose(
+    np.nan_to_num(ref_mat), np.nan_to_num(new_mat), rtol=0, atol=0)
+print(f"{'PASS' if same else 'FAIL'}: lag matrices identical ({ref_mat.shape[0]:,} anchors)")
+
+# Tensor path: year grid -> last L observed values, accts without duplicate rows only
+dup_acct = np.zeros(N_ACCTS, dtype=bool)
+dup_acct[acct[acct.size - int(dup.sum()):]] = True
+grid = np.full((N_ACCTS, years.size), np.nan)
+a_num = np.array([int(a) for a in df["acct"].to_list()])
+grid[a_num, df["yr"].to_numpy() - MIN_YEAR] = df["y_log"].to_numpy()
+has_anchor = np.isfinite(grid[:, -1]) & ~dup_acct
+t0 = time.perf_counter()
+grid_mat = ns["last_k_observed"](grid[has_anchor], L)
+t_tensor = time.perf_counter() - t0
+ref_nd = ref_mat[~dup_acct[np.array([int(a) for a in ref["acct"].to_list()])]]
+print(f"year grid (tensor)   {t_tensor:7.3f}s  speedup={t_win / max(t_tensor, 1e-9):.1f}x")
+same_t = np.array_equal(np.isnan(ref_nd), np.isnan(grid_mat)) and np.array_equal(
+    np.nan_to_num(ref_nd), np.nan_to_num(grid_mat))
+print(f"{'PASS' if same_t else 'FAIL'}: year-grid lags identical for {grid_mat.shape[0]:,} non-duplicate anchors")
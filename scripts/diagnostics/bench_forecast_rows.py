@@ -0,0 +1,127 @@
+"""
+Micro-benchmark: parcel forecast row build (+ DB record conversion).
+
+Compares the original per-(acct, horizon) dict loop against the columnar
+_build_forecast_rows_from_inf_out / _df_records in inference_pipeline.py,
+on synthetic quantile fans (no torch, no DB needed).
+
+The pipeline functions are pulled out of inference_pipeline.py with ast so
+the script does not run the pipeline itself.
+
+Usage:
+    python scripts/diagnostics/bench_forecast_rows.py [N] [H]
+"""
+import ast
+import os
+import sys
+import time
+from datetime import datetime, date
+
+import numpy as np
+import pandas as pd
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+H = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+S = 256
+MIN_SPEEDUP = 20.0
+
+PIPELINE_PY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "inference", "inference_pipeline.py")
+WANT = {
+    "_py_scalar", "_const_categorical", "_series_pylist", "_df_records",
+    "_price_quantiles_from_cube", "_build_forecast_rows_from_inf_out",
+}
+
+with open(PIPELINE_PY) as f:
+    tree = ast.parse(f.read())
+mod = ast.Module(body=[n for n in tree.body if isinstance(n, ast.FunctionDef) and n.name in WANT], type_ignores=[])
+ns = {
+    "np": np, "pd": pd, "datetime": datetime, "date": date,
+    "MODEL_VERSION": "world_model_v11_inducing_token",
+    "PARCEL_FORECAST_HAS_N_COL": False,
+}
+exec(compile(mod, PIPELINE_PY, "exec"), ns)
+missing = WANT - set(ns)
+if missing:
+    raise SystemExit(f"missing functions in {PIPELINE_PY}: {sorted(missing)}")
+
+
+# ── Baseline: the pre-columnar row builder / record conversion ──
+def _legacy_build_rows(acct_arr, qs, origin_year, run_id, series_kind, variant_id, backtest_id, as_of_date, S_local):
+    q10, q25, q50, q75, q90 = qs
+    rows = []
+    is_backtest = (series_kind == "backtest")
+    now_iso = datetime.utcnow().isoformat()
+    N_local, H_local = q50.shape
+    for i in range(N_local):
+        acct = str(acct_arr[i])
+        for h_idx in range(H_local):
+            horizon_k = int(h_idx + 1)
+            rows.append({
+                "acct": acct,
+                "origin_year": int(origin_year),
+                "horizon_m": int(12 * horizon_k),
+                "forecast_year": int(origin_year + horizon_k),
+                "value": float(q50[i, h_idx]),
+                "p10": float(q10[i, h_idx]),
+                "p25": float(q25[i, h_idx]),
+                "p50": float(q50[i, h_idx]),
+                "p75": float(q75[i, h_idx]),
+                "p90": float(q90[i, h_idx]),
+                "run_id": run_id,
+                "backtest_id": backtest_id,
+                "variant_id": variant_id,
+                "model_version": ns["MODEL_VERSION"],
+                "as_of_date": as_of_date.isoformat(),
+                "n_scenarios": int(S_local),
+                "is_backtest": bool(is_backtest),
+                "series_kind": series_kind,
+                "inserted_at": now_iso,
+                "updated_at": now_iso,
+            })
+    return pd.DataFrame(rows)
+
+
+def _legacy_df_records(df):
+    cols = list(df.columns)
+    out = []
+    for row in df.itertuples(index=False, name=None):
+        out.append(tuple(ns["_py_scalar"](v) for v in row))
+    return cols, out
+
+
+def _timed(fn, *a, **kw):
+    t0 = time.perf_counter()
+    r = fn(*a, **kw)
+    return r, time.perf_counter() - t0
+
+
+rng = np.random.default_rng(0)
+acct = np.array([f"{i:013d}" for i in range(N)])
+base = np.exp(rng.normal(12.5, 0.6, size=(N, 1, 1)))
+fan = np.sort(base * np.exp(rng.normal(0, 0.1, size=(N, 5, H)).cumsum(axis=1) * 0.2), axis=1)
+inf_out = {"acct": acct, "quantiles": fan, "q_levels": (0.10, 0.25, 0.50, 0.75, 0.90), "n_scenarios": S}
+kw = dict(origin_year=2025, run_id="forecast_2025_bench", series_kind="forecast",
+          variant_id="__forecast__", backtest_id=None, as_of_date=date(2026, 1, 1))
+
+print(f"N={N:,} H={H} rows={N * H:,}")
+
+df_old, t_old = _timed(_legacy_build_rows, acct, tuple(fan[:, j, :] for j in range(5)), S_local=S, **kw)
+df_new, t_new = _timed(ns["_build_forecast_rows_from_inf_out"], inf_out, **kw)
+print(f"row build   legacy={t_old:8.3f}s  columnar={t_new:8.3f}s  speedup={t_old / max(t_new, 1e-9):7.1f}x")
+
+(cols_old, rec_old), r_old = _timed(_legacy_df_records, df_old)
+(cols_new, rec_new), r_new = _timed(ns["_df_records"], df_new)
+print(f"df_records  legacy={r_old:8.3f}s  columnar={r_new:8.3f}s  speedup={r_old / max(r_new, 1e-9):7.1f}x")
+
+# Same rows, same Python types (timestamps differ by construction time)
+assert cols_old == cols_new, (cols_old, cols_new)
+skip = {cols_new.index("inserted_at"), cols_new.index("updated_at")}
+for a, b in zip(rec_old[:1000] + rec_old[-1000:], rec_new[:1000] + rec_new[-1000:]):
+    for j, (x, y) in enumerate(zip(a, b)):
+        if j in skip:
+            continue
+        assert x == y and type(x) is type(y), (cols_new[j], x, y)
+print("records identical (sampled head/tail)")
+
+speedup = t_old / max(t_new, 1e-9)
+print(f"{'PASS' if speedup >= MIN_SPEEDUP else 'FAIL'}: row-build speedup {speedup:.1f}x (target >= {MIN_SPEEDUP:.0f}x)")
@@ -0,0 +1,159 @@
+"""
+Cell 2d: Sampler Steps Benchmark — wall-clock vs fan calibration
+=================================================================
+Run AFTER Cell 1 (worldmodel.py v11). Optionally after the sweep with
+SWEEP_DISTILL_STEPS so distilled students sit next to the checkpoint.
+
+For one backtest origin, samples a fixed parcel set with every sampler
+(DDIM-k, DPM-Solver++ 2M, distilled student) at 20/10/5/2 steps, same token
+paths and noise seed for every run, and reports per run:
+  - wall-clock seconds (and parcels/s)
+  - coverage_p10_p90: % of (parcel, horizon) actuals inside the p10-p90 fan
+  - PIT KS: KS statistic of the PIT values against Uniform(0, 1)
+  - p50 drift: median |p50 / p50_ddim20 - 1| against the 20-step DDIM reference
+
+The inference_pipeline.py helpers (checkpoint load, context build, actuals)
+are pulled out with ast, since exec'ing that file runs the whole pipeline.
+Results are written to OUT_DIR/bench_sampler_steps_o<origin>.json.
+"""
+import ast
+import json
+import os
+import time
+
+import numpy as np
+import polars as pl
+import torch
+from scipy.stats import kstest
+
+# ═══════════════════════════════════════════════════════════════════
+# CONFIG
+# ═══════════════════════════════════════════════════════════════════
+BENCH_ORIGIN = int(globals().get("BENCH_ORIGIN", 2021))
+BENCH_PARCELS = int(globals().get("BENCH_PARCELS", 20_000))
+BENCH_SCENARIOS = int(globals().get("BENCH_SCENARIOS", 256))
+BENCH_STEPS = tuple(globals().get("BENCH_STEPS", (20, 10, 5, 2)))
+BENCH_KINDS = tuple(globals().get("BENCH_KINDS", ("ddim", "dpmpp_2m", "student")))
+BENCH_BATCH = int(globals().get("BENCH_BATCH", 512))
+BENCH_SEED = 1234
+CKPT_DIR = globals().get("CKPT_DIR") or globals().get("OUT_DIR", "")
+
+# ─── Pick up Cell 1 globals ───
+_required = [
+    "lf", "num_use", "cat_use", "H", "Scheduler", "sample_token_paths", "sample_ddim_v11",
+    "student_ckpt_path", "load_v11_student", "build_inference_context_chunked_v102",
+    "create_denoiser_v11", "create_gating_network", "create_token_persistence", "create_coherence_scale",
+    "SimpleScaler",
+]
+_missing = [r for r in _required if r not in globals()]
+if _missing:
+    print(f"⚠️  Missing Cell 1 globals: {_missing}")
+    print("   Make sure Cell 1 (worldmodel.py) has been executed first")
+    raise SystemExit
+
+_PIPELINE_PY = globals().get("PIPELINE_PY") or os.path.join(
+    os.path.dirname(os.path.abspath(globals().get("__file__", "scripts/diagnostics/x"))), "..", "inference", "inference_pipeline.py")
+_WANT = {"_ts", "_get_checkpoint_paths", "_load_ckpt_into_live_objects", "_load_student_into_live_model",
+         "_build_inference_for_accounts_at_origin", "_materialize_actual_prices_for_accounts"}
+with open(_PIPELINE_PY) as f:
+    _tree = ast.parse(f.read())
+exec(compile(ast.Module(body=[n for n in _tree.body if isinstance(n, ast.FunctionDef) and n.name in _WANT],
+                        type_ignores=[]), _PIPELINE_PY, "exec"), globals())
+
+_device = "cuda" if torch.cuda.is_available() else "cpu"
+_H = int(H)
+
+# ═══════════════════════════════════════════════════════════════════
+# STEP 1: Checkpoint, fixed parcel set, actuals
+# ═══════════════════════════════════════════════════════════════════
+_pairs = dict(_get_checkpoint_paths(CKPT_DIR))
+assert BENCH_ORIGIN in _pairs, f"❌ No checkpoint for origin {BENCH_ORIGIN} in {CKPT_DIR}"
+_ckpt_path = _pairs[BENCH_ORIGIN]
+_kind_cfg, SAMPLER_KIND = globals().get("SAMPLER_KIND", "ddim"), "ddim"   # load the teacher; students load per run
+_ckpt = _load_ckpt_into_live_objects(_ckpt_path)
+SAMPLER_KIND = _kind_cfg
+_teacher = globals()["model"]
+
+_accts = (lf.filter(pl.col("yr") == BENCH_ORIGIN).select(pl.col("acct").cast(pl.Utf8)).unique()
+          .collect()["acct"].to_numpy())
+_accts = np.sort(_accts)
+_accts = np.random.default_rng(BENCH_SEED).choice(_accts, min(BENCH_PARCELS, _accts.size), replace=False).tolist()
+ctx = _build_inference_for_accounts_at_origin(_accts, BENCH_ORIGIN, _ckpt.get("global_medians", {}))
+N = len(ctx["acct"])
+
+_act = _materialize_actual_prices_for_accounts(accts=[str(a) for a in ctx["acct"]], origin=BENCH_ORIGIN, max_horizon=_H)
+actual = np.full((N, _H), np.nan)
+if _act is not None and not _act.empty:
+    _pos = {str(a): i for i, a in enumerate(ctx["acct"])}
+    _i = np.array([_pos.get(str(a), -1) for a in _act["acct"]], dtype=np.int64)
+    _h = _act["year"].to_numpy().astype(int) - BENCH_ORIGIN - 1
+    _ok = (_i >= 0) & (_h >= 0) & (_h < _H)
+    actual[_i[_ok], _h[_ok]] = _act["actual_price"].to_numpy()[_ok]
+print(f"Sampler bench: origin={BENCH_ORIGIN} parcels={N:,} S={BENCH_SCENARIOS} "
+      f"actuals={int(np.isfinite(actual).sum()):,} device={_device} ckpt={os.path.basename(_ckpt_path)}")
+
+_sched = Scheduler(int(globals().get("DIFF_STEPS_SAMPLE", 20)), _device)
+torch.manual_seed(BENCH_SEED)
+_Z = sample_token_paths(int(K_TOKENS), _H, globals()["token_persistence"], BENCH_SCENARIOS, _device)
+
+
+# ═══════════════════════════════════════════════════════════════════
+# STEP 2: Runs
+# ═══════════════════════════════════════════════════════════════════
+def _run(kind, steps):
+    """Price paths [N, S, H] and wall-clock seconds, or (None, None) when the sampler is unavailable."""
+    m = _teacher
+    if kind == "student":
+        path = student_ckpt_path(_ckpt_path, steps)
+        if not os.path.exists(path):
+            return None, None
+        m = load_v11_student(path, _teacher, _sched.steps).to(_device)
+    out = np.empty((N, BENCH_SCENARIOS, _H), dtype=np.float64)
+    torch.manual_seed(BENCH_SEED)
+    if _device == "cuda":
+        torch.cuda.synchronize()
+    t0 = time.perf_counter()
+    for s in range(0, N, BENCH_BATCH):
+        e = min(N, s + BENCH_BATCH)
+        d = sample_ddim_v11(m, globals()["gating_net"], _sched, ctx["hist_y"][s:e], ctx["cur_num"][s:e],
+                            ctx["cur_cat"][s:e], ctx["region_id"][s:e], _Z, _device,
+                            coh_scale=globals()["coh_scale"], kind=kind, steps=steps)
+        out[s:e] = np.expm1(ctx["y_anchor"][s:e, None, None] + d)
+    if _device == "cuda":
+        torch.cuda.synchronize()
+    return out, time.perf_counter() - t0
+
+
+def _metrics(price, ref_p50):
+    q10, q50, q90 = np.percentile(price, [10, 50, 90], axis=1)   # [N, H]
+    ok = np.isfinite(actual)
+    cov = float(np.mean((actual[ok] >= q10[ok]) & (actual[ok] <= q90[ok])) * 100) if ok.any() else float("nan")
+    pit = (price <= np.where(ok, actual, np.inf)[:, None, :]).mean(axis=1)[ok]
+    ks = float(kstest(pit, "uniform").statistic) if pit.size > 20 else float("nan")
+    drift = float(np.median(np.abs(q50 / np.maximum(ref_p50, 1.0) - 1.0))) if ref_p50 is not None else 0.0
+    return cov, ks, drift, q50
+
+
+rows = []
+ref_p50 = None
+for kind in BENCH_KINDS:
+    for steps in BENCH_STEPS:
+        price, dt = _run(kind, steps)
+        if price is None:
+            print(f"  {kind:>9} k={steps:<3} — no student checkpoint, skipped")
+            continue
+        cov, ks, drift, q50 = _metrics(price, ref_p50)
+        if ref_p50 is None and kind == "ddim":
+            ref_p50 = q50   # first run (DDIM at the largest step count) is the reference
+        rows.append({"kind": kind, "steps": int(steps), "seconds": round(dt, 3),
+                     "parcels_per_s": round(N / max(dt, 1e-9), 1),
+                     "coverage_p10_p90": round(cov, 2), "pit_ks": round(ks, 4), "p50_drift": round(drift, 5)})
+        print(f"  {kind:>9} k={steps:<3} {dt:8.2f}s {N / max(dt, 1e-9):9.0f} parcels/s  "
+              f"cov={cov:5.1f}%  KS={ks:.4f}  p50_drift={drift:.4f}")
+        del price
+
+_out = os.path.join(globals().get("OUT_DIR", "."), f"bench_sampler_steps_o{BENCH_ORIGIN}.json")
+with open(_out, "w") as f:
+    json.dump({"origin": BENCH_ORIGIN, "parcels": N, "scenarios": BENCH_SCENARIOS, "device": _device,
+               "ckpt": os.path.basename(_ckpt_path), "runs": rows}, f, indent=2)
+print(f"💾 {_out}")
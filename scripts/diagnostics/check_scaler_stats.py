@@ -0,0 +1,95 @@
+"""
+Parity check: streaming ScalerStats vs exact full-data scaler fits.
+
+Builds synthetic master rows (hist_y, cur_num, target, mask, yr_label), fills
+worldmodel.ScalerStats in random-sized batches bucketed by origin_min, then for
+each origin compares the restricted (merged) stats against numpy on exactly the
+rows derive_origin_shards_from_master would keep:
+  - target / cur_num mean + std (Welford merge): equal to float64 rounding
+  - hist_y median / IQR scale (quantile sketch): within one sketch bin width
+  - a split-and-merge across "workers" gives bit-identical sketch counts
+
+The worldmodel classes are pulled out of worldmodel.py with ast.
+
+Usage:
+    python scripts/diagnostics/check_scaler_stats.py [N_ROWS]
+"""
+import ast
+import os
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 400_000
+H, L, D = 5, 21, 8
+FULL_HORIZON_ONLY = False
+
+WM_PY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "inference", "worldmodel.py")
+WANT = {"RunningMeanVar", "QuantileSketch", "ScalerStats", "_origin_min_for_rows", "_robust_loc_scale"}
+with open(WM_PY) as f:
+    tree = ast.parse(f.read())
+body = [n for n in tree.body
+        if (isinstance(n, (ast.FunctionDef, ast.ClassDef)) and n.name in WANT)
+        or (isinstance(n, ast.Assign) and any(getattr(t, "id", None) == "_ORIGIN_NEVER" for t in n.targets))]
+ns = {"np": np, "os": os, "Dict": Dict, "List": List, "Optional": Optional, "Tuple": Tuple,
+      "H": H, "Y_SKETCH_RANGE": (0.0, 32.0), "Y_SKETCH_BINS": 4096}
+exec(compile(ast.Module(body=body, type_ignores=[]), WM_PY, "exec"), ns)
+
+rng = np.random.default_rng(0)
+anchor_year = rng.integers(2006, 2020, N)
+yr_label = (anchor_year[:, None] + np.arange(1, H + 1)[None, :]).astype(np.int32)
+mask = (rng.random((N, H)) > 0.1).astype(np.float32)
+mask[mask.sum(axis=1) == 0, 0] = 1.0
+hist_y = rng.normal(12.5, 0.7, (N, L)).astype(np.float32) + rng.standard_t(3, (N, 1)).astype(np.float32) * 0.2
+cur_num = rng.lognormal(0, 1, (N, D)).astype(np.float32)
+target = (rng.normal(0.03, 0.08, (N, H)) * mask).astype(np.float32)
+
+keys = ns["_origin_min_for_rows"](mask, yr_label, FULL_HORIZON_ONLY)
+stats = ns["ScalerStats"](L, D, H, FULL_HORIZON_ONLY)
+s = 0
+while s < N:
+    e = min(N, s + int(rng.integers(1_000, 60_000)))
+    stats.update(keys[s:e], hist_y[s:e], cur_num[s:e], target[s:e])
+    s = e
+
+# worker split: two independent halves merged == one pass
+a = ns["ScalerStats"](L, D, H, FULL_HORIZON_ONLY)
+b = ns["ScalerStats"](L, D, H, FULL_HORIZON_ONLY)
+a.update(keys[: N // 3], hist_y[: N // 3], cur_num[: N // 3], target[: N // 3])
+b.update(keys[N // 3:], hist_y[N // 3:], cur_num[N // 3:], target[N // 3:])
+a.merge(b)
+merge_ok = all(np.array_equal(a.buckets[k][2].counts, stats.buckets[k][2].counts) for k in stats.buckets)
+print(f"{'PASS' if merge_ok else 'FAIL'}: worker split+merge sketch counts identical")
+
+width = 32.0 / 4096
+ok_all = merge_ok
+for origin in range(2010, 2026, 3):
+    mask_new = mask * (yr_label <= origin - 1)
+    keep = (mask_new.sum(axis=1) == float(H)) if FULL_HORIZON_ONLY else (mask_new.sum(axis=1) >= 1.0)
+    t, nm, ys = stats.restrict(origin).totals()
+    if not keep.any():
+        ok = t.n == 0
+        print(f"{'PASS' if ok else 'FAIL'}: origin={origin} no rows")
+        ok_all &= ok
+        continue
+    t_mu, t_sc = t.finalize(3e-2)
+    n_mu, n_sc = nm.finalize(3e-2)
+    y_mu, y_sc = ns["_robust_loc_scale"](ys, 0.25)
+    Y = hist_y[keep]
+    ref_med = np.median(Y, axis=0)
+    ref_sc = np.maximum((np.percentile(Y, 75, axis=0) - np.percentile(Y, 25, axis=0)) / 1.349, 0.25)
+    ok = (
+        t.n == int(keep.sum())
+        and np.allclose(t_mu, target[keep].mean(axis=0), rtol=1e-5, atol=1e-7)
+        and np.allclose(t_sc, np.maximum(target[keep].std(axis=0), 3e-2), rtol=1e-5)
+        and np.allclose(n_mu, cur_num[keep].mean(axis=0), rtol=1e-5)
+        and np.allclose(n_sc, np.maximum(cur_num[keep].std(axis=0), 3e-2), rtol=1e-5)
+        and np.max(np.abs(y_mu - ref_med)) <= width
+        and np.max(np.abs(y_sc - ref_sc)) <= 2 * width / 1.349
+    )
+    ok_all &= bool(ok)
+    print(f"{'PASS' if ok else 'FAIL'}: origin={origin} rows={int(keep.sum()):,} "
+          f"|dmed|max={np.max(np.abs(y_mu - ref_med)):.2e} |dscale|max={np.max(np.abs(y_sc - ref_sc)):.2e}")
+
+print("ALL PASS" if ok_all else "SOME CHECKS FAILED")
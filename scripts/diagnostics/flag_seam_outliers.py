@@ -13,7 +13,9 @@ Usage:
   python scripts/flag_seam_outliers.py
 """
 import os, sys, time
-import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "inference"))
+from pg_pool import shared_pool  # noqa: E402
 
 DB_URL = os.environ.get("SUPABASE_DB_URL")
 if not DB_URL:
@@ -33,8 +35,7 @@ AGG_LEVELS = [
 ]
 
 def run():
-    conn = psycopg2.connect(DB_URL)
-    conn.set_session(autocommit=True)
+    conn = shared_pool(DB_URL, maxconn=1, autocommit=True).getconn()
     cur = conn.cursor()
 
     # ── Step 1: Compute distribution ──────────────────────────────
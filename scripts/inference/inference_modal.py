@@ -109,6 +109,15 @@ def run_inference(jurisdiction: str, origin_year: int, backtest: bool = False):
             inf_source = f.read()
     print(f"[{_ts()}] Downloaded inference_pipeline.py: {len(inf_source)} chars")
 
+    # Shared Postgres pool (pg_pool.py), exec'd into globals before the pipeline
+    pool_blob = bucket.blob("code/pg_pool.py")
+    if pool_blob.exists():
+        pool_source = pool_blob.download_as_text()
+    else:
+        with open("/root/pg_pool.py", "r") as f:
+            pool_source = f.read()
+    print(f"[{_ts()}] Downloaded pg_pool.py: {len(pool_source)} chars")
+
     # ─── 5. Set up globals and config patches ────────────────────────
     import torch
 
@@ -125,6 +134,7 @@ def run_inference(jurisdiction: str, origin_year: int, backtest: bool = False):
         "RUN_FULL_BACKTEST": backtest,
         "H": 5,
         "S_SCENARIOS": 256,
+        "SINK_MODE": os.environ.get("SINK_MODE", "db"),   # "local": publish later with publish_run.py
     }
 
     # Override OUT_ROOT to use local filesystem instead of Google Drive
@@ -210,6 +220,7 @@ def run_inference(jurisdiction: str, origin_year: int, backtest: bool = False):
     globals()["FORECAST_ORIGIN_YEAR"] = origin_year
     globals()["JURISDICTION"] = jurisdiction
 
+    exec(pool_source, globals())
     print(f"[{_ts()}] Executing inference_pipeline.py...")
     exec(inf_source_patched, globals())
     print(f"[{_ts()}] inference_pipeline.py loaded")
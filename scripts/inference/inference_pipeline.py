@@ -8,11 +8,15 @@
 #   2) Parcel forecast fan -> <schema>.metrics_parcel_forecast
 #   3) Higher-level aggs   -> <schema>.metrics_{tabblock,tract,zcta,unsd,neighborhood}_{history,forecast}
 #   4) Run progress        -> <schema>.inference_runs, <schema>.inference_run_progress
+#   With SINK_MODE="local" all of the above goes to partitioned chunk files only;
+#   publish_run.py loads a finished run into <schema> afterwards.
 #
 # Notes:
 # - Uses direct Postgres (psycopg2) for fast bulk upserts.
 # - Uses short-lived DB transactions to avoid Supabase pooler idle timeout failures.
-# - Uses weighted ON CONFLICT merges for chunked geo aggregations (correct across chunks).
+# - Forecast geo aggregates (default): per-scenario price-path sums per geography kept
+#   in-process across chunks, true quantiles of the geo mean written once per level.
+# - Legacy: weighted ON CONFLICT merges for chunked geo aggregations (correct across chunks).
 # - Optionally runs a final exact aggregate refresh at the end of each run for bulletproof consistency.
 # =============================================================================
 
@@ -23,10 +27,16 @@ import os
 import re
 import time
 import json
+import hashlib
+import sqlite3
+import queue
+import multiprocessing
+import threading
 import uuid
 import math
+from collections import deque
 from contextlib import contextmanager
-from concurrent.futures import ThreadPoolExecutor, Future
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
 
 import numpy as np
@@ -65,9 +75,31 @@ try:
 except ImportError:
     pass  # torch not available at import time; worldmodel.py will have loaded it
 
-import psycopg2
 from psycopg2.extras import execute_values
 
+# Shared Postgres pool + prepared statements (pg_pool.py next to this file).
+# inference_modal.py execs it into globals before this file; otherwise import it
+# from this file's directory (exec'd in Colab there is no __file__: set CODE_DIR,
+# or run from the directory holding pg_pool.py).
+if "PgPool" not in globals():
+    import sys
+    _pg_pool_dirs = [d for d in (
+        os.path.dirname(os.path.abspath(__file__)) if "__file__" in globals() else None,
+        globals().get("CODE_DIR"),
+        os.getcwd(),
+    ) if d and os.path.isfile(os.path.join(d, "pg_pool.py"))]
+    if _pg_pool_dirs and _pg_pool_dirs[0] not in sys.path:
+        sys.path.insert(0, _pg_pool_dirs[0])
+    try:
+        from pg_pool import PgPool, shared_pool, execute_prepared, is_transient_pg_error
+    except ModuleNotFoundError as _e:
+        if _e.name != "pg_pool":
+            raise
+        raise ModuleNotFoundError(
+            "pg_pool.py must sit beside inference_pipeline.py (scripts/inference/); when exec'ing "
+            "the pipeline set CODE_DIR to that directory or run from it"
+        ) from _e
+
 
 # -----------------------------------------------------------------------------
 # CONFIG
@@ -106,15 +138,96 @@ JURISDICTION = globals().get("JURISDICTION", "hcad")
 PROP_BATCH_SIZE_SAMPLER = int(globals().get("PROP_BATCH_SIZE_SAMPLER", 512))
 PROP_BATCH_SIZE_MIN = int(globals().get("PROP_BATCH_SIZE_MIN", 64))
 
+# Streaming fan reduction: the sampler emits p10..p90 per (acct, horizon) per
+# prop batch instead of returning the full (N,S,H) y/price cubes for the chunk.
+STREAM_FAN_REDUCER = bool(globals().get("STREAM_FAN_REDUCER", True))
+
+# CPU-only hosts (nightly refresh of small jurisdictions): "int8" / "bf16" swaps in
+# the worldmodel section 16b sampler profile once per checkpoint, gated by the fan
+# accuracy guard (falls back to fp32 on failure). Ignored when CUDA is available.
+SAMPLER_CPU_PROFILE = globals().get("SAMPLER_CPU_PROFILE", None)
+
+# CPU-only hosts: shard each chunk's prop batches across this many forked sampler
+# processes (0/1 = serial in-process sampling). Workers inherit the loaded checkpoint,
+# read the token paths from shared memory and write fan quantiles into shared buffers.
+CPU_SAMPLER_WORKERS = int(globals().get("CPU_SAMPLER_WORKERS", 0))
+CPU_SAMPLER_THREADS = int(globals().get("CPU_SAMPLER_THREADS", 0))   # torch threads per worker; 0 = cores // workers
+
+# Sampler autotune: on the first chunk per checkpoint, time a short probe (one prop
+# batch, one per worker with CPU_SAMPLER_WORKERS > 1, at most 2x the largest batch
+# parcels) at SAMPLER_AUTOTUNE_PROBE_S scenarios for each grid point and keep the
+# fastest setting. CUDA: prop_batch_size x S_BLOCK, and only settings whose peak device
+# memory stays under SAMPLER_AUTOTUNE_MEM_FRAC qualify (S_BLOCK probes run at least
+# one full block). CPU: the small SAMPLER_AUTOTUNE_CPU_BATCHES x torch threads (serial
+# sampling only), current S_BLOCK. Growing prop_batch_size stops once throughput
+# gains < SAMPLER_AUTOTUNE_PLATEAU, and probing stops after SAMPLER_AUTOTUNE_BUDGET_S.
+# Results are cached in a local JSON keyed by device name, model dims and S (default:
+# next to the suite dirs) and re-probed only when the key changes. OOM backoff still
+# applies on top.
+SAMPLER_AUTOTUNE = bool(globals().get("SAMPLER_AUTOTUNE", True))
+SAMPLER_AUTOTUNE_BATCHES = tuple(globals().get("SAMPLER_AUTOTUNE_BATCHES", (256, 512, 1024, 2048, 4096)))
+SAMPLER_AUTOTUNE_CPU_BATCHES = tuple(globals().get("SAMPLER_AUTOTUNE_CPU_BATCHES", (256, 512, 1024)))
+SAMPLER_AUTOTUNE_S_BLOCKS = tuple(globals().get("SAMPLER_AUTOTUNE_S_BLOCKS", (32, 64, 128, 9999)))  # >= S = one pass
+SAMPLER_AUTOTUNE_PROBE_S = int(globals().get("SAMPLER_AUTOTUNE_PROBE_S", 32))
+SAMPLER_AUTOTUNE_PLATEAU = float(globals().get("SAMPLER_AUTOTUNE_PLATEAU", 0.05))
+SAMPLER_AUTOTUNE_BUDGET_S = float(globals().get("SAMPLER_AUTOTUNE_BUDGET_S", 120.0))
+SAMPLER_AUTOTUNE_MEM_FRAC = float(globals().get("SAMPLER_AUTOTUNE_MEM_FRAC", 0.85))
+SAMPLER_AUTOTUNE_CACHE = globals().get("SAMPLER_AUTOTUNE_CACHE", None)
+
+# Per-parcel fan cache (ParcelResultCache): quantile fans keyed by checkpoint content
+# hash + sampler config + the parcel's context row, so repeated runs of an origin
+# (variant sweeps, schema changes, resumes, re-checks) only sample parcels whose
+# inputs changed. Needs SAMPLER_PARCEL_RNG (each parcel's draws independent of its
+# batch), SAMPLER_TOKEN_PATHS="origin" and STREAM_FAN_REDUCER; off under quantized
+# SAMPLER_CPU_PROFILEs (dynamic activation scales depend on the batch). Cached fans
+# carry no scenario paths, so the cache is opened only for runs whose forecast
+# aggregates do not need them (AGG_FORECAST_MODE="sql"); under the default
+# "scenario" mode it stays closed (no hashing, no sqlite writes).
+# Least-recently-used entries are evicted past RESULT_CACHE_MAX_GB.
+# None dir -> <dirname(OUT_ROOT)>/_result_cache (prefer a local disk over Drive).
+RESULT_CACHE = bool(globals().get("RESULT_CACHE", True))
+RESULT_CACHE_DIR = globals().get("RESULT_CACHE_DIR", None)
+RESULT_CACHE_MAX_GB = float(globals().get("RESULT_CACHE_MAX_GB", 20.0))
+RESULT_CACHE_FORMAT = 1   # bump when the key or value layout changes
+
 # Chunking
 ACCT_BATCH_SIZE_OUTER = 20000     # ← increased from 5000: reduces Polars is_in scans 4×
 PG_BATCH_ROWS = 5000
 
+# Staged chunk executor: PIPELINE_CTX_WORKERS threads build inference context +
+# history rows, the main thread only samples, PIPELINE_DB_WRITERS threads (pooled
+# connections, see PG_POOL_MAX) build forecast rows and write chunk files / DB rows.
+# At most PIPELINE_QUEUE_DEPTH chunks wait between stages; a full queue blocks the
+# producer (backpressure). Per-stage utilisation is logged every
+# PIPELINE_METRICS_EVERY chunks, appended to progress_log.csv and stored in the manifest.
+PIPELINE_CTX_WORKERS = int(globals().get("PIPELINE_CTX_WORKERS", 2))
+PIPELINE_DB_WRITERS = int(globals().get("PIPELINE_DB_WRITERS", 2))
+PIPELINE_QUEUE_DEPTH = int(globals().get("PIPELINE_QUEUE_DEPTH", 3))
+PIPELINE_METRICS_EVERY = int(globals().get("PIPELINE_METRICS_EVERY", 10))
+
+# Parcel row writes: "copy" = COPY into a temp staging table + one set-based
+# INSERT ... SELECT ... ON CONFLICT merge; "execute_values" = paged VALUES upserts.
+# The copy path falls back to execute_values (same transaction) on error.
+PG_WRITE_MODE = globals().get("PG_WRITE_MODE", "copy")
+
 # Timeout / Retry
 PG_STATEMENT_TIMEOUT_MS = 300_000   # 5 minutes per SQL statement
 PG_TX_MAX_RETRIES = 3               # retries on transient DB errors
 PG_TX_BACKOFF_BASE = 5              # base seconds for exponential backoff
 
+# Connection pool (pg_pool.PgPool): connections are re-used across transactions and
+# health-checked on checkout. PG_PREPARED=None runs the hot progress / aggregate SQL
+# as server-side prepared statements unless the URL is the transaction pooler (:6543).
+PG_POOL_MAX = int(globals().get("PG_POOL_MAX", PIPELINE_DB_WRITERS + 2))
+PG_PREPARED = globals().get("PG_PREPARED", None)
+
+# Row sink: "db" = upsert every chunk into Postgres inline; "local" = write chunk
+# files only, hive-partitioned as <run_root>/{forecast,history,agg}_chunks/
+# origin_year=<o>/series_kind=<k>/variant_id=<v>/, and load the finished run with
+# publish_run.py (parallel COPY + one aggregate rebuild). In local mode sampling
+# never waits on Postgres and a failed publish is retried without re-sampling.
+SINK_MODE = globals().get("SINK_MODE", "db")
+
 # Schema compatibility:
 # Set this True only if <schema>.metrics_parcel_forecast has a column named "n".
 # Many DDLs keep only "n_scenarios" on parcel forecast rows.
@@ -126,14 +239,41 @@ AGG_FORECAST_HAS_N_COL = True
 # Final exact refresh (recommended): delete+recompute aggregate rows from parcel rows for this run slice
 RUN_FINAL_EXACT_AGG_REFRESH = True
 
+# Forecast aggregates:
+#   "scenario" = sum parcel price paths per geography per scenario in-process
+#                (GeoScenarioAggregator) and write true quantiles of the geo mean
+#                once per level at the end of the run
+#   "sql"      = per-chunk weighted AVG(p10..p90) merges + final exact SQL refresh
+AGG_FORECAST_MODE = globals().get("AGG_FORECAST_MODE", "scenario")
+
+# Inducing-token paths (the shared macro scenarios):
+#   "origin" = drawn once per origin from a seed fixed by (SAMPLER_RUN_SEED, origin),
+#              so scenario s is the same macro path in every chunk (required for
+#              AGG_FORECAST_MODE="scenario" geo sums)
+#   "chunk"  = redrawn from the global torch RNG for every chunk (legacy); scenario
+#              aggregates then fall back to AGG_FORECAST_MODE="sql"
+SAMPLER_TOKEN_PATHS = globals().get("SAMPLER_TOKEN_PATHS", "origin")
+
+# Parcel -> geography ladder: pull public.parcel_ladder_v1 once per run into a
+# local int32-coded index (cached as .npz next to the suite outputs) so chunk
+# rollups are bincounts instead of server-side JOINs. False = per-chunk SQL.
+USE_LADDER_INDEX = bool(globals().get("USE_LADDER_INDEX", True))
+LADDER_INDEX_FORMAT = 1   # bump when the cache layout changes
+
 # =============================================================================
 # RESUME CONFIG  —  fill these in to restart from where you left off
 # =============================================================================
 # Set RESUME_MODE = True and paste the run_id / suite_id from the previous run.
-# The script will query Supabase for accounts already written under that run_id
-# and skip them.  Everything else (upserts, aggregates, final refresh) is
+# Finished accounts come from the run's local resume manifest
+# (<run_root>/resume/: acct index + done bitmap + chunk log, see RunResumeManifest);
+# runs without one fall back to querying Supabase for accounts already written
+# under that run_id.  Everything else (upserts, aggregates, final refresh) is
 # idempotent so this is safe.
 RESUME_MODE = False
+RESUME_MANIFEST = bool(globals().get("RESUME_MANIFEST", True))
+# Re-build context for 5 random remaining chunks before resuming. Always done on the
+# DB fallback path; the manifest already marks accts without valid anchors as done.
+RESUME_SPOT_CHECK = bool(globals().get("RESUME_SPOT_CHECK", False))
 RESUME_PROD_RUN_ID = "forecast_2025_20260221T050431Z_8cdcf33c7b7d4ee6a948ecc6bccca160"
 RESUME_SUITE_ID    = "suite_20260221T050431Z_5b263b4bbbc344fa998999209fc58549"
 
@@ -187,15 +327,38 @@ def _chunk_list(xs, n):
         yield xs[i:i+n]
 
 def _write_df_chunk(df, out_dir, prefix, chunk_idx):
+    """Write atomically (tmp + os.replace): a crash never leaves a truncated chunk file."""
     os.makedirs(out_dir, exist_ok=True)
     if _HAS_PARQUET:
         fp = os.path.join(out_dir, f"{prefix}_chunk_{chunk_idx:05d}.parquet")
-        df.to_parquet(fp, index=False)
+        tmp = fp + ".tmp"
+        df.to_parquet(tmp, index=False)
     else:
         fp = os.path.join(out_dir, f"{prefix}_chunk_{chunk_idx:05d}.csv.gz")
-        df.to_csv(fp, index=False, compression="gzip")
+        tmp = fp + ".tmp"
+        df.to_csv(tmp, index=False, compression="gzip")
+    os.replace(tmp, fp)
     return fp
 
+def _sink_dir(run_root, sub, origin_year, series_kind, variant_id):
+    """Chunk directory under run_root; with SINK_MODE='local' it is partitioned by origin/series_kind/variant."""
+    d = os.path.join(run_root, sub)
+    if SINK_MODE == "local":
+        d = os.path.join(d, f"origin_year={int(origin_year)}", f"series_kind={series_kind}", f"variant_id={variant_id}")
+    return d
+
+def _chunk_files(d):
+    """Sorted chunk files (.parquet / .csv.gz) anywhere below d, flat or partitioned."""
+    out = []
+    for root, _, files in os.walk(d):
+        out.extend(os.path.join(root, f) for f in files if f.endswith((".parquet", ".csv.gz")))
+    return sorted(out)
+
+def _read_df_chunk(fp):
+    if fp.endswith(".parquet"):
+        return pd.read_parquet(fp)
+    return pd.read_csv(fp, dtype={"acct": str})
+
 def _py_scalar(v):
     if pd.isna(v):
         return None
@@ -207,13 +370,47 @@ def _py_scalar(v):
         return bool(v)
     return v
 
+def _const_categorical(value, n: int):
+    """Length-n categorical holding one value (or all-missing for None)."""
+    cats = [] if value is None else [value]
+    codes = np.full(int(n), -1 if value is None else 0, dtype=np.int8)
+    return pd.Categorical.from_codes(codes, categories=pd.Index(cats, dtype=object))
+
+def _series_pylist(col: pd.Series):
+    """
+    Column -> list of DB-adaptable Python values (NaN/NA -> None), converted
+    per column by numpy rather than per cell through _py_scalar.
+    """
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        lut = np.empty(len(col.cat.categories) + 1, dtype=object)
+        lut[:-1] = col.cat.categories.to_numpy().tolist()
+        lut[-1] = None
+        return lut[col.cat.codes.to_numpy()].tolist()   # code -1 -> None
+    if isinstance(col.dtype, np.dtype) and col.dtype.kind in "biuf":
+        arr = col.to_numpy()
+        if arr.dtype.kind == "f":
+            bad = np.isnan(arr)
+            if bad.any():
+                obj = arr.astype(object)
+                obj[bad] = None
+                return obj.tolist()
+        return arr.tolist()
+    vals = col.to_numpy(dtype=object)
+    bad = pd.isna(vals)
+    if bad.any():
+        vals = vals.copy()
+        vals[bad] = None
+    if col.dtype.kind == "O":
+        first = next((v for v in vals if v is not None), None)
+        if not isinstance(first, np.generic):
+            return vals.tolist()
+    return [_py_scalar(v) for v in vals]
+
 def _df_records(df: pd.DataFrame):
     if df is None or df.empty:
         return [], []
     cols = list(df.columns)
-    out = []
-    for row in df.itertuples(index=False, name=None):
-        out.append(tuple(_py_scalar(v) for v in row))
+    out = list(zip(*(_series_pylist(df[c]) for c in cols)))
     return cols, out
 
 def _make_run_id(kind: str, origin_year: int):
@@ -240,87 +437,195 @@ def _get_completed_accts_from_db(schema: str, run_id: str, table: str = "metrics
             return {row[0] for row in cur.fetchall()}
 
 
+def _get_completed_accts_from_chunks(run_root: str, sub: str = "forecast_chunks"):
+    """
+    SINK_MODE='local' counterpart of _get_completed_accts_from_db: the accts
+    already present in this run's local chunk files.
+    """
+    done = set()
+    for fp in _chunk_files(os.path.join(run_root, sub)):
+        if fp.endswith(".parquet"):
+            accts = pd.read_parquet(fp, columns=["acct"])["acct"]
+        else:
+            accts = pd.read_csv(fp, usecols=["acct"], dtype={"acct": str})["acct"]
+        done.update(accts.astype(str))
+    return done
+
+
+def _parcel_upsert_cols(table: str, parcel_forecast_has_n_col: bool = None):
+    """(conflict_cols, update_cols) for the parcel-level upserts (pipeline and publish_run.py)."""
+    if table == "metrics_parcel_history":
+        return (["acct", "year", "series_kind", "variant_id"],
+                ["value", "p50", "n", "run_id", "backtest_id", "model_version", "as_of_date", "updated_at"])
+    if table == "metrics_parcel_forecast":
+        update_cols = [
+            "forecast_year", "value", "p10", "p25", "p50", "p75", "p90",
+            "run_id", "backtest_id", "model_version", "as_of_date", "n_scenarios",
+            "is_backtest", "updated_at"
+        ]
+        if PARCEL_FORECAST_HAS_N_COL if parcel_forecast_has_n_col is None else parcel_forecast_has_n_col:
+            update_cols.insert(7, "n")
+        return ["acct", "origin_year", "horizon_m", "series_kind", "variant_id"], update_cols
+    raise ValueError(f"no upsert columns for table {table!r}")
+
+
+# -----------------------------------------------------------------------------
+# LOCAL RESUME MANIFEST
+# -----------------------------------------------------------------------------
+class RunResumeManifest:
+    """
+    Local resume state of one run, in <run_root>/resume/:
+      acct_index.npy   sorted acct ids of the run: the stable bit positions
+      done_bitmap.bin  np.packbits over acct_index, 1 = acct's chunk finished
+      chunk_log.jsonl  append-only, one line per chunk: chunk id, status, acct
+                       count, min/max acct, sha1 of the chunk's accts, row counts
+    The bitmap is replaced atomically (tmp + os.replace) and each log line is a
+    single fsynced append, so a crash loses at most the chunks in flight.
+    Resuming is a bitmap read: no DB round-trip, no per-acct set lookups.
+    """
+    DONE_STATUSES = ("done", "no_ctx")   # no_ctx: no valid anchors, re-running yields nothing
+
+    def __init__(self, run_root: str, index: np.ndarray, bits: np.ndarray, chunks: dict):
+        self.dir = os.path.join(run_root, "resume")
+        self.index = index
+        self.bits = bits
+        self.chunks = chunks
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _digest(accts) -> str:
+        return hashlib.sha1("\n".join(accts).encode("utf-8")).hexdigest()
+
+    @classmethod
+    def load(cls, run_root: str):
+        """The run's manifest, or None if it has none (runs from before the manifest / DB sink resume)."""
+        d = os.path.join(run_root, "resume")
+        if not os.path.exists(os.path.join(d, "acct_index.npy")):
+            return None
+        index = np.load(os.path.join(d, "acct_index.npy"), allow_pickle=False)
+        with open(os.path.join(d, "done_bitmap.bin"), "rb") as f:
+            bits = np.unpackbits(np.frombuffer(f.read(), dtype=np.uint8), count=index.size).astype(bool)
+        chunks = {}
+        if os.path.exists(os.path.join(d, "chunk_log.jsonl")):
+            with open(os.path.join(d, "chunk_log.jsonl")) as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue   # torn last line from a crash
+                    chunks[int(rec["chunk"])] = rec
+        return cls(run_root, index, bits, chunks)
+
+    @classmethod
+    def create(cls, run_root: str, accts, done_accts=None):
+        """New manifest over accts (plus done_accts, pre-marked: a DB-resumed run's finished accts)."""
+        all_accts = list(accts) + list(done_accts or ())
+        index = np.unique(np.asarray(all_accts, dtype=str))
+        m = cls(run_root, index, np.zeros(index.size, dtype=bool), {})
+        os.makedirs(m.dir, exist_ok=True)
+        np.save(os.path.join(m.dir, "acct_index.npy"), index, allow_pickle=False)
+        if done_accts:
+            m.bits[m._positions(list(done_accts))[1]] = True
+        m._save_bits()
+        return m
+
+    def _positions(self, accts):
+        """(found mask, index positions of the found accts) for a list of accts."""
+        arr = np.asarray(accts, dtype=str)
+        pos = np.minimum(np.searchsorted(self.index, arr), max(self.index.size - 1, 0))
+        found = (self.index[pos] == arr) if self.index.size else np.zeros(arr.size, dtype=bool)
+        return found, pos[found]
+
+    def _save_bits(self):
+        fp = os.path.join(self.dir, "done_bitmap.bin")
+        with open(fp + ".tmp", "wb") as f:
+            f.write(np.packbits(self.bits).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(fp + ".tmp", fp)
+
+    @property
+    def n_done(self) -> int:
+        return int(self.bits.sum())
+
+    @property
+    def max_chunk(self) -> int:
+        return max(self.chunks, default=0)
+
+    def remaining(self, accts):
+        """accts not yet done, in input order; accts outside the index count as not done."""
+        arr = np.asarray(accts, dtype=str)
+        found, pos = self._positions(arr)
+        done = np.zeros(arr.size, dtype=bool)
+        done[found] = self.bits[pos]
+        return arr[~done].tolist()
+
+    def mark(self, chunk_idx: int, accts, status: str, **counts):
+        """Record one finished chunk (thread-safe); DONE_STATUSES set the chunk's bits."""
+        rec = {"chunk": int(chunk_idx), "status": status, "n_accts": len(accts),
+               "min_acct": min(accts) if accts else None, "max_acct": max(accts) if accts else None,
+               "acct_sha1": self._digest(sorted(accts)), "t": datetime.utcnow().isoformat(timespec="seconds")}
+        rec.update({k: int(v) for k, v in counts.items()})
+        with self._lock:
+            if status in self.DONE_STATUSES and accts:
+                found, pos = self._positions(accts)
+                self.bits[pos] = True
+                if not found.all():
+                    print(f"[{_ts()}] ⚠️  Resume manifest: {int((~found).sum())} accts of chunk {chunk_idx} not in acct index")
+                self._save_bits()
+            with open(os.path.join(self.dir, "chunk_log.jsonl"), "a") as f:
+                f.write(json.dumps(rec) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.chunks[int(chunk_idx)] = rec
+
+
 # -----------------------------------------------------------------------------
 # POSTGRES HELPERS
 # -----------------------------------------------------------------------------
-def _pg_connect():
+def _pg_pool() -> "PgPool":
+    """The process-wide pool for SUPABASE_DB_URL (created on first use)."""
     if not SUPABASE_DB_URL:
         raise RuntimeError("SUPABASE_DB_URL is required for this pipeline.")
-    conn = psycopg2.connect(SUPABASE_DB_URL)
-    conn.autocommit = False
-    # Set a generous statement timeout so long-running queries fail fast
-    # rather than holding a connection indefinitely.
-    with conn.cursor() as cur:
-        cur.execute(f"SET statement_timeout = {int(PG_STATEMENT_TIMEOUT_MS)}")
-    conn.commit()   # apply the SET outside a transaction block
-    return conn
+    return shared_pool(
+        SUPABASE_DB_URL,
+        maxconn=int(PG_POOL_MAX),
+        # generous statement timeout so long-running queries fail fast
+        # rather than holding a connection indefinitely
+        init_sql=[f"SET statement_timeout = {int(PG_STATEMENT_TIMEOUT_MS)}"],
+        prepare=PG_PREPARED,
+        connect_retries=int(PG_TX_MAX_RETRIES),
+        backoff_base=float(PG_TX_BACKOFF_BASE),
+        log=print,
+    )
 
 
 def _is_transient_pg_error(exc):
     """Return True if the exception looks like a retryable transient error."""
-    import psycopg2.errors
-    # Statement timeout, query canceled, connection errors
-    if isinstance(exc, (psycopg2.OperationalError, psycopg2.InterfaceError)):
-        return True
-    # Specific error codes: query_canceled, statement_timeout
-    code = getattr(exc, 'pgcode', None)
-    if code in ('57014', '57P01', '57P02', '57P03', '08000', '08003', '08006'):
-        return True
-    return False
+    return is_transient_pg_error(exc)
 
 
 @contextmanager
 def _pg_tx(retries=None, label=""):
     """
-    Open a short-lived connection only for DB writes, then close immediately.
-    Prevents Supabase pooler idle disconnects during long GPU sampling.
+    One transaction on a connection from the shared pool: commit on success,
+    rollback and re-raise on error. Connections are health-checked on checkout
+    (replacing ones the Supabase pooler dropped during long GPU sampling) and
+    re-used across chunks instead of paying a TLS handshake per transaction.
 
-    Retries up to `retries` times on transient errors with exponential backoff.
+    Transient connect errors are retried up to `retries` times with exponential
+    backoff; a connection that hit a transient error mid-transaction is dropped.
     """
     if retries is None:
         retries = PG_TX_MAX_RETRIES
-
-    last_exc = None
-    for attempt in range(retries + 1):
-        conn = None
-        try:
-            conn = _pg_connect()
+    try:
+        with _pg_pool().transaction(retries=retries) as conn:
             yield conn
-            conn.commit()
-            return  # success
-        except GeneratorExit:
-            # The caller broke out of the with-block (e.g. via return/break).
-            # Commit whatever was done and exit without retrying.
-            if conn is not None:
-                try:
-                    conn.commit()
-                except Exception:
-                    pass
-            return
-        except Exception as exc:
-            last_exc = exc
-            if conn is not None:
-                try:
-                    conn.rollback()
-                except Exception:
-                    pass
-            if attempt < retries and _is_transient_pg_error(exc):
-                wait = PG_TX_BACKOFF_BASE * (2 ** attempt)
-                print(f"[{_ts()}] _pg_tx{' (' + label + ')' if label else ''}: "
-                      f"transient error (attempt {attempt+1}/{retries+1}), "
-                      f"retrying in {wait}s: {exc}")
-                time.sleep(wait)
-            else:
-                raise
-        finally:
-            if conn is not None:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
-    # Should not reach here, but just in case
-    if last_exc is not None:
-        raise last_exc
+    except Exception as exc:
+        if _is_transient_pg_error(exc):
+            print(f"[{_ts()}] _pg_tx{' (' + label + ')' if label else ''}: transient error, "
+                  f"connection dropped: {exc}")
+        raise
 
 def _upsert_df_pg(conn, schema: str, table: str, df: pd.DataFrame, conflict_cols, update_cols):
     """
@@ -358,6 +663,79 @@ def _upsert_df_pg(conn, schema: str, table: str, df: pd.DataFrame, conflict_cols
         execute_values(cur, sql, rows, page_size=int(PG_BATCH_ROWS))
         return len(rows)
 
+def _copy_df_to_stage(cur, q_stage: str, q_like_table: str, df: pd.DataFrame):
+    """
+    (Re)create temp table q_stage with df's columns typed as in q_like_table
+    (dropped at commit) and COPY df into it as CSV.
+    """
+    import io
+
+    col_sql = ", ".join(_q_ident(c) for c in df.columns)
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False, na_rep="\\N")
+    buf.seek(0)
+    cur.execute(f"DROP TABLE IF EXISTS {q_stage}")
+    cur.execute(f"CREATE TEMP TABLE {q_stage} ON COMMIT DROP AS SELECT {col_sql} FROM {q_like_table} WITH NO DATA")
+    cur.copy_expert(f"COPY {q_stage} ({col_sql}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buf)
+
+
+def _copy_upsert_df_pg(conn, schema: str, table: str, df: pd.DataFrame, conflict_cols, update_cols):
+    """
+    Bulk upsert via COPY: stream the chunk as CSV into a temp staging table
+    (never WAL-logged, dropped at commit), then merge it with one
+    INSERT ... SELECT ... ON CONFLICT DO UPDATE.
+    Same dedup-on-conflict-keys semantics and return value as _upsert_df_pg.
+    """
+    if df is None or df.empty:
+        return 0
+
+    _ck = [c for c in conflict_cols if c in df.columns]
+    if _ck:
+        _before = len(df)
+        df = df.drop_duplicates(subset=_ck, keep="last")
+        if len(df) < _before:
+            print(f"[DEDUP] {table}: {_before} -> {len(df)} rows (dropped {_before - len(df)} duplicates on {_ck})")
+
+    q_table = _q_table(schema, table)
+    q_stage = "pg_temp." + _q_ident(f"_stage_{_assert_ident(table, 'table')}")
+    cols = list(df.columns)
+    col_sql = ", ".join(_q_ident(c) for c in cols)
+    conflict_sql = ", ".join(_q_ident(c) for c in conflict_cols)
+    update_sql = ", ".join([f"{_q_ident(c)} = EXCLUDED.{_q_ident(c)}" for c in update_cols])
+
+    with conn.cursor() as cur:
+        _copy_df_to_stage(cur, q_stage, q_table, df)
+        cur.execute(f"""
+            INSERT INTO {q_table} ({col_sql})
+            SELECT {col_sql} FROM {q_stage}
+            ON CONFLICT ({conflict_sql})
+            DO UPDATE SET {update_sql}
+        """)
+        cur.execute(f"DROP TABLE IF EXISTS {q_stage}")
+    return len(df)
+
+def _bulk_upsert_df_pg(conn, schema: str, table: str, df: pd.DataFrame, conflict_cols, update_cols):
+    """
+    PG_WRITE_MODE dispatcher for large parcel-row upserts. The COPY path runs
+    under a savepoint so a failure falls back to _upsert_df_pg in the same tx.
+    """
+    if PG_WRITE_MODE != "copy":
+        return _upsert_df_pg(conn, schema, table, df, conflict_cols, update_cols)
+    with conn.cursor() as cur:
+        cur.execute("SAVEPOINT bulk_copy")
+    try:
+        n = _copy_upsert_df_pg(conn, schema, table, df, conflict_cols, update_cols)
+    except Exception as exc:
+        if not _is_transient_pg_error(exc):
+            with conn.cursor() as cur:
+                cur.execute("ROLLBACK TO SAVEPOINT bulk_copy")
+            print(f"[{_ts()}] ⚠️  COPY upsert into {table} failed ({exc}); falling back to execute_values")
+            return _upsert_df_pg(conn, schema, table, df, conflict_cols, update_cols)
+        raise
+    with conn.cursor() as cur:
+        cur.execute("RELEASE SAVEPOINT bulk_copy")
+    return n
+
 def _run_insert_start(conn, schema: str, run_id: str, level_name: str, mode: str, origin_year: int, as_of_date: date, notes: str):
     q_table = _q_table(schema, "inference_runs")
     sql = f"""
@@ -445,7 +823,8 @@ def _run_progress_upsert(
             updated_at = now()
     """
     with conn.cursor() as cur:
-        cur.execute(
+        execute_prepared(
+            cur,
             sql,
             (
                 run_id, int(chunk_seq), level_name, status, series_kind, variant_id, int(origin_year),
@@ -460,30 +839,11 @@ def _run_progress_upsert(
 # -----------------------------------------------------------------------------
 # FORECAST/HISTORY ROW BUILDERS (PARCEL LEVEL)
 # -----------------------------------------------------------------------------
-def _build_forecast_rows_from_inf_out(
-    inf_out,
-    origin_year: int,
-    run_id: str,
-    series_kind: str,
-    variant_id: str,
-    backtest_id: str = None,
-    as_of_date: date = None,
-):
+def _price_quantiles_from_cube(_raw_pl):
     """
-    inf_out must contain:
-      - acct
-      - y_levels (N,S,H)
-      - price_levels (N,S,H)
-
-    Writes schema-compatible parcel forecast rows:
-      PK = (acct, origin_year, horizon_m, series_kind, variant_id)
+    p10/p25/p50/p75/p90 over the scenario axis of a (N,S,H) price cube.
+    Returns (q10, q25, q50, q75, q90, N, S, H) with float64 (N,H) quantiles.
     """
-    as_of_date = as_of_date or datetime.utcnow().date()
-
-    acct_arr = np.asarray(inf_out["acct"]).astype(str)
-    _ = inf_out["y_levels"]  # kept for interface validation
-    _raw_pl = inf_out["price_levels"]
-
     # Prefer GPU-resident quantile computation to avoid a round-trip.
     # Falls back to numpy if torch is unavailable or price_levels is already numpy.
     try:
@@ -498,8 +858,7 @@ def _build_forecast_rows_from_inf_out(
         _qs = _torch.quantile(_pt, _torch.tensor([0.10, 0.25, 0.50, 0.75, 0.90],
                                                    device=_pt.device), dim=1)
         q10, q25, q50, q75, q90 = (_qs[i].cpu().numpy().astype(np.float64) for i in range(5))
-        price_levels_np = _pt.cpu().numpy().astype(np.float64)
-        N, S_local, H_local = price_levels_np.shape
+        N, S_local, H_local = _pt.shape
     except Exception:
         price_levels_np = np.asarray(_raw_pl, dtype=np.float64)  # (N,S,H)
         N, S_local, H_local = price_levels_np.shape
@@ -508,50 +867,81 @@ def _build_forecast_rows_from_inf_out(
         q50 = np.percentile(price_levels_np, 50, axis=1)
         q75 = np.percentile(price_levels_np, 75, axis=1)
         q90 = np.percentile(price_levels_np, 90, axis=1)
+    return q10, q25, q50, q75, q90, int(N), int(S_local), int(H_local)
 
-    rows = []
-    is_backtest = (series_kind == "backtest")
-    now_iso = datetime.utcnow().isoformat()
+def _build_forecast_rows_from_inf_out(
+    inf_out,
+    origin_year: int,
+    run_id: str,
+    series_kind: str,
+    variant_id: str,
+    backtest_id: str = None,
+    as_of_date: date = None,
+):
+    """
+    inf_out must contain:
+      - acct
+      - y_levels (N,S,H)
+      - price_levels (N,S,H)
+    or, from the streaming reducer:
+      - acct
+      - quantiles (N,5,H) at q_levels (0.10, 0.25, 0.50, 0.75, 0.90)
+      - n_scenarios
 
-    for i in range(N):
-        acct = str(acct_arr[i])
-        for h_idx in range(H_local):
-            horizon_k = int(h_idx + 1)
-            horizon_m = int(12 * horizon_k)
-            forecast_year = int(origin_year + horizon_k)
-
-            row = {
-                "acct": acct,
-                "origin_year": int(origin_year),
-                "horizon_m": horizon_m,
-                "forecast_year": forecast_year,
-                "value": float(q50[i, h_idx]),
-                "p10": float(q10[i, h_idx]),
-                "p25": float(q25[i, h_idx]),
-                "p50": float(q50[i, h_idx]),
-                "p75": float(q75[i, h_idx]),
-                "p90": float(q90[i, h_idx]),
-
-                "run_id": run_id,
-                "backtest_id": backtest_id,
-                "variant_id": variant_id,
-                "model_version": MODEL_VERSION,
-                "as_of_date": as_of_date.isoformat(),
-                "n_scenarios": int(S_local),
-
-                "is_backtest": bool(is_backtest),
-                "series_kind": series_kind,
-
-                "inserted_at": now_iso,
-                "updated_at": now_iso,
-            }
+    Writes schema-compatible parcel forecast rows:
+      PK = (acct, origin_year, horizon_m, series_kind, variant_id)
+    """
+    as_of_date = as_of_date or datetime.utcnow().date()
 
-            if PARCEL_FORECAST_HAS_N_COL:
-                row["n"] = int(S_local)
+    acct_arr = np.asarray(inf_out["acct"]).astype(str)
+
+    if "quantiles" in inf_out:
+        _q_levels = tuple(round(float(q), 4) for q in inf_out["q_levels"])
+        _qa = np.asarray(inf_out["quantiles"], dtype=np.float64)  # (N,Q,H)
+        q10, q25, q50, q75, q90 = (_qa[:, _q_levels.index(q), :] for q in (0.10, 0.25, 0.50, 0.75, 0.90))
+        N, _, H_local = _qa.shape
+        S_local = int(inf_out["n_scenarios"])
+    else:
+        _ = inf_out["y_levels"]  # kept for interface validation
+        q10, q25, q50, q75, q90, N, S_local, H_local = _price_quantiles_from_cube(inf_out["price_levels"])
+
+    # Columnar build: one (N*H,) array per column, row order acct-major /
+    # horizon-minor. Constant string columns are single-category categoricals.
+    is_backtest = (series_kind == "backtest")
+    now_iso = datetime.utcnow().isoformat()
+    n_rows = int(N) * int(H_local)
+    horizon_k = np.tile(np.arange(1, H_local + 1, dtype=np.int64), N)
+
+    cols = {
+        "acct": np.repeat(acct_arr.astype(object), H_local),
+        "origin_year": np.full(n_rows, int(origin_year), dtype=np.int64),
+        "horizon_m": 12 * horizon_k,
+        "forecast_year": int(origin_year) + horizon_k,
+        "value": np.ascontiguousarray(q50, dtype=np.float64).reshape(-1),
+        "p10": np.ascontiguousarray(q10, dtype=np.float64).reshape(-1),
+        "p25": np.ascontiguousarray(q25, dtype=np.float64).reshape(-1),
+        "p50": np.ascontiguousarray(q50, dtype=np.float64).reshape(-1),
+        "p75": np.ascontiguousarray(q75, dtype=np.float64).reshape(-1),
+        "p90": np.ascontiguousarray(q90, dtype=np.float64).reshape(-1),
+
+        "run_id": _const_categorical(run_id, n_rows),
+        "backtest_id": _const_categorical(backtest_id, n_rows),
+        "variant_id": _const_categorical(variant_id, n_rows),
+        "model_version": _const_categorical(MODEL_VERSION, n_rows),
+        "as_of_date": _const_categorical(as_of_date.isoformat(), n_rows),
+        "n_scenarios": np.full(n_rows, int(S_local), dtype=np.int64),
+
+        "is_backtest": np.full(n_rows, bool(is_backtest), dtype=bool),
+        "series_kind": _const_categorical(series_kind, n_rows),
+
+        "inserted_at": _const_categorical(now_iso, n_rows),
+        "updated_at": _const_categorical(now_iso, n_rows),
+    }
 
-            rows.append(row)
+    if PARCEL_FORECAST_HAS_N_COL:
+        cols["n"] = np.full(n_rows, int(S_local), dtype=np.int64)
 
-    return pd.DataFrame(rows)
+    return pd.DataFrame(cols, copy=False)
 
 def _build_history_rows_for_chunk(
     acct_chunk,
@@ -735,7 +1125,8 @@ def _aggregate_forecast_levels_for_chunk(
                 updated_at = now()
         """
         with conn.cursor() as cur:
-            cur.execute(
+            execute_prepared(
+                cur,
                 sql,
                 (
                     run_id,
@@ -833,7 +1224,8 @@ def _aggregate_history_levels_for_chunk(
                 updated_at = now()
         """
         with conn.cursor() as cur:
-            cur.execute(
+            execute_prepared(
+                cur,
                 sql,
                 (
                     run_id,
@@ -853,6 +1245,469 @@ def _aggregate_history_levels_for_chunk(
     return total_rows
 
 
+# -----------------------------------------------------------------------------
+# PARCEL -> GEOGRAPHY LADDER INDEX (LOCAL, CACHED)
+# -----------------------------------------------------------------------------
+class ParcelLadderIndex:
+    """
+    Compact in-memory copy of public.parcel_ladder_v1 for the AGG_LEVELS columns:
+      accts           sorted unique acct keys (fixed-width unicode)
+      codes[level]    int32 per acct, index into geoids[level] (-1 = NULL)
+      geoids[level]   dictionary of geography ids for that level
+    Cached on local disk as a pickle-free .npz, keyed by a version stamp of the
+    ladder table, so a run loads it once and rollups become bincounts.
+    """
+    def __init__(self, accts: np.ndarray, codes: dict, geoids: dict, stamp: str):
+        self.accts = accts
+        self.codes = codes
+        self.geoids = geoids
+        self.stamp = stamp
+        self.levels = [(lvl, col) for lvl, col, _, _ in AGG_LEVELS]
+
+    def __len__(self):
+        return int(self.accts.shape[0])
+
+    def rows_for(self, accts) -> np.ndarray:
+        """Row index into the index for each acct (-1 = not in the ladder); accts are stripped like the ladder's."""
+        q = np.asarray([str(a).strip() for a in accts])
+        if len(self) == 0 or q.size == 0:
+            return np.full(q.shape[0], -1, dtype=np.int64)
+        pos = np.searchsorted(self.accts, q)
+        pos_c = np.minimum(pos, len(self) - 1)
+        return np.where(self.accts[pos_c] == q, pos_c, -1).astype(np.int64)
+
+    def codes_for(self, accts) -> dict:
+        """{level: int64 geography codes aligned with accts (-1 = none)}."""
+        rows = self.rows_for(accts)
+        hit = rows >= 0
+        out = {}
+        for lvl, _ in self.levels:
+            c = np.full(rows.shape[0], -1, dtype=np.int64)
+            c[hit] = self.codes[lvl][rows[hit]]
+            out[lvl] = c
+        return out
+
+    @staticmethod
+    def _table_stamp(conn) -> str:
+        """
+        Catalog-only version of the ladder table: relfilenode (changes on TRUNCATE,
+        rewrite or non-concurrent matview REFRESH) plus the cumulative insert/update/
+        delete counters. No table scan, and unlike xmin it only ever moves forward.
+        """
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT c.relfilenode, s.n_tup_ins, s.n_tup_upd, s.n_tup_del, "
+                "       (SELECT d.stats_reset FROM pg_stat_database d WHERE d.datname = current_database()) "
+                "FROM pg_class c LEFT JOIN pg_stat_all_tables s ON s.relid = c.oid "
+                "WHERE c.oid = 'public.parcel_ladder_v1'::regclass"
+            )
+            node, n_ins, n_upd, n_del, reset = cur.fetchone()
+        if n_ins is None:
+            # no statistics row: never match, so the index is rebuilt from the table
+            return f"v{LADDER_INDEX_FORMAT}:{int(node)}:nostats:{time.time():.0f}"
+        return f"v{LADDER_INDEX_FORMAT}:{int(node)}:{int(n_ins)}:{int(n_upd)}:{int(n_del)}:{reset}"
+
+    @classmethod
+    def from_db(cls, conn, stamp: str):
+        cols = [col for _, col, _, _ in AGG_LEVELS]
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT acct, {', '.join(_q_ident(c) for c in cols)} FROM public.parcel_ladder_v1")
+            lad = pd.DataFrame(cur.fetchall(), columns=["acct"] + cols)
+        lad["acct"] = lad["acct"].astype(str).str.strip()
+        lad = lad.drop_duplicates(subset=["acct"], keep="last").sort_values("acct", kind="stable")
+        codes, geoids = {}, {}
+        for lvl, col, _, _ in AGG_LEVELS:
+            c, uniq = pd.factorize(lad[col].astype(object).where(lad[col].notna(), None).map(
+                lambda v: None if v is None else str(v)), sort=True)
+            codes[lvl] = c.astype(np.int32)
+            geoids[lvl] = np.asarray(uniq, dtype=str)
+        return cls(lad["acct"].to_numpy(dtype=str), codes, geoids, stamp)
+
+    def save(self, path: str) -> str:
+        tmp = path + ".tmp.npz"
+        arrays = {"stamp": np.asarray(self.stamp), "accts": self.accts}
+        for lvl, _ in self.levels:
+            arrays[f"codes__{lvl}"] = self.codes[lvl]
+            arrays[f"geoids__{lvl}"] = self.geoids[lvl]
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load_npz(cls, path: str):
+        with np.load(path, allow_pickle=False) as z:
+            levels = [lvl for lvl, _, _, _ in AGG_LEVELS]
+            return cls(
+                z["accts"],
+                {lvl: z[f"codes__{lvl}"] for lvl in levels},
+                {lvl: z[f"geoids__{lvl}"] for lvl in levels},
+                str(z["stamp"]),
+            )
+
+
+_LADDER_INDEX = None
+
+def _load_parcel_ladder_index(cache_dir: str = None) -> ParcelLadderIndex:
+    """
+    Return the process-wide ladder index: in-memory if current, else the local
+    .npz cache if its stamp matches the table, else a fresh download (then cached).
+    """
+    global _LADDER_INDEX
+    cache_dir = cache_dir or os.path.join(os.path.dirname(OUT_ROOT.rstrip("/")), "_ladder_index")
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, "parcel_ladder_v1.npz")
+
+    with _pg_tx(label="ladder_stamp") as conn:
+        stamp = ParcelLadderIndex._table_stamp(conn)
+    if _LADDER_INDEX is not None and _LADDER_INDEX.stamp == stamp:
+        return _LADDER_INDEX
+
+    if os.path.exists(path):
+        try:
+            idx = ParcelLadderIndex.load_npz(path)
+            if idx.stamp == stamp:
+                print(f"[{_ts()}] Ladder index: loaded {len(idx):,} parcels from cache {path}")
+                _LADDER_INDEX = idx
+                return idx
+            print(f"[{_ts()}] Ladder index: cache stamp {idx.stamp} != table {stamp}, rebuilding")
+        except Exception as exc:
+            print(f"[{_ts()}] Ladder index: unreadable cache {path} ({exc}), rebuilding")
+
+    t0 = time.time()
+    with _pg_tx(label="ladder_download") as conn:
+        idx = ParcelLadderIndex.from_db(conn, stamp)
+    idx.save(path)
+    print(f"[{_ts()}] Ladder index: {len(idx):,} parcels "
+          f"({', '.join(f'{lvl}={len(idx.geoids[lvl])}' for lvl, _ in idx.levels)}) "
+          f"in {time.time() - t0:.1f}s -> {path}")
+    _LADDER_INDEX = idx
+    return idx
+
+
+def _aggregate_history_levels_from_index(
+    conn,
+    schema: str,
+    ladder_idx: ParcelLadderIndex,
+    hist_df: pd.DataFrame,
+    run_id: str,
+    series_kind: str,
+    variant_id: str,
+    backtest_id: str,
+    as_of_date: date,
+):
+    """
+    Same weighted ON CONFLICT merge as _aggregate_history_levels_for_chunk, but the
+    per-(geo, year) AVG/COUNT of the chunk's history rows is a local bincount over
+    ladder codes, staged with COPY; no parcel_ladder_v1 JOIN or parcel re-read.
+    """
+    if hist_df is None or hist_df.empty:
+        return 0
+
+    # mirror the upserted table: one row per (acct, year), last write wins
+    hist_df = hist_df.drop_duplicates(subset=["acct", "year"], keep="last")
+    codes_by_level = ladder_idx.codes_for(hist_df["acct"].to_numpy())
+    year = hist_df["year"].to_numpy(dtype=np.int64)
+    val = hist_df["value"].to_numpy(dtype=np.float64)
+    p50 = hist_df["p50"].to_numpy(dtype=np.float64)
+    y0 = int(year.min())
+    n_years = int(year.max()) - y0 + 1
+    now_iso = datetime.utcnow().isoformat()
+
+    total_rows = 0
+    for level, ladder_col, _, tbl_history in AGG_LEVELS:
+        c = codes_by_level[level]
+        ok = c >= 0
+        if not ok.any():
+            continue
+        key = c[ok] * n_years + (year[ok] - y0)
+        uniq, inv = np.unique(key, return_inverse=True)
+        n = np.bincount(inv)
+
+        def _avg(x):
+            # AVG() semantics: NULLs are skipped, all-NULL groups stay NULL
+            fin = np.isfinite(x)
+            cnt = np.bincount(inv, weights=fin.astype(np.float64), minlength=uniq.size)
+            tot = np.bincount(inv, weights=np.where(fin, x, 0.0), minlength=uniq.size)
+            return np.divide(tot, cnt, out=np.full(uniq.size, np.nan), where=cnt > 0)
+
+        agg = pd.DataFrame({
+            ladder_col: ladder_idx.geoids[level][uniq // n_years].astype(object),
+            "year": (uniq % n_years) + y0,
+            "value": _avg(val[ok]),
+            "p50": _avg(p50[ok]),
+            "n": n.astype(np.int64),
+            "run_id": run_id,
+            "backtest_id": backtest_id,
+            "variant_id": variant_id,
+            "model_version": MODEL_VERSION,
+            "as_of_date": as_of_date.isoformat(),
+            "series_kind": series_kind,
+            "inserted_at": now_iso,
+            "updated_at": now_iso,
+        })
+
+        q_target = _q_table(schema, tbl_history)
+        q_stage = "pg_temp." + _q_ident(f"_stage_{tbl_history}")
+        col_sql = ", ".join(_q_ident(col) for col in agg.columns)
+        with conn.cursor() as cur:
+            _copy_df_to_stage(cur, q_stage, q_target, agg)
+            cur.execute(f"""
+                INSERT INTO {q_target} ({col_sql})
+                SELECT {col_sql} FROM {q_stage}
+                ON CONFLICT ({_q_ident(ladder_col)}, year, series_kind, variant_id)
+                DO UPDATE SET
+                    value = (
+                        (COALESCE({q_target}.value, 0.0) * COALESCE({q_target}.n, 0)) +
+                        (EXCLUDED.value * EXCLUDED.n)
+                    ) / NULLIF(COALESCE({q_target}.n, 0) + EXCLUDED.n, 0),
+
+                    p50 = (
+                        (COALESCE({q_target}.p50, 0.0) * COALESCE({q_target}.n, 0)) +
+                        (EXCLUDED.p50 * EXCLUDED.n)
+                    ) / NULLIF(COALESCE({q_target}.n, 0) + EXCLUDED.n, 0),
+
+                    n = COALESCE({q_target}.n, 0) + EXCLUDED.n,
+
+                    run_id = EXCLUDED.run_id,
+                    backtest_id = EXCLUDED.backtest_id,
+                    model_version = EXCLUDED.model_version,
+                    as_of_date = EXCLUDED.as_of_date,
+                    updated_at = now()
+            """)
+            total_rows += int(cur.rowcount or 0)
+            cur.execute(f"DROP TABLE IF EXISTS {q_stage}")
+
+    return total_rows
+
+
+# -----------------------------------------------------------------------------
+# IN-PROCESS SCENARIO AGGREGATION (PARCEL PRICE PATHS -> GEO FANS)
+# -----------------------------------------------------------------------------
+class _GeoScenarioPartial:
+    """
+    Per-geography scenario sums for one sampling attempt (one outer chunk).
+    Kept separate from the run aggregator so an OOM retry can drop it.
+    """
+    def __init__(self):
+        self.parts = []      # (level, uniq_codes, sums [G,S,H], counts [G])
+        self.n_parcels = 0
+
+    def add(self, codes_by_level: dict, price):
+        """price: float64 torch tensor [N, S, H] on any device; codes: int64 (N,), -1 = no geography."""
+        import torch
+        for level, codes in codes_by_level.items():
+            c = torch.as_tensor(np.asarray(codes, dtype=np.int64), device=price.device)
+            ok = c >= 0
+            if not bool(ok.any()):
+                continue
+            uniq, inv = torch.unique(c[ok], return_inverse=True)
+            blk = torch.zeros((int(uniq.shape[0]),) + tuple(price.shape[1:]), dtype=torch.float64, device=price.device)
+            blk.index_add_(0, inv, price[ok].to(torch.float64))
+            cnt = torch.bincount(inv, minlength=int(uniq.shape[0]))
+            self.parts.append((level, uniq.cpu().numpy(), blk.cpu().numpy(), cnt.cpu().numpy()))
+        self.n_parcels += int(price.shape[0])
+
+
+class GeoScenarioAggregator:
+    """
+    Running per-geography sums of parcel price paths for one run:
+    sums[level][g, s, h] = sum of price[i, s, h] over parcels i in geography g.
+    Sums and parcel counts merge by addition across prop batches and chunks;
+    quantiles of the geography mean over scenarios are taken once at the end
+    (instead of averaging parcel quantiles, which understates the spread).
+    """
+    def __init__(self, S: int, H: int, levels=None, ladder_idx: ParcelLadderIndex = None):
+        self.S = int(S)
+        self.H = int(H)
+        self.levels = [(lvl, col) for lvl, col, _, _ in (levels or AGG_LEVELS)]
+        # with a ladder index, codes come pre-encoded against its geoid dictionaries
+        self.geoids = {lvl: (list(ladder_idx.geoids[lvl]) if ladder_idx is not None else [])
+                       for lvl, _ in self.levels}
+        self._code = {lvl: {} for lvl, _ in self.levels}
+        self.sums = {lvl: np.zeros((0, self.S, self.H), dtype=np.float64) for lvl, _ in self.levels}
+        self.counts = {lvl: np.zeros((0,), dtype=np.int64) for lvl, _ in self.levels}
+        self.n_parcels = 0
+
+    def encode(self, level: str, geoids) -> np.ndarray:
+        """Dictionary-encode geoids for a level (extending the dictionary); missing -> -1."""
+        ser = pd.Series(np.asarray(geoids, dtype=object))
+        lut = self._code[level]
+        if self.geoids[level] and not lut:
+            lut.update({g: i for i, g in enumerate(self.geoids[level])})
+        new = ser[ser.notna() & ~ser.isin(lut.keys())].unique()
+        for g in new:
+            lut[g] = len(self.geoids[level])
+            self.geoids[level].append(g)
+        return ser.map(lut).fillna(-1).astype(np.int64).to_numpy()
+
+    def partial(self) -> _GeoScenarioPartial:
+        return _GeoScenarioPartial()
+
+    def merge(self, part: _GeoScenarioPartial) -> None:
+        for level, uniq, blk, cnt in part.parts:
+            need = int(uniq.max()) + 1 if uniq.size else 0
+            if self.sums[level].shape[0] < need:
+                grow = max(need, 2 * self.sums[level].shape[0])
+                sums = np.zeros((grow, self.S, self.H), dtype=np.float64)
+                sums[:self.sums[level].shape[0]] = self.sums[level]
+                counts = np.zeros((grow,), dtype=np.int64)
+                counts[:self.counts[level].shape[0]] = self.counts[level]
+                self.sums[level], self.counts[level] = sums, counts
+            self.sums[level][uniq] += blk
+            self.counts[level][uniq] += cnt
+        self.n_parcels += int(part.n_parcels)
+
+    def build_rows(
+        self,
+        level: str,
+        origin_year: int,
+        run_id: str,
+        series_kind: str,
+        variant_id: str,
+        backtest_id: str,
+        as_of_date: date,
+        geo_block: int = 4096,
+    ) -> pd.DataFrame:
+        """Aggregate forecast rows (same columns as the SQL aggregation) for one level."""
+        ladder_col = dict(self.levels)[level]
+        G = len(self.geoids[level])
+        cnt = self.counts[level][:G]
+        keep = np.flatnonzero(cnt > 0)
+        if keep.size == 0:
+            return pd.DataFrame()
+
+        qs = np.empty((5, keep.size, self.H), dtype=np.float64)
+        for b0 in range(0, keep.size, int(geo_block)):
+            g = keep[b0:b0 + int(geo_block)]
+            geo_mean = self.sums[level][g] / cnt[g][:, None, None]          # [g, S, H]
+            qs[:, b0:b0 + g.size, :] = np.quantile(geo_mean, [0.10, 0.25, 0.50, 0.75, 0.90], axis=1)
+
+        n_rows = int(keep.size) * self.H
+        horizon_k = np.tile(np.arange(1, self.H + 1, dtype=np.int64), keep.size)
+        now_iso = datetime.utcnow().isoformat()
+        geoid_arr = np.asarray(self.geoids[level], dtype=object)[keep]
+        cols = {
+            ladder_col: np.repeat(geoid_arr, self.H),
+            "origin_year": np.full(n_rows, int(origin_year), dtype=np.int64),
+            "horizon_m": 12 * horizon_k,
+            "forecast_year": int(origin_year) + horizon_k,
+            "value": qs[2].reshape(-1),
+            "p10": qs[0].reshape(-1),
+            "p25": qs[1].reshape(-1),
+            "p50": qs[2].reshape(-1),
+            "p75": qs[3].reshape(-1),
+            "p90": qs[4].reshape(-1),
+            "n": np.repeat(cnt[keep], self.H),
+            "run_id": _const_categorical(run_id, n_rows),
+            "backtest_id": _const_categorical(backtest_id, n_rows),
+            "variant_id": _const_categorical(variant_id, n_rows),
+            "model_version": _const_categorical(MODEL_VERSION, n_rows),
+            "as_of_date": _const_categorical(as_of_date.isoformat(), n_rows),
+            "n_scenarios": np.full(n_rows, self.S, dtype=np.int64),
+            "is_backtest": np.full(n_rows, series_kind == "backtest", dtype=bool),
+            "series_kind": _const_categorical(series_kind, n_rows),
+            "inserted_at": _const_categorical(now_iso, n_rows),
+            "updated_at": _const_categorical(now_iso, n_rows),
+        }
+        return pd.DataFrame(cols, copy=False)
+
+
+def _fetch_ladder_codes_for_accts(geo_agg: GeoScenarioAggregator, accts):
+    """
+    One ladder lookup for all AGG_LEVELS columns of a chunk's accts.
+    Returns {level: int64 codes aligned with accts (-1 = not in ladder / NULL)}.
+    """
+    ladder_cols = [col for _, col in geo_agg.levels]
+    sql = f"""
+        SELECT acct, {", ".join(_q_ident(c) for c in ladder_cols)}
+        FROM public.parcel_ladder_v1
+        WHERE acct = ANY(%s)
+    """
+    accts = [str(a) for a in accts]
+    with _pg_tx(label="ladder_lookup") as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, (accts,))
+            rows = cur.fetchall()
+    lad = pd.DataFrame(rows, columns=["acct"] + ladder_cols).drop_duplicates(subset=["acct"], keep="last")
+    lad = lad.set_index("acct").reindex(accts)
+    return {lvl: geo_agg.encode(lvl, lad[col].to_numpy(dtype=object)) for lvl, col in geo_agg.levels}
+
+
+def _replace_forecast_aggregate_slice(
+    conn,
+    schema: str,
+    tbl_forecast: str,
+    ladder_col: str,
+    df: pd.DataFrame,
+    origin_year: int,
+    series_kind: str,
+    variant_id: str,
+):
+    """
+    Replace the (origin_year, series_kind, variant_id) slice of one forecast
+    aggregate table with df (one bulk write); returns rows written.
+    """
+    q_target = _q_table(schema, tbl_forecast)
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            DELETE FROM {q_target}
+            WHERE origin_year = %s
+              AND series_kind = %s
+              AND variant_id = %s
+            """,
+            (int(origin_year), series_kind, variant_id),
+        )
+    return _bulk_upsert_df_pg(
+        conn=conn,
+        schema=schema,
+        table=tbl_forecast,
+        df=df,
+        conflict_cols=[ladder_col, "origin_year", "horizon_m", "series_kind", "variant_id"],
+        update_cols=[
+            "forecast_year", "value", "p10", "p25", "p50", "p75", "p90", "n",
+            "run_id", "backtest_id", "model_version", "as_of_date", "n_scenarios",
+            "is_backtest", "updated_at",
+        ],
+    )
+
+
+def _write_scenario_forecast_aggregates(
+    conn,
+    schema: str,
+    geo_agg: GeoScenarioAggregator,
+    origin_year: int,
+    run_id: str,
+    series_kind: str,
+    variant_id: str,
+    backtest_id: str,
+    as_of_date: date,
+    run_root: str = None,
+):
+    """
+    Replace this (origin_year, series_kind, variant_id) slice of every forecast
+    aggregate table with the scenario-level fans: one bulk write per level.
+    With run_root (SINK_MODE='local', conn=None) the rows go to
+    agg_chunks/<partition>/<table>_chunk_00001 for publish_run.py instead.
+    """
+    total_rows = 0
+    for level, ladder_col, tbl_forecast, _ in AGG_LEVELS:
+        df = geo_agg.build_rows(
+            level, origin_year=origin_year, run_id=run_id, series_kind=series_kind,
+            variant_id=variant_id, backtest_id=backtest_id, as_of_date=as_of_date,
+        )
+        if run_root is not None:
+            _write_df_chunk(df, _sink_dir(run_root, "agg_chunks", origin_year, series_kind, variant_id), tbl_forecast, 1)
+            n = len(df)
+        else:
+            n = _replace_forecast_aggregate_slice(conn, schema, tbl_forecast, ladder_col, df,
+                                                  origin_year, series_kind, variant_id)
+        print(f"[{_ts()}] Scenario aggregates {level}: {n} rows ({len(geo_agg.geoids[level])} geographies)"
+              f"{' -> local sink' if run_root is not None else ''}")
+        total_rows += int(n)
+    return total_rows
+
+
 # -----------------------------------------------------------------------------
 # FINAL EXACT AGGREGATE REFRESH (OPTIONAL, RECOMMENDED)
 # -----------------------------------------------------------------------------
@@ -1093,7 +1948,7 @@ def _get_checkpoint_paths(ckpt_dir: str):
     pairs = {}  # origin -> path (last wins, v11 overwrites v10.2)
     _pat = _re.compile(r"ckpt_(?:v11_)?origin_(\d{4})")
     for fn in sorted(os.listdir(ckpt_dir)):
-        if not fn.endswith(".pt"):
+        if not fn.endswith(".pt") or ".student_k" in fn:   # distilled students ride along with their teacher
             continue
         m = _pat.search(fn)
         if m:
@@ -1123,6 +1978,8 @@ def _load_ckpt_into_live_objects(ckpt_path: str):
     _n_cat = int(_cfg_ckpt.get("N_CAT", globals().get("N_CAT", 12)))
 
     _device = "cuda" if torch.cuda.is_available() else "cpu"
+    globals()["_LIVE_CKPT_PATH"] = ckpt_path
+    globals()["_CPU_PROFILE_LIVE"] = None
 
     if _arch == "v11":
         # ── v11: denoiser + gating + token_persistence + coh_scale ──
@@ -1231,9 +2088,32 @@ def _load_ckpt_into_live_objects(ckpt_path: str):
     globals()["n_scaler"] = _n_scaler
     globals()["t_scaler"] = _t_scaler
 
+    if _arch == "v11" and str(globals().get("SAMPLER_KIND", "ddim")).lower() == "student":
+        _load_student_into_live_model(ckpt_path, _model)
+
     return ckpt
 
 
+def _load_student_into_live_model(ckpt_path: str, teacher):
+    """
+    SAMPLER_KIND="student": replace the live denoiser with the distilled student
+    <ckpt>.student_k<SAMPLER_STEPS>.pt (worldmodel section 16c). Falls back to the
+    teacher with DDIM when the student is missing or was distilled on another schedule.
+    """
+    _steps = int(globals().get("SAMPLER_STEPS") or globals().get("DIFF_STEPS_SAMPLE", 20))
+    _path = student_ckpt_path(ckpt_path, _steps)
+    if not os.path.exists(_path):
+        print(f"[{_ts()}] ⚠️ SAMPLER_KIND=student but {os.path.basename(_path)} not found — sampling the teacher with DDIM")
+        return
+    try:
+        _student = load_v11_student(_path, teacher, int(globals().get("DIFF_STEPS_SAMPLE", 20)))
+    except (ValueError, RuntimeError, KeyError) as e:
+        print(f"[{_ts()}] ⚠️ Could not load student {os.path.basename(_path)} ({e}) — sampling the teacher with DDIM")
+        return
+    globals()["model"] = _student.to(next(teacher.parameters()).device)
+    print(f"[{_ts()}] Distilled student loaded: {os.path.basename(_path)} | t_idx={list(_student._sampler_t_idx)}")
+
+
 def _build_inference_for_accounts_at_origin(accts_batch, origin: int, global_medians: dict):
     """
     Wrapper around worldmodel.build_inference_context_chunked_v102.
@@ -1278,11 +2158,190 @@ def _build_inference_for_accounts_at_origin(accts_batch, origin: int, global_med
     return result
 
 
-def _sample_scenarios_for_inference_context(ctx, H: int, S: int, origin: int, prop_batch_size: int):
+def _cpu_profile_live_objects(ctx, sched, Z_tokens, coh_scale_ref):
+    """
+    SAMPLER_CPU_PROFILE on a CPU host: (model, gating_net) to sample with for the
+    loaded checkpoint. The profile copies are used only if the worldmodel fan
+    accuracy guard passes on this context's fixed parcel set; a passing report
+    cached next to the checkpoint skips the guard on later runs.
+    Resolved once per _load_ckpt_into_live_objects call.
+    """
+    _model_ref = globals().get("model")
+    _gating_net_ref = globals().get("gating_net")
+    _live = globals().get("_CPU_PROFILE_LIVE")
+    if _live is not None and _live["src"] is _model_ref:
+        return _live["model"], _live["gating_net"]
+
+    _profile = str(SAMPLER_CPU_PROFILE).lower()
+    _use = (_model_ref, _gating_net_ref)
+    _report = None
+    try:
+        _model_p, _gating_p = prepare_v11_cpu_profile(_model_ref, _gating_net_ref, _profile)
+        _ckpt_path = globals().get("_LIVE_CKPT_PATH")
+        if _ckpt_path:
+            _report = load_cpu_profile_report(_ckpt_path, _profile, jurisdiction=JURISDICTION)
+        if _report is not None:
+            print(f"[{_ts()}] CPU profile {_profile}: cached guard report "
+                  f"({'PASS' if _report.get('pass') else 'FAIL'}, speedup={_report.get('speedup')}x)")
+        else:
+            _report = cpu_profile_accuracy_guard(_model_ref, _gating_net_ref, _model_p, _gating_p,
+                                                 sched, ctx, Z_tokens, coh_scale=coh_scale_ref)
+            if _ckpt_path:
+                try:
+                    save_cpu_profile_report(_ckpt_path, _report, jurisdiction=JURISDICTION)
+                except OSError as e:
+                    print(f"[{_ts()}] ⚠️ Could not write CPU profile report next to {_ckpt_path}: {e}")
+        if _report.get("pass"):
+            _use = (_model_p, _gating_p)
+            print(f"[{_ts()}] ⚡ Sampling with CPU profile {_profile}")
+        else:
+            print(f"[{_ts()}] ⚠️ CPU profile {_profile} failed the fan accuracy guard — sampling in fp32")
+    except Exception as e:
+        print(f"[{_ts()}] ⚠️ CPU profile {_profile} unavailable ({type(e).__name__}: {e}) — sampling in fp32")
+
+    globals()["_CPU_PROFILE_LIVE"] = {"src": _model_ref, "model": _use[0], "gating_net": _use[1], "report": _report}
+    return _use
+
+
+def _sampler_noise_seed(origin: int) -> int:
+    """Per-origin seed for token paths and per-parcel noise streams, derived from SAMPLER_RUN_SEED."""
+    return int(np.random.SeedSequence([int(SAMPLER_RUN_SEED), int(origin)]).generate_state(1)[0])
+
+
+def _cpu_slice_seed(origin: int, start: int) -> int:
+    """Torch seed for the prop batch starting at row `start` of a chunk (independent of worker count)."""
+    return int(np.random.SeedSequence([int(globals().get("SEED", 42)), int(origin), int(start)]).generate_state(1)[0])
+
+
+def _cpu_sampler_worker(rank, slices, next_slice, model, gating_net, sched, Z_tokens, coh_scale,
+                        ctx, bufs, geo_codes, origin, threads, results, noise_keys=None, noise_seed=None):
+    """Forked worker: claim prop batches off the shared counter, write fans into the shared buffers."""
+    import torch
+    torch.set_num_threads(int(threads))
+    part = _GeoScenarioPartial() if geo_codes is not None else None
+    n_done = 0
+    try:
+        while True:
+            with next_slice.get_lock():
+                i = next_slice.value
+                next_slice.value += 1
+            if i >= len(slices):
+                break
+            start, end = slices[i]
+            sinks = ()
+            if part is not None:
+                codes = {lvl: c[start:end] for lvl, c in geo_codes.items()}
+                sinks = (lambda price, codes=codes: part.add(codes, price),)
+            torch.manual_seed(_cpu_slice_seed(origin, start))
+            fan = sample_ddim_v11(
+                model=model, gating_net=gating_net, sched=sched,
+                hist_y_b=ctx["hist_y"][start:end], cur_num_b=ctx["cur_num"][start:end],
+                cur_cat_b=ctx["cur_cat"][start:end], region_id_b=ctx["region_id"][start:end],
+                Z_tokens=Z_tokens, device="cpu", coh_scale=coh_scale,
+                reducer=ScenarioFanReducer(ctx["y_anchor"][start:end], sinks=sinks),
+                noise_keys=noise_keys[start:end] if noise_keys is not None else None,
+                noise_seed=noise_seed,
+            )
+            for k, buf in bufs.items():
+                buf[start:end] = torch.from_numpy(np.asarray(fan[k], dtype=np.float64))
+            n_done += end - start
+        results.put((rank, None, part.parts if part is not None else None, part.n_parcels if part is not None else 0, n_done))
+    except Exception as e:
+        results.put((rank, f"{type(e).__name__}: {e}", None, 0, n_done))
+
+
+def _sample_fan_cpu_multiproc(ctx, S: int, origin: int, prop_batch_size: int, model, gating_net,
+                              sched, Z_tokens, coh_scale, geo_codes=None, geo_part=None,
+                              noise_keys=None, noise_seed=None):
+    """
+    CPU_SAMPLER_WORKERS forked processes sample disjoint prop batches of one chunk.
+    Workers inherit the live checkpoint modules and ctx copy-on-write, read Z_tokens
+    from shared memory and write their fans into shared [N, Q, H] (+ moments /
+    exceedance) buffers; per-geography scenario sums come back as partial parts.
+    With noise_keys (SAMPLER_PARCEL_RNG) fans match the serial path exactly; otherwise
+    each prop batch is seeded from (SEED, origin, batch start), so the fans still do
+    not depend on the worker count or on which worker took the batch.
+    Returns the same dict as the STREAM_FAN_REDUCER path.
+    """
+    import torch
+    import torch.multiprocessing as tmp
+
+    N = len(ctx["acct"])
+    n_q = len(tuple(FAN_QUANTILES))
+    slices = [(s0, min(N, s0 + int(prop_batch_size))) for s0 in range(0, N, int(prop_batch_size))]
+    n_workers = max(1, min(int(CPU_SAMPLER_WORKERS), len(slices)))
+    threads = int(CPU_SAMPLER_THREADS) or max(1, (os.cpu_count() or 1) // n_workers)
+
+    Z_tokens = Z_tokens.detach().cpu().contiguous().share_memory_()
+    bufs = {"quantiles": torch.zeros((N, n_q, H), dtype=torch.float64).share_memory_()}
+    if FAN_WITH_MOMENTS:
+        bufs["mean"] = torch.zeros((N, H), dtype=torch.float64).share_memory_()
+        bufs["std"] = torch.zeros((N, H), dtype=torch.float64).share_memory_()
+    if FAN_EXCEED_GROWTH:
+        bufs["exceed"] = torch.zeros((N, len(FAN_EXCEED_GROWTH), H), dtype=torch.float64).share_memory_()
+
+    mp_ctx = tmp.get_context("fork")
+    next_slice = mp_ctx.Value("i", 0)
+    results = mp_ctx.Queue()
+    use_geo = geo_part is not None and geo_codes is not None
+    t0 = time.time()
+    procs = [
+        mp_ctx.Process(
+            target=_cpu_sampler_worker,
+            args=(r, slices, next_slice, model, gating_net, sched, Z_tokens, coh_scale, ctx, bufs,
+                  geo_codes if use_geo else None, int(origin), threads, results, noise_keys, noise_seed),
+            daemon=True,
+        )
+        for r in range(n_workers)
+    ]
+    for p in procs:
+        p.start()
+    errors, n_done, pending = [], 0, len(procs)
+    while pending:
+        try:
+            rank, err, parts, n_geo, n_rows = results.get(timeout=10)
+        except queue.Empty:
+            if not any(p.is_alive() for p in procs) and results.empty():
+                errors.append(f"{pending} worker(s) exited without reporting")
+                break
+            continue
+        pending -= 1
+        n_done += n_rows
+        if err:
+            errors.append(f"worker {rank}: {err}")
+        elif use_geo and parts:
+            geo_part.parts.extend(parts)
+            geo_part.n_parcels += int(n_geo)
+    for p in procs:
+        p.join()
+    if errors or n_done != N:
+        raise RuntimeError(f"CPU sampler workers failed ({n_done}/{N} rows): {'; '.join(errors)}")
+    dt = time.time() - t0
+    print(f"[{_ts()}] ⚡ CPU sampler: {N:,} parcels in {len(slices)} batches over {n_workers} workers "
+          f"x {threads} threads in {dt:.1f}s ({N / max(dt, 1e-9):,.0f} parcels/s)")
+
+    # copy out of the shared segments so they are released with this call
+    out = {"acct": ctx["acct"], "quantiles": bufs["quantiles"].numpy().copy(),
+           "q_levels": tuple(float(q) for q in FAN_QUANTILES), "n_scenarios": int(S)}
+    for k in ("mean", "std", "exceed"):
+        if k in bufs:
+            out[k] = bufs[k].numpy().copy()
+    if FAN_EXCEED_GROWTH:
+        out["exceed_growth"] = tuple(float(g) for g in FAN_EXCEED_GROWTH)
+    return out
+
+
+def _sample_scenarios_for_inference_context(ctx, H: int, S: int, origin: int, prop_batch_size: int,
+                                            geo_codes=None, geo_part=None):
     """
     v11: Run DDIM sampler over the inference context in account batches of prop_batch_size.
     Uses inducing-token paths and gating network for coherent joint scenarios.
     Returns dict with keys: acct, y_levels (N,S,H), price_levels (N,S,H).
+    With STREAM_FAN_REDUCER: acct, quantiles (N,Q,H) price quantiles, q_levels,
+    n_scenarios (+ mean/std/exceed when enabled in worldmodel FAN_* config).
+
+    geo_codes/geo_part: optional {level: (N,) codes} and a _GeoScenarioPartial that
+    receives every batch's price paths while they are still on device.
     """
     import torch
 
@@ -1307,19 +2366,63 @@ def _sample_scenarios_for_inference_context(ctx, H: int, S: int, origin: int, pr
     _K = int(globals().get("K_TOKENS", 8))
     _token_persistence_ref = globals().get("token_persistence")  # learned per-token phi
     _coh_scale_ref = globals().get("coh_scale")  # learned coherence scale
-    if _token_persistence_ref is not None:
-        Z_tokens = sample_token_paths(_K, _H, _token_persistence_ref, _S, _device)  # [S, K, H]
+    _phi = _token_persistence_ref if _token_persistence_ref is not None else float(globals().get("PHI_INIT", 0.80))
+    if SAMPLER_TOKEN_PATHS == "origin":
+        # Same token paths for every chunk / retry of this origin: drawn on CPU from a
+        # seed fixed per (run seed, origin), leaving the global RNG stream untouched
+        with torch.random.fork_rng(devices=[]):
+            torch.manual_seed(_sampler_noise_seed(origin))
+            Z_tokens = sample_token_paths(_K, _H, _phi, _S, "cpu").to(_device)  # [S, K, H]
     else:
-        _phi = float(globals().get("PHI_INIT", 0.80))
         Z_tokens = sample_token_paths(_K, _H, _phi, _S, _device)  # [S, K, H]
+    if SAMPLER_PARCEL_RNG:
+        _noise_seed = _sampler_noise_seed(origin)
+        _noise_keys = acct_noise_keys(ctx["acct"])
+    else:
+        _noise_seed, _noise_keys = None, None
+
+    if _device == "cpu" and str(SAMPLER_CPU_PROFILE or "fp32").lower() != "fp32":
+        _model_ref, _gating_net_ref = _cpu_profile_live_objects(ctx, _sched, Z_tokens, _coh_scale_ref)
+
+    if (_device == "cpu" and STREAM_FAN_REDUCER and CPU_SAMPLER_WORKERS > 1 and N > prop_batch_size
+            and "fork" in multiprocessing.get_all_start_methods()):
+        return _sample_fan_cpu_multiproc(ctx, _S, origin, prop_batch_size, _model_ref, _gating_net_ref,
+                                         _sched, Z_tokens, _coh_scale_ref, geo_codes, geo_part,
+                                         noise_keys=_noise_keys, noise_seed=_noise_seed)
+
+    def _geo_sinks(start, end):
+        if geo_part is None or geo_codes is None:
+            return ()
+        codes = {lvl: c[start:end] for lvl, c in geo_codes.items()}
+        return (lambda price: geo_part.add(codes, price),)
 
     # Batch over accounts
     all_y = []
     all_price = []
+    all_fan = []
 
     for start in range(0, N, prop_batch_size):
         end = min(start + prop_batch_size, N)
 
+        if STREAM_FAN_REDUCER:
+            fan = sample_ddim_v11(
+                model=_model_ref,
+                gating_net=_gating_net_ref,
+                sched=_sched,
+                hist_y_b=ctx["hist_y"][start:end],
+                cur_num_b=ctx["cur_num"][start:end],
+                cur_cat_b=ctx["cur_cat"][start:end],
+                region_id_b=ctx["region_id"][start:end],
+                Z_tokens=Z_tokens,
+                device=_device,
+                coh_scale=_coh_scale_ref,
+                reducer=ScenarioFanReducer(ctx["y_anchor"][start:end], sinks=_geo_sinks(start, end)),
+                noise_keys=_noise_keys[start:end] if _noise_keys is not None else None,
+                noise_seed=_noise_seed,
+            )  # dict of (end-start, Q, H) numpy
+            all_fan.append(fan)
+            continue
+
         deltas = sample_ddim_v11(
             model=_model_ref,
             gating_net=_gating_net_ref,
@@ -1331,16 +2434,34 @@ def _sample_scenarios_for_inference_context(ctx, H: int, S: int, origin: int, pr
             Z_tokens=Z_tokens,
             device=_device,
             coh_scale=_coh_scale_ref,
+            noise_keys=_noise_keys[start:end] if _noise_keys is not None else None,
+            noise_seed=_noise_seed,
         )  # (end-start, S, H) numpy
 
         # Convert deltas to y-levels and then price levels
         _y_anchor_batch = ctx["y_anchor"][start:end]                 # (B,)
         y_levels = _y_anchor_batch[:, None, None] + deltas            # (B, S, H)
         price_levels = np.expm1(y_levels)                             # inverse log1p
+        for _sink in _geo_sinks(start, end):
+            _sink(torch.from_numpy(price_levels.astype(np.float64)))
 
         all_y.append(y_levels)
         all_price.append(price_levels)
 
+    if STREAM_FAN_REDUCER:
+        out = {
+            "acct": ctx["acct"],
+            "quantiles": np.concatenate([f["quantiles"] for f in all_fan], axis=0),
+            "q_levels": all_fan[0]["q_levels"] if all_fan else tuple(FAN_QUANTILES),
+            "n_scenarios": _S,
+        }
+        for k in ("mean", "std", "exceed"):
+            if all_fan and k in all_fan[0]:
+                out[k] = np.concatenate([f[k] for f in all_fan], axis=0)
+        if all_fan and "exceed_growth" in all_fan[0]:
+            out["exceed_growth"] = all_fan[0]["exceed_growth"]
+        return out
+
     return {
         "acct": ctx["acct"],
         "y_levels": np.concatenate(all_y, axis=0),
@@ -1367,6 +2488,26 @@ def _materialize_actual_prices_for_accounts(lf_obj=None, accts=None, year_min=19
         year_min = int(origin) + 1
         year_max = int(origin) + int(max_horizon)
 
+    # Dense panel tensor (worldmodel section 15b): slice the price grid instead of querying
+    # the panel. One row per (acct, year), last panel row wins, like the history dedup.
+    _pt = None
+    if (lf_obj is None or lf_obj is globals().get("lf")) and globals().get("get_panel_tensor") is not None:
+        _pt = get_panel_tensor()
+    if _pt is not None:
+        _acct, _ids = _pt.ids_for(accts)
+        _j0, _j1 = _pt.year_slice(int(year_min), int(year_max))
+        if _ids.size == 0 or _j1 <= _j0:
+            return None
+        _px = np.asarray(_pt.price[_ids, _j0:_j1])
+        _r, _c = np.nonzero(np.isfinite(_px))
+        if _r.size == 0:
+            return None
+        return pd.DataFrame({
+            "acct": _acct[_r].astype(object),
+            "year": (_c + _j0 + _pt.year0).astype(np.int64),
+            "actual_price": _px[_r, _c],
+        })
+
     rows = (
         _lf_ref
         .filter(pl.col("acct").cast(pl.Utf8).is_in(accts))
@@ -1400,28 +2541,242 @@ def _pick_ckpt_for_origin(ckpt_pairs, origin_year: int):
 
     return ckpt_pairs_sorted[-1]
 
-def _sample_scenarios_with_backoff(ctx, H, S, origin):
+def _is_oom_error(e: Exception) -> bool:
+    msg = str(e).lower()
+    return ("out of memory" in msg) or ("cuda" in msg and "memory" in msg)
+
+
+def _sampler_autotune_key(S: int) -> dict:
+    """Cache key for the autotuned sampler setting: device, model dims, S and sampler."""
+    import torch
+    import platform
+
+    _model_ref = globals().get("model")
+    if torch.cuda.is_available():
+        device = f"cuda:{torch.cuda.get_device_name(0)}"
+    else:
+        device = f"cpu:{platform.machine()}:{os.cpu_count()}:{str(SAMPLER_CPU_PROFILE or 'fp32').lower()}"
+    return {
+        "device": device,
+        "arch": type(_model_ref).__name__,
+        "n_params": int(sum(p.numel() for p in _model_ref.parameters())),
+        "H": int(globals().get("H", 5)),
+        "hist_len": int(globals().get("FULL_HIST_LEN", 21)),
+        "num_dim": int(globals().get("NUM_DIM", 38)),
+        "n_cat": int(globals().get("N_CAT", 12)),
+        "S": int(S),
+        "sampler": (f"student:{len(_model_ref._sampler_t_idx)}" if getattr(_model_ref, "_sampler_t_idx", None) is not None
+                    else f"{SAMPLER_KIND}:{SAMPLER_STEPS or globals().get('DIFF_STEPS_SAMPLE', 20)}"),
+        "cpu_workers": int(CPU_SAMPLER_WORKERS) if not torch.cuda.is_available() else 0,
+        "cpu_threads": int(CPU_SAMPLER_THREADS) if not torch.cuda.is_available() else 0,
+        "probe_s": min(int(S), int(SAMPLER_AUTOTUNE_PROBE_S)),
+        "probe": 3,   # bump when the probe changes (3: reduced-S probes, small CPU grid, plateau stop)
+    }
+
+
+def _probe_ctx(ctx, n: int):
+    """First n rows of ctx, cycling rows when the chunk is smaller than n."""
+    return _subset_ctx(ctx, np.arange(int(n)) % len(ctx["acct"]))
+
+
+def _subset_ctx(ctx, idx):
+    """Rows idx of every per-parcel field of ctx; other entries are shared."""
+    N = len(ctx["acct"])
+    out = {}
+    for k, v in ctx.items():
+        if isinstance(v, np.ndarray) and v.shape[:1] == (N,):
+            out[k] = v[idx]
+        elif isinstance(v, (list, tuple)) and len(v) == N:
+            out[k] = [v[i] for i in idx]
+        else:
+            out[k] = v
+    return out
+
+
+def _autotune_sampler(ctx, H: int, S: int, origin: int) -> dict:
+    """
+    Probe parcel-scenarios/s (and CUDA peak memory) at a reduced S for one prop batch
+    per grid point (prop_batch_size x S_BLOCK on CUDA; the CPU batch grid x torch threads
+    on serial CPU sampling; one batch per forked worker with CPU_SAMPLER_WORKERS > 1,
+    through _sample_fan_cpu_multiproc) and return the fastest setting within the memory
+    headroom. Larger batches are skipped once throughput plateaus, and probing stops at
+    SAMPLER_AUTOTUNE_BUDGET_S. Cached in SAMPLER_AUTOTUNE_CACHE under
+    _sampler_autotune_key(S); a cache hit skips probing entirely.
+    Returns {"prop_batch_size", "s_block", "threads"} (threads None = leave as is).
+    """
+    import torch
+
+    cache_path = SAMPLER_AUTOTUNE_CACHE or os.path.join(os.path.dirname(OUT_ROOT), "sampler_autotune.json")
+    key = _sampler_autotune_key(S)
+    key_s = json.dumps(key, sort_keys=True)
+    cache = {}
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path) as f:
+                cache = json.load(f)
+        except Exception as e:
+            print(f"[{_ts()}] ⚠️ sampler autotune cache unreadable ({e}); re-probing")
+    if key_s in cache:
+        best = cache[key_s]["best"]
+        print(f"[{_ts()}] Sampler autotune (cached): prop_batch_size={best['prop_batch_size']} "
+              f"S_BLOCK={best['s_block']} threads={best['threads']} "
+              f"({best['parcel_scen_per_s']:,.0f} parcel-scenarios/s)")
+        return best
+
+    cuda = torch.cuda.is_available()
+    mem_cap = (torch.cuda.get_device_properties(0).total_memory * float(SAMPLER_AUTOTUNE_MEM_FRAC)) if cuda else None
+    s_block_prev = globals().get("S_BLOCK")
+    probe_s = min(int(S), int(SAMPLER_AUTOTUNE_PROBE_S))
+    if cuda:
+        s_blocks = sorted({min(int(b), int(S)) for b in SAMPLER_AUTOTUNE_S_BLOCKS})
+        batches = sorted({int(b) for b in SAMPLER_AUTOTUNE_BATCHES if int(b) >= int(PROP_BATCH_SIZE_MIN)})
+    else:
+        s_blocks = [s_block_prev]   # S_BLOCK only trades device memory for speed
+        batches = sorted({int(b) for b in SAMPLER_AUTOTUNE_CPU_BATCHES if int(b) >= int(PROP_BATCH_SIZE_MIN)})
+    # forked CPU workers: one prop batch per worker so the multi-process path runs,
+    # capped at 2x the largest batch
+    n_probe_batches = int(CPU_SAMPLER_WORKERS) if (not cuda and STREAM_FAN_REDUCER and CPU_SAMPLER_WORKERS > 1) else 1
+    if cuda or CPU_SAMPLER_WORKERS > 1:
+        thread_grid = [None]   # GPU: host threads don't matter; CPU workers: CPU_SAMPLER_THREADS rule
+    else:
+        _cores = os.cpu_count() or 1
+        thread_grid = sorted({_cores, max(1, _cores // 2)}, reverse=True)
+    threads_prev = torch.get_num_threads()
+    print(f"[{_ts()}] Sampler autotune: probing up to {len(batches)}x{len(s_blocks)}x{len(thread_grid)} "
+          f"settings (S={S}, probe S={probe_s}, budget {SAMPLER_AUTOTUNE_BUDGET_S:.0f}s, device={key['device']})")
+
+    probes = []
+    t_start = time.perf_counter()
+    over_budget = False
+    try:
+        for threads in thread_grid:
+            if threads is not None:
+                torch.set_num_threads(int(threads))
+            for sb in s_blocks:
+                if sb is not None:
+                    globals()["S_BLOCK"] = int(sb)
+                # CUDA: run at least one full S_BLOCK so peak memory matches the real chunk
+                s_run = min(int(S), max(probe_s, int(sb))) if cuda else probe_s
+                rate_prev = None
+                for bs in batches:
+                    if probes and time.perf_counter() - t_start > float(SAMPLER_AUTOTUNE_BUDGET_S):
+                        over_budget = True
+                        break
+                    n_probe = min(bs * n_probe_batches, 2 * batches[-1])
+                    pctx = _probe_ctx(ctx, n_probe)
+                    try:
+                        # untimed warm-up (allocator / compiled-graph shapes), then one timed batch
+                        _sample_scenarios_for_inference_context(pctx, int(H), s_run, int(origin), prop_batch_size=bs)
+                        if cuda:
+                            torch.cuda.synchronize()
+                            torch.cuda.reset_peak_memory_stats()
+                        t0 = time.perf_counter()
+                        _sample_scenarios_for_inference_context(pctx, int(H), s_run, int(origin), prop_batch_size=bs)
+                        if cuda:
+                            torch.cuda.synchronize()
+                        dt = time.perf_counter() - t0
+                    except RuntimeError as e:
+                        if not _is_oom_error(e):
+                            raise
+                        if cuda:
+                            torch.cuda.empty_cache()
+                        probes.append({"prop_batch_size": bs, "s_block": sb, "threads": threads, "oom": True})
+                        break   # larger batches at this S_BLOCK will not fit either
+                    # peak device memory per probe on CUDA; on CPU there is no per-probe
+                    # figure (ru_maxrss is the process lifetime high-water mark, and forked
+                    # workers are other processes), so none is recorded
+                    peak_mb = round(torch.cuda.max_memory_allocated() / 2**20, 1) if cuda else None
+                    rate = round(n_probe * s_run / max(dt, 1e-9), 1)
+                    probes.append({"prop_batch_size": bs, "s_block": sb, "threads": threads, "oom": False,
+                                   "S": s_run, "seconds": round(dt, 4), "peak_mb": peak_mb,
+                                   "parcel_scen_per_s": rate})
+                    print(f"[{_ts()}]   bs={bs:<5} S_BLOCK={sb!s:<5} threads={threads} "
+                          f"{rate:>12,.0f} parcel-scen/s"
+                          + (f"  peak={peak_mb:,.0f} MB" if peak_mb is not None else ""))
+                    if rate_prev is not None and rate < rate_prev * (1.0 + float(SAMPLER_AUTOTUNE_PLATEAU)):
+                        break   # throughput plateaued: larger batches only cost memory
+                    rate_prev = rate
+                if over_budget:
+                    break
+            if over_budget:
+                print(f"[{_ts()}] ⚠️ sampler autotune: {SAMPLER_AUTOTUNE_BUDGET_S:.0f}s budget spent "
+                      f"after {len(probes)} probes; picking from those")
+                break
+    finally:
+        globals()["S_BLOCK"] = s_block_prev
+        torch.set_num_threads(threads_prev)
+
+    ok = [p for p in probes if not p["oom"] and (mem_cap is None or p["peak_mb"] * 2**20 <= mem_cap)]
+    if not ok:
+        print(f"[{_ts()}] ⚠️ sampler autotune: no setting fit the memory headroom; keeping defaults")
+        return {"prop_batch_size": int(PROP_BATCH_SIZE_SAMPLER), "s_block": s_block_prev,
+                "threads": None, "parcel_scen_per_s": 0.0}
+    top = max(ok, key=lambda p: p["parcel_scen_per_s"])
+    best = {"prop_batch_size": top["prop_batch_size"], "s_block": top["s_block"],
+            "threads": top["threads"], "parcel_scen_per_s": top["parcel_scen_per_s"], "peak_mb": top["peak_mb"]}
+    cache[key_s] = {"key": key, "best": best, "probes": probes, "tuned_at_utc": datetime.utcnow().isoformat()}
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        tmp = f"{cache_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp, cache_path)
+    except Exception as e:
+        print(f"[{_ts()}] ⚠️ sampler autotune cache not written ({e})")
+    print(f"[{_ts()}] Sampler autotune: prop_batch_size={best['prop_batch_size']} S_BLOCK={best['s_block']} "
+          f"threads={best['threads']} ({best['parcel_scen_per_s']:,.0f} parcel-scenarios/s) → {cache_path}")
+    return best
+
+
+def _sampler_tuned_batch_size(ctx, H: int, S: int, origin: int) -> int:
+    """
+    Starting prop_batch_size for this chunk. With SAMPLER_AUTOTUNE, the first call
+    per live model runs (or loads) the autotune and applies its S_BLOCK / threads.
     """
-    Try large prop_batch_size first; back off on CUDA OOM.
+    if not SAMPLER_AUTOTUNE:
+        return int(PROP_BATCH_SIZE_SAMPLER)
+    _model_ref = globals().get("model")
+    tuned = globals().get("_SAMPLER_TUNED")
+    if tuned is None or tuned["src"] is not _model_ref or tuned["S"] != int(S):
+        best = _autotune_sampler(ctx, H, S, origin)
+        tuned = {"src": _model_ref, "S": int(S), "best": best}
+        globals()["_SAMPLER_TUNED"] = tuned
+        if best.get("s_block") is not None:
+            globals()["S_BLOCK"] = int(best["s_block"])
+        if best.get("threads") is not None:
+            import torch
+            torch.set_num_threads(int(best["threads"]))
+    return int(tuned["best"]["prop_batch_size"])
+
+
+def _sample_scenarios_with_backoff(ctx, H, S, origin, geo_agg=None, geo_codes=None):
+    """
+    Start from the autotuned prop_batch_size (PROP_BATCH_SIZE_SAMPLER when
+    SAMPLER_AUTOTUNE is off); back off on CUDA OOM.
     Returns (inf_out, used_batch_size).
+    With geo_agg, the chunk's scenario sums are merged only after a successful
+    attempt, so partial sums from an OOM'd attempt are discarded.
     """
-    bs = int(PROP_BATCH_SIZE_SAMPLER)
+    bs = _sampler_tuned_batch_size(ctx, H, S, origin)
 
     while True:
         try:
+            geo_part = geo_agg.partial() if geo_agg is not None else None
             inf_out = _sample_scenarios_for_inference_context(
                 ctx=ctx,
                 H=int(H),
                 S=int(S),
                 origin=int(origin),
                 prop_batch_size=int(bs),
+                geo_codes=geo_codes,
+                geo_part=geo_part,
             )
+            if geo_part is not None:
+                geo_agg.merge(geo_part)
             return inf_out, int(bs)
 
         except RuntimeError as e:
-            msg = str(e).lower()
-            oom = ("out of memory" in msg) or ("cuda" in msg and "memory" in msg)
-            if (not oom) or (bs <= int(PROP_BATCH_SIZE_MIN)):
+            if (not _is_oom_error(e)) or (bs <= int(PROP_BATCH_SIZE_MIN)):
                 raise
 
             bs = max(int(PROP_BATCH_SIZE_MIN), bs // 2)
@@ -1436,6 +2791,328 @@ def _sample_scenarios_with_backoff(ctx, H, S, origin):
             print(f"[{_ts()}] OOM during sampling. Retrying with prop_batch_size={bs}")
 
 
+class _StageMeter:
+    """
+    Thread-safe per-stage counters for the staged chunk executor: busy seconds,
+    items, and named wait times (e.g. sampler starved of ctx / blocked on writers).
+    Utilisation = busy seconds / (wall seconds x stage workers).
+    """
+
+    def __init__(self, workers: dict):
+        self.workers = {k: max(1, int(v)) for k, v in workers.items()}
+        self.busy = {k: 0.0 for k in workers}
+        self.items = {k: 0 for k in workers}
+        self.waits = {}
+        self.t0 = time.time()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.time()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.busy[name] += time.time() - t0
+                self.items[name] += 1
+
+    def wait(self, name: str, seconds: float):
+        with self._lock:
+            self.waits[name] = self.waits.get(name, 0.0) + float(seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            wall = max(time.time() - self.t0, 1e-9)
+            out = {k: {"workers": self.workers[k], "items": self.items[k], "busy_sec": round(self.busy[k], 2),
+                       "util": round(self.busy[k] / (wall * self.workers[k]), 3)} for k in self.busy}
+            out["wait_sec"] = {k: round(v, 2) for k, v in self.waits.items()}
+            out["wall_sec"] = round(wall, 2)
+        return out
+
+    def line(self) -> str:
+        snap = self.snapshot()
+        parts = [f"{k} util={v['util']:.0%} ({v['items']} chunks)" for k, v in snap.items() if isinstance(v, dict) and "util" in v]
+        waits = " ".join(f"{k}={v:.1f}s" for k, v in snap["wait_sec"].items())
+        return " | ".join(parts) + (f" | waits {waits}" if waits else "")
+
+
+# -----------------------------------------------------------------------------
+# PER-PARCEL RESULT CACHE
+# -----------------------------------------------------------------------------
+_FILE_SHA256 = {}   # (path, size, mtime_ns) -> hex digest
+
+
+def _file_sha256(path: str) -> str:
+    """Content hash of a checkpoint file (memoized per size / mtime)."""
+    st = os.stat(path)
+    memo = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if memo not in _FILE_SHA256:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(8 << 20), b""):
+                h.update(block)
+        _FILE_SHA256[memo] = h.hexdigest()
+    return _FILE_SHA256[memo]
+
+
+def _result_cache_fingerprint(ckpt_path: str, origin: int, S: int, H: int) -> bytes:
+    """
+    Everything besides the parcel's own context row that its fan depends on:
+    checkpoint (and distilled student) contents, origin (token paths + noise
+    seed), S, H, sampler, run seed, fan outputs, device kind and precision.
+    """
+    import torch
+
+    _model_ref = globals().get("model")
+    _student = getattr(_model_ref, "_sampler_t_idx", None) is not None
+    _steps = int(globals().get("SAMPLER_STEPS") or globals().get("DIFF_STEPS_SAMPLE", 20))
+    parts = {
+        "format": RESULT_CACHE_FORMAT,
+        "ckpt": _file_sha256(ckpt_path),
+        "student": _file_sha256(student_ckpt_path(ckpt_path, _steps)) if _student else None,
+        "origin": int(origin), "S": int(S), "H": int(H),
+        "sampler": (f"student:{len(_model_ref._sampler_t_idx)}" if _student
+                    else f"{SAMPLER_KIND}:{SAMPLER_STEPS or globals().get('DIFF_STEPS_SAMPLE', 20)}"),
+        "diff_steps": int(globals().get("DIFF_STEPS_SAMPLE", 20)),
+        "k_tokens": int(globals().get("K_TOKENS", 8)),
+        "run_seed": int(SAMPLER_RUN_SEED),
+        "fan": [list(FAN_QUANTILES), bool(FAN_WITH_MOMENTS), list(FAN_EXCEED_GROWTH or ())],
+        "device": "cuda" if torch.cuda.is_available() else "cpu",
+        "autocast": not bool(globals().get("SAMPLER_DISABLE_AUTOCAST", False)),
+        "clips": [float(globals().get(k, 0.0)) for k in
+                  ("SAMPLER_Z_CLIP", "SAMPLER_NOISE_CLIP", "SAMPLER_X0_CLIP", "SAMPLER_X_CLIP")],
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).digest()
+
+
+class ParcelResultCache:
+    """
+    Content-addressed on-disk cache of per-parcel quantile fans (<dir>/fans.sqlite).
+
+    key   = blake2b(parcel row, key=fingerprint): the row is the parcel's hist_y,
+            cur_num, cur_cat, region_id, y_anchor and acct noise key bytes; the
+            fingerprint is _result_cache_fingerprint (checkpoint hash, origin, S, ...).
+    value = the parcel's slices of the fan arrays (quantiles [+ mean/std/exceed]),
+            raw bytes back to back; the field layout is stored once per fingerprint.
+
+    Every hit or insert stamps the entry's last-used time; once the payload
+    passes max_bytes the least recently used entries are evicted down to 90%.
+    """
+    FIELDS = ("quantiles", "mean", "std", "exceed")
+    ROW_FIELDS = ("hist_y", "cur_num", "cur_cat", "region_id", "y_anchor")
+    _SQL_BATCH = 500   # keys per IN (...) query
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "fans.sqlite")
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS fans (key BLOB PRIMARY KEY, val BLOB NOT NULL, "
+                         "used INTEGER NOT NULL) WITHOUT ROWID")
+        self._db.execute("CREATE INDEX IF NOT EXISTS fans_used ON fans (used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS layouts (fp BLOB PRIMARY KEY, layout TEXT NOT NULL)")
+        self._db.commit()
+        self.n_bytes = int(self._db.execute("SELECT COALESCE(SUM(LENGTH(val)), 0) FROM fans").fetchone()[0])
+        self._layouts = {}
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def keys_for(self, ctx, fp: bytes):
+        """One 16-byte key per parcel of ctx."""
+        N = len(ctx["acct"])
+        cols = [np.ascontiguousarray(np.asarray(ctx[k])).reshape(N, -1) for k in self.ROW_FIELDS]
+        cols.append(acct_noise_keys(ctx["acct"]).reshape(N, -1))
+        raw = np.concatenate([c.view(np.uint8).reshape(N, -1) for c in cols], axis=1)
+        return [hashlib.blake2b(raw[i].tobytes(), digest_size=16, key=fp).digest() for i in range(N)]
+
+    def _layout(self, fp: bytes):
+        if fp not in self._layouts:
+            row = self._db.execute("SELECT layout FROM layouts WHERE fp = ?", (fp,)).fetchone()
+            self._layouts[fp] = json.loads(row[0]) if row else None
+        return self._layouts[fp]
+
+    def get_many(self, fp: bytes, keys):
+        """{key: value bytes} for the cached keys (their last-used stamp is refreshed)."""
+        if not keys or self._layout(fp) is None:
+            self.misses += len(keys)
+            return {}
+        found = {}
+        now = time.time_ns()
+        with self._lock, self._db:
+            for i in range(0, len(keys), self._SQL_BATCH):
+                part = keys[i:i + self._SQL_BATCH]
+                qs = ",".join("?" * len(part))
+                found.update(self._db.execute(f"SELECT key, val FROM fans WHERE key IN ({qs})", part).fetchall())
+                self._db.execute(f"UPDATE fans SET used = ? WHERE key IN ({qs})", [now, *part])
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, fp: bytes, keys, inf_out: dict):
+        """Store rows of a sampled fan dict under keys (same order), then evict LRU past max_bytes."""
+        fields = [f for f in self.FIELDS if f in inf_out]
+        N = len(keys)
+        arrs = [np.ascontiguousarray(inf_out[f]).reshape(N, -1) for f in fields]
+        layout = {
+            "fields": [[f, list(np.asarray(inf_out[f]).shape[1:]), str(a.dtype)] for f, a in zip(fields, arrs)],
+            "q_levels": [float(q) for q in inf_out["q_levels"]],
+            "n_scenarios": int(inf_out["n_scenarios"]),
+            "exceed_growth": [float(g) for g in inf_out.get("exceed_growth", ())],
+        }
+        raw = np.concatenate([a.view(np.uint8).reshape(N, -1) for a in arrs], axis=1)
+        now = time.time_ns()
+        with self._lock, self._db:
+            if self._layout(fp) != layout:
+                self._db.execute("INSERT OR REPLACE INTO layouts (fp, layout) VALUES (?, ?)", (fp, json.dumps(layout)))
+                self._layouts[fp] = layout
+            existing = set()
+            for i in range(0, N, self._SQL_BATCH):
+                part = keys[i:i + self._SQL_BATCH]
+                qs = ",".join("?" * len(part))
+                existing.update(r[0] for r in self._db.execute(f"SELECT key FROM fans WHERE key IN ({qs})", part))
+                self._db.execute(f"UPDATE fans SET used = ? WHERE key IN ({qs})", [now, *part])
+            new = [(k, raw[i].tobytes(), now) for i, k in enumerate(keys) if k not in existing]
+            self._db.executemany("INSERT OR IGNORE INTO fans (key, val, used) VALUES (?, ?, ?)", new)
+            self.n_bytes += int(raw.shape[1]) * len(new)
+            if self.n_bytes > self.max_bytes:
+                self._evict(int(self.n_bytes - 0.9 * self.max_bytes))
+
+    def _evict(self, need: int):
+        freed, victims = 0, []
+        cur = self._db.execute("SELECT key, LENGTH(val) FROM fans ORDER BY used")
+        for key, n in cur:
+            victims.append((key,))
+            freed += int(n)
+            if freed >= need:
+                break
+        cur.close()
+        self._db.executemany("DELETE FROM fans WHERE key = ?", victims)
+        self.n_bytes -= freed
+        self.evicted += len(victims)
+
+    def decode(self, fp: bytes, vals):
+        """Fan dict (as _sample_scenarios_for_inference_context returns, without acct) for values vals."""
+        layout = self._layout(fp)
+        buf = np.frombuffer(b"".join(vals), dtype=np.uint8).reshape(len(vals), -1)
+        out, off = {}, 0
+        for name, shape, dtype in layout["fields"]:
+            width = int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+            out[name] = buf[:, off:off + width].copy().view(dtype).reshape(len(vals), *shape)
+            off += width
+        out["q_levels"] = tuple(layout["q_levels"])
+        out["n_scenarios"] = layout["n_scenarios"]
+        if layout["exceed_growth"]:
+            out["exceed_growth"] = tuple(layout["exceed_growth"])
+        return out
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def stats(self) -> dict:
+        return {"path": self.path, "hits": self.hits, "misses": self.misses, "evicted": self.evicted,
+                "bytes": self.n_bytes, "max_bytes": self.max_bytes}
+
+
+def _open_result_cache(agg_forecast_mode: str):
+    """
+    The run's ParcelResultCache, or None when RESULT_CACHE is off, hits could not be
+    used (scenario forecast aggregates need every parcel's paths) or fans are not
+    per-parcel deterministic.
+    """
+    if not RESULT_CACHE:
+        return None
+    if agg_forecast_mode != "sql":
+        print(f"[{_ts()}] Result cache: off for AGG_FORECAST_MODE={agg_forecast_mode!r} "
+              f"(cached fans carry no scenario paths; use 'sql' to serve parcels from cache)")
+        return None
+    if not (SAMPLER_PARCEL_RNG and STREAM_FAN_REDUCER and SAMPLER_TOKEN_PATHS == "origin"):
+        print(f"[{_ts()}] ⚠️  RESULT_CACHE needs SAMPLER_PARCEL_RNG, STREAM_FAN_REDUCER and "
+              f"SAMPLER_TOKEN_PATHS='origin' — cache off")
+        return None
+    if str(SAMPLER_CPU_PROFILE or "fp32").lower() != "fp32":
+        print(f"[{_ts()}] ⚠️  RESULT_CACHE is off under SAMPLER_CPU_PROFILE={SAMPLER_CPU_PROFILE!r} "
+              f"(quantized fans depend on the batch)")
+        return None
+    cache_dir = RESULT_CACHE_DIR or os.path.join(os.path.dirname(OUT_ROOT.rstrip("/")), "_result_cache")
+    try:
+        cache = ParcelResultCache(cache_dir, int(RESULT_CACHE_MAX_GB * (1 << 30)))
+    except (OSError, sqlite3.Error) as exc:
+        print(f"[{_ts()}] ⚠️  Result cache unavailable at {cache_dir} ({exc}) — sampling everything")
+        return None
+    print(f"[{_ts()}] Result cache: {cache.path} ({cache.n_bytes / (1 << 30):.2f} / {RESULT_CACHE_MAX_GB:g} GB)")
+    return cache
+
+
+def _sample_scenarios_cached(ctx, H, S, origin, result_cache, cache_fp, use_hits: bool,
+                             geo_agg=None, geo_codes=None):
+    """
+    _sample_scenarios_with_backoff behind the per-parcel result cache: cached
+    parcels are decoded, only the misses are sampled (and stored).
+    use_hits=False (scenario aggregates need every parcel's paths) samples the
+    whole chunk and only fills the cache. If sampling raises, the error is logged
+    and inf_out holds just the cached parcels (None when there are none), with
+    n_failed counting the parcels that were not sampled.
+    Returns (inf_out, used_batch_size or None if nothing was sampled, n_hits, n_failed).
+    """
+    def _sample(sub):
+        # a sampler failure (backoff exhausted, bad chunk) fails these parcels, not the origin
+        try:
+            return _sample_scenarios_with_backoff(sub, H, S, origin, geo_agg=geo_agg, geo_codes=geo_codes)
+        except Exception as e:
+            print(f"[{_ts()}] ⚠️  sampler failed for {len(sub['acct']):,} parcels: {type(e).__name__}: {e}")
+            return None, None
+
+    if result_cache is None:
+        inf_out, bs = _sample(ctx)
+        return inf_out, bs, 0, (len(ctx["acct"]) if inf_out is None else 0)
+
+    keys = result_cache.keys_for(ctx, cache_fp)
+    N = len(keys)
+    if use_hits:
+        cached = result_cache.get_many(cache_fp, keys)
+    else:
+        cached = {}
+        result_cache.misses += N
+    miss = np.array([i for i, k in enumerate(keys) if k not in cached], dtype=np.int64)
+
+    sampled, bs = None, None
+    if miss.size:
+        sub = ctx if miss.size == N else _subset_ctx(ctx, miss)
+        sampled, bs = _sample(sub)
+        if sampled is not None:
+            result_cache.put_many(cache_fp, [keys[i] for i in miss], sampled)
+        if miss.size == N:
+            return sampled, bs, 0, (N if sampled is None else 0)
+    n_failed = int(miss.size) if sampled is None else 0
+
+    hit = np.array([i for i, k in enumerate(keys) if k in cached], dtype=np.int64)
+    dec = result_cache.decode(cache_fp, [cached[keys[i]] for i in hit])
+    if n_failed:
+        # keep the cached parcels; the caller still logs the chunk as sample_failed
+        acct = ctx["acct"]
+        out = {"acct": acct[hit] if isinstance(acct, np.ndarray) else [acct[i] for i in hit]}
+    else:
+        out = {"acct": ctx["acct"]}
+    out.update({"q_levels": dec["q_levels"], "n_scenarios": dec["n_scenarios"]})
+    if "exceed_growth" in dec:
+        out["exceed_growth"] = dec["exceed_growth"]
+    for f in ParcelResultCache.FIELDS:
+        if f in dec:
+            if n_failed:
+                out[f] = dec[f]
+                continue
+            full = np.empty((N,) + dec[f].shape[1:], dtype=dec[f].dtype)
+            full[hit] = dec[f]
+            if sampled is not None:
+                full[miss] = sampled[f]
+            out[f] = full
+    return out, bs, int(hit.size), n_failed
+
+
 # -----------------------------------------------------------------------------
 # CORE RUNNER (ONE ORIGIN, ONE MODE)
 # -----------------------------------------------------------------------------
@@ -1453,15 +3130,33 @@ def _run_one_origin(
     resume_run_id: str = None,
 ):
     assert mode in ("forecast", "backtest")
+    assert SINK_MODE in ("db", "local"), f"SINK_MODE must be 'db' or 'local', got {SINK_MODE!r}"
     _assert_ident(schema, "schema")
+    local_sink = SINK_MODE == "local"
 
     # ---- RESUME: reuse previous run_id and skip already-done accounts ----
+    resume_state = None       # RunResumeManifest of this run
+    resumed_from_manifest = False
+    done_accts = None
     if resume_run_id:
         run_id = resume_run_id
         print(f"[{_ts()}] RESUME MODE: reusing run_id={run_id}")
-        done_accts = _get_completed_accts_from_db(schema, run_id, "metrics_parcel_forecast")
-        n_already = len(done_accts)
-        all_accts_prod = [a for a in all_accts_prod if a not in done_accts]
+        t_res = time.time()
+        if RESUME_MANIFEST:
+            resume_state = RunResumeManifest.load(os.path.join(out_dir, f"{mode}_origin_{origin_year}_{run_id}"))
+        if resume_state is not None:
+            resumed_from_manifest = True
+            n_already = resume_state.n_done
+            all_accts_prod = resume_state.remaining(all_accts_prod)
+            print(f"[{_ts()}] RESUME: local manifest, {len(resume_state.chunks)} chunks logged "
+                  f"(read in {time.time() - t_res:.2f}s, no DB query)")
+        else:
+            if local_sink:
+                done_accts = _get_completed_accts_from_chunks(os.path.join(out_dir, f"{mode}_origin_{origin_year}_{run_id}"))
+            else:
+                done_accts = _get_completed_accts_from_db(schema, run_id, "metrics_parcel_forecast")
+            n_already = len(done_accts)
+            all_accts_prod = [a for a in all_accts_prod if a not in done_accts]
         # Shuffle remaining accounts so chunks get a random mix of forecastable/non-forecastable
         # (avoids runs of empty chunks when accounts are sorted by type)
         import random as _rng
@@ -1481,6 +3176,12 @@ def _run_one_origin(
     else:
         run_id = _make_run_id(mode, int(origin_year))
 
+    # With the sorted panel index, acct-ordered chunks map to contiguous row groups
+    # (a shuffled chunk would touch nearly every row group of the panel).
+    if globals().get("get_panel_index") is not None and get_panel_index() is not None:
+        all_accts_prod = sorted(all_accts_prod)
+        print(f"[{_ts()}] Panel index active: processing {len(all_accts_prod):,} accounts in acct order")
+
     as_of_date = datetime.utcnow().date()
 
     series_kind_forecast = "forecast" if mode == "forecast" else "backtest"
@@ -1495,11 +3196,25 @@ def _run_one_origin(
         hist_variant_id = variant_id if WRITE_BACKTEST_HISTORY_VARIANTS else None
         hist_backtest_id = backtest_id if WRITE_BACKTEST_HISTORY_VARIANTS else None
 
+    # Scenario-level geo sums live only in this process, so a resumed run (which
+    # skips parcels sampled before the restart) uses the SQL aggregation path.
+    agg_forecast_mode = AGG_FORECAST_MODE
+    if agg_forecast_mode == "scenario" and resume_run_id:
+        print(f"[{_ts()}] ⚠️  RESUME: scenario aggregates need every parcel of the run in-process; "
+              f"using AGG_FORECAST_MODE='sql' for this run")
+        agg_forecast_mode = "sql"
+    if agg_forecast_mode == "scenario" and SAMPLER_TOKEN_PATHS != "origin":
+        print(f"[{_ts()}] ⚠️  SAMPLER_TOKEN_PATHS={SAMPLER_TOKEN_PATHS!r} redraws scenarios per chunk, so "
+              f"scenario s differs across chunks; using AGG_FORECAST_MODE='sql' for this run")
+        agg_forecast_mode = "sql"
+
     run_root = os.path.join(out_dir, f"{mode}_origin_{origin_year}_{run_id}")
     os.makedirs(run_root, exist_ok=True)
     os.makedirs(os.path.join(run_root, "forecast_chunks"), exist_ok=True)
     os.makedirs(os.path.join(run_root, "history_chunks"), exist_ok=True)
     os.makedirs(os.path.join(run_root, "eval_chunks"), exist_ok=True)
+    if RESUME_MANIFEST and resume_state is None:
+        resume_state = RunResumeManifest.create(run_root, all_accts_prod, done_accts)
 
     manifest = {
         "run_id": run_id,
@@ -1521,8 +3236,22 @@ def _run_one_origin(
         "acct_batch_size_outer": int(ACCT_BATCH_SIZE_OUTER),
         "parcel_forecast_has_n_col": bool(PARCEL_FORECAST_HAS_N_COL),
         "final_exact_agg_refresh": bool(RUN_FINAL_EXACT_AGG_REFRESH),
+        "agg_forecast_mode": agg_forecast_mode,
+        "sampler_parcel_rng": bool(SAMPLER_PARCEL_RNG),
+        "sampler_token_paths": SAMPLER_TOKEN_PATHS,
+        "sampler_run_seed": int(SAMPLER_RUN_SEED),
+        "sink_mode": SINK_MODE,
+        "resume_manifest": bool(RESUME_MANIFEST),
+        "as_of_date": as_of_date.isoformat(),
+        "series_kind_history": series_kind_history,
+        "hist_variant_id": hist_variant_id if hist_variant_id is not None else "__history__",
+        "hist_backtest_id": hist_backtest_id,
+        "jurisdiction": JURISDICTION,
+        "run_notes": f"H={H}, S={S}, ckpt_origin={ckpt_origin}, variant_id={variant_id}",
         "started_at_utc": datetime.utcnow().isoformat(),
     }
+    if local_sink:
+        manifest["publish"] = {"status": "pending"}
     with open(os.path.join(run_root, "run_manifest.json"), "w") as f:
         json.dump(manifest, f, indent=2)
 
@@ -1538,31 +3267,34 @@ def _run_one_origin(
         import torch as _torch
         if hasattr(_torch, 'compile') and _torch.cuda.is_available():
             _compile_mode = globals().get("COMPILE_MODE", "reduce-overhead")
-            # The compiled model replaces the sampler's forward pass in-place
+            # The sampler calls model.forward_step per DDIM step (parcel context is
+            # encoded once per batch), so compile that method in-place on the module
             _model_ref = globals().get("model") or globals().get("_model")
             if _model_ref is not None and not getattr(_model_ref, '_compiled', False):
-                print(f"[{_ts()}] torch.compile(model, mode='{_compile_mode}') — first batch will be slow (warmup)")
-                _compiled = _torch.compile(_model_ref, mode=_compile_mode)
-                # Patch the compiled model back into the global so the sampler uses it
-                if 'model' in globals():
-                    globals()['model'] = _compiled
-                elif '_model' in globals():
-                    globals()['_model'] = _compiled
-                _compiled._compiled = True  # mark to avoid re-compiling on resume
+                print(f"[{_ts()}] torch.compile(model.forward_step, mode='{_compile_mode}') — first batch will be slow (warmup)")
+                _model_ref.forward_step = _torch.compile(_model_ref.forward_step, mode=_compile_mode)
+                _model_ref._compiled = True  # mark to avoid re-compiling on resume
     except Exception as _e:
         print(f"[{_ts()}] torch.compile skipped: {_e}")
 
-    with _pg_tx() as conn:
-        _run_insert_start(
-            conn=conn,
-            schema=schema,
-            run_id=run_id,
-            level_name="parcel",
-            mode=mode,
-            origin_year=int(origin_year),
-            as_of_date=as_of_date,
-            notes=f"H={H}, S={S}, ckpt_origin={ckpt_origin}, variant_id={variant_id}",
-        )
+    result_cache = _open_result_cache(agg_forecast_mode)
+    cache_fp = _result_cache_fingerprint(ckpt_path, int(origin_year), int(S), int(H)) if result_cache is not None else None
+    cache_hits_total = 0
+
+    if local_sink:
+        print(f"[{_ts()}] SINK_MODE='local': chunk files only, load with publish_run.py {run_root}")
+    else:
+        with _pg_tx() as conn:
+            _run_insert_start(
+                conn=conn,
+                schema=schema,
+                run_id=run_id,
+                level_name="parcel",
+                mode=mode,
+                origin_year=int(origin_year),
+                as_of_date=as_of_date,
+                notes=manifest["run_notes"],
+            )
 
     n_total = len(all_accts_prod)
     n_done = 0
@@ -1575,16 +3307,34 @@ def _run_one_origin(
     progress_csv = os.path.join(run_root, "progress_log.csv")
     eval_csv = os.path.join(run_root, "backtest_eval_summary.csv")
 
+    ladder_idx = None
+    if USE_LADDER_INDEX:
+        try:
+            ladder_idx = _load_parcel_ladder_index()
+        except Exception as exc:
+            print(f"[{_ts()}] ⚠️  Ladder index unavailable ({exc}); using per-chunk ladder JOINs")
+
+    geo_agg = (GeoScenarioAggregator(S=int(S), H=int(H), ladder_idx=ladder_idx)
+               if agg_forecast_mode == "scenario" else None)
+    geo_agg_complete = True
+
     # Resume-safe chunk numbering: continue from where previous run left off
     chunk_start = 1
     if resume_run_id:
         fc_dir = os.path.join(run_root, "forecast_chunks")
         hist_dir = os.path.join(run_root, "history_chunks")
-        existing_fc = len([f for f in os.listdir(fc_dir) if f.endswith(('.parquet', '.csv.gz'))]) if os.path.isdir(fc_dir) else 0
-        existing_hist = len([f for f in os.listdir(hist_dir) if f.endswith(('.parquet', '.csv.gz'))]) if os.path.isdir(hist_dir) else 0
-        chunk_start = max(existing_fc, existing_hist) + 1
-        print(f"[{_ts()}] RESUME: continuing chunk numbering from {chunk_start} (found {existing_fc} fc, {existing_hist} hist chunks)")
-
+        # Highest chunk index, not file count: parallel DB writers can leave gaps on a crash
+        def _max_chunk_idx(d):
+            return max((int(m.group(1)) for f in _chunk_files(d)
+                        for m in [re.search(r"_chunk_(\d+)", os.path.basename(f))] if m), default=0)
+        existing_fc = _max_chunk_idx(fc_dir)
+        existing_hist = _max_chunk_idx(hist_dir)
+        existing_log = resume_state.max_chunk if resumed_from_manifest else 0
+        chunk_start = max(existing_fc, existing_hist, existing_log) + 1
+        print(f"[{_ts()}] RESUME: continuing chunk numbering from {chunk_start} (highest fc chunk {existing_fc}, "
+              f"hist chunk {existing_hist}, logged chunk {existing_log})")
+
+    if resume_run_id and (not resumed_from_manifest or RESUME_SPOT_CHECK):
         # ── SPOT CHECK: test 5 random future chunks before committing ──
         import random as _rng
 
@@ -1670,422 +3420,486 @@ def _run_one_origin(
             print(f"[{_ts()}] ✅ Spot check passed: expect ~{est_new:,} new forecasts")
         # ── end spot check ──
 
-    # ── Thread pool for async DB writes ──
-    _db_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db_write")
-    _pending_db_future: Future = None  # type: ignore
-
-    def _wait_for_pending_db():
-        """Block until prior async DB write completes; propagate exceptions."""
-        nonlocal _pending_db_future
-        if _pending_db_future is not None:
-            try:
-                _pending_db_future.result(timeout=600)  # 10 min max wait
-            except Exception as exc:
-                print(f"[{_ts()}] ⚠️  Async DB write failed: {exc}")
-            _pending_db_future = None
-
-    # ── Thread pool for context prefetch (overlaps CPU ctx build with GPU sampling) ──
-    _ctx_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ctx_prefetch")
+    # ── Staged chunk executor ──
+    # ctx builders (PIPELINE_CTX_WORKERS threads: inference context + history rows)
+    #   → sampler (this thread; GPU/CPU sampling + geo scenario sums only)
+    #   → DB writers (PIPELINE_DB_WRITERS threads: forecast rows, chunk files, DB upserts, progress)
+    # Both hand-offs hold at most PIPELINE_QUEUE_DEPTH chunks; a full queue blocks its producer.
     _all_chunks = list(_chunk_list(all_accts_prod, int(ACCT_BATCH_SIZE_OUTER)))
-    _prefetched_ctx: Future = None  # type: ignore
-
-    def _build_ctx_for_chunk(acct_chunk_raw):
-        """Build inference context — safe to run on a background thread (read-only Polars + local numpy)."""
-        ac = [str(a) for a in acct_chunk_raw]
-        return ac, _build_inference_for_accounts_at_origin(
-            accts_batch=ac,
-            origin=int(origin_year),
-            global_medians=global_medians,
-        )
-
-    for chunk_idx, acct_chunk_raw in enumerate(_all_chunks, start=chunk_start):
-        # Wait for prior chunk's DB write to finish before reusing counters
-        _wait_for_pending_db()
-
-        t0 = time.time()
-        used_prop_batch_size = None
-
-        # ---------------------------------------------------------------------
-        # 1) History (build locally)
-        # ---------------------------------------------------------------------
-        hist_chunk_df = pd.DataFrame()
-        hist_rows_upserted = 0
-        hist_agg_rows_upserted = 0
-        # Need acct_chunk early for history; derive from raw or prefetched
-        _acct_chunk_for_hist = [str(a) for a in acct_chunk_raw]
-
-        do_hist_this_run = (mode == "forecast" and write_history_series) or (mode == "backtest" and WRITE_BACKTEST_HISTORY_VARIANTS)
-
-        if do_hist_this_run:
-            hist_chunk_df = _build_history_rows_for_chunk(
-                acct_chunk=_acct_chunk_for_hist,
-                run_id=run_id,
-                max_year=int(origin_year),
-                series_kind=series_kind_history,
-                variant_id=(hist_variant_id if hist_variant_id is not None else "__history__"),
-                backtest_id=hist_backtest_id,
-                min_year=1900,
-                as_of_date=as_of_date,
-            )
-
-            hist_fp = _write_df_chunk(hist_chunk_df, os.path.join(run_root, "history_chunks"), "metrics_parcel_history", chunk_idx)
-            print(f"[{_ts()}] Chunk {chunk_idx}: wrote history chunk rows={len(hist_chunk_df)} -> {hist_fp}")
-
-            if not hist_chunk_df.empty:
-                hist_chunk_df["jurisdiction"] = JURISDICTION
-                try:
-                    with _pg_tx(label=f"hist_chunk_{chunk_idx}") as conn:
-                        hist_rows_upserted = _upsert_df_pg(
-                            conn=conn,
-                            schema=schema,
-                            table="metrics_parcel_history",
-                            df=hist_chunk_df,
-                            conflict_cols=["acct", "year", "series_kind", "variant_id"],
-                            update_cols=[
-                                "value", "p50", "n",
-                                "run_id", "backtest_id", "model_version", "as_of_date",
-                                "updated_at"
-                            ],
-                        )
-
-                        hist_agg_rows_upserted = _aggregate_history_levels_for_chunk(
-                            conn=conn,
-                            schema=schema,
-                            acct_chunk=_acct_chunk_for_hist,
-                            run_id=run_id,
-                            series_kind=series_kind_history,
-                            variant_id=(hist_variant_id if hist_variant_id is not None else "__history__"),
-                            backtest_id=hist_backtest_id,
-                            as_of_date=as_of_date,
-                        )
-                except Exception as exc:
-                    print(f"[{_ts()}] Chunk {chunk_idx}: ⚠️  HISTORY DB write failed after retries, SKIPPING: {exc}")
-                    hist_rows_upserted = 0
-                    hist_agg_rows_upserted = 0
-
-                history_rows_total += int(hist_rows_upserted)
-                history_agg_rows_total += int(hist_agg_rows_upserted)
-
-        # ---------------------------------------------------------------------
-        # 2) Retrieve prefetched context or build synchronously (first chunk)
-        # ---------------------------------------------------------------------
-        if _prefetched_ctx is not None:
-            try:
-                acct_chunk, ctx = _prefetched_ctx.result(timeout=600)
-            except Exception as _pf_exc:
-                print(f"[{_ts()}] Chunk {chunk_idx}: prefetch failed ({_pf_exc}), building synchronously")
-                acct_chunk = [str(a) for a in acct_chunk_raw]
-                ctx = _build_inference_for_accounts_at_origin(
-                    accts_batch=acct_chunk, origin=int(origin_year), global_medians=global_medians,
-                )
-            _prefetched_ctx = None
-        else:
-            acct_chunk = [str(a) for a in acct_chunk_raw]
-            print(f"[{_ts()}] Chunk {chunk_idx}: building inference context for {len(acct_chunk)} accts "
-                  f"[{acct_chunk[0]}..{acct_chunk[-1]}] origin={origin_year}")
+    do_hist_this_run = (mode == "forecast" and write_history_series) or (mode == "backtest" and WRITE_BACKTEST_HISTORY_VARIANTS)
+    _hist_variant = hist_variant_id if hist_variant_id is not None else "__history__"
+    _n_ctx_workers = max(1, int(PIPELINE_CTX_WORKERS))
+    _n_writers = max(1, int(PIPELINE_DB_WRITERS))
+    _depth = max(1, int(PIPELINE_QUEUE_DEPTH))
+
+    _meter = _StageMeter({"ctx": _n_ctx_workers, "sample": 1, "write": _n_writers})
+    _tot_lock = threading.Lock()     # run totals + progress CSV (updated by writer threads)
+    _agg_lock = threading.Lock()     # weighted aggregate merges touch shared rows: one writer at a time
+    _write_slots = threading.BoundedSemaphore(_depth)
+    _write_futs = []
+
+    _ctx_pool = ThreadPoolExecutor(max_workers=_n_ctx_workers, thread_name_prefix="ctx_build")
+    _db_pool = ThreadPoolExecutor(max_workers=_n_writers, thread_name_prefix="db_write")
+    print(f"[{_ts()}] Pipeline: {len(_all_chunks)} chunks | ctx workers={_n_ctx_workers} "
+          f"sampler=1 db writers={_n_writers} queue depth={_depth}")
+
+    def _build_stage(acct_chunk_raw):
+        """Stage 1 (ctx worker): inference context + local history rows for one chunk."""
+        with _meter.stage("ctx"):
+            ac = [str(a) for a in acct_chunk_raw]
             ctx = _build_inference_for_accounts_at_origin(
-                accts_batch=acct_chunk, origin=int(origin_year), global_medians=global_medians,
+                accts_batch=ac,
+                origin=int(origin_year),
+                global_medians=global_medians,
             )
-
-        # Detailed diagnostic on the return value
-        if ctx is None:
-            _ctx_reason = "ctx=None"
-        elif not isinstance(ctx, dict):
-            _ctx_reason = f"ctx type={type(ctx).__name__} (expected dict)"
-        elif "acct" not in ctx:
-            _ctx_reason = f"ctx missing 'acct' key, keys={list(ctx.keys())}"
-        elif len(ctx["acct"]) == 0:
-            _ctx_reason = f"ctx['acct'] is empty (len=0), keys={list(ctx.keys())}"
-        else:
-            _ctx_reason = None
-
-        if _ctx_reason:
-            print(f"[{_ts()}] Chunk {chunk_idx}: ⚠️  no valid inference rows — {_ctx_reason}")
-            n_done += len(acct_chunk)
-
-            with _pg_tx() as conn:
-                _run_progress_upsert(
-                    conn=conn,
-                    schema=schema,
+            hist_df = pd.DataFrame()
+            if do_hist_this_run:
+                hist_df = _build_history_rows_for_chunk(
+                    acct_chunk=ac,
                     run_id=run_id,
-                    chunk_seq=chunk_idx,
-                    level_name="parcel",
-                    status="running",
-                    series_kind=series_kind_forecast,
-                    variant_id=variant_id,
-                    origin_year=int(origin_year),
-                    chunk_rows=int(len(hist_chunk_df)) if do_hist_this_run else 0,
-                    chunk_keys=int(len(acct_chunk)),
-                    rows_upserted_total=int(parcel_rows_total + agg_rows_total + history_rows_total + history_agg_rows_total),
-                    keys_upserted_total=int(n_done),
-                    min_key=min(acct_chunk) if acct_chunk else None,
-                    max_key=max(acct_chunk) if acct_chunk else None,
+                    max_year=int(origin_year),
+                    series_kind=series_kind_history,
+                    variant_id=_hist_variant,
+                    backtest_id=hist_backtest_id,
+                    min_year=1900,
+                    as_of_date=as_of_date,
                 )
+            return ac, ctx, hist_df
 
-            _append_csv_row(progress_csv, {
-                "timestamp": _ts(),
-                "chunk_idx": int(chunk_idx),
-                "mode": mode,
-                "origin_year": int(origin_year),
-                "accts_in_chunk": int(len(acct_chunk)),
-                "accts_valid_ctx": 0,
-                "prop_batch_size_used": None,
-                "parcel_history_rows": int(hist_rows_upserted),
-                "parcel_forecast_rows": 0,
-                "agg_history_rows": int(hist_agg_rows_upserted),
-                "agg_forecast_rows": 0,
-                "n_done": int(n_done),
-                "n_total": int(n_total),
-                "pct_done": float(100.0 * n_done / max(n_total, 1)),
-                "elapsed_chunk_sec": float(time.time() - t0),
-                "elapsed_run_sec": float(time.time() - t_run0),
-            })
-
-            print(f"[{_ts()}] Chunk {chunk_idx}: no valid inference rows | elapsed={time.time()-t0:.1f}s")
-            continue
-
-        # Inference context is valid — print diagnostic
-        n_ctx = len(ctx["acct"])
-        print(f"[{_ts()}] Chunk {chunk_idx}: ✅ {n_ctx}/{len(acct_chunk)} valid anchors, "
-              f"sample_valid={ctx['acct'][:3]}")
-        # ---------------------------------------------------------------------
-        # 3) Sample scenarios (adaptive backoff)
-        # ---------------------------------------------------------------------
-        inf_out, used_prop_batch_size = _sample_scenarios_with_backoff(
-            ctx=ctx,
-            H=int(H),
-            S=int(S),
-            origin=int(origin_year),
-        )
-
-        # ── Prefetch: start building context for the NEXT chunk on a background thread ──
-        _next_chunk_idx = chunk_idx - chunk_start + 1  # 0-based index into _all_chunks
-        if _next_chunk_idx < len(_all_chunks):
-            _prefetched_ctx = _ctx_pool.submit(_build_ctx_for_chunk, _all_chunks[_next_chunk_idx])
-
-        if inf_out is None:
-            n_done += len(acct_chunk)
-
-            with _pg_tx() as conn:
-                _run_progress_upsert(
+    def _write_history(chunk_idx, acct_chunk, hist_chunk_df):
+        """
+        Chunk file + DB upsert + level aggregates for the history rows; returns
+        (parcel, agg) row counts and whether the DB write succeeded.
+        """
+        nonlocal history_rows_total, history_agg_rows_total
+        if not do_hist_this_run:
+            return 0, 0, True
+        hist_fp = _write_df_chunk(hist_chunk_df, _sink_dir(run_root, "history_chunks", origin_year, series_kind_history, _hist_variant),
+                                  "metrics_parcel_history", chunk_idx)
+        print(f"[{_ts()}] Chunk {chunk_idx}: wrote history chunk rows={len(hist_chunk_df)} -> {hist_fp}")
+        if hist_chunk_df.empty:
+            return 0, 0, True
+        if local_sink:
+            # history aggregates are rebuilt once by publish_run.py
+            with _tot_lock:
+                history_rows_total += len(hist_chunk_df)
+            return len(hist_chunk_df), 0, True
+        hist_chunk_df["jurisdiction"] = JURISDICTION
+        hist_rows_upserted, hist_agg_rows_upserted, hist_ok = 0, 0, True
+        try:
+            with _pg_tx(label=f"hist_chunk_{chunk_idx}") as conn:
+                _conflict, _update = _parcel_upsert_cols("metrics_parcel_history")
+                hist_rows_upserted = _bulk_upsert_df_pg(
                     conn=conn,
                     schema=schema,
-                    run_id=run_id,
-                    chunk_seq=chunk_idx,
-                    level_name="parcel",
-                    status="running",
-                    series_kind=series_kind_forecast,
-                    variant_id=variant_id,
-                    origin_year=int(origin_year),
-                    chunk_rows=int(len(hist_chunk_df)) if do_hist_this_run else 0,
-                    chunk_keys=int(len(acct_chunk)),
-                    rows_upserted_total=int(parcel_rows_total + agg_rows_total + history_rows_total + history_agg_rows_total),
-                    keys_upserted_total=int(n_done),
-                    min_key=min(acct_chunk) if acct_chunk else None,
-                    max_key=max(acct_chunk) if acct_chunk else None,
+                    table="metrics_parcel_history",
+                    df=hist_chunk_df,
+                    conflict_cols=_conflict,
+                    update_cols=_update,
                 )
 
-            _append_csv_row(progress_csv, {
-                "timestamp": _ts(),
-                "chunk_idx": int(chunk_idx),
-                "mode": mode,
-                "origin_year": int(origin_year),
-                "accts_in_chunk": int(len(acct_chunk)),
-                "accts_valid_ctx": int(len(ctx["acct"])) if ctx is not None else 0,
-                "prop_batch_size_used": int(used_prop_batch_size) if used_prop_batch_size is not None else None,
-                "parcel_history_rows": int(hist_rows_upserted),
-                "parcel_forecast_rows": 0,
-                "agg_history_rows": int(hist_agg_rows_upserted),
-                "agg_forecast_rows": 0,
-                "n_done": int(n_done),
-                "n_total": int(n_total),
-                "pct_done": float(100.0 * n_done / max(n_total, 1)),
-                "elapsed_chunk_sec": float(time.time() - t0),
-                "elapsed_run_sec": float(time.time() - t_run0),
-            })
-
-            print(f"[{_ts()}] Chunk {chunk_idx}: sampler returned no output | elapsed={time.time()-t0:.1f}s")
-            continue
-
-        # ---------------------------------------------------------------------
-        # 4) Build parcel forecast rows (local)
-        # ---------------------------------------------------------------------
-        forecast_chunk_df = _build_forecast_rows_from_inf_out(
-            inf_out=inf_out,
-            origin_year=int(origin_year),
-            run_id=run_id,
-            series_kind=series_kind_forecast,
-            variant_id=variant_id,
-            backtest_id=backtest_id,
-            as_of_date=as_of_date,
-        )
-
-        fc_fp = _write_df_chunk(forecast_chunk_df, os.path.join(run_root, "forecast_chunks"), "metrics_parcel_forecast", chunk_idx)
-        print(f"[{_ts()}] Chunk {chunk_idx}: wrote forecast chunk rows={len(forecast_chunk_df)} -> {fc_fp}")
-
-        # ---------------------------------------------------------------------
-        # 5) Upsert parcel forecast + aggregate higher zooms + progress
-        #    → dispatched to background thread so GPU can start next chunk
-        # ---------------------------------------------------------------------
-        parcel_rows_upserted = 0
-        agg_rows_upserted = 0
-
-        # Capture loop-local values for the closure
-        _fc_df = forecast_chunk_df
-        _ac = list(acct_chunk)
-        _ci = chunk_idx
-        _hr = int(len(hist_chunk_df)) if do_hist_this_run else 0
-
-        def _do_db_write(_fc_df=_fc_df, _ac=_ac, _ci=_ci, _hr=_hr):
-            nonlocal parcel_rows_total, agg_rows_total, n_done
-            _pru = 0
-            _aru = 0
-            try:
-                with _pg_tx(label=f"forecast_chunk_{_ci}") as conn:
-                    if not _fc_df.empty:
-                        _fc_df["jurisdiction"] = JURISDICTION
-                        parcel_forecast_update_cols = [
-                            "forecast_year", "value", "p10", "p25", "p50", "p75", "p90",
-                            "run_id", "backtest_id", "model_version", "as_of_date", "n_scenarios",
-                            "is_backtest", "updated_at"
-                        ]
-                        if PARCEL_FORECAST_HAS_N_COL:
-                            parcel_forecast_update_cols.insert(7, "n")
-
-                        _pru = _upsert_df_pg(
+                with _agg_lock:
+                    if ladder_idx is not None:
+                        hist_agg_rows_upserted = _aggregate_history_levels_from_index(
                             conn=conn,
                             schema=schema,
-                            table="metrics_parcel_forecast",
-                            df=_fc_df,
-                            conflict_cols=["acct", "origin_year", "horizon_m", "series_kind", "variant_id"],
-                            update_cols=parcel_forecast_update_cols,
+                            ladder_idx=ladder_idx,
+                            hist_df=hist_chunk_df,
+                            run_id=run_id,
+                            series_kind=series_kind_history,
+                            variant_id=_hist_variant,
+                            backtest_id=hist_backtest_id,
+                            as_of_date=as_of_date,
                         )
-
-                        _aru = _aggregate_forecast_levels_for_chunk(
+                    else:
+                        hist_agg_rows_upserted = _aggregate_history_levels_for_chunk(
                             conn=conn,
                             schema=schema,
-                            acct_chunk=_ac,
+                            acct_chunk=acct_chunk,
                             run_id=run_id,
-                            origin_year=int(origin_year),
-                            series_kind=series_kind_forecast,
-                            variant_id=variant_id,
-                            backtest_id=backtest_id,
+                            series_kind=series_kind_history,
+                            variant_id=_hist_variant,
+                            backtest_id=hist_backtest_id,
                             as_of_date=as_of_date,
                         )
-
-                    parcel_rows_total += int(_pru)
-                    agg_rows_total += int(_aru)
-                    n_done += len(_ac)
-
-                    _run_progress_upsert(
-                        conn=conn,
-                        schema=schema,
+        except Exception as exc:
+            print(f"[{_ts()}] Chunk {chunk_idx}: ⚠️  HISTORY DB write failed after retries, SKIPPING: {exc}")
+            hist_rows_upserted = 0
+            hist_agg_rows_upserted = 0
+            hist_ok = False
+
+        with _tot_lock:
+            history_rows_total += int(hist_rows_upserted)
+            history_agg_rows_total += int(hist_agg_rows_upserted)
+        return int(hist_rows_upserted), int(hist_agg_rows_upserted), hist_ok
+
+    def _write_stage(chunk_idx, acct_chunk, ctx, hist_chunk_df, inf_out, used_prop_batch_size, t0, skip_reason):
+        """Stage 3 (DB writer): history + forecast rows for one chunk, progress row, eval summary."""
+        nonlocal parcel_rows_total, agg_rows_total, n_done
+        try:
+            with _meter.stage("write"):
+                hist_rows_upserted, hist_agg_rows_upserted, hist_ok = _write_history(chunk_idx, acct_chunk, hist_chunk_df)
+                hist_rows = int(len(hist_chunk_df)) if do_hist_this_run else 0
+                parcel_rows_upserted = 0
+                agg_rows_upserted = 0
+                forecast_chunk_df = None
+                # resume manifest status: only done / no_ctx chunks are skipped on resume
+                if not skip_reason:
+                    chunk_status = "done"
+                elif skip_reason == "no valid inference rows":
+                    chunk_status = "no_ctx"
+                else:
+                    chunk_status = "sample_failed"
+                if not hist_ok and chunk_status != "sample_failed":
+                    chunk_status = "db_failed"   # history rows are retried on resume
+
+                if inf_out is not None:
+                    # -------------------------------------------------------------
+                    # Build parcel forecast rows (local) + chunk file
+                    # -------------------------------------------------------------
+                    forecast_chunk_df = _build_forecast_rows_from_inf_out(
+                        inf_out=inf_out,
+                        origin_year=int(origin_year),
                         run_id=run_id,
-                        chunk_seq=_ci,
-                        level_name="parcel",
-                        status="running",
                         series_kind=series_kind_forecast,
                         variant_id=variant_id,
+                        backtest_id=backtest_id,
+                        as_of_date=as_of_date,
+                    )
+                    fc_fp = _write_df_chunk(forecast_chunk_df, _sink_dir(run_root, "forecast_chunks", origin_year, series_kind_forecast, variant_id),
+                                            "metrics_parcel_forecast", chunk_idx)
+                    print(f"[{_ts()}] Chunk {chunk_idx}: wrote forecast chunk rows={len(forecast_chunk_df)} -> {fc_fp}")
+
+                # -----------------------------------------------------------------
+                # Upsert parcel forecast + aggregate higher zooms + progress
+                # -----------------------------------------------------------------
+                if local_sink:
+                    parcel_rows_upserted = len(forecast_chunk_df) if forecast_chunk_df is not None else 0
+                    with _tot_lock:
+                        parcel_rows_total += int(parcel_rows_upserted)
+                        n_done += len(acct_chunk)
+                else:
+                    try:
+                        with _pg_tx(label=f"forecast_chunk_{chunk_idx}") as conn:
+                            if forecast_chunk_df is not None and not forecast_chunk_df.empty:
+                                forecast_chunk_df["jurisdiction"] = JURISDICTION
+                                _conflict, _update = _parcel_upsert_cols("metrics_parcel_forecast")
+                                parcel_rows_upserted = _bulk_upsert_df_pg(
+                                    conn=conn,
+                                    schema=schema,
+                                    table="metrics_parcel_forecast",
+                                    df=forecast_chunk_df,
+                                    conflict_cols=_conflict,
+                                    update_cols=_update,
+                                )
+
+                                # scenario mode writes all forecast aggregates once at the end of the run
+                                if agg_forecast_mode == "sql":
+                                    with _agg_lock:
+                                        agg_rows_upserted = _aggregate_forecast_levels_for_chunk(
+                                            conn=conn,
+                                            schema=schema,
+                                            acct_chunk=acct_chunk,
+                                            run_id=run_id,
+                                            origin_year=int(origin_year),
+                                            series_kind=series_kind_forecast,
+                                            variant_id=variant_id,
+                                            backtest_id=backtest_id,
+                                            as_of_date=as_of_date,
+                                        )
+
+                            with _tot_lock:
+                                parcel_rows_total += int(parcel_rows_upserted)
+                                agg_rows_total += int(agg_rows_upserted)
+                                n_done += len(acct_chunk)
+                                _rows_total = int(parcel_rows_total + agg_rows_total + history_rows_total + history_agg_rows_total)
+                                _keys_total = int(n_done)
+
+                            _run_progress_upsert(
+                                conn=conn,
+                                schema=schema,
+                                run_id=run_id,
+                                chunk_seq=chunk_idx,
+                                level_name="parcel",
+                                status="running",
+                                series_kind=series_kind_forecast,
+                                variant_id=variant_id,
+                                origin_year=int(origin_year),
+                                chunk_rows=int(hist_rows + (len(forecast_chunk_df) if forecast_chunk_df is not None else 0)),
+                                chunk_keys=int(len(acct_chunk)),
+                                rows_upserted_total=_rows_total,
+                                keys_upserted_total=_keys_total,
+                                min_key=min(acct_chunk) if acct_chunk else None,
+                                max_key=max(acct_chunk) if acct_chunk else None,
+                            )
+                    except Exception as exc:
+                        print(f"[{_ts()}] Chunk {chunk_idx}: ⚠️  FORECAST DB write failed after retries, SKIPPING: {exc}")
+                        chunk_status = "db_failed"
+                        with _tot_lock:
+                            n_done += len(acct_chunk)  # still count as processed
+
+                # -----------------------------------------------------------------
+                # Optional local backtest scoring summary (no DB)
+                # -----------------------------------------------------------------
+                eval_df = None
+                if mode == "backtest" and forecast_chunk_df is not None:
+                    eval_df = _backtest_eval_summary_for_chunk(
+                        forecast_chunk_df=forecast_chunk_df,
+                        acct_chunk=acct_chunk,
                         origin_year=int(origin_year),
-                        chunk_rows=int(_hr + len(_fc_df)),
-                        chunk_keys=int(len(_ac)),
-                        rows_upserted_total=int(parcel_rows_total + agg_rows_total + history_rows_total + history_agg_rows_total),
-                        keys_upserted_total=int(n_done),
-                        min_key=min(_ac) if _ac else None,
-                        max_key=max(_ac) if _ac else None,
                     )
-            except Exception as exc:
-                print(f"[{_ts()}] Chunk {_ci}: ⚠️  FORECAST DB write failed after retries, SKIPPING: {exc}")
-                n_done += len(_ac)  # still count as processed
-
-        _pending_db_future = _db_pool.submit(_do_db_write)
-
-        # ---------------------------------------------------------------------
-        # 6) Optional local backtest scoring summary (no DB)
-        # ---------------------------------------------------------------------
-        if mode == "backtest":
-            eval_df = _backtest_eval_summary_for_chunk(
-                forecast_chunk_df=forecast_chunk_df,
-                acct_chunk=acct_chunk,
-                origin_year=int(origin_year),
-            )
-            if eval_df is not None and not eval_df.empty:
-                eval_fp = _write_df_chunk(eval_df, os.path.join(run_root, "eval_chunks"), "backtest_eval_summary", chunk_idx)
-                print(f"[{_ts()}] Chunk {chunk_idx}: wrote backtest eval summary rows={len(eval_df)} -> {eval_fp}")
-                for _, r in eval_df.iterrows():
-                    _append_csv_row(eval_csv, {k: _py_scalar(v) for k, v in r.to_dict().items()})
-
-        _append_csv_row(progress_csv, {
-            "timestamp": _ts(),
-            "chunk_idx": int(chunk_idx),
-            "mode": mode,
-            "origin_year": int(origin_year),
-            "accts_in_chunk": int(len(acct_chunk)),
-            "accts_valid_ctx": int(len(ctx["acct"])) if ctx is not None else 0,
-            "prop_batch_size_used": int(used_prop_batch_size) if used_prop_batch_size is not None else None,
-            "parcel_history_rows": int(hist_rows_upserted),
-            "parcel_forecast_rows": int(parcel_rows_upserted),
-            "agg_history_rows": int(hist_agg_rows_upserted),
-            "agg_forecast_rows": int(agg_rows_upserted),
-            "n_done": int(n_done),
-            "n_total": int(n_total),
-            "pct_done": float(100.0 * n_done / max(n_total, 1)),
-            "elapsed_chunk_sec": float(time.time() - t0),
-            "elapsed_run_sec": float(time.time() - t_run0),
-        })
+                    if eval_df is not None and not eval_df.empty:
+                        eval_fp = _write_df_chunk(eval_df, os.path.join(run_root, "eval_chunks"), "backtest_eval_summary", chunk_idx)
+                        print(f"[{_ts()}] Chunk {chunk_idx}: wrote backtest eval summary rows={len(eval_df)} -> {eval_fp}")
+
+                if resume_state is not None:
+                    resume_state.mark(chunk_idx, acct_chunk, chunk_status,
+                                      forecast_rows=parcel_rows_upserted, history_rows=hist_rows_upserted)
+
+            _snap = _meter.snapshot()
+            with _tot_lock:
+                if eval_df is not None and not eval_df.empty:
+                    for _, r in eval_df.iterrows():
+                        _append_csv_row(eval_csv, {k: _py_scalar(v) for k, v in r.to_dict().items()})
+                _append_csv_row(progress_csv, {
+                    "timestamp": _ts(),
+                    "chunk_idx": int(chunk_idx),
+                    "mode": mode,
+                    "origin_year": int(origin_year),
+                    "accts_in_chunk": int(len(acct_chunk)),
+                    "accts_valid_ctx": 0 if skip_reason == "no valid inference rows" else int(len(ctx["acct"])),
+                    "prop_batch_size_used": int(used_prop_batch_size) if used_prop_batch_size is not None else None,
+                    "parcel_history_rows": int(hist_rows_upserted),
+                    "parcel_forecast_rows": int(parcel_rows_upserted),
+                    "agg_history_rows": int(hist_agg_rows_upserted),
+                    "agg_forecast_rows": int(agg_rows_upserted),
+                    "n_done": int(n_done),
+                    "n_total": int(n_total),
+                    "pct_done": float(100.0 * n_done / max(n_total, 1)),
+                    "elapsed_chunk_sec": float(time.time() - t0),
+                    "elapsed_run_sec": float(time.time() - t_run0),
+                    "util_ctx": _snap["ctx"]["util"],
+                    "util_sample": _snap["sample"]["util"],
+                    "util_write": _snap["write"]["util"],
+                    "sampler_wait_ctx_sec": _snap["wait_sec"].get("sampler_wait_ctx", 0.0),
+                    "sampler_wait_write_sec": _snap["wait_sec"].get("sampler_wait_write", 0.0),
+                })
+                _n_done_now = int(n_done)
+
+            if skip_reason:
+                print(f"[{_ts()}] Chunk {chunk_idx}: {skip_reason} | elapsed={time.time()-t0:.1f}s")
+            else:
+                print(
+                    f"[{_ts()}] Chunk {chunk_idx} complete | mode={mode} origin={origin_year} "
+                    f"| done={_n_done_now}/{n_total} ({100.0*_n_done_now/max(n_total,1):.2f}%) "
+                    f"| prop_bs={used_prop_batch_size} "
+                    f"| parcel_fc={parcel_rows_upserted} agg_fc={agg_rows_upserted} "
+                    f"| parcel_hist={hist_rows_upserted} agg_hist={hist_agg_rows_upserted} "
+                    f"| elapsed={time.time()-t0:.1f}s"
+                )
+        finally:
+            _write_slots.release()
+
+    def _submit_write(chunk_idx, acct_chunk, ctx, hist_chunk_df, inf_out, used_prop_batch_size, t0, skip_reason=None):
+        """Hand a chunk to the writers; blocks while PIPELINE_QUEUE_DEPTH writes are already queued."""
+        t_w = time.time()
+        _write_slots.acquire()
+        _meter.wait("sampler_wait_write", time.time() - t_w)
+        _write_futs.append(_db_pool.submit(_write_stage, chunk_idx, acct_chunk, ctx, hist_chunk_df,
+                                           inf_out, used_prop_batch_size, t0, skip_reason))
+
+    _ctx_q = deque()   # (chunk_idx, acct_chunk_raw, Future) in chunk order, at most _depth + workers in flight
+    _next_submit = 0
+
+    def _fill_ctx_queue():
+        nonlocal _next_submit
+        while _next_submit < len(_all_chunks) and len(_ctx_q) < _depth + _n_ctx_workers:
+            raw = _all_chunks[_next_submit]
+            _ctx_q.append((chunk_start + _next_submit, raw, _ctx_pool.submit(_build_stage, raw)))
+            _next_submit += 1
+
+    _fill_ctx_queue()
+    try:
+        while _ctx_q:
+            chunk_idx, acct_chunk_raw, _fut = _ctx_q.popleft()
+            _fill_ctx_queue()
+
+            # ---------------------------------------------------------------------
+            # 1) Context + history rows from the ctx builders
+            # ---------------------------------------------------------------------
+            t_wait = time.time()
+            try:
+                acct_chunk, ctx, hist_chunk_df = _fut.result(timeout=600)
+            except Exception as _pf_exc:
+                print(f"[{_ts()}] Chunk {chunk_idx}: context build failed ({_pf_exc}), building synchronously")
+                acct_chunk, ctx, hist_chunk_df = _build_stage(acct_chunk_raw)
+            _meter.wait("sampler_wait_ctx", time.time() - t_wait)
+            t0 = time.time()
 
-        print(
-            f"[{_ts()}] Chunk {chunk_idx} complete | mode={mode} origin={origin_year} "
-            f"| done={n_done}/{n_total} ({100.0*n_done/max(n_total,1):.2f}%) "
-            f"| prop_bs={used_prop_batch_size} "
-            f"| parcel_fc={parcel_rows_upserted} agg_fc={agg_rows_upserted} "
-            f"| parcel_hist={hist_rows_upserted} agg_hist={hist_agg_rows_upserted} "
-            f"| elapsed={time.time()-t0:.1f}s"
-        )
+            # Detailed diagnostic on the return value
+            if ctx is None:
+                _ctx_reason = "ctx=None"
+            elif not isinstance(ctx, dict):
+                _ctx_reason = f"ctx type={type(ctx).__name__} (expected dict)"
+            elif "acct" not in ctx:
+                _ctx_reason = f"ctx missing 'acct' key, keys={list(ctx.keys())}"
+            elif len(ctx["acct"]) == 0:
+                _ctx_reason = f"ctx['acct'] is empty (len=0), keys={list(ctx.keys())}"
+            else:
+                _ctx_reason = None
+
+            if _ctx_reason:
+                print(f"[{_ts()}] Chunk {chunk_idx}: ⚠️  no valid inference rows — {_ctx_reason}")
+                _submit_write(chunk_idx, acct_chunk, ctx, hist_chunk_df, None, None, t0,
+                              skip_reason="no valid inference rows")
+                continue
+
+            # Inference context is valid — print diagnostic
+            n_ctx = len(ctx["acct"])
+            print(f"[{_ts()}] Chunk {chunk_idx}: ✅ {n_ctx}/{len(acct_chunk)} valid anchors, "
+                  f"sample_valid={ctx['acct'][:3]}")
+            # ---------------------------------------------------------------------
+            # 2) Sample scenarios (adaptive backoff)
+            # ---------------------------------------------------------------------
+            with _meter.stage("sample"):
+                geo_codes = None
+                if geo_agg is not None and geo_agg_complete:
+                    try:
+                        if ladder_idx is not None:
+                            geo_codes = ladder_idx.codes_for(ctx["acct"])
+                        else:
+                            geo_codes = _fetch_ladder_codes_for_accts(geo_agg, ctx["acct"])
+                    except Exception as exc:
+                        print(f"[{_ts()}] Chunk {chunk_idx}: ⚠️  ladder lookup failed ({exc}); "
+                              f"falling back to SQL forecast aggregates for this run")
+                        geo_agg_complete = False
+
+                # cached fans carry no scenario paths: hits only when this chunk feeds no geo sums
+                inf_out, used_prop_batch_size, n_hits, n_failed = _sample_scenarios_cached(
+                    ctx=ctx,
+                    H=int(H),
+                    S=int(S),
+                    origin=int(origin_year),
+                    result_cache=result_cache,
+                    cache_fp=cache_fp,
+                    use_hits=geo_codes is None,
+                    geo_agg=(geo_agg if geo_codes is not None else None),
+                    geo_codes=geo_codes,
+                )
+                if (inf_out is None or n_failed) and geo_codes is not None:
+                    # a failed streaming pass may have folded part of the chunk into geo_agg
+                    print(f"[{_ts()}] Chunk {chunk_idx}: ⚠️  scenario sums incomplete; "
+                          f"falling back to SQL forecast aggregates for this run")
+                    geo_agg_complete = False
+                if n_hits:
+                    cache_hits_total += n_hits
+                    print(f"[{_ts()}] Chunk {chunk_idx}: result cache {n_hits}/{n_ctx} parcels, "
+                          f"sampled {n_ctx - n_hits - n_failed}" + (f", {n_failed} failed" if n_failed else ""))
+
+            # ---------------------------------------------------------------------
+            # 3) Forecast rows, chunk files, DB upserts, progress → writer threads
+            # ---------------------------------------------------------------------
+            if inf_out is None:
+                _skip = "sampler failed (no output)"
+            elif n_failed:
+                _skip = f"sampler failed for {n_failed} parcels (cached fans written)"
+            else:
+                _skip = None
+            _submit_write(chunk_idx, acct_chunk, ctx, hist_chunk_df, inf_out, used_prop_batch_size, t0,
+                          skip_reason=_skip)
+
+            if PIPELINE_METRICS_EVERY > 0 and (chunk_idx - chunk_start + 1) % PIPELINE_METRICS_EVERY == 0:
+                print(f"[{_ts()}] Pipeline stages: {_meter.line()}")
+    finally:
+        # -------------------------------------------------------------------------
+        # Drain the writers before the final refresh
+        # -------------------------------------------------------------------------
+        for _f in _ctx_q:
+            _f[2].cancel()
+        _ctx_pool.shutdown(wait=True)
+        _db_pool.shutdown(wait=True)
+        for _f in _write_futs:
+            if _f.exception() is not None:
+                print(f"[{_ts()}] ⚠️  Async DB write failed: {_f.exception()}")
+
+    print(f"[{_ts()}] Pipeline stages (final): {_meter.line()}")
+    manifest["pipeline_stages"] = _meter.snapshot()
+    if not local_sink:
+        manifest["pg_pool"] = _pg_pool().stats()
+    if result_cache is not None:
+        manifest["result_cache"] = result_cache.stats()
+        print(f"[{_ts()}] Result cache: {cache_hits_total:,} parcels served from cache, "
+              f"{result_cache.misses:,} sampled, {result_cache.evicted:,} evicted")
+        result_cache.close()
 
     # -------------------------------------------------------------------------
-    # 7) Final exact aggregate refresh + finalize run status
+    # 4) Final exact aggregate refresh + finalize run status
+    #    (local sink: scenario aggregates to agg_chunks/, the rest is publish_run.py)
     # -------------------------------------------------------------------------
-    # Drain any pending async DB write before final refresh
-    _wait_for_pending_db()
-    _db_pool.shutdown(wait=True)
-    _ctx_pool.shutdown(wait=False)  # no pending work; just cleanup
 
-    try:
-        with _pg_tx(retries=5, label="final_agg_refresh") as conn:
-            if RUN_FINAL_EXACT_AGG_REFRESH:
-                _recompute_forecast_aggregates_exact_for_run(
-                    conn=conn,
-                    schema=schema,
-                    run_id=run_id,
-                    origin_year=int(origin_year),
-                    series_kind=series_kind_forecast,
-                    variant_id=variant_id,
-                    backtest_id=backtest_id,
-                    as_of_date=as_of_date,
-                )
-
-                if (mode == "forecast" and write_history_series) or (mode == "backtest" and WRITE_BACKTEST_HISTORY_VARIANTS):
-                    _recompute_history_aggregates_exact_for_run(
+    if local_sink:
+        if geo_agg is not None and geo_agg_complete:
+            agg_rows_total += _write_scenario_forecast_aggregates(
+                conn=None,
+                schema=schema,
+                geo_agg=geo_agg,
+                origin_year=int(origin_year),
+                run_id=run_id,
+                series_kind=series_kind_forecast,
+                variant_id=variant_id,
+                backtest_id=backtest_id,
+                as_of_date=as_of_date,
+                run_root=run_root,
+            )
+    else:
+        try:
+            with _pg_tx(retries=5, label="final_agg_refresh") as conn:
+                if geo_agg is not None and geo_agg_complete:
+                    agg_rows_total += _write_scenario_forecast_aggregates(
                         conn=conn,
                         schema=schema,
+                        geo_agg=geo_agg,
+                        origin_year=int(origin_year),
                         run_id=run_id,
-                        series_kind=series_kind_history,
-                        variant_id=(hist_variant_id if hist_variant_id is not None else "__history__"),
-                        backtest_id=hist_backtest_id,
+                        series_kind=series_kind_forecast,
+                        variant_id=variant_id,
+                        backtest_id=backtest_id,
+                        as_of_date=as_of_date,
+                    )
+                elif RUN_FINAL_EXACT_AGG_REFRESH or geo_agg is not None:
+                    _recompute_forecast_aggregates_exact_for_run(
+                        conn=conn,
+                        schema=schema,
+                        run_id=run_id,
+                        origin_year=int(origin_year),
+                        series_kind=series_kind_forecast,
+                        variant_id=variant_id,
+                        backtest_id=backtest_id,
                         as_of_date=as_of_date,
                     )
 
-            _run_update_status(conn, schema, run_id, "completed")
-    except Exception as exc:
-        print(f"[{_ts()}] ⚠️  Final aggregate refresh FAILED after retries: {exc}")
-        print(f"[{_ts()}]    The parcel-level data is safe. Re-run the final refresh separately.")
-        # Still try to mark the run as completed
-        try:
-            with _pg_tx(retries=2, label="mark_completed_fallback") as conn:
+                if RUN_FINAL_EXACT_AGG_REFRESH:
+                    if (mode == "forecast" and write_history_series) or (mode == "backtest" and WRITE_BACKTEST_HISTORY_VARIANTS):
+                        _recompute_history_aggregates_exact_for_run(
+                            conn=conn,
+                            schema=schema,
+                            run_id=run_id,
+                            series_kind=series_kind_history,
+                            variant_id=(hist_variant_id if hist_variant_id is not None else "__history__"),
+                            backtest_id=hist_backtest_id,
+                            as_of_date=as_of_date,
+                        )
+
                 _run_update_status(conn, schema, run_id, "completed")
-        except Exception:
-            print(f"[{_ts()}]    Could not mark run as completed either.")
+        except Exception as exc:
+            print(f"[{_ts()}] ⚠️  Final aggregate refresh FAILED after retries: {exc}")
+            print(f"[{_ts()}]    The parcel-level data is safe. Re-run the final refresh separately.")
+            # Still try to mark the run as completed
+            try:
+                with _pg_tx(retries=2, label="mark_completed_fallback") as conn:
+                    _run_update_status(conn, schema, run_id, "completed")
+            except Exception:
+                print(f"[{_ts()}]    Could not mark run as completed either.")
 
     manifest["finished_at_utc"] = datetime.utcnow().isoformat()
     manifest["elapsed_run_sec"] = float(time.time() - t_run0)
@@ -2105,6 +3919,7 @@ def _run_one_origin(
         "variant_id": variant_id,
         "backtest_id": backtest_id,
         "run_root": run_root,
+        "sink_mode": SINK_MODE,
         "parcel_forecast_rows_total": int(parcel_rows_total),
         "agg_forecast_rows_total": int(agg_rows_total),
         "parcel_history_rows_total": int(history_rows_total),
@@ -2219,6 +4034,7 @@ suite_manifest = {
     "n_accounts_total": int(n_total),
     "parcel_forecast_has_n_col": bool(PARCEL_FORECAST_HAS_N_COL),
     "final_exact_agg_refresh": bool(RUN_FINAL_EXACT_AGG_REFRESH),
+    "sink_mode": SINK_MODE,
     "started_at_utc": datetime.utcnow().isoformat(),
     "checkpoint_origins_available": [int(o) for o, _ in ckpt_pairs],
 }
@@ -2227,6 +4043,7 @@ with open(os.path.join(OUT_ROOT, "suite_manifest.json"), "w") as f:
 
 print(f"[{_ts()}] SUITE_ID={SUITE_ID}")
 print(f"[{_ts()}] TARGET_SCHEMA={TARGET_SCHEMA}")
+print(f"[{_ts()}] SINK_MODE={SINK_MODE}")
 print(f"[{_ts()}] Accounts={n_total}")
 print(f"[{_ts()}] Checkpoint origins={suite_manifest['checkpoint_origins_available']}")
 
@@ -2305,6 +4122,8 @@ try:
     print(f"  Results count: {len(results)}")
     for r in results:
         print(f"   - {r['mode']} origin={r['origin_year']} run_id={r['run_id']}")
+    if SINK_MODE == "local":
+        print(f"  Not in Postgres yet — publish with: python scripts/inference/publish_run.py {OUT_ROOT}")
 
 except Exception as e:
     print(f"[{_ts()}] ERROR: {e}")
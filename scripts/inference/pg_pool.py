@@ -0,0 +1,295 @@
+"""
+Shared Postgres connection pool for the DB-writing scripts
+==========================================================
+One thread-safe pool per (process, DSN), used by inference_pipeline.py,
+upload_history.py, upload_geo.py, h3_mvt_pipeline.py and flag_seam_outliers.py.
+
+- Connections are opened lazily (up to maxconn), re-used across transactions and
+  health-checked on checkout: closed / broken ones are replaced, ones idle longer
+  than healthcheck_idle_s get a `SELECT 1`, ones idle past max_idle_s (Supabase
+  pooler idle disconnects) are reopened.
+- init_sql (statement_timeout, ...) runs once per physical connection.
+- transaction() retries the checkout on transient errors (is_transient_pg_error)
+  with exponential backoff; run_tx() / execute_values_tx() retry the whole
+  transaction body, for idempotent writes such as upsert batches.
+- execute_prepared() runs hot parameterised SQL as a server-side prepared
+  statement (PREPARE once per connection, then EXECUTE). Disabled automatically
+  behind a transaction-mode pooler (port 6543), which cannot keep session state.
+
+inference_modal.py execs this file into the pipeline globals; standalone scripts
+import it (scripts/inference on sys.path).
+"""
+import hashlib
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+
+_PG_POOL_TRANSIENT_CODES = ('57014', '57P01', '57P02', '57P03', '08000', '08003', '08006')
+
+
+def _pool_ts():
+    return time.strftime("%H:%M:%S")
+
+
+def is_transient_pg_error(exc):
+    """Return True if the exception looks like a retryable transient error."""
+    # Statement timeout, query canceled, connection errors
+    if isinstance(exc, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+        return True
+    # Specific error codes: query_canceled, statement_timeout, admin shutdown, connection failure
+    return getattr(exc, 'pgcode', None) in _PG_POOL_TRANSIENT_CODES
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers its pool, prepared statements and last use."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = None
+        self.prepared = set()
+        self.prepare_enabled = False
+        self.last_used = time.time()
+        self.opened_at = time.time()
+
+
+def _to_dollar_params(sql: str):
+    """psycopg2 '%s' placeholders -> PREPARE-style $1..$n; returns (sql, n_params)."""
+    n = 0
+
+    def _sub(m):
+        nonlocal n
+        if m.group(0) == "%%":
+            return "%"
+        n += 1
+        return f"${n}"
+
+    return re.sub(r"%%|%s", _sub, sql), n
+
+
+def execute_prepared(cur, sql: str, params=()):
+    """
+    cur.execute(sql, params) as a server-side prepared statement on pooled
+    connections (statement name = hash of the SQL text). Plain connections, or
+    pools with prepared statements off, fall back to cur.execute.
+    """
+    conn = cur.connection
+    if not getattr(conn, "prepare_enabled", False):
+        return cur.execute(sql, params)
+    name = "ps_" + hashlib.sha1(sql.encode("utf-8")).hexdigest()[:16]
+    if name not in conn.prepared:
+        body, n = _to_dollar_params(sql)
+        if n != len(params):
+            raise ValueError(f"execute_prepared: {len(params)} params for {n} placeholders")
+        cur.execute(f"PREPARE {name} AS {body}")
+        conn.prepared.add(name)
+    if not params:
+        return cur.execute(f"EXECUTE {name}")
+    return cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+
+
+class PgPool:
+    """
+    Thread-safe, lazily filled Postgres connection pool (see module docstring).
+    getconn() blocks while maxconn connections are checked out.
+    """
+
+    def __init__(self, dsn: str, maxconn: int = 4, init_sql=(), autocommit: bool = False,
+                 healthcheck_idle_s: float = 30.0, max_idle_s: float = 600.0,
+                 prepare=None, connect_retries: int = 3, backoff_base: float = 5.0, log=print):
+        if not dsn:
+            raise RuntimeError("PgPool: a database URL is required.")
+        self.dsn = dsn
+        self.maxconn = max(1, int(maxconn))
+        self.init_sql = tuple(init_sql)
+        self.autocommit = bool(autocommit)
+        self.healthcheck_idle_s = float(healthcheck_idle_s)
+        self.max_idle_s = float(max_idle_s)
+        if prepare is None:
+            prepare = urlsplit(dsn).port != 6543   # transaction-mode pooler: no session state
+        self.prepare = bool(prepare)
+        self.connect_retries = int(connect_retries)
+        self.backoff_base = float(backoff_base)
+        self.log = log
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+        self.n_opened = 0
+        self.n_reused = 0
+        self.n_discarded = 0
+
+    # ── physical connections ──
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, connection_factory=PooledConnection)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            for stmt in self.init_sql:
+                cur.execute(stmt)
+        conn.autocommit = self.autocommit
+        conn.prepare_enabled = self.prepare
+        conn.pool = self
+        with self._lock:
+            self.n_opened += 1
+        return conn
+
+    def _close(self, conn):
+        with self._lock:
+            self.n_discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        idle = time.time() - conn.last_used
+        if idle > self.max_idle_s:
+            return False
+        if idle > self.healthcheck_idle_s:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                if not conn.autocommit:
+                    conn.rollback()
+            except Exception:
+                return False
+        return conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    # ── checkout / return ──
+    def getconn(self, retries=None):
+        """Check out a healthy connection, opening one (with transient retries) if none is idle."""
+        retries = self.connect_retries if retries is None else int(retries)
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    break
+                if self._healthy(conn):
+                    with self._lock:
+                        self.n_reused += 1
+                    return conn
+                self._close(conn)
+            for attempt in range(retries + 1):
+                try:
+                    return self._connect()
+                except Exception as exc:
+                    if attempt < retries and is_transient_pg_error(exc):
+                        wait = self.backoff_base * (2 ** attempt)
+                        self.log(f"[{_pool_ts()}] PgPool: connect failed (attempt {attempt+1}/"
+                                 f"{retries+1}), retrying in {wait:.0f}s: {exc}")
+                        time.sleep(wait)
+                    else:
+                        raise
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, discard: bool = False):
+        """Return a connection; broken ones (or discard=True) are closed instead of re-used."""
+        try:
+            if discard or conn.closed:
+                self._close(conn)
+                return
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit != self.autocommit:
+                    conn.autocommit = self.autocommit
+            except Exception:
+                self._close(conn)
+                return
+            conn.last_used = time.time()
+            with self._lock:
+                self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, retries=None):
+        """Checked-out connection for the block; discarded if the block raised a transient error."""
+        conn = self.getconn(retries)
+        discard = False
+        try:
+            yield conn
+        except Exception as exc:
+            discard = conn.closed or is_transient_pg_error(exc)
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    @contextmanager
+    def transaction(self, retries=None):
+        """
+        One transaction on a pooled connection: commit on success, rollback and
+        re-raise on error (the connection is dropped if the error was transient).
+        Checkout retries transient connect errors `retries` times (connect_retries
+        when None); use run_tx() to retry the body as well.
+        """
+        with self.connection(retries) as conn:
+            if conn.autocommit:
+                conn.autocommit = False
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                raise
+
+    def run_tx(self, fn, retries: int = 3, label: str = ""):
+        """fn(conn) inside transaction(); the whole call is retried on transient errors."""
+        for attempt in range(int(retries) + 1):
+            try:
+                with self.transaction() as conn:
+                    return fn(conn)
+            except Exception as exc:
+                if attempt < int(retries) and is_transient_pg_error(exc):
+                    wait = self.backoff_base * (2 ** attempt)
+                    self.log(f"[{_pool_ts()}] PgPool{' (' + label + ')' if label else ''}: "
+                             f"transient error (attempt {attempt+1}/{int(retries)+1}), "
+                             f"retrying in {wait:.0f}s: {exc}")
+                    time.sleep(wait)
+                else:
+                    raise
+
+    def execute_values_tx(self, sql: str, rows, template=None, page_size: int = 1000,
+                          retries: int = 3, label: str = ""):
+        """One idempotent execute_values batch (e.g. an upsert page) as its own retried transaction."""
+        def _batch(conn):
+            with conn.cursor() as cur:
+                psycopg2.extras.execute_values(cur, sql, rows, template=template, page_size=int(page_size))
+        return self.run_tx(_batch, retries=retries, label=label)
+
+    def closeall(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"opened": self.n_opened, "reused": self.n_reused, "discarded": self.n_discarded,
+                    "idle": len(self._idle), "maxconn": self.maxconn, "prepared_statements": self.prepare}
+
+
+_SHARED_POOLS = {}
+_SHARED_POOLS_LOCK = threading.Lock()
+
+
+def shared_pool(dsn: str, **kwargs) -> PgPool:
+    """The process-wide PgPool for dsn (kwargs apply only when it is first created)."""
+    with _SHARED_POOLS_LOCK:
+        pool = _SHARED_POOLS.get(dsn)
+        if pool is None:
+            pool = _SHARED_POOLS[dsn] = PgPool(dsn, **kwargs)
+        return pool
@@ -279,8 +279,9 @@ if has_lf and all_accts_g and "_build_inference_for_accounts_at_origin" in globa
                     ctx=ctx, H=5, S=4, origin=int(origin), prop_batch_size=64,
                 )
                 if inf_out is not None and "acct" in inf_out:
+                    _out_key = "quantiles" if "quantiles" in inf_out else "price_levels"
                     _ok(f"Sampling works: {len(inf_out['acct'])} accts, "
-                        f"price_levels shape={np.array(inf_out['price_levels']).shape}")
+                        f"{_out_key} shape={np.array(inf_out[_out_key]).shape}")
                 else:
                     _bad("Sampler returned None or missing 'acct'")
         except Exception as e:
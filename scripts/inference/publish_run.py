@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Publish SINK_MODE="local" inference runs to Postgres
+====================================================
+inference_pipeline.py with SINK_MODE="local" writes every run as chunk files only:
+
+  <run_root>/run_manifest.json
+  <run_root>/forecast_chunks/origin_year=<o>/series_kind=<k>/variant_id=<v>/metrics_parcel_forecast_chunk_*.parquet
+  <run_root>/history_chunks/ ...                                           /metrics_parcel_history_chunk_*.parquet
+  <run_root>/agg_chunks/     ...                                           /metrics_<level>_forecast_chunk_00001.parquet
+                                                                             (AGG_FORECAST_MODE="scenario" only)
+
+This script loads finished runs into <schema>:
+  1. inference_runs row (status 'running')
+  2. parcel chunk files, --workers at a time, each as one COPY + staged merge
+     transaction on a pooled connection (transient errors retried per file)
+  3. one aggregate rebuild transaction: scenario aggregates from agg_chunks/
+     (or the exact SQL refresh from the parcel rows), history aggregates,
+     then status 'completed'
+
+Progress is recorded under "publish" in run_manifest.json. Every step is an
+idempotent upsert / slice replace, so a failed publish is simply re-run:
+files already loaded are skipped, nothing is re-sampled. Flat (SINK_MODE="db")
+chunk directories load the same way, e.g. to backfill chunks whose inline
+upsert was skipped.
+
+Usage:
+  SUPABASE_DB_URL=postgresql://... python scripts/inference/publish_run.py SUITE_OR_RUN_DIR [...]
+      [--workers 4] [--schema forecast_...] [--force]
+
+The DB helpers are pulled out of inference_pipeline.py with ast, since
+exec'ing that file runs the whole pipeline.
+"""
+import argparse
+import ast
+import glob
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from psycopg2.extras import execute_values
+
+PIPELINE_PY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inference_pipeline.py")
+sys.path.insert(0, os.path.dirname(PIPELINE_PY))
+from pg_pool import is_transient_pg_error, shared_pool  # noqa: E402
+
+WANT = {
+    "_ts", "_assert_ident", "_q_ident", "_q_table", "_py_scalar", "_const_categorical",
+    "_series_pylist", "_df_records", "_is_transient_pg_error", "_upsert_df_pg",
+    "_copy_df_to_stage", "_copy_upsert_df_pg", "_bulk_upsert_df_pg", "_run_insert_start",
+    "_run_update_status", "_parcel_upsert_cols", "_replace_forecast_aggregate_slice",
+    "_recompute_forecast_aggregates_exact_for_run", "_recompute_history_aggregates_exact_for_run",
+    "_chunk_files", "_read_df_chunk",
+}
+WANT_CONST = {"_IDENT_RE", "AGG_LEVELS", "PG_BATCH_ROWS", "PG_WRITE_MODE",
+              "PG_STATEMENT_TIMEOUT_MS", "PG_TX_MAX_RETRIES", "PG_TX_BACKOFF_BASE"}
+
+with open(PIPELINE_PY) as f:
+    tree = ast.parse(f.read())
+body = [n for n in tree.body
+        if (isinstance(n, ast.FunctionDef) and n.name in WANT)
+        or (isinstance(n, ast.Assign) and any(getattr(t, "id", None) in WANT_CONST for t in n.targets))]
+ns = {
+    "np": np, "pd": pd, "os": os, "re": re, "time": time, "date": date,
+    "execute_values": execute_values, "is_transient_pg_error": is_transient_pg_error,
+}
+exec(compile(ast.Module(body=body, type_ignores=[]), PIPELINE_PY, "exec"), ns)
+_ts = ns["_ts"]
+
+_CHUNK_RE = re.compile(r"^(?P<table>[a-z_]+)_chunk_\d+\.(parquet|csv\.gz)$")
+
+
+def _find_runs(paths):
+    """Run roots (dirs holding run_manifest.json) at or below each path."""
+    roots = []
+    for p in paths:
+        if os.path.isfile(os.path.join(p, "run_manifest.json")):
+            roots.append(p)
+        else:
+            roots.extend(os.path.dirname(m) for m in
+                         sorted(glob.glob(os.path.join(p, "**", "run_manifest.json"), recursive=True)))
+    return roots
+
+
+def _save_manifest(run_root, manifest):
+    fp = os.path.join(run_root, "run_manifest.json")
+    tmp = fp + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, fp)
+
+
+def _parcel_files(run_root):
+    """[(table, path)] for every parcel chunk file of the run."""
+    out = []
+    for sub in ("history_chunks", "forecast_chunks"):
+        for fp in ns["_chunk_files"](os.path.join(run_root, sub)):
+            m = _CHUNK_RE.match(os.path.basename(fp))
+            if m:
+                out.append((m.group("table"), fp))
+    return out
+
+
+def publish_run(run_root, pool, schema=None, workers=4, force=False):
+    with open(os.path.join(run_root, "run_manifest.json")) as f:
+        manifest = json.load(f)
+    pub = manifest.get("publish") or {}
+    if pub.get("status") == "completed" and not force:
+        print(f"[{_ts()}] {run_root}: already published at {pub.get('completed_at_utc')}, skipping (--force to redo)")
+        return pub
+
+    schema = ns["_assert_ident"](schema or manifest["schema"], "schema")
+    run_id = manifest["run_id"]
+    origin_year = int(manifest["origin_year"])
+    as_of_date = date.fromisoformat(manifest["as_of_date"]) if manifest.get("as_of_date") else date.today()
+    jurisdiction = manifest.get("jurisdiction")
+    has_n_col = bool(manifest.get("parcel_forecast_has_n_col", False))
+    ns["S"] = int(manifest["S"])
+    ns["MODEL_VERSION"] = manifest["model_version"]
+    ns["PARCEL_FORECAST_HAS_N_COL"] = has_n_col
+    retries = int(ns["PG_TX_MAX_RETRIES"])
+
+    files_done = set([] if force else pub.get("files_done", []))
+    pub.update({"status": "running", "schema": schema, "started_at_utc": pub.get("started_at_utc") or time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "files_done": sorted(files_done)})
+    manifest["publish"] = pub
+    _save_manifest(run_root, manifest)
+    print(f"[{_ts()}] PUBLISH {manifest['mode']} origin={origin_year} run_id={run_id} -> {schema}")
+
+    # ---- 1) run row ----
+    pool.run_tx(lambda conn: ns["_run_insert_start"](
+        conn=conn, schema=schema, run_id=run_id, level_name="parcel", mode=manifest["mode"],
+        origin_year=origin_year, as_of_date=as_of_date,
+        notes=manifest.get("run_notes") or f"published from {os.path.basename(run_root)}",
+    ), retries=retries, label="run_start")
+
+    # ---- 2) parcel chunks, parallel COPY ----
+    todo = [(t, fp) for t, fp in _parcel_files(run_root) if os.path.relpath(fp, run_root) not in files_done]
+    print(f"[{_ts()}] {len(todo)} chunk files to load ({len(files_done)} already loaded), workers={workers}")
+    rows = {"metrics_parcel_forecast": 0, "metrics_parcel_history": 0}
+    t0 = time.time()
+
+    def _load(table, fp):
+        df = ns["_read_df_chunk"](fp)
+        if df.empty:
+            return table, fp, 0
+        if jurisdiction is not None and "jurisdiction" not in df.columns:
+            df["jurisdiction"] = jurisdiction
+        conflict_cols, update_cols = ns["_parcel_upsert_cols"](table, has_n_col)
+        n = pool.run_tx(lambda conn: ns["_bulk_upsert_df_pg"](conn, schema, table, df, conflict_cols, update_cols),
+                        retries=retries, label=os.path.basename(fp))
+        return table, fp, int(n)
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="publish") as ex:
+        futs = {ex.submit(_load, t, fp): fp for t, fp in todo}
+        for fut in as_completed(futs):
+            fp = futs[fut]
+            try:
+                table, _, n = fut.result()
+            except Exception as exc:
+                print(f"[{_ts()}] ⚠️  {os.path.basename(fp)} failed: {exc}")
+                failed.append(fp)
+                continue
+            rows[table] += n
+            files_done.add(os.path.relpath(fp, run_root))
+            pub["files_done"] = sorted(files_done)
+            _save_manifest(run_root, manifest)
+            print(f"[{_ts()}] {table}: {n:,} rows <- {os.path.relpath(fp, run_root)}")
+    dt = time.time() - t0
+    n_rows = sum(rows.values())
+    print(f"[{_ts()}] Parcel rows: {n_rows:,} in {dt:.1f}s ({n_rows / max(dt, 1e-9):,.0f} rows/s)")
+
+    if failed:
+        pub.update({"status": "failed", "failed_files": [os.path.relpath(fp, run_root) for fp in failed]})
+        _save_manifest(run_root, manifest)
+        raise RuntimeError(f"{len(failed)} chunk files failed to load; re-run publish_run.py {run_root}")
+
+    # ---- 3) one aggregate rebuild + completed ----
+    agg_files = [fp for fp in ns["_chunk_files"](os.path.join(run_root, "agg_chunks"))
+                 if _CHUNK_RE.match(os.path.basename(fp))]
+    has_history = any(t == "metrics_parcel_history" for t, _ in _parcel_files(run_root))
+    ladder_cols = {tbl: col for _, col, tbl, _ in ns["AGG_LEVELS"]}
+
+    def _rebuild(conn):
+        if agg_files:
+            for fp in agg_files:
+                table = _CHUNK_RE.match(os.path.basename(fp)).group("table")
+                n = ns["_replace_forecast_aggregate_slice"](
+                    conn, schema, table, ladder_cols[table], ns["_read_df_chunk"](fp),
+                    origin_year, manifest["series_kind_forecast"], manifest["variant_id"],
+                )
+                print(f"[{_ts()}] Scenario aggregates {table}: {n} rows")
+        else:
+            ns["_recompute_forecast_aggregates_exact_for_run"](
+                conn=conn, schema=schema, run_id=run_id, origin_year=origin_year,
+                series_kind=manifest["series_kind_forecast"], variant_id=manifest["variant_id"],
+                backtest_id=manifest.get("backtest_id"), as_of_date=as_of_date,
+            )
+        if has_history:
+            ns["_recompute_history_aggregates_exact_for_run"](
+                conn=conn, schema=schema, run_id=run_id,
+                series_kind=manifest.get("series_kind_history") or ("history" if manifest["mode"] == "forecast" else "backtest"),
+                variant_id=manifest.get("hist_variant_id") or "__history__",
+                backtest_id=manifest.get("hist_backtest_id"), as_of_date=as_of_date,
+            )
+        ns["_run_update_status"](conn, schema, run_id, "completed")
+
+    t1 = time.time()
+    pool.run_tx(_rebuild, retries=retries, label="aggregate_rebuild")
+    print(f"[{_ts()}] Aggregates rebuilt in {time.time() - t1:.1f}s")
+
+    pub.update({
+        "status": "completed",
+        "completed_at_utc": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "parcel_forecast_rows": int(rows["metrics_parcel_forecast"]),
+        "parcel_history_rows": int(rows["metrics_parcel_history"]),
+        "parcel_load_sec": round(dt, 1),
+        "agg_source": "agg_chunks" if agg_files else "sql_refresh",
+        "pg_pool": pool.stats(),
+    })
+    pub.pop("failed_files", None)
+    _save_manifest(run_root, manifest)
+    print(f"[{_ts()}] PUBLISHED run_id={run_id}")
+    return pub
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Load SINK_MODE='local' inference runs into Postgres")
+    ap.add_argument("paths", nargs="+", help="run roots or suite directories containing them")
+    ap.add_argument("--workers", type=int, default=4, help="parallel COPY transactions")
+    ap.add_argument("--schema", default=None, help="target schema (default: the run manifest's)")
+    ap.add_argument("--force", action="store_true", help="re-load files / runs already published")
+    args = ap.parse_args()
+
+    db_url = (os.environ.get("SUPABASE_DB_URL") or os.environ.get("POSTGRES_URL")
+              or os.environ.get("POSTGRES_URL_NON_POOLING") or "")
+    if not db_url:
+        raise SystemExit("SUPABASE_DB_URL is not set")
+    pool = shared_pool(
+        db_url,
+        maxconn=max(1, args.workers) + 1,
+        init_sql=[f"SET statement_timeout = {int(ns['PG_STATEMENT_TIMEOUT_MS'])}"],
+        connect_retries=int(ns["PG_TX_MAX_RETRIES"]),
+        backoff_base=float(ns["PG_TX_BACKOFF_BASE"]),
+    )
+
+    runs = _find_runs(args.paths)
+    if not runs:
+        raise SystemExit(f"No run_manifest.json under {args.paths}")
+    failed = []
+    for run_root in runs:
+        try:
+            publish_run(run_root, pool, schema=args.schema, workers=args.workers, force=args.force)
+        except Exception as exc:
+            print(f"[{_ts()}] ❌ {run_root}: {exc}")
+            failed.append(run_root)
+    pool.closeall()
+    print(f"[{_ts()}] {len(runs) - len(failed)}/{len(runs)} runs published")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -74,7 +74,7 @@ def _read_parquet_safe(path):
 
 
 def _glob_sorted(pattern):
-    return sorted(glob.glob(pattern))
+    return sorted(glob.glob(pattern, recursive=True))
 
 
 # =============================================================================
@@ -102,13 +102,14 @@ def inventory_chunks(run_dir):
                     pass
         return out
 
+    # "**" also matches the origin_year=/series_kind=/variant_id= partitions of SINK_MODE="local" runs
     hist_files = _parse(
-        _glob_sorted(os.path.join(history_dir, "*.parquet")) +
-        _glob_sorted(os.path.join(history_dir, "*.csv.gz"))
+        _glob_sorted(os.path.join(history_dir, "**", "*.parquet")) +
+        _glob_sorted(os.path.join(history_dir, "**", "*.csv.gz"))
     )
     fc_files = _parse(
-        _glob_sorted(os.path.join(forecast_dir, "*.parquet")) +
-        _glob_sorted(os.path.join(forecast_dir, "*.csv.gz"))
+        _glob_sorted(os.path.join(forecast_dir, "**", "*.parquet")) +
+        _glob_sorted(os.path.join(forecast_dir, "**", "*.csv.gz"))
     )
     return hist_files, fc_files
 
@@ -21,7 +21,7 @@
 # - Default scaled shard dtype float32 (float16 only after stability is proven)
 # - Missing lag fill uses per-lag median (not zeros) in shard build and inference
 
-import os, sys, time, math, json, warnings, hashlib, subprocess, contextlib, inspect, shutil
+import os, sys, time, math, json, warnings, hashlib, subprocess, contextlib, copy, inspect, shutil, threading
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional, Any
 
@@ -140,6 +140,14 @@ PANEL_PATH_DRIVE = "/content/drive/MyDrive/HCAD_Archive_Aggregates/hcad_master_p
 PANEL_PATH_LOCAL = "/content/local_panel.parquet"
 PANEL_PATH = globals().get("PANEL_PATH", PANEL_PATH_LOCAL if os.path.exists(PANEL_PATH_LOCAL) else PANEL_PATH_DRIVE)
 
+# Sort-aware panel index (section 15a): one-pass (acct, yr)-sorted copy + acct -> row-range index
+USE_PANEL_INDEX = bool(globals().get("USE_PANEL_INDEX", True))
+PANEL_INDEX_DIR = globals().get("PANEL_INDEX_DIR", None)   # None -> <SCRATCH_ROOT>/panel_index
+PANEL_INDEX_ROW_GROUP = 65_536
+# Dense (acct x year) tensor cache (section 15b), built from the panel index; np.memmap'd by every consumer
+USE_PANEL_TENSOR = bool(globals().get("USE_PANEL_TENSOR", True))
+PANEL_TENSOR_ACCT_BLOCK = 250_000
+
 OUT_DIR = globals().get("OUT_DIR", "/content/drive/MyDrive/data_backups/world_model_v10_2_fullpanel")
 os.makedirs(OUT_DIR, exist_ok=True)
 
@@ -172,6 +180,8 @@ MAX_ACCTS_DIFFUSION = int(os.environ.get("WM_MAX_ACCTS", "50000"))
 ACCT_CHUNK_SIZE_TRAIN = 300_000
 ACCT_CHUNK_SIZE_INFER = 200_000
 MAX_ROWS_PER_SHARD = 8_000_000
+SHARD_FORMAT = globals().get("SHARD_FORMAT", "cols")  # "cols": dir of mmap-able .npy columns; "npz": legacy pickled
+ORIGIN_SHARD_VIEWS = bool(globals().get("ORIGIN_SHARD_VIEWS", True))  # origin shards = row-index views over master
 
 # Hash bucket sizes (kept for categorical hashing + gating spatial input)
 HASH_BUCKET_SIZE = 32768
@@ -192,6 +202,8 @@ DIFF_BATCH = 131072  # v11 uses more VRAM per batch (gating + tokens); was 52428
 DIFF_LR = 4e-4
 DIFF_EPOCHS = 60
 DIFF_EPOCHS_WARMSTART = 20
+TRAIN_HOLDOUT_FRAC = 0.05         # share of accts (by acct hash) held out of training for early stopping
+TRAIN_HOLDOUT_MAX_ROWS = 50_000   # rows of the held-out views scored each epoch for early stopping
 DIFF_STEPS_TRAIN = 128
 DIFF_STEPS_SAMPLE = 20
 
@@ -217,6 +229,10 @@ SCALE_FLOOR_Y = 3e-2
 SCALE_FLOOR_NUM = 3e-2
 SCALE_FLOOR_TGT = 3e-2
 
+# Streaming scaler statistics (section 8), filled while the master shards are written
+Y_SKETCH_BINS = 4096          # fixed-grid hist_y quantile sketch (bin width = range / bins)
+Y_SKETCH_RANGE = (0.0, 32.0)  # log1p(value) range; values outside count in the edge bins
+
 # Sampling stability controls
 SAMPLER_DISABLE_AUTOCAST = False   # BF16 autocast on A100 — 2× matmul throughput; safe with nan_to_num guards
 SAMPLER_Z_CLIP = 20.0        # conditioning z-score clip (sampling only)
@@ -225,8 +241,48 @@ SAMPLER_X0_CLIP = 50.0       # clamp x0_pred each step
 SAMPLER_X_CLIP = 50.0        # clamp x each step
 SAMPLER_REPORT_BAD_STEP = False    # suppresses per-step GPU→CPU syncs (.item() calls)
 
+# Sampler solver (section 16): "ddim" (first order), "dpmpp_2m" (DPM-Solver++ 2M,
+# second order multistep) or "student" (DDIM on a progressively distilled student
+# checkpoint's own timestep grid, section 16c). SAMPLER_STEPS is how many timesteps
+# of the sampling schedule are walked (None -> DIFF_STEPS_SAMPLE).
+SAMPLER_KIND = globals().get("SAMPLER_KIND", "ddim")
+SAMPLER_STEPS = globals().get("SAMPLER_STEPS", None)
+
+# Per-parcel noise streams (section 16): with noise keys, the sampler's idiosyncratic
+# noise is a counter-based hash of (seed, acct key, scenario, step, horizon), so chunking,
+# prop batch size, S_BLOCK, OOM backoff and resume order never change a parcel's fan.
+SAMPLER_PARCEL_RNG = bool(globals().get("SAMPLER_PARCEL_RNG", True))
+SAMPLER_RUN_SEED = int(globals().get("SAMPLER_RUN_SEED", SEED))
+
+# Progressive distillation (section 16c): each round halves the step count
+DISTILL_EPOCHS = 4                   # epochs per halving round
+DISTILL_LR = 1e-4
+DISTILL_MAX_ROWS_PER_EPOCH = 2_000_000
+
+# CPU sampler profile (section 16b): "bf16" = CPU bf16 autocast on the DDIM steps,
+# "int8" = dynamic int8 nn.Linear layers. The pipeline's SAMPLER_CPU_PROFILE picks one
+# on CPU hosts and only keeps it if the fan accuracy guard passes against fp32.
+CPU_PROFILE_GUARD_PARCELS = 512          # fixed parcel set: first N accts in sorted order
+CPU_PROFILE_GUARD_SEED = 20240601        # shared noise seed for the fp32 / profile fans
+CPU_PROFILE_MAX_MEDIAN_REL_ERR = 0.005   # median |q_profile - q_fp32| / |q_fp32| over all fan cells
+CPU_PROFILE_MAX_P99_REL_ERR = 0.03       # p99 of the same
+CPU_PROFILE_MAX_WIDTH_DRIFT = 0.02       # median |(p90-p10)_profile / (p90-p10)_fp32 - 1|
+
+# Scenario fan reduction (sample_ddim_v11 reducer path)
+FAN_QUANTILES = (0.10, 0.25, 0.50, 0.75, 0.90)
+FAN_WITH_MOMENTS = False     # also emit per-(parcel, horizon) mean/std of price
+FAN_EXCEED_GROWTH = ()       # e.g. (0.0, 0.10): P(price_h > price_anchor * (1 + g))
+
 # Scaled shard dtype
 SCALED_SHARDS_FLOAT16 = False  # keep float32 until stability is proven
+# False: the batch loader scales raw shards per batch (no scaled copy on scratch);
+# True: materialize write_scaled_shards_v102 copies first (previous behaviour)
+TRAIN_WRITE_SCALED_SHARDS = bool(globals().get("TRAIN_WRITE_SCALED_SHARDS", False))
+
+# Training batch loader (section 13b): background gather into pinned buffers
+TRAIN_PREFETCH = bool(globals().get("TRAIN_PREFETCH", True))   # False: same batches, gathered inline
+TRAIN_PREFETCH_WORKERS = 2    # gather threads
+TRAIN_PREFETCH_DEPTH = 4      # batches in flight ahead of the one training
 
 print(f"[{ts()}] HCAD World Model v11.0 FULLPANEL (INDUCING-TOKEN DIFFUSION)")
 print(f"[{ts()}] FULL_PANEL_MODE={FULL_PANEL_MODE} FULL_HORIZON_ONLY={FULL_HORIZON_ONLY}")
@@ -277,6 +333,7 @@ cfg = {
     "SAMPLER_X0_CLIP": float(SAMPLER_X0_CLIP),
     "SAMPLER_X_CLIP": float(SAMPLER_X_CLIP),
     "SCALED_SHARDS_FLOAT16": bool(SCALED_SHARDS_FLOAT16),
+    "TRAIN_WRITE_SCALED_SHARDS": bool(TRAIN_WRITE_SCALED_SHARDS),
 }
 with open(os.path.join(OUT_DIR, "run_config.json"), "w") as f:
     json.dump(cfg, f, indent=2)
@@ -579,10 +636,158 @@ def _np_savez_shard(
         acct=acct.astype(object, copy=False),
     )
 
-def _iter_shards_npz(shard_paths: List[str]):
+# Columnar shards: <stem>.cols/ holds one fixed-width .npy per column plus meta.json.
+# Columns open with np.load(mmap_mode="r"), so reads are page-cache gathers, not a
+# decompress + unpickle of the whole shard. acct is stored as acct_code (int64) into
+# a sorted acct dictionary (.npy, fixed-width unicode) written once per shard build.
+COL_SHARD_VERSION = 1
+
+def _shard_file(shard_dir: str, stem: str, like: Optional[str] = None) -> str:
+    """Shard path for stem in SHARD_FORMAT (or in the same format as the shard `like`)."""
+    cols = _is_col_shard(like) if like is not None else (SHARD_FORMAT == "cols")
+    return os.path.join(shard_dir, f"{stem}.cols" if cols else f"{stem}.npz")
+
+def _is_col_shard(path: str) -> bool:
+    return path.endswith(".cols")
+
+def _write_col_shard(path: str, meta_extra: Optional[Dict[str, Any]] = None, **cols: np.ndarray) -> None:
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    n_rows = None
+    schema = {}
+    for name, arr in cols.items():
+        arr = np.ascontiguousarray(arr)
+        if arr.dtype == object:
+            raise TypeError(f"column shard {path}: '{name}' is dtype=object (dictionary-encode it)")
+        n_rows = int(arr.shape[0]) if n_rows is None else n_rows
+        assert int(arr.shape[0]) == n_rows, f"column shard {path}: '{name}' has {arr.shape[0]} rows != {n_rows}"
+        np.save(os.path.join(tmp, f"{name}.npy"), arr)
+        schema[name] = {"dtype": str(arr.dtype), "shape": list(arr.shape)}
+    meta = {"version": COL_SHARD_VERSION, "n_rows": int(n_rows or 0), "columns": schema}
+    meta.update(meta_extra or {})
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+class ColShard:
+    """Read-only view of a columnar shard; z[name] is an np.memmap (same access pattern as NpzFile)."""
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.files = list(self.meta["columns"])
+        self.n_rows = int(self.meta["n_rows"])
+        self._cache: Dict[str, np.ndarray] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.meta["columns"]
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self._cache:
+            if name not in self.meta["columns"]:
+                raise KeyError(f"{name} is not a column of {self.path}")
+            self._cache[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+        return self._cache[name]
+
+    def accts(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Decode acct_code (optionally for a row subset) through the shard's acct dictionary."""
+        codes = self["acct_code"] if rows is None else self["acct_code"][rows]
+        return _load_acct_dict(self.meta["acct_dict"])[codes]
+
+_ACCT_DICT_CACHE: Dict[str, np.ndarray] = {}
+
+def _load_acct_dict(path: str) -> np.ndarray:
+    if path not in _ACCT_DICT_CACHE:
+        _ACCT_DICT_CACHE[path] = np.load(path, mmap_mode="r")
+    return _ACCT_DICT_CACHE[path]
+
+def _write_acct_dict(shard_dir: str, accts: List[str]) -> str:
+    path = os.path.abspath(os.path.join(shard_dir, "acct_dict.npy"))
+    np.save(path, np.unique(np.asarray([str(a) for a in accts])))
+    _ACCT_DICT_CACHE.pop(path, None)
+    return path
+
+def _save_shard(
+    path: str,
+    acct_dict_path: Optional[str] = None,
+    acct: Optional[np.ndarray] = None,
+    acct_code: Optional[np.ndarray] = None,
+    **arrays: np.ndarray,
+) -> None:
+    """
+    Write a raw training shard (the _np_savez_shard columns) as a columnar shard
+    (path *.cols, acct as acct_code) or as a legacy .npz (acct as object array).
+    """
+    if not _is_col_shard(path):
+        if acct is None:
+            acct = _load_acct_dict(acct_dict_path)[acct_code]
+        _np_savez_shard(path, acct=np.asarray(acct, dtype=object), **arrays)
+        return
+    if acct_code is None:
+        d = _load_acct_dict(acct_dict_path)
+        q = np.asarray([str(a) for a in acct])
+        acct_code = np.searchsorted(d, q)
+        assert bool(np.all(d[np.minimum(acct_code, d.size - 1)] == q)), "acct missing from shard acct dictionary"
+    _write_col_shard(
+        path,
+        meta_extra={"acct_dict": acct_dict_path},
+        hist_y=arrays["hist_y"].astype(np.float32, copy=False),
+        cur_num=arrays["cur_num"].astype(np.float32, copy=False),
+        cur_cat=arrays["cur_cat"].astype(np.int64, copy=False),
+        region_id=arrays["region_id"].astype(np.int64, copy=False),
+        target=arrays["target"].astype(np.float32, copy=False),
+        mask=arrays["mask"].astype(np.float32, copy=False),
+        yr_label=arrays["yr_label"].astype(np.int32, copy=False),
+        y_anchor=arrays["y_anchor"].astype(np.float32, copy=False),
+        anchor_year=arrays["anchor_year"].astype(np.int32, copy=False),
+        acct_code=np.asarray(acct_code, dtype=np.int64),
+    )
+
+class ShardView:
+    """
+    Origin view over a master columnar shard (<stem>.view/): the kept master row ids
+    plus the origin's label rule. Columns are gathered from the master memmaps on
+    access; mask is overridden lazily as mask * (yr_label <= max_label_year), the same
+    rule derive_origin_shards_from_master used to bake into physical copies.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            vmeta = json.load(f)
+        self.base = ColShard(vmeta["base"])
+        self.rows = np.load(os.path.join(path, "rows.npy"), mmap_mode="r")
+        self.max_label_year = int(vmeta["max_label_year"])
+        self.meta = dict(self.base.meta)
+        self.meta.update(vmeta)
+        self.files = [c for c in self.base.files]
+        self.n_rows = int(self.rows.shape[0])
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.base
+
+    def gather(self, name: str, b: Optional[np.ndarray] = None) -> np.ndarray:
+        """Column `name` for view rows b (all rows if None), with the origin mask rule applied."""
+        rows = self.rows if b is None else self.rows[b]
+        out = self.base[name][rows]
+        if name == "mask":
+            allowed = self.base["yr_label"][rows] <= self.max_label_year
+            out = out * allowed.astype(out.dtype)
+        return out
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.gather(name)
+
+def _iter_shards(shard_paths: List[str]):
+    """Yield (path, shard) for columnar (.cols, memmapped), origin-view (.view) or legacy .npz shards."""
     for p in shard_paths:
-        z = np.load(p, allow_pickle=True)
-        yield p, z
+        if _is_col_shard(p):
+            yield p, ColShard(p)
+        elif p.endswith(".view"):
+            yield p, ShardView(p)
+        else:
+            yield p, np.load(p, allow_pickle=True)
 
 # -----------------------------
 # 7) Master shards at max_origin, then derive per-origin shards
@@ -625,7 +830,8 @@ def build_master_training_shards_v102_local(
 
     print(f"[{ts()}] Building MASTER shards at max_origin={origin}")
     print(f"[{ts()}] train_max_year={train_max_year} anchor_cutoff={anchor_cutoff} full_horizon_only={full_horizon_only}")
-    print(f"[{ts()}] shard_dir={shard_dir}")
+    print(f"[{ts()}] shard_dir={shard_dir} format={SHARD_FORMAT}")
+    acct_dict_path = _write_acct_dict(shard_dir, accts)
 
     region_expr = build_region_id_expr()
     cat_hash_exprs = build_cat_hash_exprs(cat_use_local)
@@ -637,6 +843,7 @@ def build_master_training_shards_v102_local(
 
     hist_exprs = [pl.col("y_log").shift(i).over("acct").alias(f"lag_{i}") for i in range(FULL_HIST_LEN)]
     global_medians_accum: Dict[str, List[float]] = {c: [] for c in num_use_local}
+    scaler_stats = ScalerStats(FULL_HIST_LEN, len(num_use_local), H, full_horizon_only=bool(full_horizon_only))
 
     shard_paths: List[str] = []
     shard_id = 0
@@ -671,11 +878,12 @@ def build_master_training_shards_v102_local(
         anchor_year = np.concatenate(buf_ay, axis=0)
         acct_arr = np.concatenate(buf_acct, axis=0).astype(object)
 
-        shard_path = os.path.join(shard_dir, f"shard_{shard_id:05d}.npz")
+        shard_path = _shard_file(shard_dir, f"shard_{shard_id:05d}")
         if shard_id == 0:
             print(f"  [DIAG-RAW] flush shard_0: hist_y={hist_y.shape} cur_num={cur_num.shape} cur_cat={cur_cat.shape} region_id={region_id.shape}")
-        _np_savez_shard(
+        _save_shard(
             shard_path,
+            acct_dict_path=acct_dict_path,
             hist_y=hist_y,
             cur_num=cur_num,
             cur_cat=cur_cat,
@@ -810,6 +1018,11 @@ def build_master_training_shards_v102_local(
                 cur_cat_list.append(np.zeros(n_keep, dtype=np.int64))
         cur_cat = np.column_stack(cur_cat_list).astype(np.int64) if cur_cat_list else np.zeros((n_keep, 0), np.int64)
 
+        scaler_stats.update(
+            _origin_min_for_rows(mask[idx], yr_label[idx], full_horizon_only),
+            hist_y, cur_num, target[idx],
+        )
+
         buf_hist.append(hist_y)
         buf_num.append(cur_num)
         buf_cat.append(cur_cat)
@@ -826,6 +1039,7 @@ def build_master_training_shards_v102_local(
             flush()
 
     flush()
+    scaler_stats_path = scaler_stats.save(shard_dir, shard_paths)
 
     global_medians: Dict[str, float] = {}
     for c in num_use_local:
@@ -839,6 +1053,7 @@ def build_master_training_shards_v102_local(
     dt_all = time.time() - t0_all
     print(f"[{ts()}] MASTER build done shards={len(shard_paths)} n_train={n_train_total:,} time={dt_all:.1f}s")
     print(f"[{ts()}] MASTER max_anchor_year={max_anchor_year_seen} max_label_year_used={max_label_year_used}")
+    print(f"[{ts()}] MASTER scaler stats rows={scaler_stats.n_rows:,} origin_min buckets={sorted(scaler_stats.buckets)}")
 
     return {
         "max_origin": int(origin),
@@ -848,6 +1063,7 @@ def build_master_training_shards_v102_local(
         "max_anchor_year": max_anchor_year_seen,
         "max_label_year_used": int(max_label_year_used),
         "master_dir": shard_dir,
+        "scaler_stats": scaler_stats_path,
     }
 
 def derive_origin_shards_from_master(
@@ -895,11 +1111,12 @@ def derive_origin_shards_from_master(
         yr_label = np.concatenate(buf_yr, axis=0)
         y_anchor = np.concatenate(buf_yanc, axis=0)
         anchor_year = np.concatenate(buf_ay, axis=0)
-        acct_arr = np.concatenate(buf_acct, axis=0).astype(object)
+        acct_arr = np.concatenate(buf_acct, axis=0)
 
-        shard_path = os.path.join(shard_dir, f"shard_{shard_id:05d}.npz")
-        _np_savez_shard(
+        shard_path = _shard_file(shard_dir, f"shard_{shard_id:05d}", like=master_shard_paths[0])
+        _save_shard(
             shard_path,
+            acct_dict_path=acct_dict_path,
             hist_y=hist_y,
             cur_num=cur_num,
             cur_cat=cur_cat,
@@ -909,7 +1126,7 @@ def derive_origin_shards_from_master(
             yr_label=yr_label,
             y_anchor=y_anchor,
             anchor_year=anchor_year,
-            acct=acct_arr,
+            **({"acct_code": acct_arr} if acct_dict_path is not None else {"acct": acct_arr}),
         )
         shard_paths.append(shard_path)
         print(f"[{ts()}] Wrote ORIGIN {os.path.basename(shard_path)} rows={hist_y.shape[0]:,}")
@@ -929,8 +1146,46 @@ def derive_origin_shards_from_master(
 
     t0 = time.time()
     required_max_label = int(origin - 1)
+    acct_dict_path = None
+    master_stats_path = os.path.join(os.path.dirname(master_shard_paths[0]), ScalerStats.FILE) if master_shard_paths else ""
+    master_names = [os.path.basename(p) for p in master_shard_paths]
+    if os.path.exists(os.path.join(shard_dir, ScalerStats.FILE)):
+        os.remove(os.path.join(shard_dir, ScalerStats.FILE))
+
+    # Origin views: only mask / yr_label / anchor_year are read, and each master shard
+    # gets a row-index file instead of a physical copy of its kept rows.
+    if ORIGIN_SHARD_VIEWS and master_shard_paths and all(_is_col_shard(p) for p in master_shard_paths):
+        for view_id, (p, z) in enumerate(_iter_shards(master_shard_paths)):
+            yr_label = np.asarray(z["yr_label"])
+            mask_new = np.asarray(z["mask"]) * (yr_label <= required_max_label).astype(np.float32)
+            if full_horizon_only:
+                keep = (mask_new.sum(axis=1) == float(H))
+            else:
+                keep = (mask_new.sum(axis=1) >= 1.0)
+            idx = np.flatnonzero(keep)
+            if idx.size == 0:
+                continue
+            n_train_total += int(idx.size)
+
+            ay_max = int(np.max(np.asarray(z["anchor_year"])[idx]))
+            if (max_anchor_year_seen is None) or (ay_max > max_anchor_year_seen):
+                max_anchor_year_seen = ay_max
+            yr_used = yr_label[idx][mask_new[idx] > 0.0]
+            if yr_used.size > 0:
+                max_label_year_used = max(max_label_year_used, int(np.max(yr_used)))
+
+            view_path = os.path.join(shard_dir, f"shard_{view_id:05d}.view")
+            _write_col_shard(
+                view_path,
+                meta_extra={"kind": "origin_view", "base": os.path.abspath(p), "origin": origin,
+                            "max_label_year": required_max_label},
+                rows=idx.astype(np.int64),
+            )
+            shard_paths.append(view_path)
+            print(f"[{ts()}] Wrote ORIGIN VIEW {os.path.basename(view_path)} rows={idx.size:,} base={os.path.basename(p)}")
+        master_shard_paths = []   # nothing left for the copying path below
 
-    for _, z in _iter_shards_npz(master_shard_paths):
+    for _, z in _iter_shards(master_shard_paths):
         hist_y = z["hist_y"].astype(np.float32, copy=False)
         cur_num = z["cur_num"].astype(np.float32, copy=False)
         cur_cat = z["cur_cat"].astype(np.int64, copy=False)
@@ -940,7 +1195,11 @@ def derive_origin_shards_from_master(
         yr_label = z["yr_label"].astype(np.int32, copy=False)
         y_anchor = z["y_anchor"].astype(np.float32, copy=False)
         anchor_year = z["anchor_year"].astype(np.int32, copy=False)
-        acct = z["acct"].astype(object, copy=False)
+        if isinstance(z, ColShard):
+            acct = z["acct_code"]
+            acct_dict_path = z.meta["acct_dict"]
+        else:
+            acct = z["acct"].astype(object, copy=False)
 
         if hist_y.shape[0] == 0:
             continue
@@ -990,6 +1249,19 @@ def derive_origin_shards_from_master(
         assert int(max_anchor_year_seen) <= int(origin - 1), f"Anchor leakage (origin): {max_anchor_year_seen} > {origin-1}"
     assert int(max_label_year_used) <= int(origin - 1), f"Label leakage (origin): {max_label_year_used} > {origin-1}"
 
+    # Per-origin scaler stats: merge of the master's origin_min buckets (no data pass).
+    scaler_stats_path = None
+    if master_stats_path and os.path.exists(master_stats_path):
+        mst = ScalerStats.load(master_stats_path)
+        if mst.shards != master_names or mst.full_horizon_only != bool(full_horizon_only):
+            print(f"[{ts()}] WARNING: master scaler stats do not match these shards/full_horizon_only; training will stream them")
+        else:
+            ost = mst.restrict(origin)
+            if ost.n_rows != int(n_train_total):
+                print(f"[{ts()}] WARNING: origin scaler stats rows={ost.n_rows:,} != n_train={n_train_total:,}; training will stream them")
+            else:
+                scaler_stats_path = ost.save(shard_dir, shard_paths)
+
     dt = time.time() - t0
     print(f"[{ts()}] Derived origin shards done origin={origin} shards={len(shard_paths)} n_train={n_train_total:,} time={dt:.1f}s")
     return {
@@ -1000,6 +1272,7 @@ def derive_origin_shards_from_master(
         "max_label_year_used": int(max_label_year_used),
         "required_max_label": int(origin - 1),
         "leakage_free": bool(int(max_label_year_used) <= int(origin - 1)),
+        "scaler_stats": scaler_stats_path,
     }
 
 # -----------------------------
@@ -1017,12 +1290,19 @@ class RunningMeanVar:
             return
         X = X.astype(np.float64, copy=False)
         n_b = int(X.shape[0])
-        mean_b = X.mean(axis=0)
-        var_b = X.var(axis=0)
+        self._merge_moments(n_b, X.mean(axis=0), X.var(axis=0) * n_b)
+
+    def merge(self, other: "RunningMeanVar") -> "RunningMeanVar":
+        """Fold another accumulator in (pairwise Chan update: exact up to float64 rounding)."""
+        if int(other.n) > 0:
+            self._merge_moments(int(other.n), other.mean, other.M2)
+        return self
+
+    def _merge_moments(self, n_b: int, mean_b: np.ndarray, M2_b: np.ndarray) -> None:
         if self.n == 0:
-            self.n = n_b
-            self.mean = mean_b
-            self.M2 = var_b * n_b
+            self.n = int(n_b)
+            self.mean = np.array(mean_b, dtype=np.float64)
+            self.M2 = np.array(M2_b, dtype=np.float64)
             return
         n_a = int(self.n)
         mean_a = self.mean
@@ -1030,7 +1310,7 @@ class RunningMeanVar:
         n = n_a + n_b
         delta = mean_b - mean_a
         mean = mean_a + delta * (float(n_b) / float(n))
-        M2 = M2_a + var_b * n_b + (delta * delta) * (float(n_a) * float(n_b) / float(n))
+        M2 = M2_a + M2_b + (delta * delta) * (float(n_a) * float(n_b) / float(n))
         self.n = n
         self.mean = mean
         self.M2 = M2
@@ -1045,6 +1325,75 @@ class RunningMeanVar:
         std = np.maximum(std, float(scale_floor))
         return self.mean.astype(np.float32), std.astype(np.float32)
 
+class QuantileSketch:
+    """
+    Per-column fixed-grid histogram over [lo, hi). Merging adds counts, so the sketch of
+    a set of rows is the same however they were split across shards, workers or origin
+    buckets. Quantiles interpolate inside a bin (error below one bin width). Non-finite
+    values are skipped; values outside [lo, hi) are counted in the edge bins.
+    """
+    def __init__(self, dim: int, lo: float = Y_SKETCH_RANGE[0], hi: float = Y_SKETCH_RANGE[1],
+                 bins: int = Y_SKETCH_BINS):
+        self.dim = int(dim)
+        self.lo = float(lo)
+        self.hi = float(hi)
+        self.bins = int(bins)
+        self.counts = np.zeros((self.dim, self.bins), dtype=np.int64)
+
+    @property
+    def width(self) -> float:
+        return (self.hi - self.lo) / float(self.bins)
+
+    @property
+    def n(self) -> np.ndarray:
+        return self.counts.sum(axis=1)
+
+    def update(self, X: np.ndarray) -> None:
+        if X.size == 0:
+            return
+        X = np.asarray(X, dtype=np.float64).reshape(-1, self.dim)
+        b = np.floor((X - self.lo) / self.width)
+        ok = np.isfinite(b)
+        b = np.clip(np.where(ok, b, 0.0), 0, self.bins - 1).astype(np.int64)
+        flat = (b + np.arange(self.dim, dtype=np.int64)[None, :] * self.bins)[ok]
+        self.counts += np.bincount(flat, minlength=self.dim * self.bins).reshape(self.dim, self.bins)
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        assert (self.dim, self.lo, self.hi, self.bins) == (other.dim, other.lo, other.hi, other.bins), \
+            "QuantileSketch.merge: grids differ"
+        self.counts += other.counts
+        return self
+
+    def quantile(self, q: float) -> np.ndarray:
+        """Per-column q-quantile (np.percentile's linear rank); NaN for empty columns."""
+        out = np.full((self.dim,), np.nan, dtype=np.float64)
+        cum = np.cumsum(self.counts, axis=1)
+        for j in range(self.dim):
+            n = int(cum[j, -1])
+            if n == 0:
+                continue
+            r = float(q) * float(n - 1)
+            k = int(np.searchsorted(cum[j], r, side="right"))
+            c = int(self.counts[j, k])
+            frac = (r - float(cum[j, k] - c) + 0.5) / float(c)
+            out[j] = self.lo + (float(k) + frac) * self.width
+        return out
+
+    def abs_z_summary(self, mean: np.ndarray, scale: np.ndarray, z_clip: float,
+                      qs: Tuple[float, ...] = (95.0, 99.0, 99.9)) -> Tuple[int, float, List[float]]:
+        """(rows, frac(|z| > z_clip), pooled |z| percentiles) at bin centres, all columns pooled."""
+        centres = self.lo + (np.arange(self.bins, dtype=np.float64) + 0.5) * self.width
+        absz = np.abs((centres[None, :] - np.asarray(mean, np.float64)[:, None]) / np.asarray(scale, np.float64)[:, None])
+        w = self.counts.ravel()
+        total = int(w.sum())
+        if total == 0:
+            return 0, float("nan"), [float("nan")] * len(qs)
+        sat = float(w[absz.ravel() > float(z_clip)].sum()) / float(total)
+        order = np.argsort(absz.ravel(), kind="stable")
+        z_sorted, cw = absz.ravel()[order], np.cumsum(w[order])
+        pct = [float(z_sorted[min(int(np.searchsorted(cw, q / 100.0 * total, side="left")), z_sorted.size - 1)]) for q in qs]
+        return int(self.n.max()), sat, pct
+
 class SimpleScaler:
     def __init__(self, mean: np.ndarray, scale: np.ndarray):
         self.mean_ = mean.astype(np.float32)
@@ -1060,14 +1409,169 @@ class SimpleScaler:
             return X.astype(np.float32)
         return (X.astype(np.float32) * self.scale_ + self.mean_).astype(np.float32)
 
+# Training rows are bucketed by origin_min, the smallest origin whose derived shards keep
+# the row under derive_origin_shards_from_master's rule (mask * (yr_label <= origin - 1)):
+#   full_horizon_only: all H labels valid and max(yr_label) <= origin - 1
+#   otherwise:         some valid label with yr_label <= origin - 1
+# so stats for an origin are the exact merge of buckets with origin_min <= origin.
+_ORIGIN_NEVER = np.iinfo(np.int32).max
+
+def _origin_min_for_rows(mask: np.ndarray, yr_label: np.ndarray, full_horizon_only: bool) -> np.ndarray:
+    mask = np.asarray(mask)
+    yr = np.asarray(yr_label).astype(np.int64)
+    if full_horizon_only:
+        return np.where(mask.sum(axis=1) == float(H), yr.max(axis=1) + 1, _ORIGIN_NEVER)
+    return np.where(mask > 0.0, yr, _ORIGIN_NEVER - 1).min(axis=1) + 1
+
+class ScalerStats:
+    """
+    Streaming scaler statistics for a set of training shards: target and cur_num
+    moments (RunningMeanVar) and a hist_y QuantileSketch, per origin_min bucket.
+    Filled by build_master_training_shards_v102_local while it writes the shards,
+    restricted per origin by derive_origin_shards_from_master (no data pass), and
+    saved as scaler_stats.npz next to the shards it describes.
+    """
+    FILE = "scaler_stats.npz"
+
+    def __init__(self, hist_len: int, num_dim: int, h: int, full_horizon_only: bool):
+        self.hist_len = int(hist_len)
+        self.num_dim = int(num_dim)
+        self.h = int(h)
+        self.full_horizon_only = bool(full_horizon_only)
+        self.buckets: Dict[int, Tuple[RunningMeanVar, RunningMeanVar, QuantileSketch]] = {}
+        self.shards: List[str] = []
+
+    def _bucket(self, key: int) -> Tuple[RunningMeanVar, RunningMeanVar, QuantileSketch]:
+        if key not in self.buckets:
+            self.buckets[key] = (RunningMeanVar(self.h), RunningMeanVar(self.num_dim), QuantileSketch(self.hist_len))
+        return self.buckets[key]
+
+    @property
+    def n_rows(self) -> int:
+        return int(sum(b[0].n for b in self.buckets.values()))
+
+    def update(self, keys: np.ndarray, hist_y: np.ndarray, cur_num: np.ndarray, target: np.ndarray) -> None:
+        keys = np.asarray(keys)
+        for key in np.unique(keys):
+            sel = np.flatnonzero(keys == key)
+            t, nm, ys = self._bucket(int(key))
+            t.update(np.asarray(target)[sel])
+            if self.num_dim > 0:
+                nm.update(np.asarray(cur_num)[sel])
+            ys.update(np.asarray(hist_y)[sel])
+
+    def merge(self, other: "ScalerStats") -> "ScalerStats":
+        for key, (t, nm, ys) in other.buckets.items():
+            mt, mn, my = self._bucket(int(key))
+            mt.merge(t)
+            mn.merge(nm)
+            my.merge(ys)
+        return self
+
+    def totals(self, max_key: Optional[int] = None) -> Tuple[RunningMeanVar, RunningMeanVar, QuantileSketch]:
+        """Merged stats over buckets with key <= max_key (all buckets if None)."""
+        t, nm, ys = RunningMeanVar(self.h), RunningMeanVar(self.num_dim), QuantileSketch(self.hist_len)
+        for key in sorted(self.buckets):
+            if max_key is None or key <= int(max_key):
+                bt, bn, by = self.buckets[key]
+                t.merge(bt)
+                nm.merge(bn)
+                ys.merge(by)
+        return t, nm, ys
+
+    def restrict(self, origin: int) -> "ScalerStats":
+        """Single-bucket stats for the rows derive_origin_shards_from_master keeps at `origin`."""
+        out = ScalerStats(self.hist_len, self.num_dim, self.h, self.full_horizon_only)
+        out.buckets[int(origin)] = self.totals(max_key=int(origin))
+        return out
+
+    def save(self, shard_dir: str, shard_paths: List[str]) -> str:
+        keys = sorted(self.buckets)
+        b = [self.buckets[k] for k in keys]
+        grid = b[0][2] if b else QuantileSketch(self.hist_len)
+        path = os.path.join(shard_dir, self.FILE)
+        tmp = path + ".tmp.npz"
+        np.savez(
+            tmp,
+            dims=np.asarray([self.hist_len, self.num_dim, self.h], dtype=np.int64),
+            full_horizon_only=np.asarray(self.full_horizon_only),
+            keys=np.asarray(keys, dtype=np.int64),
+            n=np.asarray([x[0].n for x in b], dtype=np.int64),
+            t_mean=np.asarray([x[0].mean for x in b], dtype=np.float64).reshape(len(b), self.h),
+            t_M2=np.asarray([x[0].M2 for x in b], dtype=np.float64).reshape(len(b), self.h),
+            num_mean=np.asarray([x[1].mean for x in b], dtype=np.float64).reshape(len(b), self.num_dim),
+            num_M2=np.asarray([x[1].M2 for x in b], dtype=np.float64).reshape(len(b), self.num_dim),
+            y_grid=np.asarray([grid.lo, grid.hi, grid.bins], dtype=np.float64),
+            y_counts=np.asarray([x[2].counts for x in b], dtype=np.int64).reshape(len(b), self.hist_len, grid.bins),
+            shards=np.asarray([os.path.basename(p) for p in shard_paths]),
+        )
+        os.replace(tmp, path)
+        self.shards = [os.path.basename(p) for p in shard_paths]
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "ScalerStats":
+        z = np.load(path, allow_pickle=False)
+        hist_len, num_dim, h = (int(v) for v in z["dims"])
+        out = cls(hist_len, num_dim, h, bool(z["full_horizon_only"]))
+        lo, hi, bins = z["y_grid"]
+        for i, key in enumerate(z["keys"]):
+            t, nm, ys = RunningMeanVar(h), RunningMeanVar(num_dim), QuantileSketch(hist_len, lo, hi, int(bins))
+            n = int(z["n"][i])
+            t.n, t.mean, t.M2 = n, z["t_mean"][i].copy(), z["t_M2"][i].copy()
+            nm.n, nm.mean, nm.M2 = (n if num_dim > 0 else 0), z["num_mean"][i].copy(), z["num_M2"][i].copy()
+            ys.counts = z["y_counts"][i].copy()
+            out.buckets[int(key)] = (t, nm, ys)
+        out.shards = [str(s) for s in z["shards"]]
+        return out
+
+def scaler_stats_for_shards(
+    shard_paths: List[str],
+    num_dim: int,
+    full_horizon_only: Optional[bool] = None,
+) -> ScalerStats:
+    """
+    The ScalerStats saved next to shard_paths (written by the master build / origin
+    derivation) if it covers exactly these shards; otherwise one streaming pass.
+    With full_horizon_only set, the stats must be bucketed by origin_min under that
+    rule (master shards, for per-origin restrict); otherwise one bucket is enough.
+    """
+    names = [os.path.basename(p) for p in shard_paths]
+    path = os.path.join(os.path.dirname(shard_paths[0]), ScalerStats.FILE) if shard_paths else ""
+    if path and os.path.exists(path):
+        st = ScalerStats.load(path)
+        if (st.shards == names and (st.hist_len, st.num_dim, st.h) == (int(FULL_HIST_LEN), int(num_dim), int(H))
+                and (full_horizon_only is None or st.full_horizon_only == bool(full_horizon_only))):
+            print(f"[{ts()}] scaler stats from {path} rows={st.n_rows:,} buckets={sorted(st.buckets)}")
+            return st
+        print(f"[{ts()}] WARNING: {path} does not cover these shards; recomputing in one pass")
+
+    bucketed = full_horizon_only is not None
+    st = ScalerStats(FULL_HIST_LEN, int(num_dim), H,
+                     full_horizon_only=bool(full_horizon_only) if bucketed else bool(FULL_HORIZON_ONLY))
+    for _, z in _iter_shards(shard_paths):
+        hy = np.asarray(z["hist_y"], dtype=np.float32)
+        if hy.shape[0] == 0:
+            continue
+        cn = np.asarray(z["cur_num"], dtype=np.float32)
+        if int(num_dim) > 0 and cn.shape[1] != int(num_dim):
+            print(f"  [DIAG-SCALER] cur_num.shape={cn.shape} vs num_dim={num_dim}")
+        if bucketed:
+            keys = _origin_min_for_rows(np.asarray(z["mask"]), np.asarray(z["yr_label"]), bool(full_horizon_only))
+        else:
+            keys = np.zeros(hy.shape[0], dtype=np.int64)
+        st.update(keys, hy, cn, np.asarray(z["target"], dtype=np.float32))
+    st.shards = names
+    print(f"[{ts()}] scaler stats streamed over {len(shard_paths)} shards rows={st.n_rows:,}")
+    return st
+
 # -----------------------------
 # PATCH D) Robust y_scaler + fail-fast saturation gate
 # -----------------------------
-def _robust_loc_scale(X: np.ndarray, scale_floor: float) -> Tuple[np.ndarray, np.ndarray]:
-    X = X.astype(np.float32, copy=False)
-    med = np.nanmedian(X, axis=0).astype(np.float32)
-    q25 = np.nanpercentile(X, 25, axis=0).astype(np.float32)
-    q75 = np.nanpercentile(X, 75, axis=0).astype(np.float32)
+def _robust_loc_scale(sketch: QuantileSketch, scale_floor: float) -> Tuple[np.ndarray, np.ndarray]:
+    med = sketch.quantile(0.50).astype(np.float32)
+    q25 = sketch.quantile(0.25).astype(np.float32)
+    q75 = sketch.quantile(0.75).astype(np.float32)
     sc = (q75 - q25) / 1.349
     sc = np.where(np.isfinite(sc), sc, float(scale_floor)).astype(np.float32)
     sc = np.maximum(sc, float(scale_floor)).astype(np.float32)
@@ -1080,50 +1584,26 @@ def fit_scalers_from_shards_v102_robust_y(
     scale_floor_y: float,
     scale_floor_num: float,
     scale_floor_tgt: float,
-    max_y_rows: int = 500_000,
+    stats: Optional[ScalerStats] = None,
 ) -> Tuple[SimpleScaler, SimpleScaler, SimpleScaler]:
     """
-    - y_scaler: robust median/IQR computed on a subsample of hist_y rows (fast, stable).
-    - num_scaler + tgt_scaler: mean/std streaming (unchanged).
-    """
-    # Streaming stats for num and target
-    t_stat = RunningMeanVar(H)
-    n_stat = RunningMeanVar(int(num_dim)) if int(num_dim) > 0 else None
-
-    # Subsample for robust y
-    y_samples = []
-    y_rows = 0
-
-    for _, z in _iter_shards_npz(shard_paths):
-        hy = z["hist_y"].astype(np.float32, copy=False)
-        tg = z["target"].astype(np.float32, copy=False)
-        t_stat.update(tg)
-        if n_stat is not None:
-            _cn = z["cur_num"].astype(np.float32, copy=False)
-            if not hasattr(n_stat, '_diag_done'):
-                print(f"  [DIAG-SCALER] first shard cur_num.shape={_cn.shape} vs n_stat.dim={n_stat.dim}")
-                n_stat._diag_done = True
-            n_stat.update(_cn)
-
-        if y_rows < int(max_y_rows) and hy.shape[0] > 0:
-            take = min(int(hy.shape[0]), int(max_y_rows - y_rows))
-            if take > 0:
-                y_samples.append(hy[:take].astype(np.float32, copy=False))
-                y_rows += int(take)
-
-        if y_rows >= int(max_y_rows):
-            break
+    - y_scaler: robust median/IQR per hist_y column from the streaming quantile sketch (all rows).
+    - num_scaler + tgt_scaler: mean/std from the merged streaming moments.
+    stats defaults to scaler_stats_for_shards(shard_paths) (no pass when the build saved them).
+    """
+    if stats is None:
+        stats = scaler_stats_for_shards(shard_paths, int(num_dim))
+    t_stat, n_stat, y_sketch = stats.totals()
 
-    if y_rows <= 0:
+    if int(y_sketch.n.max(initial=0)) <= 0:
         # This should not happen if shards exist, but keep safe.
         y_mu = np.zeros((FULL_HIST_LEN,), dtype=np.float32)
         y_sc = np.full((FULL_HIST_LEN,), float(scale_floor_y), dtype=np.float32)
     else:
-        Y = np.concatenate(y_samples, axis=0).astype(np.float32, copy=False)
-        y_mu, y_sc = _robust_loc_scale(Y, scale_floor=float(scale_floor_y))
+        y_mu, y_sc = _robust_loc_scale(y_sketch, scale_floor=float(scale_floor_y))
 
     t_mu, t_sc = t_stat.finalize(scale_floor=float(scale_floor_tgt))
-    if n_stat is not None:
+    if int(num_dim) > 0:
         n_mu, n_sc = n_stat.finalize(scale_floor=float(scale_floor_num))
     else:
         n_mu = np.zeros((0,), dtype=np.float32)
@@ -1135,39 +1615,22 @@ def assert_y_scaler_contract(
     y_scaler: SimpleScaler,
     shard_paths: List[str],
     z_clip: float = 20.0,
-    max_check_rows: int = 200_000,
     max_sat_frac: float = 0.01,
+    stats: Optional[ScalerStats] = None,
 ) -> None:
     """
     Fail-fast if the standardized hist_y saturates the sampler regime again.
     This is the exact failure you saw (|hy_z|>20 on a large fraction).
+    Checked on every row via the hist_y sketch (|z| at bin centres).
     """
-    checked = 0
-    xs = []
-    for _, z in _iter_shards_npz(shard_paths):
-        hy = z["hist_y"].astype(np.float32, copy=False)
-        if hy.shape[0] == 0:
-            continue
-        take = min(int(hy.shape[0]), int(max_check_rows - checked))
-        if take <= 0:
-            break
-        xs.append(hy[:take])
-        checked += int(take)
-        if checked >= int(max_check_rows):
-            break
+    if stats is None:
+        stats = scaler_stats_for_shards(shard_paths, 0)
+    _, _, y_sketch = stats.totals()
+    checked, sat, (p95, p99, p999) = y_sketch.abs_z_summary(y_scaler.mean_, y_scaler.scale_, float(z_clip))
 
     if checked <= 0:
         raise RuntimeError("assert_y_scaler_contract: no hist_y rows available")
 
-    X = np.concatenate(xs, axis=0).astype(np.float32, copy=False)
-    Z = y_scaler.transform(X).astype(np.float32, copy=False)
-
-    absz = np.abs(Z)
-    sat = float(np.mean(absz > float(z_clip)))
-    p95 = float(np.percentile(absz, 95))
-    p99 = float(np.percentile(absz, 99))
-    p999 = float(np.percentile(absz, 99.9))
-
     print(f"[{ts()}] y_scaler_contract checked_rows={checked:,} sat_frac(|z|>{z_clip})={sat:.6f} absz_p95={p95:.3f} absz_p99={p99:.3f} absz_p99_9={p999:.3f}")
 
     if not np.isfinite(sat) or sat > float(max_sat_frac):
@@ -1189,7 +1652,7 @@ def write_scaled_shards_v102(
     os.makedirs(out_dir_scaled, exist_ok=True)
     out_paths: List[str] = []
 
-    for p, z in _iter_shards_npz(shard_paths_raw):
+    for p, z in _iter_shards(shard_paths_raw):
         hist_y = z["hist_y"].astype(np.float32, copy=False)
         cur_num = z["cur_num"].astype(np.float32, copy=False)
         cur_cat = z["cur_cat"].astype(np.int64, copy=False)
@@ -1224,6 +1687,25 @@ def write_scaled_shards_v102(
         region_id_i = region_id.astype(np.int32, copy=False)
 
         base = os.path.basename(p)
+        if isinstance(z, (ColShard, ShardView)):
+            out_p = os.path.join(out_dir_scaled, os.path.splitext(base)[0] + "_scaled.cols")
+            extra = {"acct_code": np.asarray(z["acct_code"])} if keep_acct else {}
+            _write_col_shard(
+                out_p,
+                meta_extra={"acct_dict": z.meta.get("acct_dict")},
+                hist_y_s=hist_y_s,
+                cur_num_s=cur_num_s,
+                x0_s=x0_s,
+                mask=mask_s,
+                cur_cat=cur_cat_i,
+                region_id=region_id_i,
+                anchor_year=anchor_year,
+                y_anchor=y_anchor,
+                **extra,
+            )
+            out_paths.append(out_p)
+            continue
+
         out_p = os.path.join(out_dir_scaled, base.replace(".npz", "_scaled.npz"))
 
         if keep_acct:
@@ -1504,22 +1986,18 @@ class Conv1dDenoiserV11(nn.Module):
         self._n_scaler = None
         self._t_scaler = None
 
-    def forward(self, x_t, t, hist_y, cur_num, cur_cat, region_id, u_i):
+    def encode_context(self, hist_y, cur_num, cur_cat, region_id):
         """
-        x_t: [B, H] noised target
-        t: [B] diffusion timestep
-        hist_y: [B, hist_len] scaled history
-        cur_num: [B, num_dim] scaled numerics
-        cur_cat: [B, n_cat] categorical indices
-        region_id: [B] region bucket ids
-        u_i: [B, H] per-parcel shared driver from gating network
+        Per-parcel conditioning h_hist + h_num + h_cat + h_region -> [B, hidden].
+        Depends only on the parcel (not on x_t, t or u_i), so the sampler
+        encodes it once per parcel instead of once per scenario x DDIM step.
         """
+        B = hist_y.shape[0]
         h_hist = self.hist_enc(hist_y)
         if cur_num.shape[1] > 0:
             h_num = self.num_enc(cur_num)
         else:
-            h_num = self.num_enc(torch.zeros((x_t.shape[0], 1), device=x_t.device, dtype=x_t.dtype))
-        h_t = self.t_enc(self.t_emb(t))
+            h_num = self.num_enc(torch.zeros((B, 1), device=hist_y.device, dtype=hist_y.dtype))
 
         if cur_cat.shape[1] > 0 and len(self.cat_embs) > 0:
             cat_vecs = []
@@ -1528,23 +2006,49 @@ class Conv1dDenoiserV11(nn.Module):
                 cat_vecs.append(emb(v))
             cat_vec = torch.cat(cat_vecs, dim=1)
         else:
-            cat_vec = torch.zeros((x_t.shape[0], 1), device=x_t.device, dtype=x_t.dtype)
+            cat_vec = torch.zeros((B, 1), device=hist_y.device, dtype=hist_y.dtype)
 
         h_cat = self.cat_enc(cat_vec)
 
         region_vec = self.region_emb(region_id.clamp(0, GEO_BUCKETS - 1).long())
         h_region = self.region_enc(region_vec)
 
+        return h_hist + h_num + h_cat + h_region
+
+    def add_token_cond(self, h_ctx, u_i):
+        """h_ctx [B, hidden] + token conditioning of u_i [B, H]; constant across DDIM steps."""
         # v11: single token conditioning replaces macro + geo
-        h_token = self.token_cond_enc(u_i)
+        return h_ctx + self.token_cond_enc(u_i)
 
-        h_cond = h_hist + h_num + h_cat + h_region + h_token + h_t
+    def forward_step(self, x_t, t, h_static):
+        """
+        Per-step denoiser pass given h_static = add_token_cond(encode_context(...), u_i).
+        Only the timestep embedding and the conv/FiLM stack run here.
+        """
+        h_t = self.t_enc(self.t_emb(t))
+        h_cond = h_static + h_t
 
         x = self.input_proj(x_t.unsqueeze(1))
         for conv, film in zip(self.conv_blocks, self.film_layers):
             x = film(conv(x) + x, h_cond)
         return self.output_proj(x).squeeze(1)
 
+    def forward(self, x_t, t, hist_y, cur_num, cur_cat, region_id, u_i):
+        """
+        x_t: [B, H] noised target
+        t: [B] diffusion timestep
+        hist_y: [B, hist_len] scaled history
+        cur_num: [B, num_dim] scaled numerics
+        cur_cat: [B, n_cat] categorical indices
+        region_id: [B] region bucket ids
+        u_i: [B, H] per-parcel shared driver from gating network
+
+        Same summation order as the fused v11 forward, so outputs (and
+        state_dict keys) are unchanged for existing checkpoints.
+        """
+        h_ctx = self.encode_context(hist_y, cur_num, cur_cat, region_id)
+        return self.forward_step(x_t, t, self.add_token_cond(h_ctx, u_i))
+
 def create_denoiser_v11(target_dim: int, hist_len: int, num_dim: int, n_cat: int) -> nn.Module:
     return Conv1dDenoiserV11(target_dim, hist_len, num_dim, n_cat, DENOISER_HIDDEN, DENOISER_LAYERS, CONV_KERNEL_SIZE)
 
@@ -1584,9 +2088,309 @@ def get_autocast_ctx(device: str):
         return torch.autocast(device_type="cuda", dtype=torch.bfloat16)
     return contextlib.nullcontext()
 
+# -----------------------------
+# 13b) Prefetching shard batch loader
+# -----------------------------
+class ShardBatchLoader:
+    """
+    Minibatch loader over training shards (.cols / .view / .npz).
+
+    Seed contract: for epoch ep, the shard order is
+    default_rng([*seed_key, ep]).permutation(n_shards), and the row order inside
+    the shard at position i is default_rng([*seed_key, ep, i]).permutation(n_rows).
+    Batches are consecutive DIFF_BATCH slices of that row order. The batch sequence
+    therefore depends only on (seed_key, ep, shard contents), never on prefetch
+    settings or thread timing.
+
+    With prefetch on, a one-thread opener decodes the next shard while `workers`
+    threads gather upcoming batches (numpy fancy-indexing releases the GIL) into
+    pinned host tensors, keeping `depth` batches in flight; the training thread only
+    issues non_blocking H2D copies. On CPU-only runs nothing is pinned and the
+    threads overlap shard I/O and gathers with compute.
+
+    affine maps an output name to (mean, scale): that column is gathered as float32,
+    standardized in place as (x - mean) / scale (the same float32 ops as
+    SimpleScaler.transform), then cast to its column dtype (e.g. float16), so raw
+    shards train exactly like write_scaled_shards_v102 copies.
+    """
+    def __init__(
+        self,
+        shard_paths: List[str],
+        columns: Dict[str, Tuple[str, Any]],   # out name -> (shard column, numpy dtype or None)
+        batch_size: int,
+        seed_key: Tuple[int, ...],
+        device: str,
+        prefetch: bool = TRAIN_PREFETCH,
+        workers: int = TRAIN_PREFETCH_WORKERS,
+        depth: int = TRAIN_PREFETCH_DEPTH,
+        affine: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None,
+    ):
+        self.shard_paths = list(shard_paths)
+        self.columns = dict(columns)
+        self.affine = {k: (np.asarray(mu, np.float32), np.asarray(sc, np.float32)) for k, (mu, sc) in (affine or {}).items()}
+        self.batch_size = int(batch_size)
+        self.seed_key = tuple(int(k) for k in seed_key)
+        self.device = device
+        self.prefetch = bool(prefetch)
+        self.workers = max(1, int(workers))
+        self.depth = max(1, int(depth))
+        self.pin = self.prefetch and str(device).startswith("cuda") and torch.cuda.is_available()
+
+    def _open(self, path: str) -> Dict[str, Any]:
+        _, z = next(_iter_shards([path]))
+        if isinstance(z, (ColShard, ShardView)):
+            return {"z": z, "n": int(z.n_rows)}
+        # legacy .npz: decode each needed column once, not once per batch
+        cols = {src: z[src] for src, _ in self.columns.values() if src in z}
+        return {"z": cols, "n": int(next(iter(cols.values())).shape[0]) if cols else 0}
+
+    def _gather(self, shard: Dict[str, Any], b: np.ndarray) -> Dict[str, torch.Tensor]:
+        z = shard["z"]
+        out = {}
+        for name, (src, dtype) in self.columns.items():
+            if src not in z:
+                continue
+            arr = z.gather(src, b) if isinstance(z, ShardView) else z[src][b]   # fancy index: a fresh copy
+            if name in self.affine:
+                mu, sc = self.affine[name]
+                arr = np.asarray(arr, dtype=np.float32)
+                np.subtract(arr, mu, out=arr)
+                np.divide(arr, sc, out=arr)
+            t = torch.from_numpy(np.ascontiguousarray(arr, dtype=dtype))
+            out[name] = t.pin_memory() if self.pin else t
+        return out
+
+    def _to_device(self, host: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+        return {k: v.to(self.device, non_blocking=True) for k, v in host.items()}
+
+    def _plan(self, ep: int, open_shard):
+        order = np.random.default_rng([*self.seed_key, int(ep)]).permutation(len(self.shard_paths))
+        for pos, si in enumerate(order):
+            shard = open_shard(pos, self.shard_paths[int(si)])
+            if shard["n"] == 0:
+                continue
+            perm = np.random.default_rng([*self.seed_key, int(ep), pos]).permutation(shard["n"])
+            for start in range(0, shard["n"], self.batch_size):
+                yield shard, perm[start:start + self.batch_size]
+
+    def epoch(self, ep: int):
+        """Yield device-resident batches {name: tensor} for epoch ep."""
+        if not self.prefetch:
+            for shard, b in self._plan(ep, lambda pos, p: self._open(p)):
+                yield self._to_device(self._gather(shard, b))
+            return
+
+        from collections import deque
+        from concurrent.futures import ThreadPoolExecutor
+
+        opener = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shard_open")
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch_gather")
+        opened: Dict[int, Any] = {}
+        next_order = np.random.default_rng([*self.seed_key, int(ep)]).permutation(len(self.shard_paths))
+
+        def open_shard(pos, path):
+            # decode shard pos now (usually already done) and start decoding the next one
+            fut = opened.pop(pos, None) or opener.submit(self._open, path)
+            order_next = pos + 1
+            if order_next < len(self.shard_paths) and order_next not in opened:
+                nxt = self.shard_paths[int(next_order[order_next])]
+                opened[order_next] = opener.submit(self._open, nxt)
+            return fut.result()
+
+        pending = deque()
+        try:
+            for shard, b in self._plan(ep, open_shard):
+                pending.append(pool.submit(self._gather, shard, b))
+                if len(pending) >= self.depth:
+                    yield self._to_device(pending.popleft().result())
+            while pending:
+                yield self._to_device(pending.popleft().result())
+        finally:
+            for f in pending:
+                f.cancel()
+            pool.shutdown(wait=True)
+            opener.shutdown(wait=True)
+
 # -----------------------------
 # 14) Shard-based diffusion training loop (inducing-token v11)
 # -----------------------------
+EARLY_STOP_PATIENCE = 5
+
+_HOLDOUT_BUCKETS = 10_000
+_ACCT_BUCKET_CACHE: Dict[str, np.ndarray] = {}
+
+def _acct_buckets(accts) -> np.ndarray:
+    """Stable bucket in [0, _HOLDOUT_BUCKETS) per acct string (blake2b of the stripped acct)."""
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(str(a).strip().encode(), digest_size=8).digest(), "little") % _HOLDOUT_BUCKETS
+         for a in accts),
+        dtype=np.int64, count=len(accts),
+    )
+
+def _row_acct_buckets(z) -> np.ndarray:
+    """_acct_buckets for every row of a ColShard / ShardView (hashed once per acct dictionary)."""
+    base = z.base if isinstance(z, ShardView) else z
+    dict_path = base.meta["acct_dict"]
+    if dict_path not in _ACCT_BUCKET_CACHE:
+        _ACCT_BUCKET_CACHE[dict_path] = _acct_buckets(_load_acct_dict(dict_path))
+    codes = base["acct_code"] if not isinstance(z, ShardView) else base["acct_code"][z.rows]
+    return _ACCT_BUCKET_CACHE[dict_path][np.asarray(codes)]
+
+def split_holdout_shards(
+    shard_paths: List[str], frac: float = TRAIN_HOLDOUT_FRAC,
+) -> Tuple[List[str], List[str]]:
+    """
+    (train, holdout) row views over shard_paths: accts whose hash bucket falls below
+    frac go to the holdout, so the split is acct-disjoint and does not depend on the
+    origin having more than one shard. Each input shard (columnar or origin view)
+    gets a train_*.view / holdout_*.view pair under <shard_dir>/holdout_split/; the
+    origin mask rule of an input view carries over. Legacy .npz shards cannot be
+    viewed, so they fall back to holding out the last shard.
+    """
+    frac = float(frac)
+    if frac <= 0.0 or not shard_paths:
+        return list(shard_paths), []
+    if not all(_is_col_shard(p) or p.endswith(".view") for p in shard_paths):
+        if len(shard_paths) <= 1:
+            print(f"[{ts()}] WARNING: one .npz shard, no holdout split possible")
+            return list(shard_paths), []
+        return list(shard_paths[:-1]), list(shard_paths[-1:])
+
+    split_dir = os.path.join(os.path.dirname(shard_paths[0]), "holdout_split")
+    shutil.rmtree(split_dir, ignore_errors=True)
+    os.makedirs(split_dir)
+    cut = int(round(frac * _HOLDOUT_BUCKETS))
+    train, holdout = [], []
+    n_train = n_hold = 0
+    for i, (p, z) in enumerate(_iter_shards(shard_paths)):
+        is_view = isinstance(z, ShardView)
+        rows = np.asarray(z.rows) if is_view else np.arange(z.n_rows, dtype=np.int64)
+        hold = _row_acct_buckets(z) < cut
+        base = z.base.path if is_view else p
+        max_label_year = z.max_label_year if is_view else int(np.iinfo(np.int32).max)
+        for name, sel, out in (("train", ~hold, train), ("holdout", hold, holdout)):
+            if not sel.any():
+                continue
+            view_path = os.path.join(split_dir, f"{name}_{i:05d}.view")
+            _write_col_shard(
+                view_path,
+                meta_extra={"kind": "origin_view", "base": os.path.abspath(base), "source": os.path.abspath(p),
+                            "max_label_year": int(max_label_year), "split": name, "holdout_frac": frac},
+                rows=rows[sel].astype(np.int64),
+            )
+            out.append(view_path)
+        n_hold += int(hold.sum())
+        n_train += int((~hold).sum())
+    print(f"[{ts()}] Holdout split: {frac:.1%} of accts -> {n_hold:,} holdout / {n_train:,} train rows ({split_dir})")
+    if not holdout or not train:
+        return list(shard_paths), []
+    return train, holdout
+
+def _holdout_batches(
+    holdout_paths: List[str],
+    columns: Dict[str, Tuple[str, Any]],
+    affine: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]],
+    device: str,
+    max_rows: int = TRAIN_HOLDOUT_MAX_ROWS,
+) -> List[Dict[str, torch.Tensor]]:
+    """A fixed set of device-resident, standardized batches from the held-out shards (first max_rows rows)."""
+    loader = ShardBatchLoader(holdout_paths, columns, batch_size=int(DIFF_BATCH), seed_key=(int(SEED), -1),
+                              device=device, prefetch=False, affine=affine)
+    out: List[Dict[str, torch.Tensor]] = []
+    n = 0
+    for bt in loader.epoch(0):
+        out.append(bt)
+        n += int(bt["x0"].shape[0])
+        if n >= int(max_rows):
+            break
+    return out
+
+def _v11_holdout_loss(
+    model: nn.Module,
+    gating_net: nn.Module,
+    token_persistence: TokenPersistence,
+    coh_scale: CoherenceScale,
+    sched: "Scheduler",
+    batches: List[Dict[str, torch.Tensor]],
+    num_dim: int,
+    device: str,
+    autocast_ctx,
+    seed: int,
+) -> float:
+    """Row-weighted denoising loss on fixed batches; noise is re-seeded each call so epochs compare like for like."""
+    mods = (model, gating_net, token_persistence, coh_scale)
+    was_training = [m.training for m in mods]
+    for m in mods:
+        m.eval()
+    devices = [torch.device(device).index or 0] if str(device).startswith("cuda") else []
+    tot, n = 0.0, 0
+    with torch.no_grad(), torch.random.fork_rng(devices=devices):
+        torch.manual_seed(int(seed))
+        for bt in batches:
+            x0 = bt["x0"].float()
+            B = int(x0.shape[0])
+            xn = bt["xn"] if int(num_dim) > 0 else torch.zeros((B, 0), device=device, dtype=torch.float32)
+            loss, _ = _v11_denoise_loss(
+                model, gating_net, token_persistence, coh_scale, sched,
+                bt["hy"], xn, x0, bt["m"].float(), bt["xc"], bt["rid"], device, autocast_ctx,
+            )
+            tot += float(loss.item()) * B
+            n += B
+    for m, w in zip(mods, was_training):
+        m.train(w)
+    return tot / max(1, n)
+
+def _train_loss_plateaued(losses: List[float], patience: int = EARLY_STOP_PATIENCE) -> bool:
+    """True when the best of the last `patience` epoch losses is not within 0.1% of the earlier best."""
+    if len(losses) <= int(patience):
+        return False
+    return min(losses[-int(patience):]) > min(losses[:-int(patience)]) * 1.001
+
+def _v11_denoise_loss(
+    model: nn.Module,
+    gating_net: nn.Module,
+    token_persistence: TokenPersistence,
+    coh_scale: CoherenceScale,
+    sched: "Scheduler",
+    hy: torch.Tensor,
+    xn: torch.Tensor,
+    x0: torch.Tensor,
+    m: torch.Tensor,
+    xc: torch.Tensor,
+    rid: torch.Tensor,
+    device: str,
+    autocast_ctx,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Masked structured-noise denoising loss for one standardized batch; returns (loss, alpha)."""
+    B = int(x0.shape[0])
+    # Sample fresh token paths PER BATCH — phi gradients flow through
+    # the AR(1) recurrence via reparameterization trick.
+    # torch.randn terms are constants w.r.t. phi, so autograd works.
+    Z_k = sample_token_paths_learned(
+        K_TOKENS, H, token_persistence.get_phi(), 1, device
+    )  # [1, K, H]
+    Z_k = Z_k.expand(B, -1, -1).clone()  # [B, K, H] — clone() avoids inplace grad error
+
+    eps_idio = torch.randn_like(x0)  # [B, H] idiosyncratic noise
+
+    with autocast_ctx:
+        # Compute per-parcel mixing weights
+        alpha = gating_net(hy.float(), xn.float(), xc, rid)  # [B, K]
+
+        # Compute shared driver with learned coherence scale
+        sigma_u = coh_scale()  # scalar in (0, 2)
+        u_i = compute_shared_driver(alpha, Z_k)  # [B, H]
+        u_i_scaled = sigma_u * u_i
+
+        # Structured noise: ε̃ = sigma_u * u_i + ε_idio
+        noise = u_i_scaled + eps_idio
+
+        t_idx = torch.randint(0, int(DIFF_STEPS_TRAIN), (B,), device=device)
+        xt = sched.q(x0, t_idx, noise)
+        noise_hat = model(xt, t_idx.float(), hy.float(), xn.float(), xc, rid, u_i_scaled)
+        loss = ((noise_hat - noise) ** 2 * m).sum() / (m.sum() + 1e-8)
+    return loss, alpha
+
 def train_diffusion_v11(
     shard_paths: List[str],
     origin: int,
@@ -1599,9 +2403,21 @@ def train_diffusion_v11(
     num_dim: int,
     n_cat: int,
     work_dirs: Dict[str, str],
+    holdout_paths: Optional[List[str]] = None,
+    patience: int = EARLY_STOP_PATIENCE,
 ) -> Tuple[SimpleScaler, SimpleScaler, SimpleScaler, List[float], List[str]]:
+    """
+    holdout_paths (see split_holdout_shards): shards scored every epoch and never
+    trained on; training stops when their loss has not improved for `patience`
+    epochs and the best-epoch weights are restored. Without them the train-loss
+    plateau rule applies. Scalers are fit on shard_paths only, so the holdout
+    stays unseen (one stats pass when shard_paths are split views rather than the
+    origin's shards). Epochs run / best epoch / per-epoch holdout losses
+    are left on model._epochs_used, model._best_epoch and model._val_losses.
+    """
     if not shard_paths:
         raise ValueError(f"No shards for origin {origin}")
+    holdout_paths = list(holdout_paths or [])
 
     phi_init = token_persistence.get_phi_list()
     sigma_init = coh_scale.get_sigma()
@@ -1611,13 +2427,14 @@ def train_diffusion_v11(
     # IMPORTANT: raise the history scale floor to prevent tiny scales from producing huge z-scores
     y_floor = max(float(SCALE_FLOOR_Y), 0.25)
 
+    scaler_stats = scaler_stats_for_shards(list(shard_paths), int(num_dim))
     y_scaler, n_scaler, t_scaler = fit_scalers_from_shards_v102_robust_y(
         shard_paths=shard_paths,
         num_dim=int(num_dim),
         scale_floor_y=float(y_floor),
         scale_floor_num=float(SCALE_FLOOR_NUM),
         scale_floor_tgt=float(SCALE_FLOOR_TGT),
-        max_y_rows=500_000,
+        stats=scaler_stats,
     )
 
     # Fail-fast if we are back in the saturation regime.
@@ -1625,26 +2442,56 @@ def train_diffusion_v11(
         y_scaler=y_scaler,
         shard_paths=shard_paths,
         z_clip=float(SAMPLER_Z_CLIP) if SAMPLER_Z_CLIP is not None else 20.0,
-        max_check_rows=200_000,
         max_sat_frac=0.01,
+        stats=scaler_stats,
     )
 
     model._y_scaler = y_scaler
     model._n_scaler = n_scaler
     model._t_scaler = t_scaler
 
-    scaled_dir = os.path.join(work_dirs["SCALED_SHARD_ROOT"], f"origin_{int(origin)}")
-    scaled_paths = write_scaled_shards_v102(
-        shard_paths_raw=shard_paths,
-        out_dir_scaled=scaled_dir,
-        y_scaler=y_scaler,
-        n_scaler=n_scaler,
-        t_scaler=t_scaler,
-        num_dim=int(num_dim),
-        keep_acct=False,
-        use_float16=bool(SCALED_SHARDS_FLOAT16),
-    )
-    print(f"[{ts()}] Scaled shards ready: {len(scaled_paths)} dir={scaled_dir} float16={SCALED_SHARDS_FLOAT16}")
+    fdt = np.float16 if SCALED_SHARDS_FLOAT16 else np.float32
+    raw_cols = {
+        "hy": ("hist_y", fdt),
+        "xn": ("cur_num", fdt),
+        "x0": ("target", fdt),
+        "m": ("mask", fdt),
+        "xc": ("cur_cat", np.int64),
+        "rid": ("region_id", np.int64),
+    }
+    raw_affine = {
+        "hy": (y_scaler.mean_, y_scaler.scale_),
+        "xn": (n_scaler.mean_, n_scaler.scale_),
+        "x0": (t_scaler.mean_, t_scaler.scale_),
+    }
+    if TRAIN_WRITE_SCALED_SHARDS:
+        scaled_dir = os.path.join(work_dirs["SCALED_SHARD_ROOT"], f"origin_{int(origin)}")
+        scaled_paths = write_scaled_shards_v102(
+            shard_paths_raw=shard_paths,
+            out_dir_scaled=scaled_dir,
+            y_scaler=y_scaler,
+            n_scaler=n_scaler,
+            t_scaler=t_scaler,
+            num_dim=int(num_dim),
+            keep_acct=False,
+            use_float16=bool(SCALED_SHARDS_FLOAT16),
+        )
+        print(f"[{ts()}] Scaled shards ready: {len(scaled_paths)} dir={scaled_dir} float16={SCALED_SHARDS_FLOAT16}")
+        loader_cols = {
+            "hy": ("hist_y_s", None),    # None: keep the shard dtype (float16 shards stay half on the wire)
+            "xn": ("cur_num_s", None),
+            "x0": ("x0_s", None),
+            "m": ("mask", None),
+            "xc": ("cur_cat", np.int64),
+            "rid": ("region_id", np.int64),
+        }
+        loader_affine = None
+    else:
+        # Fused path: raw shards (or origin views) are standardized per batch in the loader.
+        scaled_paths = list(shard_paths)
+        loader_cols = raw_cols
+        loader_affine = raw_affine
+        print(f"[{ts()}] Scaling on the fly from {len(shard_paths)} raw shards (no scaled copy) float16={SCALED_SHARDS_FLOAT16}")
     sys.stdout.flush()
 
     print(f"[{ts()}] Creating scheduler..."); sys.stdout.flush()
@@ -1683,14 +2530,27 @@ def train_diffusion_v11(
     _diag_alpha_entropy_sum = 0.0
     _diag_alpha_count = 0
 
-    scaled_paths_local = list(scaled_paths)
+    loader = ShardBatchLoader(
+        scaled_paths,
+        columns=loader_cols,
+        batch_size=int(DIFF_BATCH),
+        seed_key=(int(SEED), int(origin)),
+        device=device,
+        affine=loader_affine,
+    )
+    print(f"[{ts()}] Batch loader: prefetch={loader.prefetch} workers={loader.workers} depth={loader.depth} pinned={loader.pin} fused_scaling={bool(loader.affine)}")
+
+    val_batches = _holdout_batches(holdout_paths, raw_cols, raw_affine, device) if holdout_paths else []
+    val_losses: List[float] = []
+    best_val, best_ep, best_state = float("inf"), -1, None
+    if val_batches:
+        print(f"[{ts()}] Holdout early stopping: {len(holdout_paths)} shard(s), {sum(int(b['x0'].shape[0]) for b in val_batches):,} rows, patience={patience}")
 
     _total_batches = 0
     print(f"[{ts()}] Starting training loop: {int(epochs)} epochs"); sys.stdout.flush()
 
     for ep in range(int(epochs)):
         t_ep0 = time.time()
-        rng.shuffle(scaled_paths_local)
         ep_losses: List[float] = []
         _diag_alpha_sum = torch.zeros(K_TOKENS, device=device)
         _diag_alpha_sq_sum = torch.zeros(K_TOKENS, device=device)
@@ -1699,107 +2559,78 @@ def train_diffusion_v11(
 
         # (token paths sampled fresh per-batch — no bank refresh needed)
 
-        for _shard_idx, (_, z) in enumerate(_iter_shards_npz(scaled_paths_local)):
-            hist_y_s = z["hist_y_s"]
-            cur_num_s = z["cur_num_s"]
-            x0_s = z["x0_s"]
-            mask = z["mask"]
-            cur_cat = z["cur_cat"].astype(np.int64, copy=False)
-            region_id = z["region_id"].astype(np.int64, copy=False)
-
-            n = int(x0_s.shape[0])
-            if n == 0:
-                continue
-
-            perm = rng.permutation(n)
-
-            for start in range(0, n, int(DIFF_BATCH)):
-                b = perm[start:start + int(DIFF_BATCH)]
-                B = int(b.size)
-                if B == 0:
-                    continue
-
-                hy = torch.from_numpy(hist_y_s[b]).to(device, non_blocking=True)
-                if int(num_dim) > 0:
-                    xn = torch.from_numpy(cur_num_s[b]).to(device, non_blocking=True)
-                else:
-                    xn = torch.zeros((B, 0), device=device, dtype=torch.float32)
-                if _total_batches == 0:
-                    print(f"  [DIAG-TRAIN] batch0: hist_y_s={hist_y_s.shape} cur_num_s={cur_num_s.shape} hy={hy.shape} xn={xn.shape} num_dim_param={num_dim}")
-
-                x0 = torch.from_numpy(x0_s[b]).to(device, non_blocking=True).float()
-                m = torch.from_numpy(mask[b]).to(device, non_blocking=True).float()
-
-                xc = torch.from_numpy(cur_cat[b]).to(device, non_blocking=True)
-                rid = torch.from_numpy(region_id[b]).to(device, non_blocking=True)
-
-                # Sample fresh token paths PER BATCH — phi gradients flow through
-                # the AR(1) recurrence via reparameterization trick.
-                # torch.randn terms are constants w.r.t. phi, so autograd works.
-                Z_k = sample_token_paths_learned(
-                    K_TOKENS, H, token_persistence.get_phi(), 1, device
-                )  # [1, K, H]
-                Z_k = Z_k.expand(B, -1, -1).clone()  # [B, K, H] — clone() avoids inplace grad error
-
-                eps_idio = torch.randn_like(x0)  # [B, H] idiosyncratic noise
-
-                try:
-                    with autocast_ctx:
-                        # Compute per-parcel mixing weights
-                        alpha = gating_net(hy.float(), xn.float(), xc, rid)  # [B, K]
-
-                        # Accumulate diagnostics (detached, no grad impact)
-                        with torch.no_grad():
-                            _diag_alpha_sum += alpha.sum(dim=0)
-                            _diag_alpha_sq_sum += (alpha ** 2).sum(dim=0)
-                            # Entropy: -Σ α log(α+ε)
-                            _diag_alpha_entropy_sum += float(-(alpha * torch.log(alpha + 1e-8)).sum().item())
-                            _diag_alpha_count += B
-
-                        # Compute shared driver with learned coherence scale
-                        sigma_u = coh_scale()  # scalar in (0, 2)
-                        u_i = compute_shared_driver(alpha, Z_k)  # [B, H]
-                        u_i_scaled = sigma_u * u_i
-
-                        # Structured noise: ε̃ = sigma_u * u_i + ε_idio
-                        noise = u_i_scaled + eps_idio
-
-                        t_idx = torch.randint(0, int(DIFF_STEPS_TRAIN), (B,), device=device)
-                        xt = sched.q(x0, t_idx, noise)
-                        noise_hat = model(xt, t_idx.float(), hy.float(), xn.float(), xc, rid, u_i_scaled)
-                        loss = ((noise_hat - noise) ** 2 * m).sum() / (m.sum() + 1e-8)
-
-                    opt.zero_grad(set_to_none=True)
-                    loss.backward()
-                    all_params = [p for pg in param_groups for p in pg["params"]]
-                    torch.nn.utils.clip_grad_norm_(all_params, 1.0)
-                    opt.step()
-
-                    ep_losses.append(float(loss.item()))
-                    _total_batches += 1
-
-                    # Progress: print every 10 batches within an epoch
-                    if _total_batches <= 3 or _total_batches % 10 == 0:
-                        print(f"  batch {_total_batches} ep={ep} loss={float(loss.item()):.5f} B={B}", flush=True)
-
-                except Exception as _batch_err:
-                    print(f"\n❌ TRAINING ERROR at ep={ep} batch={_total_batches} B={B}: {type(_batch_err).__name__}: {_batch_err}", flush=True)
-                    import traceback; traceback.print_exc(); sys.stdout.flush()
-                    raise
+        for bt in loader.epoch(ep):
+            hy = bt["hy"]
+            x0 = bt["x0"].float()
+            m = bt["m"].float()
+            xc = bt["xc"]
+            rid = bt["rid"]
+            B = int(x0.shape[0])
+            if int(num_dim) > 0:
+                xn = bt["xn"]
+            else:
+                xn = torch.zeros((B, 0), device=device, dtype=torch.float32)
+            if _total_batches == 0:
+                print(f"  [DIAG-TRAIN] batch0: hy={tuple(hy.shape)} xn={tuple(xn.shape)} x0={tuple(x0.shape)} num_dim_param={num_dim}")
+
+            try:
+                loss, alpha = _v11_denoise_loss(
+                    model, gating_net, token_persistence, coh_scale, sched,
+                    hy, xn, x0, m, xc, rid, device, autocast_ctx,
+                )
+
+                # Accumulate diagnostics (detached, no grad impact)
+                with torch.no_grad():
+                    _diag_alpha_sum += alpha.sum(dim=0)
+                    _diag_alpha_sq_sum += (alpha ** 2).sum(dim=0)
+                    # Entropy: -Σ α log(α+ε)
+                    _diag_alpha_entropy_sum += float(-(alpha * torch.log(alpha + 1e-8)).sum().item())
+                    _diag_alpha_count += B
+
+                opt.zero_grad(set_to_none=True)
+                loss.backward()
+                all_params = [p for pg in param_groups for p in pg["params"]]
+                torch.nn.utils.clip_grad_norm_(all_params, 1.0)
+                opt.step()
+
+                ep_losses.append(float(loss.item()))
+                _total_batches += 1
+
+                # Progress: print every 10 batches within an epoch
+                if _total_batches <= 3 or _total_batches % 10 == 0:
+                    print(f"  batch {_total_batches} ep={ep} loss={float(loss.item()):.5f} B={B}", flush=True)
+
+            except Exception as _batch_err:
+                print(f"\n❌ TRAINING ERROR at ep={ep} batch={_total_batches} B={B}: {type(_batch_err).__name__}: {_batch_err}", flush=True)
+                import traceback; traceback.print_exc(); sys.stdout.flush()
+                raise
 
         lr_sched.step()
         mean_loss = float(np.mean(ep_losses)) if ep_losses else float("nan")
         losses.append(mean_loss)
 
+        model._epochs_used = ep + 1
+        if val_batches:
+            val_loss = _v11_holdout_loss(
+                model, gating_net, token_persistence, coh_scale, sched, val_batches,
+                int(num_dim), device, autocast_ctx, seed=int(SEED) + int(origin),
+            )
+            val_losses.append(val_loss)
+            wb_log({f"val/loss_origin_{origin}": val_loss, "val/loss": val_loss, "train/epoch": ep + 1})
+            if val_loss < best_val:
+                best_val, best_ep = val_loss, ep
+                best_state = [
+                    {k: v.detach().clone() for k, v in mod.state_dict().items()}
+                    for mod in (model, gating_net, token_persistence, coh_scale)
+                ]
+            elif ep - best_ep >= int(patience):
+                print(f"[{ts()}] ⚠️ Early stopping at epoch {ep+1}: holdout loss {val_loss:.6f} hasn't improved for {patience} epochs (best={best_val:.6f} @ep{best_ep+1})")
+                break
         # v11.1: Early stopping — if loss hasn't improved for PATIENCE epochs, stop.
         # Prevents bad checkpoints (e.g. HCAD o2022 with 3% coverage from overtraining).
-        EARLY_STOP_PATIENCE = 5
-        if len(losses) > EARLY_STOP_PATIENCE:
-            recent_best = min(losses[-EARLY_STOP_PATIENCE:])
-            overall_best = min(losses[:-EARLY_STOP_PATIENCE])
-            if recent_best > overall_best * 1.001:  # no improvement (within 0.1%)
-                print(f"[{ts()}] ⚠️ Early stopping at epoch {ep+1}: loss {mean_loss:.6f} hasn't improved for {EARLY_STOP_PATIENCE} epochs (best={min(losses):.6f})")
-                break
+        elif _train_loss_plateaued(losses, patience=int(patience)):
+            print(f"[{ts()}] ⚠️ Early stopping at epoch {ep+1}: loss {mean_loss:.6f} hasn't improved for {patience} epochs (best={min(losses):.6f})")
+            break
 
         dt_ep = time.time() - t_ep0
 
@@ -1844,12 +2675,619 @@ def train_diffusion_v11(
             log_data[f"tokens/alpha_mean_{k_idx}"] = a_k
         wb_log(log_data)
 
+    if best_state is not None and best_ep + 1 < int(getattr(model, "_epochs_used", 0)):
+        for mod, sd in zip((model, gating_net, token_persistence, coh_scale), best_state):
+            mod.load_state_dict(sd)
+        print(f"[{ts()}] Restored best holdout weights from epoch {best_ep+1} (holdout loss {best_val:.6f})")
+    model._best_epoch = int(best_ep + 1) if best_state is not None else int(getattr(model, "_epochs_used", len(losses)))
+    model._val_losses = val_losses
+
     # Print final learned values
     print(f"[{ts()}] FINAL phi_k = {[f'{p:.4f}' for p in token_persistence.get_phi_list()]}")
     print(f"[{ts()}] FINAL sigma_u = {coh_scale.get_sigma():.4f}")
 
     return y_scaler, n_scaler, t_scaler, losses, scaled_paths
 
+# -----------------------------
+# 14b) Multi-origin joint training (one pass over the master shards per epoch)
+# -----------------------------
+def train_diffusion_v11_multi_origin(
+    master_shard_paths: List[str],
+    origins: List[int],
+    epochs: int,
+    members: Dict[int, Dict[str, nn.Module]],
+    device: str,
+    num_dim: int,
+    n_cat: int,
+    full_horizon_only: bool,
+) -> Dict[int, Dict[str, Any]]:
+    """
+    Train one v11 module set per origin (members[origin] = {"model", "gating_net",
+    "token_persistence", "coh_scale"}) in lock-step over a single pass of the master
+    shards per epoch, instead of one derive + fit + train run per origin.
+
+    Each master batch is gathered and copied to the device once, then routed to every
+    origin whose derived shards would keep the row (derive_origin_shards_from_master's
+    rule, evaluated on device), with that origin's label cutoff applied to the mask
+    and that origin's scalers (the master ScalerStats restricted to the origin, no
+    extra pass). Per-origin batches are the routed subsets of each master batch.
+    Origins stop independently on the same loss plateau rule as train_diffusion_v11.
+
+    Returns {origin: {"y_scaler", "n_scaler", "t_scaler", "losses", "n_train"}}.
+    """
+    if not master_shard_paths:
+        raise ValueError("No master shards for joint training")
+    origins = sorted(int(o) for o in origins)
+    print(f"[{ts()}] train_diffusion_v11_multi_origin origins={origins} shards={len(master_shard_paths)} epochs={epochs}")
+
+    stats = scaler_stats_for_shards(master_shard_paths, int(num_dim), full_horizon_only=bool(full_horizon_only))
+    y_floor = max(float(SCALE_FLOOR_Y), 0.25)
+    sched = Scheduler(DIFF_STEPS_TRAIN, device=device)
+    autocast_ctx = get_autocast_ctx(device)
+
+    def _dev(a: np.ndarray) -> torch.Tensor:
+        return torch.as_tensor(np.asarray(a, dtype=np.float32), device=device)
+
+    state: Dict[int, Dict[str, Any]] = {}
+    for o in origins:
+        ost = stats.restrict(o)
+        if ost.n_rows == 0:
+            print(f"[{ts()}] WARNING: origin={o} has no training rows in the master shards, skipping")
+            continue
+        y_scaler, n_scaler, t_scaler = fit_scalers_from_shards_v102_robust_y(
+            shard_paths=master_shard_paths,
+            num_dim=int(num_dim),
+            scale_floor_y=float(y_floor),
+            scale_floor_num=float(SCALE_FLOOR_NUM),
+            scale_floor_tgt=float(SCALE_FLOOR_TGT),
+            stats=ost,
+        )
+        assert_y_scaler_contract(
+            y_scaler=y_scaler,
+            shard_paths=master_shard_paths,
+            z_clip=float(SAMPLER_Z_CLIP) if SAMPLER_Z_CLIP is not None else 20.0,
+            max_sat_frac=0.01,
+            stats=ost,
+        )
+        mb = members[o]
+        mb["model"]._y_scaler = y_scaler
+        mb["model"]._n_scaler = n_scaler
+        mb["model"]._t_scaler = t_scaler
+        param_groups = [
+            {"params": list(mb["model"].parameters()), "lr": DIFF_LR},
+            {"params": list(mb["gating_net"].parameters()), "lr": DIFF_LR},
+            {"params": list(mb["token_persistence"].parameters()), "lr": DIFF_LR * 10},
+            {"params": list(mb["coh_scale"].parameters()), "lr": DIFF_LR * 5},
+        ]
+        try:
+            opt = torch.optim.AdamW(param_groups, weight_decay=1e-4, fused=True)
+        except TypeError:
+            opt = torch.optim.AdamW(param_groups, weight_decay=1e-4)
+        for k in ("model", "gating_net", "token_persistence", "coh_scale"):
+            mb[k].train()
+        state[o] = {
+            "members": mb,
+            "opt": opt,
+            "lr_sched": torch.optim.lr_scheduler.CosineAnnealingLR(opt, T_max=int(epochs), eta_min=DIFF_LR * 0.1),
+            "params": [p for pg in param_groups for p in pg["params"]],
+            "aff": (_dev(y_scaler.mean_), _dev(y_scaler.scale_), _dev(n_scaler.mean_), _dev(n_scaler.scale_),
+                    _dev(t_scaler.mean_), _dev(t_scaler.scale_)),
+            "scalers": (y_scaler, n_scaler, t_scaler),
+            "n_train": int(ost.n_rows),
+            "losses": [],
+            "stopped": False,
+        }
+        print(f"[{ts()}]   origin={o} n_train={ost.n_rows:,}")
+    if not state:
+        raise ValueError(f"No training rows for any of origins {origins}")
+
+    loader = ShardBatchLoader(
+        master_shard_paths,
+        columns={
+            "hy": ("hist_y", np.float32),
+            "xn": ("cur_num", np.float32),
+            "x0": ("target", np.float32),
+            "m": ("mask", np.float32),
+            "yr": ("yr_label", np.int32),
+            "xc": ("cur_cat", np.int64),
+            "rid": ("region_id", np.int64),
+        },
+        batch_size=int(DIFF_BATCH),
+        seed_key=(int(SEED), int(max(origins))),
+        device=device,
+    )
+    print(f"[{ts()}] Batch loader: prefetch={loader.prefetch} workers={loader.workers} depth={loader.depth} pinned={loader.pin}")
+
+    for ep in range(int(epochs)):
+        live = [o for o in state if not state[o]["stopped"]]
+        if not live:
+            break
+        t_ep0 = time.time()
+        ep_losses: Dict[int, List[float]] = {o: [] for o in live}
+
+        for bt in loader.epoch(ep):
+            for o in live:
+                so = state[o]
+                mb = so["members"]
+                m_o = bt["m"] * (bt["yr"] <= int(o) - 1).to(bt["m"].dtype)
+                cnt = m_o.sum(dim=1)
+                keep = (cnt == float(H)) if full_horizon_only else (cnt >= 1.0)
+                idx = keep.nonzero(as_tuple=True)[0]
+                if int(idx.numel()) == 0:
+                    continue
+                y_mu, y_sc, n_mu, n_sc, t_mu, t_sc = so["aff"]
+                hy = (bt["hy"][idx] - y_mu) / y_sc
+                x0 = (bt["x0"][idx] - t_mu) / t_sc
+                if int(num_dim) > 0:
+                    xn = (bt["xn"][idx] - n_mu) / n_sc
+                else:
+                    xn = torch.zeros((int(idx.numel()), 0), device=device, dtype=torch.float32)
+
+                loss, _ = _v11_denoise_loss(
+                    mb["model"], mb["gating_net"], mb["token_persistence"], mb["coh_scale"], sched,
+                    hy, xn, x0, m_o[idx], bt["xc"][idx], bt["rid"][idx], device, autocast_ctx,
+                )
+                so["opt"].zero_grad(set_to_none=True)
+                loss.backward()
+                torch.nn.utils.clip_grad_norm_(so["params"], 1.0)
+                so["opt"].step()
+                ep_losses[o].append(float(loss.item()))
+
+        dt_ep = time.time() - t_ep0
+        log_data = {"train/epoch": ep + 1}
+        for o in live:
+            so = state[o]
+            so["lr_sched"].step()
+            mean_loss = float(np.mean(ep_losses[o])) if ep_losses[o] else float("nan")
+            so["losses"].append(mean_loss)
+            log_data[f"train/loss_origin_{o}"] = mean_loss
+            if _train_loss_plateaued(so["losses"]):
+                so["stopped"] = True
+                print(f"[{ts()}] ⚠️ origin={o} early stop at epoch {ep+1}: best={min(so['losses']):.6f}")
+        print(f"[{ts()}] joint ep={ep+1}/{epochs} {dt_ep:.0f}s/ep " +
+              " ".join(f"o{o}={state[o]['losses'][-1]:.5f}" for o in live), flush=True)
+        wb_log(log_data)
+
+    out: Dict[int, Dict[str, Any]] = {}
+    for o, so in state.items():
+        y_scaler, n_scaler, t_scaler = so["scalers"]
+        tp, cs = so["members"]["token_persistence"], so["members"]["coh_scale"]
+        print(f"[{ts()}] origin={o} FINAL epochs={len(so['losses'])} phi_k={[f'{p:.4f}' for p in tp.get_phi_list()]} sigma_u={cs.get_sigma():.4f}")
+        out[o] = {
+            "y_scaler": y_scaler,
+            "n_scaler": n_scaler,
+            "t_scaler": t_scaler,
+            "losses": so["losses"],
+            "n_train": so["n_train"],
+        }
+    return out
+
+# -----------------------------
+# 15a) Sort-aware panel index (one pass; row-group reads instead of full scans)
+# -----------------------------
+PANEL_INDEX_FORMAT = 1
+PANEL_INDEX = None
+_PANEL_INDEX_LOCK = threading.Lock()
+
+def _ranges_to_index(starts: np.ndarray, lens: np.ndarray) -> np.ndarray:
+    """Concatenate arange(s, s+n) for every (s, n) without a Python loop."""
+    lens = np.asarray(lens, dtype=np.int64)
+    tot = int(lens.sum())
+    if tot == 0:
+        return np.zeros(0, dtype=np.int64)
+    offs = np.cumsum(lens) - lens
+    return np.repeat(np.asarray(starts, dtype=np.int64) - offs, lens) + np.arange(tot, dtype=np.int64)
+
+class SortedPanelIndex:
+    """
+    Copy of the panel sorted by (acct, yr) in fixed-size row groups, plus an
+    acct -> [start, stop) row-range index. Rows of one acct are contiguous and
+    year-ordered, so a lookup reads only the row groups holding those accts.
+    """
+    def __init__(self, path: str, accts: np.ndarray, starts: np.ndarray, stops: np.ndarray,
+                 rg_starts: np.ndarray, stamp: str):
+        self.path = path
+        self.accts = accts
+        self.starts = starts
+        self.stops = stops
+        self.rg_starts = rg_starts  # [n_row_groups + 1], last = n_rows
+        self.stamp = stamp
+
+    @staticmethod
+    def source_stamp(panel_path: str) -> str:
+        st = os.stat(panel_path)
+        return f"v{PANEL_INDEX_FORMAT}:{int(st.st_size)}:{int(st.st_mtime)}:{int(PANEL_INDEX_ROW_GROUP)}"
+
+    @classmethod
+    def build(cls, panel_path: str, index_dir: str) -> "SortedPanelIndex":
+        import pyarrow.parquet as pq
+
+        os.makedirs(index_dir, exist_ok=True)
+        sorted_path = os.path.join(index_dir, "panel_sorted.parquet")
+        t0 = time.time()
+        (
+            pl.scan_parquet(panel_path)
+            .filter(pl.col("acct").is_not_null())
+            .with_columns(pl.col("acct").cast(pl.Utf8).alias("acct"))
+            .sort(["acct", "yr"], maintain_order=True)
+            .sink_parquet(sorted_path + ".tmp", row_group_size=int(PANEL_INDEX_ROW_GROUP))
+        )
+        os.replace(sorted_path + ".tmp", sorted_path)
+
+        acct = pl.read_parquet(sorted_path, columns=["acct"])["acct"].to_numpy().astype(str)
+        n = int(acct.shape[0])
+        brk = np.flatnonzero(acct[1:] != acct[:-1]) + 1
+        starts = np.concatenate([[0], brk]).astype(np.int64) if n else np.zeros(0, np.int64)
+        stops = np.concatenate([brk, [n]]).astype(np.int64) if n else np.zeros(0, np.int64)
+        keys = acct[starts]
+        if keys.size > 1 and not bool(np.all(keys[1:] > keys[:-1])):
+            raise RuntimeError("sorted panel acct order does not match numpy string order")
+
+        md = pq.ParquetFile(sorted_path).metadata
+        rg_rows = np.array([md.row_group(i).num_rows for i in range(md.num_row_groups)], dtype=np.int64)
+        rg_starts = np.concatenate([[0], np.cumsum(rg_rows)]).astype(np.int64)
+
+        idx = cls(sorted_path, keys, starts, stops, rg_starts, cls.source_stamp(panel_path))
+        np.savez(os.path.join(index_dir, "panel_index.tmp.npz"), accts=keys, starts=starts, stops=stops,
+                 rg_starts=rg_starts, stamp=np.asarray(idx.stamp))
+        os.replace(os.path.join(index_dir, "panel_index.tmp.npz"), os.path.join(index_dir, "panel_index.npz"))
+        print(f"[{ts()}] Panel index built: rows={n:,} accts={keys.size:,} row_groups={md.num_row_groups} "
+              f"time={time.time() - t0:.1f}s -> {index_dir}")
+        return idx
+
+    @classmethod
+    def load(cls, index_dir: str) -> Optional["SortedPanelIndex"]:
+        ipath = os.path.join(index_dir, "panel_index.npz")
+        spath = os.path.join(index_dir, "panel_sorted.parquet")
+        if not (os.path.exists(ipath) and os.path.exists(spath)):
+            return None
+        with np.load(ipath, allow_pickle=False) as z:
+            return cls(spath, z["accts"], z["starts"], z["stops"], z["rg_starts"], str(z["stamp"]))
+
+    def row_ranges(self, accts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """[start, stop) row ranges of the requested accts present in the panel, in file order."""
+        q = np.unique(np.asarray([str(a) for a in accts]))
+        if q.size == 0 or self.accts.size == 0:
+            return np.zeros(0, np.int64), np.zeros(0, np.int64)
+        pos = np.minimum(np.searchsorted(self.accts, q), self.accts.size - 1)
+        pos = pos[self.accts[pos] == q]
+        return self.starts[pos], self.stops[pos]
+
+    def read(self, accts: List[str], columns: List[str]) -> Optional[pl.DataFrame]:
+        """Rows of the requested accts (sorted by acct, yr), reading only the row groups that hold them."""
+        starts, stops = self.row_ranges(accts)
+        if starts.size == 0:
+            return None
+        return self._read_rows(starts, stops, columns)
+
+    def read_acct_range(self, a0: int, a1: int, columns: List[str]) -> pl.DataFrame:
+        """Rows of index accts a0:a1 (positions in self.accts), in file order."""
+        return self._read_rows(self.starts[a0:a1], self.stops[a0:a1], columns)
+
+    def _read_rows(self, starts: np.ndarray, stops: np.ndarray, columns: List[str]) -> pl.DataFrame:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        rg_first = np.searchsorted(self.rg_starts, starts, side="right") - 1
+        rg_last = np.searchsorted(self.rg_starts, stops - 1, side="right") - 1
+        rgs = np.unique(_ranges_to_index(rg_first, rg_last - rg_first + 1))
+
+        tbl = pq.ParquetFile(self.path).read_row_groups(rgs.tolist(), columns=columns)
+        rg_rows = np.diff(self.rg_starts)
+        table_rows = _ranges_to_index(self.rg_starts[rgs], rg_rows[rgs])   # global row id of each read row
+        local = np.searchsorted(table_rows, _ranges_to_index(starts, stops - starts))
+        return pl.from_arrow(tbl.take(pa.array(local)))
+
+def get_panel_index(panel_path: Optional[str] = None, index_dir: Optional[str] = None) -> Optional[SortedPanelIndex]:
+    """
+    Process-wide SortedPanelIndex for PANEL_PATH, built once and reused while the
+    source panel is unchanged. Returns None when disabled or when it cannot be
+    built (callers then fall back to full lazy scans).
+    """
+    global PANEL_INDEX
+    if not USE_PANEL_INDEX:
+        return None
+    panel_path = panel_path or PANEL_PATH
+    index_dir = index_dir or PANEL_INDEX_DIR or os.path.join(work_dirs["SCRATCH_ROOT"], "panel_index")
+    with _PANEL_INDEX_LOCK:
+        try:
+            stamp = SortedPanelIndex.source_stamp(panel_path)
+            if PANEL_INDEX is not None and PANEL_INDEX.stamp == stamp:
+                return PANEL_INDEX
+            idx = SortedPanelIndex.load(index_dir)
+            if idx is None or idx.stamp != stamp:
+                print(f"[{ts()}] Panel index missing or stale in {index_dir}; building (one pass over {panel_path})")
+                idx = SortedPanelIndex.build(panel_path, index_dir)
+            PANEL_INDEX = idx
+            return idx
+        except Exception as e:
+            print(f"[{ts()}] WARNING panel index unavailable ({e}); using full panel scans")
+            return None
+
+def _panel_index_columns(num_use_local: List[str], cat_use_local: List[str]) -> List[str]:
+    """Source columns the context builder needs (features + region id inputs)."""
+    want = ["acct", "yr", "tot_appr_val"] + list(num_use_local) + list(cat_use_local)
+    if GEO_COL:
+        want.append(GEO_COL)
+    elif HAS_LATLON:
+        want += ["gis_lat", "gis_lon"]
+    return [c for c in dict.fromkeys(want) if c in cols_set]
+
+def dense_hist_lags(acct_sorted: np.ndarray, y: np.ndarray, rows: np.ndarray, hist_len: int) -> np.ndarray:
+    """
+    Lag matrix [len(rows), hist_len] (oldest -> newest, last column = y[row]) for
+    rows of a frame sorted by (acct, yr), from one scatter into a dense
+    (acct, observation) grid and a sliding-window view. Identical to
+    shift(i).over("acct") for i in 0..hist_len-1 (missing -> NaN).
+    """
+    n = int(acct_sorted.shape[0])
+    if n == 0 or rows.size == 0:
+        return np.zeros((int(rows.size), int(hist_len)), dtype=np.float32)
+    brk = np.flatnonzero(acct_sorted[1:] != acct_sorted[:-1]) + 1
+    grp_start = np.concatenate([[0], brk]).astype(np.int64)
+    code = np.repeat(np.arange(grp_start.size), np.diff(np.concatenate([grp_start, [n]])))
+    rank = np.arange(n, dtype=np.int64) - grp_start[code]
+    L = int(hist_len)
+    grid = np.full((grp_start.size, int(rank.max()) + L), np.nan, dtype=np.float64)
+    grid[code, rank + L - 1] = y
+    win = np.lib.stride_tricks.sliding_window_view(grid, L, axis=1)   # [G, max_rank+1, L]
+    return win[code[rows], rank[rows]].astype(np.float32)
+
+def _context_rows_from_panel_index(
+    pidx: SortedPanelIndex,
+    acct_chunk: List[str],
+    read_cols: List[str],
+    anchor_year: int,
+    region_expr: pl.Expr,
+    cat_hash_exprs: List[pl.Expr],
+) -> Tuple[Optional[pl.DataFrame], Optional[np.ndarray]]:
+    raw = pidx.read(acct_chunk, read_cols)
+    if raw is None or len(raw) == 0:
+        return None, None
+    df_all = (
+        raw.lazy()
+        .filter(pl.col("yr").is_between(MIN_YEAR, int(anchor_year)))
+        .filter(pl.col("tot_appr_val") > 0)
+        .with_columns([
+            pl.col("acct").cast(pl.Utf8).alias("acct"),
+            pl.col("yr").cast(pl.Int32).alias("yr"),
+            pl.col("tot_appr_val").log1p().alias("y_log"),
+        ])
+        .with_columns([region_expr] + cat_hash_exprs)
+        .collect()
+    )
+    if len(df_all) == 0:
+        return None, None
+    is_anchor = df_all["yr"].to_numpy() == int(anchor_year)
+    rows = np.flatnonzero(is_anchor)
+    hist_mat = dense_hist_lags(
+        df_all["acct"].to_numpy(), df_all["y_log"].to_numpy().astype(np.float64), rows, FULL_HIST_LEN
+    )
+    return df_all.filter(pl.Series(is_anchor)), hist_mat
+
+# -----------------------------
+# 15b) Dense (acct x year) panel tensor (memmap; shared by inference, history and actuals)
+# -----------------------------
+PANEL_TENSOR_FORMAT = 1
+PANEL_TENSOR = None
+
+class PanelTensor:
+    """
+    Dense on-disk arrays over (acct, year), acct axis = SortedPanelIndex.accts:
+      price   [A, Y] float64  raw tot_appr_val (NaN = no row); last row wins on duplicates
+      y_log   [A, Y] float32  log1p(tot_appr_val) of rows with tot_appr_val > 0
+      num     [A, Y, F] float32, cat [A, Y, C] int32 (hashed), region [A, Y] int32,
+              taken from the same rows as y_log
+      dup     [A] uint8  acct has duplicate (acct, yr) rows
+    Each array is an .npy opened with mmap_mode="r", so consumers slice it zero-copy.
+    """
+    ARRAYS = ("price", "y_log", "num", "cat", "region", "dup")
+
+    def __init__(self, tensor_dir: str, meta: Dict[str, Any], pidx: SortedPanelIndex):
+        self.dir = tensor_dir
+        self.meta = meta
+        self.pidx = pidx
+        self.year0 = int(meta["year0"])
+        self.n_years = int(meta["n_years"])
+        self.num_cols = list(meta["num_cols"])
+        self.cat_cols = list(meta["cat_cols"])
+        for name in self.ARRAYS:
+            setattr(self, name, np.load(os.path.join(tensor_dir, f"{name}.npy"), mmap_mode="r"))
+
+    @staticmethod
+    def _stamp(pidx: SortedPanelIndex, num_cols: List[str], cat_cols: List[str]) -> str:
+        cols_key = hashlib.md5(json.dumps([num_cols, cat_cols, GEO_COL, SEED]).encode()).hexdigest()[:12]
+        return f"t{PANEL_TENSOR_FORMAT}:{pidx.stamp}:{cols_key}"
+
+    @classmethod
+    def build(cls, pidx: SortedPanelIndex, tensor_dir: str, num_cols: List[str], cat_cols: List[str]) -> "PanelTensor":
+        num_cols = [c for c in num_cols if c in cols_set]
+        cat_cols = [c for c in cat_cols if c in cols_set]
+        os.makedirs(tensor_dir, exist_ok=True)
+        t0 = time.time()
+
+        yr_rng = pl.scan_parquet(pidx.path).select([pl.col("yr").min().alias("lo"), pl.col("yr").max().alias("hi")]).collect()
+        year0, year1 = int(yr_rng["lo"][0]), int(yr_rng["hi"][0])
+        A, Y, n_num, n_cat = int(pidx.accts.size), year1 - year0 + 1, len(num_cols), len(cat_cols)
+
+        def _mm(name, dtype, shape, fill):
+            arr = np.lib.format.open_memmap(os.path.join(tensor_dir, f"{name}.npy"), mode="w+", dtype=dtype, shape=shape)
+            arr[...] = fill
+            return arr
+
+        price = _mm("price", np.float64, (A, Y), np.nan)
+        y_log = _mm("y_log", np.float32, (A, Y), np.nan)
+        num = _mm("num", np.float32, (A, Y, n_num), np.nan)
+        cat = _mm("cat", np.int32, (A, Y, n_cat), 0)
+        region = _mm("region", np.int32, (A, Y), 0)
+        dup = _mm("dup", np.uint8, (A,), 0)
+
+        read_cols = _panel_index_columns(num_cols, cat_cols)
+        region_expr = build_region_id_expr()
+        cat_hash_exprs = build_cat_hash_exprs(cat_cols)
+        for a0 in range(0, A, int(PANEL_TENSOR_ACCT_BLOCK)):
+            a1 = min(A, a0 + int(PANEL_TENSOR_ACCT_BLOCK))
+            blk = pidx.read_acct_range(a0, a1, read_cols).with_columns(
+                pl.Series("_aid", np.repeat(np.arange(a0, a1), pidx.stops[a0:a1] - pidx.starts[a0:a1]))
+            )
+
+            allr = blk.unique(subset=["_aid", "yr"], keep="last", maintain_order=True)
+            aid = allr["_aid"].to_numpy()
+            yi = allr["yr"].to_numpy().astype(np.int64) - year0
+            price[aid, yi] = allr["tot_appr_val"].cast(pl.Float64).to_numpy()
+
+            pos = (
+                blk.filter(pl.col("tot_appr_val") > 0)
+                .with_columns([pl.col("tot_appr_val").log1p().alias("y_log"), region_expr] + cat_hash_exprs)
+            )
+            n_per = pos.group_by(["_aid", "yr"]).len()
+            dup[n_per.filter(pl.col("len") > 1)["_aid"].unique().to_numpy()] = 1
+            pos = pos.unique(subset=["_aid", "yr"], keep="last", maintain_order=True)
+            aid = pos["_aid"].to_numpy()
+            yi = pos["yr"].to_numpy().astype(np.int64) - year0
+            y_log[aid, yi] = pos["y_log"].to_numpy().astype(np.float32)
+            region[aid, yi] = pos["region_id"].to_numpy().astype(np.int32)
+            for j, c in enumerate(num_cols):
+                num[aid, yi, j] = pos[c].cast(pl.Float32).to_numpy()
+            for j, c in enumerate(cat_cols):
+                cat[aid, yi, j] = pos[f"cat_{c}"].to_numpy().astype(np.int32)
+            print(f"[{ts()}] Panel tensor accts {a0:,}:{a1:,} rows={len(blk):,}")
+
+        for arr in (price, y_log, num, cat, region, dup):
+            arr.flush()
+        meta = {
+            "stamp": cls._stamp(pidx, num_cols, cat_cols),
+            "year0": year0, "n_years": Y, "num_cols": num_cols, "cat_cols": cat_cols,
+        }
+        with open(os.path.join(tensor_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        print(f"[{ts()}] Panel tensor built: A={A:,} years={year0}-{year1} F={n_num} C={n_cat} "
+              f"time={time.time() - t0:.1f}s -> {tensor_dir}")
+        return cls(tensor_dir, meta, pidx)
+
+    @classmethod
+    def load(cls, tensor_dir: str, pidx: SortedPanelIndex) -> Optional["PanelTensor"]:
+        mpath = os.path.join(tensor_dir, "meta.json")
+        if not os.path.exists(mpath):
+            return None
+        with open(mpath) as f:
+            meta = json.load(f)
+        if not all(os.path.exists(os.path.join(tensor_dir, f"{n}.npy")) for n in cls.ARRAYS):
+            return None
+        return cls(tensor_dir, meta, pidx)
+
+    def ids_for(self, accts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(acct strings, tensor row ids) for the requested accts present in the panel, acct-sorted."""
+        q = np.unique(np.asarray([str(a) for a in accts]))
+        keys = self.pidx.accts
+        if q.size == 0 or keys.size == 0:
+            return q[:0], np.zeros(0, np.int64)
+        pos = np.minimum(np.searchsorted(keys, q), keys.size - 1)
+        hit = keys[pos] == q
+        return q[hit], pos[hit].astype(np.int64)
+
+    def year_slice(self, year_min: int, year_max: int) -> Tuple[int, int]:
+        lo = max(int(year_min), self.year0)
+        hi = min(int(year_max), self.year0 + self.n_years - 1)
+        return lo - self.year0, hi - self.year0 + 1
+
+    def covers(self, num_use_local: List[str], cat_use_local: List[str]) -> bool:
+        """True if every feature the caller needs (and the panel has) is in the tensor."""
+        have_n, have_c = set(self.num_cols), set(self.cat_cols)
+        return (all(c in have_n for c in num_use_local if c in cols_set)
+                and all(c in have_c for c in cat_use_local if c in cols_set))
+
+def get_panel_tensor(num_cols: Optional[List[str]] = None, cat_cols: Optional[List[str]] = None) -> Optional[PanelTensor]:
+    """
+    Process-wide PanelTensor next to the panel index, (re)built when the index or
+    the feature set changes. None when disabled or unavailable.
+    """
+    global PANEL_TENSOR
+    if not USE_PANEL_TENSOR:
+        return None
+    pidx = get_panel_index()
+    if pidx is None:
+        return None
+    num_cols = [c for c in (num_use if num_cols is None else num_cols) if c in cols_set]
+    cat_cols = [c for c in (cat_use if cat_cols is None else cat_cols) if c in cols_set]
+    stamp = PanelTensor._stamp(pidx, num_cols, cat_cols)
+    tensor_dir = os.path.join(os.path.dirname(pidx.path), "tensor")
+    with _PANEL_INDEX_LOCK:
+        try:
+            if PANEL_TENSOR is not None and PANEL_TENSOR.meta.get("stamp") == stamp:
+                return PANEL_TENSOR
+            pt = PanelTensor.load(tensor_dir, pidx)
+            if pt is None or pt.meta.get("stamp") != stamp:
+                print(f"[{ts()}] Panel tensor missing or stale in {tensor_dir}; building")
+                pt = PanelTensor.build(pidx, tensor_dir, num_cols, cat_cols)
+            PANEL_TENSOR = pt
+            return pt
+        except Exception as e:
+            print(f"[{ts()}] WARNING panel tensor unavailable ({e}); using panel reads")
+            return None
+
+def last_k_observed(V: np.ndarray, k: int) -> np.ndarray:
+    """
+    [n, Y] year grid (NaN = no row) -> [n, k] of each row's last k observed values,
+    right-aligned (oldest -> newest), NaN-padded on the left. Equals
+    shift(i).over("acct") lags for accts without duplicate (acct, yr) rows.
+    """
+    n = int(V.shape[0])
+    out = np.full((n, int(k)), np.nan, dtype=np.float32)
+    if n == 0 or V.shape[1] == 0:
+        return out
+    M = np.isfinite(V)
+    from_right = np.cumsum(M[:, ::-1], axis=1)[:, ::-1]   # observed values at or after column j
+    col = int(k) - from_right
+    r, j = np.nonzero(M & (col >= 0))
+    out[r, col[r, j]] = V[r, j]
+    return out
+
+def _context_rows_from_panel_tensor(
+    pt: PanelTensor,
+    acct_chunk: List[str],
+    num_use_local: List[str],
+    cat_use_local: List[str],
+    anchor_year: int,
+) -> Tuple[Optional[pl.DataFrame], Optional[np.ndarray], List[str]]:
+    """
+    Anchor rows + raw lag matrix for acct_chunk straight from the tensor.
+    Accts with duplicate (acct, yr) rows are returned separately (third item)
+    for the row-level path, since their lags are not a function of the year grid.
+    """
+    acct, ids = pt.ids_for(acct_chunk)
+    a_idx = int(anchor_year) - pt.year0
+    if ids.size == 0 or not (0 <= a_idx < pt.n_years):
+        return None, None, []
+    is_dup = np.asarray(pt.dup[ids]).astype(bool)
+    fallback = acct[is_dup].tolist()
+    acct, ids = acct[~is_dup], ids[~is_dup]
+
+    y_anc = np.asarray(pt.y_log[ids, a_idx])
+    ok = np.isfinite(y_anc)
+    acct, ids, y_anc = acct[ok], ids[ok], y_anc[ok]
+    if ids.size == 0:
+        return None, None, fallback
+
+    y0, _ = pt.year_slice(MIN_YEAR, anchor_year)
+    hist_mat = last_k_observed(np.asarray(pt.y_log[ids, y0:a_idx + 1]), FULL_HIST_LEN)
+
+    cols = {
+        "acct": acct,
+        "y_log": y_anc.astype(np.float64),
+        "region_id": np.asarray(pt.region[ids, a_idx]).astype(np.int64),
+    }
+    num_pos = {c: j for j, c in enumerate(pt.num_cols)}
+    cat_pos = {c: j for j, c in enumerate(pt.cat_cols)}
+    anc_num = np.asarray(pt.num[ids, a_idx]) if num_pos else None
+    anc_cat = np.asarray(pt.cat[ids, a_idx]) if cat_pos else None
+    for c in num_use_local:
+        if c in num_pos:
+            cols[c] = anc_num[:, num_pos[c]]
+    for c in cat_use_local:
+        cols[f"cat_{c}"] = anc_cat[:, cat_pos[c]].astype(np.int64) if c in cat_pos else np.zeros(ids.size, np.int64)
+    return pl.DataFrame(cols), hist_mat, fallback
+
 # -----------------------------
 # 15) Chunked inference context builder (no future labels)
 # -----------------------------
@@ -1865,6 +3303,7 @@ def build_inference_context_chunked_v102(
     anchor_year: int,
     acct_chunk_size: int = ACCT_CHUNK_SIZE_INFER,
     max_parcels: Optional[int] = None,
+    panel_index: Optional[SortedPanelIndex] = None,
 ) -> Optional[Dict[str, Any]]:
     if global_medians is None:
         global_medians = {}
@@ -1875,6 +3314,14 @@ def build_inference_context_chunked_v102(
     cat_hash_exprs = build_cat_hash_exprs(cat_use_local)
     hist_exprs = [pl.col("y_log").shift(i).over("acct").alias(f"lag_{i}") for i in range(FULL_HIST_LEN)]
 
+    # Sorted panel index: read only the row groups of each chunk, lags from a dense grid
+    pidx = panel_index if panel_index is not None else get_panel_index()
+    read_cols = _panel_index_columns(num_use_local, cat_use_local) if pidx is not None else None
+    # Dense tensor: anchors, lags and features sliced from memmaps (row path only for duplicate-row accts)
+    ptensor = get_panel_tensor() if pidx is not None and panel_index is None else None
+    if ptensor is not None and not ptensor.covers(num_use_local, cat_use_local):
+        ptensor = None
+
     hist_buf: List[np.ndarray] = []
     num_buf: List[np.ndarray] = []
     cat_buf: List[np.ndarray] = []
@@ -1888,26 +3335,58 @@ def build_inference_context_chunked_v102(
         if not acct_chunk:
             continue
 
-        base_q = (
-            lf
-            .filter(pl.col("acct").cast(pl.Utf8).is_in(acct_chunk))
-            .filter(pl.col("yr").is_between(MIN_YEAR, int(anchor_year)))
-            .filter(pl.col("tot_appr_val") > 0)
-            .with_columns([
-                pl.col("acct").cast(pl.Utf8).alias("acct"),
-                pl.col("yr").cast(pl.Int32).alias("yr"),
-                pl.col("tot_appr_val").log1p().alias("y_log"),
-            ])
-            .sort(["acct", "yr"])
-            .with_columns(hist_exprs + [region_expr] + cat_hash_exprs)
-        )
+        if ptensor is not None:
+            df, hist_mat, dup_accts = _context_rows_from_panel_tensor(
+                ptensor, acct_chunk, num_use_local, cat_use_local, int(anchor_year)
+            )
+            if dup_accts:
+                df_d, hist_d = _context_rows_from_panel_index(
+                    pidx, dup_accts, read_cols, int(anchor_year), region_expr, cat_hash_exprs
+                )
+                if df_d is not None and len(df_d) > 0:
+                    keep = ["acct", "y_log", "region_id"] + [c for c in num_use_local if c in df_d.columns] \
+                        + [f"cat_{c}" for c in cat_use_local]
+                    df_d = df_d.select(keep).with_columns(
+                        [pl.col("y_log").cast(pl.Float64), pl.col("region_id").cast(pl.Int64)]
+                        + [pl.col(c).cast(pl.Float32) for c in num_use_local if c in df_d.columns]
+                        + [pl.col(f"cat_{c}").cast(pl.Int64) for c in cat_use_local]
+                    )
+                    if df is None:
+                        df, hist_mat = df_d, hist_d
+                    else:
+                        df = pl.concat([df, df_d.select(df.columns)], how="vertical")
+                        hist_mat = np.concatenate([hist_mat, hist_d], axis=0)
+                        order = np.argsort(df["acct"].to_numpy().astype(str), kind="stable")
+                        df, hist_mat = df[order], hist_mat[order]
+            if df is None or len(df) == 0:
+                continue
+        elif pidx is not None:
+            df, hist_mat = _context_rows_from_panel_index(
+                pidx, acct_chunk, read_cols, int(anchor_year), region_expr, cat_hash_exprs
+            )
+            if df is None or len(df) == 0:
+                continue
+        else:
+            base_q = (
+                lf
+                .filter(pl.col("acct").cast(pl.Utf8).is_in(acct_chunk))
+                .filter(pl.col("yr").is_between(MIN_YEAR, int(anchor_year)))
+                .filter(pl.col("tot_appr_val") > 0)
+                .with_columns([
+                    pl.col("acct").cast(pl.Utf8).alias("acct"),
+                    pl.col("yr").cast(pl.Int32).alias("yr"),
+                    pl.col("tot_appr_val").log1p().alias("y_log"),
+                ])
+                .sort(["acct", "yr"])
+                .with_columns(hist_exprs + [region_expr] + cat_hash_exprs)
+            )
 
-        df = base_q.filter(pl.col("yr") == int(anchor_year)).collect()
-        if len(df) == 0:
-            continue
+            df = base_q.filter(pl.col("yr") == int(anchor_year)).collect()
+            if len(df) == 0:
+                continue
 
-        hist_cols = [f"lag_{i}" for i in range(FULL_HIST_LEN - 1, -1, -1)]
-        hist_mat = np.column_stack([df[c].to_numpy().astype(np.float32) for c in hist_cols]).astype(np.float32)
+            hist_cols = [f"lag_{i}" for i in range(FULL_HIST_LEN - 1, -1, -1)]
+            hist_mat = np.column_stack([df[c].to_numpy().astype(np.float32) for c in hist_cols]).astype(np.float32)
         hist_mat = fill_hist_lags_no_zeros(hist_mat, fallback_value=float(Y_FALLBACK_LOG1P))
         hist_y = hist_mat.astype(np.float32)
 
@@ -1983,6 +3462,189 @@ def build_inference_context_chunked_v102(
 # -----------------------------
 # 16) Stable coherent DDIM sampler (float32 + guards + clipping)
 # -----------------------------
+def sampler_timesteps(T: int, steps: int) -> np.ndarray:
+    """Descending timestep grid: `steps` evenly spaced indices of a T-step schedule (T-1 ... 0)."""
+    idx = np.linspace(0, int(T) - 1, max(1, int(steps))).round().astype(int)
+    return np.unique(idx)[::-1].copy()
+
+_M32 = 0xFFFFFFFF
+
+def _mul32(x: torch.Tensor, c: int) -> torch.Tensor:
+    """(x * c) mod 2^32 for int64 tensors holding uint32 values, without int64 overflow."""
+    lo, hi = int(c) & 0xFFFF, (int(c) >> 16) & 0xFFFF
+    return (x * lo + (((x * hi) & 0xFFFF) << 16)) & _M32
+
+def _mix32(x: torch.Tensor) -> torch.Tensor:
+    """lowbias32 integer hash, elementwise on int64 tensors holding uint32 values."""
+    x = x & _M32
+    x = x ^ (x >> 16)
+    x = _mul32(x, 0x7FEB352D)
+    x = x ^ (x >> 15)
+    x = _mul32(x, 0x846CA68B)
+    return x ^ (x >> 16)
+
+def acct_noise_keys(accts) -> np.ndarray:
+    """
+    Stable 64-bit per-account noise keys: blake2b (8 bytes) of the stripped account
+    string, as an (N, 2) int64 array of uint32 words (lo, hi).
+    """
+    out = np.empty((len(accts), 2), dtype=np.int64)
+    for i, a in enumerate(accts):
+        d = int.from_bytes(hashlib.blake2b(str(a).strip().encode(), digest_size=8).digest(), "little")
+        out[i, 0], out[i, 1] = d & _M32, d >> 32
+    return out
+
+def parcel_noise(
+    seed: int, keys: torch.Tensor, s0: int, n_s: int, n_h: int, step: int, device: str,
+) -> torch.Tensor:
+    """
+    Standard normals [N, n_s, n_h] for parcels `keys` (acct_noise_keys), scenarios
+    s0 .. s0+n_s-1 and denoising step `step`. Each value is a pure function of
+    (seed, key, scenario, step, horizon): two hashed uniforms through Box-Muller,
+    so any split of parcels or scenarios into batches reproduces the same draws.
+
+    Counters are folded in by hashing (_mix32(state + _mix32(counter))), never
+    XOR, and the 64-bit key is carried as two independently seeded 32-bit lanes,
+    so distinct parcels do not share (or permute) noise vectors.
+    """
+    kw = torch.as_tensor(keys, dtype=torch.int64).to(device).reshape(-1, 2)
+    seed = int(seed) & _M32
+    lanes = []
+    for lane in (1, 2):
+        k = _mix32(kw[:, 0] + _mix32(torch.tensor((seed ^ (lane * 0x9E3779B9)) & _M32, device=device, dtype=torch.int64)))
+        k = _mix32(kw[:, 1] + k)
+        lanes.append(k)
+    sc = torch.arange(int(s0), int(s0) + int(n_s), device=device, dtype=torch.int64)
+    x1 = _mix32(lanes[0][:, None] + _mix32(sc)[None, :]).unsqueeze(2)                  # [N, n_s, 1]
+    x2 = _mix32(lanes[1][:, None] + _mix32(sc + 0x85EBCA6B)[None, :]).unsqueeze(2)
+    c = 2 * (int(step) * int(n_h) + torch.arange(int(n_h), device=device, dtype=torch.int64))
+
+    def _u(ctr):
+        m = _mix32(ctr)
+        return (_mix32(x1 + m) ^ _mix32(x2 + _mix32(m))).double() + 0.5
+
+    u1 = _u(c) / 4294967296.0
+    u2 = _u(c + 1) / 4294967296.0
+    return (torch.sqrt(-2.0 * torch.log(u1)) * torch.cos(2.0 * math.pi * u2)).float()
+
+def _clipped_x0_pred(x: torch.Tensor, noise_hat: torch.Tensor, abar: torch.Tensor) -> torch.Tensor:
+    """x0 implied by a (guarded, clipped) noise prediction at abar, itself guarded and clipped."""
+    noise_hat = torch.nan_to_num(noise_hat, nan=0.0, posinf=0.0, neginf=0.0)
+    noise_hat = noise_hat.clamp(-float(SAMPLER_NOISE_CLIP), float(SAMPLER_NOISE_CLIP))
+    x0_pred = (x - torch.sqrt(1.0 - abar).clamp(min=1e-6) * noise_hat) / torch.sqrt(abar).clamp(min=1e-6)
+    x0_pred = torch.nan_to_num(x0_pred, nan=0.0, posinf=0.0, neginf=0.0)
+    return x0_pred.clamp(-float(SAMPLER_X0_CLIP), float(SAMPLER_X0_CLIP))
+
+def _ddim_step(
+    x: torch.Tensor, noise_hat: torch.Tensor, abar: torch.Tensor, abar_prev: torch.Tensor, last: bool,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """One deterministic (eta=0) DDIM step with the sampler's finite guards and clips; returns (x_next, x0_pred)."""
+    noise_hat = torch.nan_to_num(noise_hat, nan=0.0, posinf=0.0, neginf=0.0)
+    noise_hat = noise_hat.clamp(-float(SAMPLER_NOISE_CLIP), float(SAMPLER_NOISE_CLIP))
+    x0_pred = _clipped_x0_pred(x, noise_hat, abar)
+    if last:
+        x = x0_pred
+    else:
+        x = torch.sqrt(abar_prev).clamp(min=0.0) * x0_pred + torch.sqrt(1.0 - abar_prev).clamp(min=0.0) * noise_hat
+    x = torch.nan_to_num(x, nan=0.0, posinf=0.0, neginf=0.0)
+    return x.clamp(-float(SAMPLER_X_CLIP), float(SAMPLER_X_CLIP)), x0_pred
+
+def _dpmpp_2m_step(
+    x: torch.Tensor, x0_pred: torch.Tensor, abar: torch.Tensor, abar_prev: torch.Tensor, prev, last: bool,
+) -> Tuple[torch.Tensor, Any]:
+    """
+    One DPM-Solver++(2M) step (data prediction, VP schedule: alpha = sqrt(abar),
+    sigma = sqrt(1 - abar), lambda = log(alpha / sigma)). prev is (x0_pred, h) of
+    the previous step or None (first-order step). The last step (into abar_prev = 1)
+    returns x0_pred, like DDIM. Returns (x_next, prev for the next step).
+    """
+    if last:
+        return x0_pred, None
+    a, s = torch.sqrt(abar), torch.sqrt(1.0 - abar).clamp(min=1e-6)
+    a_n, s_n = torch.sqrt(abar_prev), torch.sqrt(1.0 - abar_prev).clamp(min=1e-6)
+    h = torch.log(a_n / s_n) - torch.log(a / s)
+    if prev is None:
+        d = x0_pred
+    else:
+        x0_last, h_last = prev
+        r = h_last / h
+        d = (1.0 + 0.5 / r) * x0_pred - (0.5 / r) * x0_last
+    x_next = (s_n / s) * x - a_n * torch.expm1(-h) * d
+    return x_next, (x0_pred, h)
+
+class ScenarioFanReducer:
+    """
+    Per-parcel fan reducer fed by sample_ddim_v11 one S-block at a time.
+    Blocks stay on device and are reduced with an exact sort once all S
+    scenarios of the current parcel batch are in, so the host only ever sees
+    [N, Q, H] quantiles (plus optional moments / exceedance), never [N, S, H].
+    Quantiles use the same linear interpolation as np.percentile.
+    """
+    def __init__(
+        self,
+        y_anchor: np.ndarray,
+        quantiles=FAN_QUANTILES,
+        with_moments: bool = FAN_WITH_MOMENTS,
+        exceed_growth=FAN_EXCEED_GROWTH,
+        sinks=(),
+    ):
+        self.y_anchor = np.asarray(y_anchor, dtype=np.float32)
+        # sinks: callables fed the full float64 price block [N, S, H] (on device)
+        # before it is reduced, e.g. per-geography scenario sums
+        self.sinks = tuple(sinks or ())
+        self.quantiles = tuple(float(q) for q in quantiles)
+        self.with_moments = bool(with_moments)
+        self.exceed_growth = tuple(float(g) for g in (exceed_growth or ()))
+        self._blocks: List[torch.Tensor] = []
+        self._ya_t = None
+
+    def reset(self) -> None:
+        self._blocks = []
+        self._ya_t = None
+
+    def update(self, s0: int, deltas_blk: torch.Tensor) -> None:
+        """deltas_blk: [N, sb, H] unscaled log-deltas on device for scenarios s0:s0+sb."""
+        if self._ya_t is None:
+            self._ya_t = torch.from_numpy(self.y_anchor).to(deltas_blk.device)
+        # same float32 y-level arithmetic as the cube path, then float64 prices
+        y_blk = self._ya_t[:, None, None] + deltas_blk.float()
+        self._blocks.append(torch.expm1(y_blk.double()))
+
+    def finalize(self) -> Dict[str, Any]:
+        n_q = len(self.quantiles)
+        if not self._blocks:
+            N = int(self.y_anchor.shape[0])
+            return {"quantiles": np.zeros((N, n_q, H), dtype=np.float64), "q_levels": self.quantiles, "n_scenarios": 0}
+
+        price = torch.cat(self._blocks, dim=1) if len(self._blocks) > 1 else self._blocks[0]  # [N, S, H]
+        self._blocks = []
+        for sink in self.sinks:
+            sink(price)
+        N, S_local, H_local = price.shape
+        srt, _ = torch.sort(price, dim=1)
+
+        pos = torch.tensor(self.quantiles, device=price.device, dtype=torch.float64) * float(S_local - 1)
+        lo = pos.floor().long()
+        hi = pos.ceil().long()
+        frac = (pos - lo.double()).view(1, -1, 1)
+        q_lo = srt.index_select(1, lo)
+        q_hi = srt.index_select(1, hi)
+        out = {
+            "quantiles": (q_lo + (q_hi - q_lo) * frac).cpu().numpy(),  # [N, Q, H]
+            "q_levels": self.quantiles,
+            "n_scenarios": int(S_local),
+        }
+        if self.with_moments:
+            out["mean"] = price.mean(dim=1).cpu().numpy()
+            out["std"] = price.std(dim=1, unbiased=False).cpu().numpy()
+        if self.exceed_growth:
+            p_anchor = torch.expm1(self._ya_t.double()).view(N, 1)
+            exc = [(price > (p_anchor * (1.0 + g)).unsqueeze(1)).double().mean(dim=1) for g in self.exceed_growth]
+            out["exceed"] = torch.stack(exc, dim=1).cpu().numpy()  # [N, G, H]
+            out["exceed_growth"] = self.exceed_growth
+        self._ya_t = None
+        return out
+
 @torch.no_grad()
 def sample_ddim_v11(
     model: nn.Module,
@@ -1995,11 +3657,27 @@ def sample_ddim_v11(
     Z_tokens: torch.Tensor,    # [S, K, H] pre-sampled token paths
     device: str,
     coh_scale: CoherenceScale = None,  # optional: if None, sigma_u=1.0
-) -> np.ndarray:
+    reducer: ScenarioFanReducer = None,  # optional: stream S-blocks into a fan reducer
+    kind: Optional[str] = None,          # SAMPLER_KIND when None
+    steps: Optional[int] = None,         # SAMPLER_STEPS / DIFF_STEPS_SAMPLE when None
+    noise_keys: Optional[np.ndarray] = None,  # (N, 2) acct_noise_keys: per-parcel noise streams
+    noise_seed: Optional[int] = None,         # SAMPLER_RUN_SEED when None
+):
     """
     v11 DDIM sampler with inducing-token coherence and S-block chunking.
     Processes scenarios in blocks of S_BLOCK to keep peak VRAM proportional
     to N * S_BLOCK, not N * S.
+
+    kind="dpmpp_2m" swaps the DDIM update for DPM-Solver++(2M) on the same
+    timestep grid; a distilled student (model._sampler_t_idx set) is always
+    walked with DDIM on its own grid, whatever kind/steps say.
+
+    With noise_keys the idiosyncratic noise comes from parcel_noise keyed by
+    (noise_seed, parcel key, scenario index), not the global torch RNG, so a
+    parcel's paths depend only on its inputs, Z_tokens and the seed.
+
+    Returns deltas (N, S, H) as numpy, or reducer.finalize() when a reducer
+    is given (no (N, S, H) host buffer is allocated in that case).
     """
     model.eval()
     gating_net.eval()
@@ -2008,7 +3686,7 @@ def sample_ddim_v11(
     S = int(Z_tokens.shape[0])
     K = int(Z_tokens.shape[1])
     if N == 0:
-        return np.zeros((0, S, H), dtype=np.float32)
+        return reducer.finalize() if reducer is not None else np.zeros((0, S, H), dtype=np.float32)
 
     # Coherence scale
     sigma_u = 1.0
@@ -2033,34 +3711,62 @@ def sample_ddim_v11(
     print(f"[{ts()}] SAMPLER v11 conditioning absmax hy={hy_absmax:.3f} xn={xn_absmax:.3f} "
           f"N={N} S={S} K={K} S_BLOCK={sb} sigma_u={sigma_u:.3f}")
 
-    # Move conditioning to device (shared across all S-blocks)
-    hy = torch.from_numpy(hy_np).pin_memory().to(device=device, dtype=torch.float32, non_blocking=True)
-    xn = torch.from_numpy(xn_np).pin_memory().to(device=device, dtype=torch.float32, non_blocking=True) if xn_np.shape[1] > 0 else torch.zeros((N, 0), device=device, dtype=torch.float32)
-    xc = torch.from_numpy(cur_cat_b.astype(np.int64)).pin_memory().to(device=device, non_blocking=True)
-    rid = torch.from_numpy(region_id_b.astype(np.int64)).pin_memory().to(device=device, non_blocking=True)
+    # Move conditioning to device (shared across all S-blocks); pinned staging
+    # only when copying to a GPU (pin_memory needs CUDA)
+    _pin = str(device).startswith("cuda")
+    def _h2d(a):
+        t = torch.from_numpy(a)
+        return (t.pin_memory() if _pin else t).to(device=device, non_blocking=_pin)
+    hy = _h2d(hy_np).float()
+    xn = _h2d(xn_np).float() if xn_np.shape[1] > 0 else torch.zeros((N, 0), device=device, dtype=torch.float32)
+    xc = _h2d(cur_cat_b.astype(np.int64))
+    rid = _h2d(region_id_b.astype(np.int64))
 
     # Compute per-parcel gating weights ONCE (shared across all scenarios)
     alpha = gating_net(hy.float(), xn.float(), xc, rid)  # [N, K]
 
-    # Move Z_tokens to device
-    if Z_tokens.device != torch.device(device):
-        Z_tokens = Z_tokens.to(device)
-
-    # DDIM schedule indices
-    T = int(sched.steps)
-    idx = np.linspace(0, T - 1, int(DIFF_STEPS_SAMPLE)).round().astype(int)
-    idx = np.unique(idx)[::-1].copy()
-
-    # Autocast context
+    # Autocast context (CPU bf16 profile: see prepare_v11_cpu_profile)
     if SAMPLER_DISABLE_AUTOCAST:
         autocast_ctx = contextlib.nullcontext()
+    elif getattr(model, "_cpu_profile", None) == "bf16" and str(device) == "cpu":
+        autocast_ctx = torch.autocast(device_type="cpu", dtype=torch.bfloat16)
     else:
         autocast_ctx = get_autocast_ctx(device)
 
-    # Output buffer (CPU, filled incrementally per S-block)
-    out = np.empty((N, S, H), dtype=np.float32)
+    # Encode per-parcel conditioning ONCE (hist/num/cat/region encoders do not
+    # depend on the scenario or the DDIM step). Runs under the same autocast
+    # as the per-step pass, so h_ctx keeps the fused forward's dtype/numerics.
+    with autocast_ctx:
+        h_ctx = model.encode_context(hy.float(), xn.float(), xc, rid)  # [N, hidden]
+
+    # Move Z_tokens to device
+    if Z_tokens.device != torch.device(device):
+        Z_tokens = Z_tokens.to(device)
+
+    # Timestep grid (descending) and solver
+    kind = str(kind or SAMPLER_KIND).lower()
+    student_grid = getattr(model, "_sampler_t_idx", None)
+    if student_grid is not None:
+        idx = np.asarray(student_grid, dtype=int)
+        kind = "ddim"
+    else:
+        idx = sampler_timesteps(int(sched.steps), int(steps or SAMPLER_STEPS or DIFF_STEPS_SAMPLE))
+    if kind not in ("ddim", "dpmpp_2m", "student"):
+        raise ValueError(f"Unknown SAMPLER_KIND {kind!r}")
+
+    # Output buffer (CPU, filled incrementally per S-block); the reducer path
+    # un-scales on device instead and never materialises the cube on host
+    if reducer is None:
+        out = np.empty((N, S, H), dtype=np.float32)
+    else:
+        reducer.reset()
+        t_mean = torch.from_numpy(model._t_scaler.mean_).to(device=device, dtype=torch.float32)
+        t_scale = torch.from_numpy(model._t_scaler.scale_).to(device=device, dtype=torch.float32)
 
     first_bad_step = None
+    seed_n = int(SAMPLER_RUN_SEED if noise_seed is None else noise_seed)
+    if noise_keys is not None and len(noise_keys) != N:
+        raise ValueError(f"noise_keys has {len(noise_keys)} entries for {N} parcels")
 
     # ── S-block loop: process scenarios in chunks ──
     for s0 in range(0, S, sb):
@@ -2078,29 +3784,26 @@ def sample_ddim_v11(
         u_i_blk = u_i_blk * horizon_scale  # [N, sb_actual, H]
         u_i_flat = u_i_blk.reshape(N * sb_actual, H)  # [N*sb_actual, H]
 
-        # Expand conditioning for this block only
-        hy_exp = hy.repeat_interleave(sb_actual, dim=0)
-        xn_exp = xn.repeat_interleave(sb_actual, dim=0)
-        xc_exp = xc.repeat_interleave(sb_actual, dim=0)
-        rid_exp = rid.repeat_interleave(sb_actual, dim=0)
+        # Expand cached parcel context for this block and fold in the token
+        # conditioning (u_i is fixed across DDIM steps)
+        with autocast_ctx:
+            h_static = model.add_token_cond(h_ctx.repeat_interleave(sb_actual, dim=0), u_i_flat)
 
         # Initial x: structured noise = sigma_u * u_i + idiosyncratic
-        idio_noise = torch.randn((N * sb_actual, H), device=device, dtype=torch.float32)
+        if noise_keys is not None:
+            idio_noise = parcel_noise(seed_n, noise_keys, s0, sb_actual, H, 0, device).reshape(N * sb_actual, H)
+        else:
+            idio_noise = torch.randn((N * sb_actual, H), device=device, dtype=torch.float32)
         x = u_i_flat + idio_noise
         x = x.float()
+        dpm_prev = None
 
-        # DDIM denoising loop for this block
+        # Denoising loop for this block
         for i_step, t_idx in enumerate(idx):
             t = torch.full((N * sb_actual,), float(t_idx), device=device, dtype=torch.float32)
 
             with autocast_ctx:
-                noise_hat = model(
-                    x, t, hy_exp, xn_exp, xc_exp, rid_exp, u_i_flat,
-                ).to(dtype=torch.float32)
-
-            # Finite guards and clipping
-            noise_hat = torch.nan_to_num(noise_hat, nan=0.0, posinf=0.0, neginf=0.0)
-            noise_hat = noise_hat.clamp(-float(SAMPLER_NOISE_CLIP), float(SAMPLER_NOISE_CLIP))
+                noise_hat = model.forward_step(x, t, h_static).to(dtype=torch.float32)
 
             abar = sched.abar[int(t_idx)].to(dtype=torch.float32)
             if (i_step + 1) < len(idx):
@@ -2108,20 +3811,13 @@ def sample_ddim_v11(
             else:
                 abar_prev = torch.tensor(1.0, device=device, dtype=torch.float32)
 
-            sqrt_abar = torch.sqrt(abar).clamp(min=1e-6)
-            sqrt_om = torch.sqrt(1.0 - abar).clamp(min=1e-6)
-
-            x0_pred = (x - sqrt_om * noise_hat) / sqrt_abar
-            x0_pred = torch.nan_to_num(x0_pred, nan=0.0, posinf=0.0, neginf=0.0)
-            x0_pred = x0_pred.clamp(-float(SAMPLER_X0_CLIP), float(SAMPLER_X0_CLIP))
-
-            if (i_step + 1) < len(idx):
-                x = torch.sqrt(abar_prev).clamp(min=0.0) * x0_pred + torch.sqrt(1.0 - abar_prev).clamp(min=0.0) * noise_hat
+            if kind == "dpmpp_2m":
+                x0_pred = _clipped_x0_pred(x, noise_hat, abar)
+                x, dpm_prev = _dpmpp_2m_step(x, x0_pred, abar, abar_prev, dpm_prev, last=(i_step + 1) == len(idx))
+                x = torch.nan_to_num(x, nan=0.0, posinf=0.0, neginf=0.0)
+                x = x.clamp(-float(SAMPLER_X_CLIP), float(SAMPLER_X_CLIP))
             else:
-                x = x0_pred
-
-            x = torch.nan_to_num(x, nan=0.0, posinf=0.0, neginf=0.0)
-            x = x.clamp(-float(SAMPLER_X_CLIP), float(SAMPLER_X_CLIP))
+                x, _ = _ddim_step(x, noise_hat, abar, abar_prev, last=(i_step + 1) == len(idx))
 
             if SAMPLER_REPORT_BAD_STEP and s0 == 0:  # only report for first block
                 bad = (~torch.isfinite(x)).any(dim=1)
@@ -2132,18 +3828,383 @@ def sample_ddim_v11(
                     x_absmax = float(x.abs().max().item())
                     print(f"[{ts()}] SAMPLER step={i_step}/{len(idx)} t_idx={int(t_idx)} bad_frac={bad_frac:.4f} x_absmax={x_absmax:.3f}")
 
-        # Write this block's results to output buffer
-        x_blk = model._t_scaler.inverse_transform(x.detach().cpu().numpy().astype(np.float32))
-        out[:, s0:s0 + sb_actual, :] = x_blk.reshape(N, sb_actual, H)
+        # Write this block's results to output buffer (or hand it to the reducer)
+        if reducer is None:
+            x_blk = model._t_scaler.inverse_transform(x.detach().cpu().numpy().astype(np.float32))
+            out[:, s0:s0 + sb_actual, :] = x_blk.reshape(N, sb_actual, H)
+        else:
+            x_blk = x.detach().float() * t_scale + t_mean
+            reducer.update(s0, x_blk.reshape(N, sb_actual, H))
+            del x_blk
 
         # Free GPU memory for this block
-        del x, u_i_blk, u_i_flat, hy_exp, xn_exp, xc_exp, rid_exp, idio_noise
+        del x, u_i_blk, u_i_flat, h_static, idio_noise
 
     if first_bad_step is not None:
         print(f"[{ts()}] SAMPLER first_bad_step={first_bad_step}")
 
+    if reducer is not None:
+        return reducer.finalize()
     return out
 
+# -----------------------------
+# 16b) CPU sampler profile (int8 / bf16) + fan accuracy guard
+# -----------------------------
+CPU_PROFILES = ("fp32", "bf16", "int8")
+
+def prepare_v11_cpu_profile(model: nn.Module, gating_net: nn.Module, profile: str):
+    """
+    CPU copies of the v11 denoiser + gating net for sample_ddim_v11:
+      "fp32": plain CPU copies
+      "bf16": copies tagged so the sampler runs the DDIM steps under CPU bf16 autocast
+      "int8": dynamic int8 quantisation of every nn.Linear (encoders, FiLM, t_enc,
+              gating MLP); the Conv1d blocks have no dynamic-quant kernel and stay fp32
+    The originals are not modified (the accuracy guard compares against them).
+    Quantisation runs at load time in well under a second, so nothing but the
+    guard report is exported next to the checkpoint.
+    """
+    profile = str(profile).lower()
+    if profile not in CPU_PROFILES:
+        raise ValueError(f"Unknown CPU sampler profile {profile!r} (expected one of {CPU_PROFILES})")
+    m = copy.deepcopy(model).to("cpu").eval()
+    g = copy.deepcopy(gating_net).to("cpu").eval()
+    if profile == "int8":
+        from torch.ao.quantization import quantize_dynamic
+        m = quantize_dynamic(m, {nn.Linear}, dtype=torch.qint8)
+        g = quantize_dynamic(g, {nn.Linear}, dtype=torch.qint8)
+    m._cpu_profile = profile
+    g._cpu_profile = profile
+    return m, g
+
+def cpu_profile_accuracy_guard(
+    model: nn.Module,
+    gating_net: nn.Module,
+    model_p: nn.Module,
+    gating_p: nn.Module,
+    sched: Scheduler,
+    ctx: Dict[str, np.ndarray],
+    Z_tokens: torch.Tensor,
+    coh_scale: CoherenceScale = None,
+    n_parcels: int = CPU_PROFILE_GUARD_PARCELS,
+    seed: int = CPU_PROFILE_GUARD_SEED,
+) -> Dict[str, Any]:
+    """
+    Compare the quantile fans of a CPU profile (model_p/gating_p) against the fp32
+    model on a fixed parcel set (first n_parcels accts in sorted order), both on
+    CPU with the same token paths and idiosyncratic noise. Returns a JSON-able
+    report; report["pass"] is False when any CPU_PROFILE_MAX_* tolerance is exceeded.
+    """
+    acct = np.asarray(ctx["acct"]).astype(str)
+    sel = np.sort(np.argsort(acct, kind="stable")[: int(n_parcels)])
+    if sched.abar.device.type != "cpu":
+        sched = Scheduler(sched.steps, "cpu")
+    Z_cpu = Z_tokens.detach().to("cpu")
+
+    def _fan(m, g):
+        with torch.random.fork_rng(devices=[]):
+            torch.manual_seed(int(seed))
+            t0 = time.perf_counter()
+            fan = sample_ddim_v11(
+                m, g, sched,
+                ctx["hist_y"][sel], ctx["cur_num"][sel], ctx["cur_cat"][sel], ctx["region_id"][sel],
+                Z_cpu, "cpu", coh_scale=coh_scale,
+                reducer=ScenarioFanReducer(ctx["y_anchor"][sel], with_moments=False, exceed_growth=()),
+            )
+            return fan, time.perf_counter() - t0
+
+    ref, t_ref = _fan(model, gating_net)
+    new, t_new = _fan(model_p, gating_p)
+    q_ref, q_new = ref["quantiles"], new["quantiles"]  # [n, Q, H] prices
+    rel = (np.abs(q_new - q_ref) / np.maximum(np.abs(q_ref), 1.0)).ravel()
+    rel = rel[np.isfinite(rel)] if rel.size else rel
+
+    width_drift = 0.0
+    q_levels = list(ref["q_levels"])
+    if 0.10 in q_levels and 0.90 in q_levels:
+        i10, i90 = q_levels.index(0.10), q_levels.index(0.90)
+        w_ref = q_ref[:, i90] - q_ref[:, i10]
+        w_new = q_new[:, i90] - q_new[:, i10]
+        ok_w = w_ref > 0
+        if ok_w.any():
+            width_drift = float(np.median(np.abs(w_new[ok_w] / w_ref[ok_w] - 1.0)))
+
+    report = {
+        "profile": getattr(model_p, "_cpu_profile", "fp32"),
+        "n_parcels": int(sel.size),
+        "seed": int(seed),
+        "median_rel_err": float(np.median(rel)) if rel.size else 0.0,
+        "p99_rel_err": float(np.percentile(rel, 99)) if rel.size else 0.0,
+        "max_rel_err": float(rel.max()) if rel.size else 0.0,
+        "width_drift": width_drift,
+        "t_fp32_s": round(t_ref, 3),
+        "t_profile_s": round(t_new, 3),
+        "speedup": round(t_ref / max(t_new, 1e-9), 2),
+        "torch_version": torch.__version__,
+    }
+    report["pass"] = bool(
+        rel.size == q_ref.size
+        and report["median_rel_err"] <= CPU_PROFILE_MAX_MEDIAN_REL_ERR
+        and report["p99_rel_err"] <= CPU_PROFILE_MAX_P99_REL_ERR
+        and report["width_drift"] <= CPU_PROFILE_MAX_WIDTH_DRIFT
+    )
+    print(f"[{ts()}] CPU profile guard ({report['profile']}, {report['n_parcels']} parcels): "
+          f"median_rel={report['median_rel_err']:.2e} p99_rel={report['p99_rel_err']:.2e} "
+          f"width_drift={report['width_drift']:.2e} speedup={report['speedup']:.2f}x "
+          f"-> {'PASS' if report['pass'] else 'FAIL'}")
+    return report
+
+def _cpu_profile_report_path(ckpt_path: str, profile: str) -> str:
+    return f"{os.path.splitext(ckpt_path)[0]}.cpu_{str(profile).lower()}.json"
+
+def save_cpu_profile_report(ckpt_path: str, report: Dict[str, Any], jurisdiction: str = "") -> str:
+    """Write the guard report next to the checkpoint, stamped with the checkpoint's size/mtime."""
+    st = os.stat(ckpt_path)
+    rec = dict(report, ckpt=os.path.basename(ckpt_path), ckpt_size=int(st.st_size),
+               ckpt_mtime=int(st.st_mtime), jurisdiction=str(jurisdiction))
+    path = _cpu_profile_report_path(ckpt_path, report["profile"])
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(rec, f, indent=2)
+    os.replace(tmp, path)
+    return path
+
+def load_cpu_profile_report(ckpt_path: str, profile: str, jurisdiction: str = "") -> Optional[Dict[str, Any]]:
+    """
+    Cached guard report for (checkpoint, profile, jurisdiction), or None when it is
+    missing or stale (checkpoint rewritten, different torch build, different parcels).
+    """
+    path = _cpu_profile_report_path(ckpt_path, profile)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            rec = json.load(f)
+        st = os.stat(ckpt_path)
+    except (OSError, ValueError):
+        return None
+    if (rec.get("ckpt_size") != int(st.st_size) or rec.get("ckpt_mtime") != int(st.st_mtime)
+            or rec.get("jurisdiction") != str(jurisdiction) or rec.get("torch_version") != torch.__version__):
+        return None
+    return rec
+
+# -----------------------------
+# 16c) Progressive distillation: fewer-step student denoisers
+# -----------------------------
+def _teacher_two_steps(
+    teacher: nn.Module,
+    x: torch.Tensor,
+    h_static: torch.Tensor,
+    grid: np.ndarray,
+    j: int,
+    sched: Scheduler,
+    device: str,
+    autocast_ctx,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Teacher DDIM from grid[j] for two grid steps (to grid[j+2]), or to x0 when the
+    grid runs out first. Returns (x_end, abar_end); abar_end is 1 when x_end is x0.
+    """
+    B = int(x.shape[0])
+    cur = int(j)
+    for _ in range(2):
+        t = torch.full((B,), float(grid[cur]), device=device, dtype=torch.float32)
+        with autocast_ctx:
+            noise_hat = teacher.forward_step(x, t, h_static).to(dtype=torch.float32)
+        abar = sched.abar[int(grid[cur])].to(dtype=torch.float32)
+        last = cur + 1 >= len(grid)
+        abar_next = (torch.tensor(1.0, device=device, dtype=torch.float32) if last
+                     else sched.abar[int(grid[cur + 1])].to(dtype=torch.float32))
+        x, _ = _ddim_step(x, noise_hat, abar, abar_next, last)
+        if last:
+            return x, abar_next
+        cur += 1
+    return x, sched.abar[int(grid[cur])].to(dtype=torch.float32)
+
+def distill_v11_student(
+    teacher: nn.Module,
+    gating_net: nn.Module,
+    token_persistence: TokenPersistence,
+    coh_scale: CoherenceScale,
+    shard_paths: List[str],
+    sched: Scheduler,
+    teacher_t_idx: np.ndarray,
+    epochs: int,
+    device: str,
+    num_dim: int,
+    seed_key: Tuple[int, ...] = (0,),
+) -> nn.Module:
+    """
+    One progressive-distillation round (Salimans & Ho, 2022): a copy of the teacher
+    learns to cover two teacher DDIM steps in one, so its grid is teacher_t_idx[::2]
+    (with an odd-length grid the student's last step is the teacher's last step).
+
+    Training states are the sampler's: parcel context from standardized shard rows,
+    a horizon-scaled token driver from the frozen gating net / token paths, and
+    x_t = q(x0, t, u + eps) (pure structured noise at the first grid point). The
+    student's x0 prediction is regressed onto the x0 that makes one DDIM step land
+    on the teacher's two-step result. Gating net, token paths and coherence scale
+    are shared with the teacher and stay frozen.
+
+    Returns the student (eval mode) with _sampler_t_idx and the teacher's scalers set.
+    """
+    grid = np.asarray(teacher_t_idx, dtype=int)
+    student_grid = grid[::2].copy()
+    y_scaler, n_scaler, t_scaler = teacher._y_scaler, teacher._n_scaler, teacher._t_scaler
+
+    student = copy.deepcopy(teacher).to(device)
+    for attr in ("_sampler_t_idx", "_cpu_profile"):
+        if hasattr(student, attr):
+            delattr(student, attr)
+    mods = (teacher, gating_net, token_persistence, coh_scale)
+    for m in mods:
+        m.eval()
+        for p in m.parameters():
+            p.requires_grad_(False)
+    student.train()
+
+    try:
+        opt = torch.optim.AdamW(student.parameters(), lr=DISTILL_LR, weight_decay=1e-4, fused=True)
+    except TypeError:
+        opt = torch.optim.AdamW(student.parameters(), lr=DISTILL_LR, weight_decay=1e-4)
+    autocast_ctx = get_autocast_ctx(device)
+    loader = ShardBatchLoader(
+        shard_paths,
+        columns={
+            "hy": ("hist_y", np.float32),
+            "xn": ("cur_num", np.float32),
+            "x0": ("target", np.float32),
+            "xc": ("cur_cat", np.int64),
+            "rid": ("region_id", np.int64),
+        },
+        batch_size=int(DIFF_BATCH),
+        seed_key=tuple(seed_key),
+        device=device,
+        affine={
+            "hy": (y_scaler.mean_, y_scaler.scale_),
+            "xn": (n_scaler.mean_, n_scaler.scale_),
+            "x0": (t_scaler.mean_, t_scaler.scale_),
+        },
+    )
+    horizon_scale = torch.sqrt(torch.arange(1, H + 1, device=device, dtype=torch.float32)).unsqueeze(0)
+    sigma_u = coh_scale.get_sigma()
+    print(f"[{ts()}] distill_v11_student: {len(grid)} -> {len(student_grid)} steps, "
+          f"{len(shard_paths)} shards, epochs={int(epochs)}, rows/epoch<={DISTILL_MAX_ROWS_PER_EPOCH:,}")
+
+    for ep in range(int(epochs)):
+        t_ep0 = time.time()
+        tot, n_rows = 0.0, 0
+        for bt in loader.epoch(ep):
+            x0 = bt["x0"].float()
+            B = int(x0.shape[0])
+            hy = bt["hy"].float()
+            xn = bt["xn"].float() if int(num_dim) > 0 else torch.zeros((B, 0), device=device, dtype=torch.float32)
+            xc, rid = bt["xc"], bt["rid"]
+            j = 2 * int(torch.randint(0, len(student_grid), (1,)).item())
+            t_start = int(grid[j])
+
+            with torch.no_grad():
+                alpha = gating_net(hy, xn, xc, rid)                                  # [B, K]
+                Z = sample_token_paths(K_TOKENS, H, token_persistence, B, device)    # [B, K, H]
+                u = sigma_u * torch.einsum("bk,bkh->bh", alpha, Z) * horizon_scale   # [B, H]
+                noise = u + torch.randn_like(x0)
+                if j == 0:
+                    x_s = noise
+                else:
+                    x_s = sched.q(x0, torch.full((B,), t_start, device=device, dtype=torch.long), noise)
+                h_t = teacher.add_token_cond(teacher.encode_context(hy, xn, xc, rid).float(), u)
+                x_end, abar_end = _teacher_two_steps(teacher, x_s, h_t, grid, j, sched, device, autocast_ctx)
+
+                abar_s = sched.abar[t_start].to(dtype=torch.float32)
+                if float(abar_end) >= 1.0:
+                    x0_tgt = x_end
+                else:
+                    ratio = torch.sqrt(1.0 - abar_end) / torch.sqrt(1.0 - abar_s).clamp(min=1e-6)
+                    x0_tgt = (x_end - ratio * x_s) / (torch.sqrt(abar_end) - ratio * torch.sqrt(abar_s))
+
+            with autocast_ctx:
+                h_s = student.add_token_cond(student.encode_context(hy, xn, xc, rid).float(), u)
+                t = torch.full((B,), float(t_start), device=device, dtype=torch.float32)
+                noise_hat = student.forward_step(x_s, t, h_s).to(dtype=torch.float32)
+            x0_hat = (x_s - torch.sqrt(1.0 - abar_s) * noise_hat) / torch.sqrt(abar_s).clamp(min=1e-6)
+            loss = ((x0_hat - x0_tgt) ** 2).mean()
+
+            opt.zero_grad(set_to_none=True)
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(student.parameters(), 1.0)
+            opt.step()
+
+            tot += float(loss.item()) * B
+            n_rows += B
+            if n_rows >= int(DISTILL_MAX_ROWS_PER_EPOCH):
+                break
+        print(f"[{ts()}] distill ep={ep} x0_mse={tot / max(1, n_rows):.5f} rows={n_rows:,} ({time.time() - t_ep0:.0f}s)")
+
+    for m in mods:
+        for p in m.parameters():
+            p.requires_grad_(True)
+    student.eval()
+    student._sampler_t_idx = student_grid
+    student._y_scaler, student._n_scaler, student._t_scaler = y_scaler, n_scaler, t_scaler
+    return student
+
+def distill_v11_student_progressive(
+    teacher: nn.Module,
+    gating_net: nn.Module,
+    token_persistence: TokenPersistence,
+    coh_scale: CoherenceScale,
+    shard_paths: List[str],
+    sched: Scheduler,
+    steps_from: int,
+    steps_to: int,
+    device: str,
+    num_dim: int,
+    epochs: int = DISTILL_EPOCHS,
+) -> nn.Module:
+    """Halve the DDIM step count (20 -> 10 -> 5 -> 3 -> 2 ...) until the student walks at most steps_to steps."""
+    cur = teacher
+    grid = sampler_timesteps(int(sched.steps), int(steps_from))
+    rnd = 0
+    while len(grid) > max(1, int(steps_to)):
+        cur = distill_v11_student(cur, gating_net, token_persistence, coh_scale, shard_paths, sched,
+                                  grid, epochs, device, num_dim, seed_key=(int(SEED), 7000 + rnd))
+        grid = cur._sampler_t_idx
+        rnd += 1
+    return cur
+
+def student_ckpt_path(ckpt_path: str, steps: int) -> str:
+    """Student checkpoint stored next to its teacher: <ckpt>.student_k<steps>.pt."""
+    return f"{os.path.splitext(ckpt_path)[0]}.student_k{int(steps)}.pt"
+
+def save_v11_student(ckpt_path: str, student: nn.Module, sched: Scheduler, info: Optional[Dict[str, Any]] = None) -> str:
+    """Save the student denoiser next to teacher checkpoint ckpt_path; returns the student path."""
+    grid = np.asarray(student._sampler_t_idx, dtype=int)
+    path = student_ckpt_path(ckpt_path, len(grid))
+    torch.save({
+        "arch": "v11_student",
+        "model_state_dict": student.state_dict(),
+        "sampler_t_idx": grid.tolist(),
+        "sched_steps": int(sched.steps),
+        "teacher_ckpt": os.path.basename(ckpt_path),
+        "distill": dict(info or {}),
+    }, path)
+    return path
+
+def load_v11_student(path: str, teacher: nn.Module, sched_steps: int) -> nn.Module:
+    """
+    Student denoiser for a loaded teacher (same architecture and scalers). Raises
+    ValueError when the student was distilled on a different sampling schedule.
+    """
+    ck = torch.load(path, map_location="cpu")
+    if int(ck.get("sched_steps", -1)) != int(sched_steps):
+        raise ValueError(f"{os.path.basename(path)} was distilled on a {ck.get('sched_steps')}-step schedule, "
+                         f"sampler uses {int(sched_steps)}")
+    student = copy.deepcopy(teacher)
+    student.load_state_dict(ck["model_state_dict"])
+    student.eval()
+    student._sampler_t_idx = np.asarray(ck["sampler_t_idx"], dtype=int)
+    student._y_scaler, student._n_scaler, student._t_scaler = teacher._y_scaler, teacher._n_scaler, teacher._t_scaler
+    return student
+
 # -----------------------------
 # 17) Acceptance tests
 # -----------------------------
@@ -42,6 +42,9 @@ import psycopg2
 import psycopg2.extras
 import mercantile
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "inference"))
+from pg_pool import shared_pool  # noqa: E402
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
@@ -128,11 +131,11 @@ def get_db_connection() -> psycopg2.extensions.connection:
     if not db_url: raise RuntimeError("No database URL provided in environment.")
     
     # [FIX] Start with autocommit=True for safe DDL execution
-    conn = psycopg2.connect(db_url)
-    conn.autocommit = True 
+    # (connection from the shared pool in scripts/inference/pg_pool.py)
+    conn = shared_pool(db_url, maxconn=1, autocommit=True,
+                       init_sql=["SET statement_timeout = '30min';"]).getconn()
     
     with conn.cursor() as cur:
-        cur.execute("SET statement_timeout = '30min';")
         try:
             # Attempt to force write mode
             cur.execute("SET SESSION CHARACTERISTICS AS TRANSACTION READ WRITE;")
@@ -5,6 +5,9 @@ Run AFTER Cell 1 (worldmodel.py) and BEFORE Cell 2 (backtest).
 
 Default config: origin 2025 only, 500K SF-only sample.
 Override by setting SWEEP_ORIGINS_OVERRIDE and SWEEP_VARIANTS before running.
+Set SWEEP_JOINT_ORIGINS=1 to train all origins of a variant jointly over one
+master shard build (train_diffusion_v11_multi_origin), or SWEEP_WARM_START=1 to
+chain origins (t+1 initialised from t) with holdout-shard early stopping.
 
 Reuses all Cell 1 globals:
   lf, train_accts, num_use, cat_use, NUM_DIM, N_CAT, work_dirs, cfg,
@@ -47,16 +50,40 @@ SWEEP_EPOCHS_BASE = int(os.environ.get("SWEEP_EPOCHS", "60"))
 # Set True to retrain even when checkpoint exists (renames old to .bak)
 FORCE_RETRAIN = bool(globals().get("FORCE_RETRAIN", True))
 
+# Joint mode: one account sample + one master shard build per variant, and all
+# origins trained in lock-step over a single pass of the master shards per epoch
+# (train_diffusion_v11_multi_origin) instead of one build + train per origin.
+SWEEP_JOINT_ORIGINS = bool(globals().get("SWEEP_JOINT_ORIGINS", os.environ.get("SWEEP_JOINT_ORIGINS", "0") == "1"))
+
+# Warm start: origin t+1 starts from origin t's weights (trained here or loaded from its
+# checkpoint) for at most DIFF_EPOCHS_WARMSTART epochs. Holdout early stopping holds
+# out TRAIN_HOLDOUT_FRAC of the origin's accts (acct-hash row views, never trained on
+# or used for the scalers), scores them each epoch and keeps the best-epoch weights.
+SWEEP_WARM_START = bool(globals().get("SWEEP_WARM_START", os.environ.get("SWEEP_WARM_START", "0") == "1"))
+SWEEP_HOLDOUT_EARLY_STOP = bool(globals().get(
+    "SWEEP_HOLDOUT_EARLY_STOP",
+    os.environ.get("SWEEP_HOLDOUT_EARLY_STOP", "1" if SWEEP_WARM_START else "0") == "1",
+))
+
+# Fewer-step sampling: after each checkpoint is saved, progressively distill a student
+# denoiser (worldmodel section 16c) down to at most this many sampler steps and save it
+# next to the checkpoint as <ckpt>.student_k<steps>.pt. 0 = off.
+SWEEP_DISTILL_STEPS = int(globals().get("SWEEP_DISTILL_STEPS", os.environ.get("SWEEP_DISTILL_STEPS", "0")))
+
 # ─── Validate Cell 1 globals ───
 _required = [
     "lf", "train_accts", "num_use", "cat_use", "NUM_DIM", "N_CAT",
     "work_dirs", "cfg", "OUT_DIR", "FULL_HORIZON_ONLY",
     "build_master_training_shards_v102_local",
     "derive_origin_shards_from_master",
-    "train_diffusion_v11", "create_denoiser_v11",
+    "train_diffusion_v11", "split_holdout_shards", "create_denoiser_v11",
     "create_gating_network", "create_token_persistence",
     "create_coherence_scale", "copy_small_artifacts_to_drive",
 ]
+if SWEEP_JOINT_ORIGINS:
+    _required.append("train_diffusion_v11_multi_origin")
+if SWEEP_DISTILL_STEPS > 0:
+    _required += ["Scheduler", "distill_v11_student_progressive", "save_v11_student"]
 _missing = [r for r in _required if r not in dir() and r not in globals()]
 if _missing:
     print(f"⚠️  Missing Cell 1 globals: {_missing}")
@@ -72,6 +99,9 @@ print(f"v11 Retrain (Inducing-Token Diffusion)")
 print(f"   Origins: {SWEEP_ORIGINS}")
 print(f"   Variants: {[v[0] for v in SWEEP_VARIANTS]}")
 print(f"   Base epochs: {SWEEP_EPOCHS_BASE} (scales with dataset size)")
+print(f"   Joint origins: {SWEEP_JOINT_ORIGINS}")
+print(f"   Warm start: {SWEEP_WARM_START}  holdout early stop: {SWEEP_HOLDOUT_EARLY_STOP}")
+print(f"   Distilled student steps: {SWEEP_DISTILL_STEPS or 'off'}")
 print(f"   Device: {_device}")
 print(f"   Output: {_out_dir}")
 
@@ -201,6 +231,186 @@ _cfg = globals().get("cfg", {})
 
 sweep_results = []
 
+
+_WARM_KEYS = ("model", "gating_net", "token_persistence", "coh_scale")
+
+
+def _v11_ckpt_data(model, gating_net, token_persistence, coh_scale, y_scaler, n_scaler, t_scaler,
+                   global_medians, variant_tag, sample_size, strat_above, strat_pct, n_train, epochs, losses,
+                   train_info=None):
+    return {
+        "model_state_dict": model.state_dict(),
+        "gating_net_state_dict": gating_net.state_dict(),
+        "token_persistence_state_dict": token_persistence.state_dict(),
+        "coh_scale_state_dict": coh_scale.state_dict(),
+        "y_scaler_mean": y_scaler.mean_.tolist(),
+        "y_scaler_scale": y_scaler.scale_.tolist(),
+        "n_scaler_mean": n_scaler.mean_.tolist(),
+        "n_scaler_scale": n_scaler.scale_.tolist(),
+        "t_scaler_mean": t_scaler.mean_.tolist(),
+        "t_scaler_scale": t_scaler.scale_.tolist(),
+        "global_medians": global_medians,
+        "cfg": dict(_cfg, **(train_info or {})),
+        "arch": "v11",
+        # Feature lists: critical for eval-time alignment
+        "num_use": list(_num_use),
+        "cat_use": list(_cat_use),
+        "sweep": {
+            "variant": variant_tag,
+            "sample_size": sample_size,
+            "stratify_above": strat_above,
+            "stratify_target_pct": strat_pct,
+            "n_train": n_train,
+            "epochs": epochs,
+            "epochs_used": (train_info or {}).get("EPOCHS_USED", len(losses)),
+            "final_loss": losses[-1] if losses else None,
+            "phi_k_final": token_persistence.get_phi_list(),
+            "sigma_u_final": coh_scale.get_sigma(),
+        },
+    }
+
+
+def _warm_states_from_ckpt(ckpt_path):
+    """{module: state_dict} from a saved v11 checkpoint (CPU), for chaining past a skipped origin."""
+    ck = torch.load(ckpt_path, map_location="cpu", weights_only=False)
+    return {k: ck[f"{k}_state_dict"] for k in _WARM_KEYS}
+
+
+def _new_v11_members():
+    _hist_len = int(_cfg.get("FULL_HIST_LEN", 21))
+    _H = int(_cfg.get("H", 5))
+    return {
+        "model": create_denoiser_v11(target_dim=_H, hist_len=_hist_len, num_dim=_num_dim, n_cat=_n_cat).to(_device),
+        "gating_net": create_gating_network(hist_len=_hist_len, num_dim=_num_dim, n_cat=_n_cat).to(_device),
+        "token_persistence": create_token_persistence().to(_device),
+        "coh_scale": create_coherence_scale().to(_device),
+    }
+
+
+def _distill_student(model, gating_net, token_persistence, coh_scale, y_scaler, n_scaler, t_scaler,
+                     shard_paths, ckpt_path):
+    """SWEEP_DISTILL_STEPS: distill a fewer-step student from a freshly saved teacher checkpoint."""
+    t0 = time.time()
+    model._y_scaler, model._n_scaler, model._t_scaler = y_scaler, n_scaler, t_scaler
+    sched = Scheduler(int(globals().get("DIFF_STEPS_SAMPLE", 20)), device=_device)
+    student = distill_v11_student_progressive(
+        model, gating_net, token_persistence, coh_scale, shard_paths, sched,
+        steps_from=sched.steps, steps_to=SWEEP_DISTILL_STEPS, device=_device, num_dim=_num_dim,
+    )
+    if student is model:
+        print(f"  ⚠️  Sampler already walks <= {SWEEP_DISTILL_STEPS} steps, no student distilled")
+        return None
+    path = save_v11_student(ckpt_path, student, sched,
+                            info={"steps_from": sched.steps, "epochs_per_round": int(globals().get("DISTILL_EPOCHS", 4))})
+    print(f"  🎓 Student ({len(student._sampler_t_idx)} steps) saved: {path} ({time.time() - t0:.0f}s)")
+    del student
+    return path
+
+
+def _run_joint_variant(variant_tag, sample_size, strat_above, strat_pct):
+    """All SWEEP_ORIGINS for one variant from one sample, one master build and one data pass per epoch."""
+    t0 = time.time()
+    todo = []
+    for origin in SWEEP_ORIGINS:
+        ckpt_path = os.path.join(_out_dir, f"ckpt_v11_origin_{origin}_{variant_tag}.pt")
+        if os.path.exists(ckpt_path):
+            if not FORCE_RETRAIN:
+                print(f"\n  ✅ {os.path.basename(ckpt_path)} already exists, skipping")
+                sweep_results.append({"variant": variant_tag, "origin": origin,
+                                      "status": "skipped", "ckpt_path": ckpt_path})
+                continue
+            os.rename(ckpt_path, ckpt_path + ".bak")
+            print(f"\n  🔄 FORCE_RETRAIN: renamed {os.path.basename(ckpt_path)} → .bak")
+        todo.append(origin)
+    if not todo:
+        return
+
+    # One sample for every origin (seeded like the max origin's per-origin run)
+    max_origin = max(SWEEP_ORIGINS)
+    seed = 42 + max_origin * 100
+    if strat_above is not None:
+        sweep_accts = _sample_stratified(
+            _all_accts, sample_size, _lf_for_training, max_origin, strat_above, strat_pct, seed)
+    else:
+        sweep_accts = _sample_random(_all_accts, sample_size, seed)
+    print(f"  Sampled {len(sweep_accts):,} accounts (shared by origins {todo})")
+
+    variant_work_dirs = copy.deepcopy(_work_dirs)
+    variant_scratch = os.path.join(variant_work_dirs.get("SCRATCH_ROOT", "/content/wm_scratch"), f"sweep_{variant_tag}")
+    os.makedirs(variant_scratch, exist_ok=True)
+    variant_work_dirs["RAW_SHARD_ROOT"] = os.path.join(variant_scratch, "raw")
+    variant_work_dirs["SCALED_SHARD_ROOT"] = os.path.join(variant_scratch, "scaled")
+    os.makedirs(variant_work_dirs["RAW_SHARD_ROOT"], exist_ok=True)
+
+    master_result = build_master_training_shards_v102_local(
+        lf=_lf_for_training,
+        accts=sweep_accts,
+        num_use_local=_num_use,
+        cat_use_local=_cat_use,
+        max_origin=max_origin,
+        full_horizon_only=_full_horizon_only,
+        work_dirs=variant_work_dirs,
+    )
+
+    members = {o: _new_v11_members() for o in todo}
+    try:
+        init_wandb(
+            name=f"v11-{variant_tag}-joint-o{min(todo)}-{max(todo)}",
+            tags=["v11", variant_tag, "joint_origins", "retrain"],
+            extra_config={"variant": variant_tag, "origins": todo, "sample_size": sample_size,
+                          "n_train_master": master_result["n_train"]},
+        )
+    except Exception as e:
+        print(f"  ⚠️  W&B init failed: {e}")
+
+    _epochs = SWEEP_EPOCHS_BASE
+    print(f"  🧪 Joint training {len(todo)} origins ({_epochs} epochs, {master_result['n_train']:,} master rows)")
+    results = train_diffusion_v11_multi_origin(
+        master_shard_paths=master_result["shards"],
+        origins=todo,
+        epochs=_epochs,
+        members=members,
+        device=_device,
+        num_dim=_num_dim,
+        n_cat=_n_cat,
+        full_horizon_only=_full_horizon_only,
+    )
+
+    dt = time.time() - t0
+    for origin in todo:
+        if origin not in results:
+            sweep_results.append({"variant": variant_tag, "origin": origin,
+                                  "status": "no_data", "ckpt_path": None})
+            continue
+        r, mb = results[origin], members[origin]
+        ckpt_name = f"ckpt_v11_origin_{origin}_{variant_tag}.pt"
+        ckpt_data = _v11_ckpt_data(
+            mb["model"], mb["gating_net"], mb["token_persistence"], mb["coh_scale"],
+            r["y_scaler"], r["n_scaler"], r["t_scaler"], master_result["global_medians"],
+            variant_tag, sample_size, strat_above, strat_pct, r["n_train"], _epochs, r["losses"],
+            train_info={"EPOCHS_USED": len(r["losses"]), "EPOCHS_MAX": _epochs, "EARLY_STOP": "train_loss"},
+        )
+        ckpt_data["sweep"]["joint_origins"] = list(todo)
+        local_ckpt = os.path.join(variant_scratch, ckpt_name)
+        torch.save(ckpt_data, local_ckpt)
+        final_path = copy_small_artifacts_to_drive(local_ckpt, _out_dir)
+        print(f"  💾 Saved: {final_path} ({os.path.getsize(final_path)/1e6:.0f}MB)")
+        if SWEEP_DISTILL_STEPS > 0:
+            # master shards: the student only imitates the teacher, it never sees labels as targets
+            _distill_student(mb["model"], mb["gating_net"], mb["token_persistence"], mb["coh_scale"],
+                             r["y_scaler"], r["n_scaler"], r["t_scaler"], master_result["shards"], final_path)
+        sweep_results.append({
+            "variant": variant_tag, "origin": origin,
+            "status": "trained", "ckpt_path": final_path,
+            "n_train": r["n_train"], "final_loss": r["losses"][-1] if r["losses"] else None,
+            "time_s": dt / len(todo),
+        })
+    print(f"  ⏱  Total time for {variant_tag} (joint, {len(todo)} origins): {dt:.0f}s")
+
+    del members
+    if _device == "cuda":
+        torch.cuda.empty_cache()
+
 # ═══════════════════════════════════════════════════════════════════
 # CHECKPOINT AUDIT
 # ═══════════════════════════════════════════════════════════════════
@@ -246,6 +456,11 @@ for variant_tag, sample_size, strat_above, strat_pct in SWEEP_VARIANTS:
           f"{f', stratify>{strat_above/1e6:.0f}M@{strat_pct:.0%}' if strat_above else ', random'})")
     print(f"{'█' * 70}")
 
+    if SWEEP_JOINT_ORIGINS and len(SWEEP_ORIGINS) > 1:
+        _run_joint_variant(variant_tag, sample_size, strat_above, strat_pct)
+        continue
+
+    _warm_states, _warm_origin = None, None
     for origin in SWEEP_ORIGINS:
         # ── Check if checkpoint already exists ──
         ckpt_name = f"ckpt_v11_origin_{origin}_{variant_tag}.pt"
@@ -259,6 +474,8 @@ for variant_tag, sample_size, strat_above, strat_pct in SWEEP_VARIANTS:
                     "variant": variant_tag, "origin": origin,
                     "status": "skipped", "ckpt_path": ckpt_path,
                 })
+                if SWEEP_WARM_START:
+                    _warm_states, _warm_origin = _warm_states_from_ckpt(ckpt_path), origin
                 continue
             else:
                 bak = ckpt_path + ".bak"
@@ -342,6 +559,12 @@ for variant_tag, sample_size, strat_above, strat_pct in SWEEP_VARIANTS:
         token_persistence = create_token_persistence().to(_device)
         coh_scale = create_coherence_scale().to(_device)
 
+        _warm = SWEEP_WARM_START and _warm_states is not None
+        if _warm:
+            for _k, _mod in zip(_WARM_KEYS, (model, gating_net, token_persistence, coh_scale)):
+                _mod.load_state_dict(_warm_states[_k])
+            print(f"  🔗 Warm start from origin {_warm_origin}")
+
         # ── Initialize W&B for this variant ──
         try:
             init_wandb(
@@ -359,11 +582,20 @@ for variant_tag, sample_size, strat_above, strat_pct in SWEEP_VARIANTS:
 
         # ── Epochs: fixed at base (no scaling — with 5.8M rows each epoch is already huge) ──
         _epochs = SWEEP_EPOCHS_BASE  # default 60
-        print(f"  🧪 Training v11 from scratch ({_epochs} epochs, {n_train:,} rows)")
+        if _warm:
+            _epochs = int(globals().get("DIFF_EPOCHS_WARMSTART", 20))
+        _train_shards, _holdout_shards = (
+            split_holdout_shards(origin_shards) if SWEEP_HOLDOUT_EARLY_STOP else (origin_shards, [])
+        )
+        _holdout_frac = float(globals().get("TRAIN_HOLDOUT_FRAC", 0.05))
+        if SWEEP_HOLDOUT_EARLY_STOP and not _holdout_shards:
+            print("  ⚠️  No holdout rows for this origin; early stopping falls back to the train-loss plateau rule")
+        print(f"  🧪 Training v11 {'warm-started' if _warm else 'from scratch'} (max {_epochs} epochs, {n_train:,} rows"
+              f"{f', holdout {_holdout_frac:.1%} of accts' if _holdout_shards else ''})")
 
         # ── Train v11 ──
         y_scaler, n_scaler, t_scaler, losses, _ = train_diffusion_v11(
-            shard_paths=origin_shards,
+            shard_paths=_train_shards,
             origin=origin,
             epochs=_epochs,
             model=model,
@@ -374,38 +606,25 @@ for variant_tag, sample_size, strat_above, strat_pct in SWEEP_VARIANTS:
             num_dim=_num_dim,
             n_cat=_n_cat,
             work_dirs=variant_work_dirs,
+            holdout_paths=_holdout_shards,
         )
+        _train_info = {
+            "EPOCHS_USED": int(getattr(model, "_epochs_used", len(losses))),
+            "EPOCHS_MAX": int(_epochs),
+            "BEST_EPOCH": int(getattr(model, "_best_epoch", len(losses))),
+            "EARLY_STOP": "holdout" if _holdout_shards else "train_loss",
+            "HOLDOUT_FRAC": _holdout_frac if _holdout_shards else None,
+            "HOLDOUT_LOSS_BEST": min(model._val_losses) if getattr(model, "_val_losses", None) else None,
+            "WARM_START_FROM": int(_warm_origin) if _warm else None,
+        }
+        print(f"  📊 Epochs used {_train_info['EPOCHS_USED']}/{_epochs} (best epoch {_train_info['BEST_EPOCH']})")
 
         # ── Save v11 checkpoint (all 4 modules) ──
-        ckpt_data = {
-            "model_state_dict": model.state_dict(),
-            "gating_net_state_dict": gating_net.state_dict(),
-            "token_persistence_state_dict": token_persistence.state_dict(),
-            "coh_scale_state_dict": coh_scale.state_dict(),
-            "y_scaler_mean": y_scaler.mean_.tolist(),
-            "y_scaler_scale": y_scaler.scale_.tolist(),
-            "n_scaler_mean": n_scaler.mean_.tolist(),
-            "n_scaler_scale": n_scaler.scale_.tolist(),
-            "t_scaler_mean": t_scaler.mean_.tolist(),
-            "t_scaler_scale": t_scaler.scale_.tolist(),
-            "global_medians": _global_medians,
-            "cfg": _cfg,
-            "arch": "v11",
-            # Feature lists: critical for eval-time alignment
-            "num_use": list(_num_use),
-            "cat_use": list(_cat_use),
-            "sweep": {
-                "variant": variant_tag,
-                "sample_size": sample_size,
-                "stratify_above": strat_above,
-                "stratify_target_pct": strat_pct,
-                "n_train": n_train,
-                "epochs": _epochs,
-                "final_loss": losses[-1] if losses else None,
-                "phi_k_final": token_persistence.get_phi_list(),
-                "sigma_u_final": coh_scale.get_sigma(),
-            },
-        }
+        ckpt_data = _v11_ckpt_data(
+            model, gating_net, token_persistence, coh_scale, y_scaler, n_scaler, t_scaler,
+            _global_medians, variant_tag, sample_size, strat_above, strat_pct, n_train, _epochs, losses,
+            train_info=_train_info,
+        )
 
         local_ckpt = os.path.join(variant_scratch, ckpt_name)
         torch.save(ckpt_data, local_ckpt)
@@ -415,6 +634,9 @@ for variant_tag, sample_size, strat_above, strat_pct in SWEEP_VARIANTS:
         print(f"  ⏱  Total time for {variant_tag}/{origin}: {dt:.0f}s")
         print(f"  📊 Final phi_k = {[f'{p:.3f}' for p in token_persistence.get_phi_list()]}")
         print(f"  📊 Final sigma_u = {coh_scale.get_sigma():.3f}")
+        if SWEEP_DISTILL_STEPS > 0:
+            _distill_student(model, gating_net, token_persistence, coh_scale, y_scaler, n_scaler, t_scaler,
+                             list(_train_shards) + list(_holdout_shards), final_path)
 
         sweep_results.append({
             "variant": variant_tag, "origin": origin,
@@ -423,6 +645,13 @@ for variant_tag, sample_size, strat_above, strat_pct in SWEEP_VARIANTS:
             "time_s": dt,
         })
 
+        if SWEEP_WARM_START:
+            _warm_states = {
+                _k: {n: t.detach().cpu().clone() for n, t in _mod.state_dict().items()}
+                for _k, _mod in zip(_WARM_KEYS, (model, gating_net, token_persistence, coh_scale))
+            }
+            _warm_origin = origin
+
         # Free GPU memory
         del model, gating_net, token_persistence, coh_scale
         if _device == "cuda":
@@ -13,16 +13,16 @@ Usage:
   cd v0-properlytic-8v
   python scripts/upload_geo.py [--parcels] [--zcta] [--tracts] [--tabblocks] [--all]
 """
-import os, sys, zipfile, tempfile, time, argparse, io
+import importlib.util, os, sys, zipfile, tempfile, time, argparse, io
 from pathlib import Path
 from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "inference"))
+
 # --- Deps ---
-try:
-    import psycopg2, psycopg2.extras
-except ImportError:
+if importlib.util.find_spec("psycopg2") is None:  # pg_pool's driver
     os.system(f"{sys.executable} -m pip install psycopg2-binary")
-    import psycopg2, psycopg2.extras
+from pg_pool import shared_pool  # noqa: E402
 try:
     import geopandas as gpd
 except ImportError:
@@ -77,10 +77,11 @@ def get_db_connection():
     if not db_url:
         raise RuntimeError("No database URL found in environment")
 
-    conn = psycopg2.connect(db_url)
-    conn.autocommit = True
+    # Connection from the shared pool (scripts/inference/pg_pool.py); upsert batches go
+    # through conn.pool.execute_values_tx, which retries transient errors on a fresh connection
+    conn = shared_pool(db_url, maxconn=2, autocommit=True,
+                       init_sql=["SET statement_timeout = '60min';"]).getconn()
     with conn.cursor() as cur:
-        cur.execute("SET statement_timeout = '60min';")
         try:
             cur.execute("SET SESSION CHARACTERISTICS AS TRANSACTION READ WRITE;")
         except:
@@ -182,30 +183,27 @@ def upload_parcels(conn):
 
     # Batch insert
     inserted = 0
-    with conn.cursor() as cur:
-        batch = []
-        for _, row in gdf.iterrows():
-            geom_wkb = row.geometry.wkb_hex
-            batch.append((row["acct"], geom_wkb))
-            if len(batch) >= BATCH_SIZE:
-                psycopg2.extras.execute_values(
-                    cur,
-                    "INSERT INTO public.geo_parcel_poly (acct, geom) VALUES %s ON CONFLICT (acct) DO NOTHING",
-                    batch,
-                    template="(%s, ST_Multi(ST_SetSRID(ST_GeomFromWKB(decode(%s, 'hex')), 4326)))"
-                )
-                inserted += len(batch)
-                if inserted % 10000 == 0:
-                    print(f"[{ts()}] Parcels: {inserted:,} / {len(gdf):,}")
-                batch = []
-        if batch:
-            psycopg2.extras.execute_values(
-                cur,
+    batch = []
+    for _, row in gdf.iterrows():
+        geom_wkb = row.geometry.wkb_hex
+        batch.append((row["acct"], geom_wkb))
+        if len(batch) >= BATCH_SIZE:
+            conn.pool.execute_values_tx(
                 "INSERT INTO public.geo_parcel_poly (acct, geom) VALUES %s ON CONFLICT (acct) DO NOTHING",
                 batch,
                 template="(%s, ST_Multi(ST_SetSRID(ST_GeomFromWKB(decode(%s, 'hex')), 4326)))"
             )
             inserted += len(batch)
+            if inserted % 10000 == 0:
+                print(f"[{ts()}] Parcels: {inserted:,} / {len(gdf):,}")
+            batch = []
+    if batch:
+        conn.pool.execute_values_tx(
+            "INSERT INTO public.geo_parcel_poly (acct, geom) VALUES %s ON CONFLICT (acct) DO NOTHING",
+            batch,
+            template="(%s, ST_Multi(ST_SetSRID(ST_GeomFromWKB(decode(%s, 'hex')), 4326)))"
+        )
+        inserted += len(batch)
 
     print(f"[{ts()}] ✅ Uploaded {inserted:,} parcels to geo_parcel_poly")
 
@@ -248,30 +246,27 @@ def upload_zcta(conn):
         cur.execute("CREATE INDEX idx_geo_zcta20_us_geom ON public.geo_zcta20_us USING GIST (geom);")
 
     inserted = 0
-    with conn.cursor() as cur:
-        batch = []
-        for _, row in gdf.iterrows():
-            geom_wkb = row.geometry.wkb_hex
-            batch.append((row["zcta5"], geom_wkb))
-            if len(batch) >= BATCH_SIZE:
-                psycopg2.extras.execute_values(
-                    cur,
-                    "INSERT INTO public.geo_zcta20_us (zcta5, geom) VALUES %s ON CONFLICT (zcta5) DO NOTHING",
-                    batch,
-                    template="(%s, ST_Multi(ST_SetSRID(ST_GeomFromWKB(decode(%s, 'hex')), 4326)))"
-                )
-                inserted += len(batch)
-                if inserted % 5000 == 0:
-                    print(f"[{ts()}] ZCTAs: {inserted:,} / {len(gdf):,}")
-                batch = []
-        if batch:
-            psycopg2.extras.execute_values(
-                cur,
+    batch = []
+    for _, row in gdf.iterrows():
+        geom_wkb = row.geometry.wkb_hex
+        batch.append((row["zcta5"], geom_wkb))
+        if len(batch) >= BATCH_SIZE:
+            conn.pool.execute_values_tx(
                 "INSERT INTO public.geo_zcta20_us (zcta5, geom) VALUES %s ON CONFLICT (zcta5) DO NOTHING",
                 batch,
                 template="(%s, ST_Multi(ST_SetSRID(ST_GeomFromWKB(decode(%s, 'hex')), 4326)))"
             )
             inserted += len(batch)
+            if inserted % 5000 == 0:
+                print(f"[{ts()}] ZCTAs: {inserted:,} / {len(gdf):,}")
+            batch = []
+    if batch:
+        conn.pool.execute_values_tx(
+            "INSERT INTO public.geo_zcta20_us (zcta5, geom) VALUES %s ON CONFLICT (zcta5) DO NOTHING",
+            batch,
+            template="(%s, ST_Multi(ST_SetSRID(ST_GeomFromWKB(decode(%s, 'hex')), 4326)))"
+        )
+        inserted += len(batch)
 
     print(f"[{ts()}] ✅ Uploaded {inserted:,} ZCTAs to geo_zcta20_us")
 
@@ -309,28 +304,25 @@ def upload_tracts(conn):
         cur.execute("CREATE INDEX idx_geo_tract20_tx_geom ON public.geo_tract20_tx USING GIST (geom);")
 
     inserted = 0
-    with conn.cursor() as cur:
-        batch = []
-        for _, row in gdf.iterrows():
-            geom_wkb = row.geometry.wkb_hex
-            batch.append((row["geoid"], geom_wkb))
-            if len(batch) >= BATCH_SIZE:
-                psycopg2.extras.execute_values(
-                    cur,
-                    "INSERT INTO public.geo_tract20_tx (geoid, geom) VALUES %s ON CONFLICT (geoid) DO NOTHING",
-                    batch,
-                    template="(%s, ST_Multi(ST_SetSRID(ST_GeomFromWKB(decode(%s, 'hex')), 4326)))"
-                )
-                inserted += len(batch)
-                batch = []
-        if batch:
-            psycopg2.extras.execute_values(
-                cur,
+    batch = []
+    for _, row in gdf.iterrows():
+        geom_wkb = row.geometry.wkb_hex
+        batch.append((row["geoid"], geom_wkb))
+        if len(batch) >= BATCH_SIZE:
+            conn.pool.execute_values_tx(
                 "INSERT INTO public.geo_tract20_tx (geoid, geom) VALUES %s ON CONFLICT (geoid) DO NOTHING",
                 batch,
                 template="(%s, ST_Multi(ST_SetSRID(ST_GeomFromWKB(decode(%s, 'hex')), 4326)))"
             )
             inserted += len(batch)
+            batch = []
+    if batch:
+        conn.pool.execute_values_tx(
+            "INSERT INTO public.geo_tract20_tx (geoid, geom) VALUES %s ON CONFLICT (geoid) DO NOTHING",
+            batch,
+            template="(%s, ST_Multi(ST_SetSRID(ST_GeomFromWKB(decode(%s, 'hex')), 4326)))"
+        )
+        inserted += len(batch)
 
     print(f"[{ts()}] ✅ Uploaded {inserted:,} TX tracts to geo_tract20_tx")
 
@@ -368,30 +360,27 @@ def upload_tabblocks(conn):
         cur.execute("CREATE INDEX idx_geo_tabblock20_tx_geom ON public.geo_tabblock20_tx USING GIST (geom);")
 
     inserted = 0
-    with conn.cursor() as cur:
-        batch = []
-        for _, row in gdf.iterrows():
-            geom_wkb = row.geometry.wkb_hex
-            batch.append((row["geoid20"], geom_wkb))
-            if len(batch) >= BATCH_SIZE:
-                psycopg2.extras.execute_values(
-                    cur,
-                    "INSERT INTO public.geo_tabblock20_tx (geoid20, geom) VALUES %s ON CONFLICT (geoid20) DO NOTHING",
-                    batch,
-                    template="(%s, ST_Multi(ST_SetSRID(ST_GeomFromWKB(decode(%s, 'hex')), 4326)))"
-                )
-                inserted += len(batch)
-                if inserted % 50000 == 0:
-                    print(f"[{ts()}] Tabblocks: {inserted:,} / {len(gdf):,}")
-                batch = []
-        if batch:
-            psycopg2.extras.execute_values(
-                cur,
+    batch = []
+    for _, row in gdf.iterrows():
+        geom_wkb = row.geometry.wkb_hex
+        batch.append((row["geoid20"], geom_wkb))
+        if len(batch) >= BATCH_SIZE:
+            conn.pool.execute_values_tx(
                 "INSERT INTO public.geo_tabblock20_tx (geoid20, geom) VALUES %s ON CONFLICT (geoid20) DO NOTHING",
                 batch,
                 template="(%s, ST_Multi(ST_SetSRID(ST_GeomFromWKB(decode(%s, 'hex')), 4326)))"
             )
             inserted += len(batch)
+            if inserted % 50000 == 0:
+                print(f"[{ts()}] Tabblocks: {inserted:,} / {len(gdf):,}")
+            batch = []
+    if batch:
+        conn.pool.execute_values_tx(
+            "INSERT INTO public.geo_tabblock20_tx (geoid20, geom) VALUES %s ON CONFLICT (geoid20) DO NOTHING",
+            batch,
+            template="(%s, ST_Multi(ST_SetSRID(ST_GeomFromWKB(decode(%s, 'hex')), 4326)))"
+        )
+        inserted += len(batch)
 
     print(f"[{ts()}] ✅ Uploaded {inserted:,} TX tabblocks to geo_tabblock20_tx")
 
@@ -14,16 +14,16 @@ Usage:
 By default uploads zcta + tract + tabblock aggregate history.
 Use --parcel to also upload parcel-level history (30M rows — slow).
 """
-import os, sys, time, argparse
+import importlib.util, os, sys, time, argparse
 from pathlib import Path
 from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "inference"))
+
 # --- Deps ---
-try:
-    import psycopg2, psycopg2.extras
-except ImportError:
+if importlib.util.find_spec("psycopg2") is None:  # pg_pool's driver
     os.system(f"{sys.executable} -m pip install psycopg2-binary")
-    import psycopg2, psycopg2.extras
+from pg_pool import shared_pool  # noqa: E402
 try:
     import pandas as pd
 except ImportError:
@@ -81,10 +81,11 @@ def get_db_connection():
     if not db_url:
         raise RuntimeError("No database URL found in environment")
 
-    conn = psycopg2.connect(db_url)
-    conn.autocommit = True
+    # Connection from the shared pool (scripts/inference/pg_pool.py); upsert batches go
+    # through conn.pool.execute_values_tx, which retries transient errors on a fresh connection
+    conn = shared_pool(db_url, maxconn=2, autocommit=True,
+                       init_sql=["SET statement_timeout = '120min';"]).getconn()
     with conn.cursor() as cur:
-        cur.execute("SET statement_timeout = '120min';")
         try:
             cur.execute("SET SESSION CHARACTERISTICS AS TRANSACTION READ WRITE;")
         except:
@@ -135,14 +136,15 @@ def upsert_history(conn, table, key_col, records):
     """
     template = "(%s, %s, %s, %s, %s, 'history', '__history__')"
 
+    # each batch is its own pooled transaction, retried on transient errors
+    # (a dropped pooler connection no longer kills a 30M-row parcel upload)
     inserted = 0
-    with conn.cursor() as cur:
-        for i in range(0, len(records), BATCH_SIZE):
-            batch = records[i : i + BATCH_SIZE]
-            psycopg2.extras.execute_values(cur, sql, batch, template=template)
-            inserted += len(batch)
-            if inserted % 5000 < BATCH_SIZE:
-                print(f"[{ts()}]   {table}: {inserted:,} / {len(records):,}")
+    for i in range(0, len(records), BATCH_SIZE):
+        batch = records[i : i + BATCH_SIZE]
+        conn.pool.execute_values_tx(sql, batch, template=template, label=table)
+        inserted += len(batch)
+        if inserted % 5000 < BATCH_SIZE:
+            print(f"[{ts()}]   {table}: {inserted:,} / {len(records):,}")
 
     print(f"[{ts()}] ✅ Upserted {inserted:,} rows into {table}")
     return inserted
@@ -54,8 +54,13 @@ def train_worldmodel(
     epochs: int = 60,
     sample_size: int = 500_000,
     origin: int = 2019,
+    min_origin: int = 0,
 ):
-    """Download panel from GCS, adapt schema, train v11 model."""
+    """Download panel from GCS, adapt schema, train v11 model.
+
+    min_origin > 0 trains every origin in [min_origin, origin] jointly from one
+    master shard build (SWEEP_JOINT_ORIGINS) instead of origin alone.
+    """
     import json, time, tempfile, shutil
     import numpy as np
     import polars as pl
@@ -237,8 +242,9 @@ def train_worldmodel(
     os.environ["WM_MAX_ACCTS"] = str(sample_size)
     os.environ["WM_SAMPLE_FRACTION"] = "1.0"
     os.environ["SWEEP_EPOCHS"] = str(epochs)
-    os.environ["BACKTEST_MIN_ORIGIN"] = str(origin)
+    os.environ["BACKTEST_MIN_ORIGIN"] = str(min_origin if 0 < min_origin < origin else origin)
     os.environ["FORECAST_ORIGIN_YEAR"] = str(origin)
+    os.environ["SWEEP_JOINT_ORIGINS"] = "1" if 0 < min_origin < origin else "0"
 
     # Create output directory
     out_dir = f"/output/{jurisdiction_suffix}_v11"
@@ -342,6 +348,8 @@ def train_worldmodel(
     # ─── Fix EVAL_ORIGINS for our year range ───
     # Default EVAL_ORIGINS=[2021,2022,2023,2024] is wrong for origin=2019
     globals()['EVAL_ORIGINS'] = [origin - 3, origin - 2, origin - 1, origin]
+    if 0 < min_origin < origin:
+        globals()['EVAL_ORIGINS'] = list(range(min_origin, origin + 1))
     print(f"  Patched EVAL_ORIGINS={globals()['EVAL_ORIGINS']}")
 
     # ─── Force NUM_DIM/N_CAT to match actual feature lists ───
@@ -419,19 +427,21 @@ def main(
     epochs: int = 60,
     sample_size: int = 500_000,
     origin: int = 2019,
+    min_origin: int = 0,
 ):
-    """Entry point: modal run scripts/train_modal.py --jurisdiction sf_ca"""
+    """Entry point: modal run scripts/train_modal.py --jurisdiction sf_ca [--min-origin 2016 --origin 2019]"""
     print(f"🚀 Launching v11 training on Modal A100")
     print(f"   Jurisdiction: {jurisdiction}")
     print(f"   Epochs: {epochs}")
     print(f"   Sample: {sample_size:,}")
-    print(f"   Origin: {origin}")
+    print(f"   Origin: {origin}" + (f" (joint from {min_origin})" if 0 < min_origin < origin else ""))
 
     result = train_worldmodel.remote(
         jurisdiction=jurisdiction,
         epochs=epochs,
         sample_size=sample_size,
         origin=origin,
+        min_origin=min_origin,
     )
 
     print(f"\n✅ Training complete!")